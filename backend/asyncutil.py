@@ -0,0 +1,20 @@
+# ⏳ asyncio-Hilfen für Stadtwache
+# Ohne Abhängigkeiten, damit Hintergrunddienste (jobs, checkin_monitor) sie ohne Importzyklus nutzen können
+
+import asyncio
+from typing import Optional
+
+
+async def wait_for_event(event: asyncio.Event, timeout: Optional[float]) -> bool:
+    """Wait until ``event`` is set or ``timeout`` passes; returns whether it was set.
+
+    asyncio.wait instead of wait_for: on Python 3.11 wait_for swallows a cancel()
+    that arrives together with event.set(), and the calling loop would keep
+    running through shutdown.
+    """
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait((waiter,), timeout=timeout)
+    finally:
+        waiter.cancel()
+    return event.is_set()
@@ -0,0 +1,156 @@
+# 📦 Batch-Requests für Stadtwache
+# Mehrere GET-Aufrufe in einem Round-Trip: eine Authentifizierung, parallele In-Process-Ausführung,
+# gebündelte Antwort (Dashboard-Start über Mobilfunk)
+
+import os
+import json
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from pydantic import BaseModel
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+BATCH_TIMEOUT_SECONDS = float(os.getenv("BATCH_TIMEOUT_SECONDS", "30"))
+BATCH_PATH = "/api/batch"
+
+# Nur diese Header der Teilanfragen werden weitergereicht bzw. zurückgegeben
+FORWARDED_REQUEST_HEADERS = {"if-none-match", "accept-language"}
+RETURNED_RESPONSE_HEADERS = {"etag", "cache-control", "content-type"}
+
+BATCH_SIZE = metrics.histogram(
+    "http_batch_size", "Sub-requests per batch request", buckets=(1, 2, 3, 5, 8, 10, 15, 20, 50))
+
+# (Token, User) der Batch-Anfrage - get_current_user spart sich JWT und Datenbank für Teilanfragen
+batch_user: ContextVar[Optional[Tuple[str, Any]]] = ContextVar("batch_user", default=None)
+
+# ================================================
+# MODELLE
+# ================================================
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str  # "/api/incidents" oder "/incidents", optional mit Query-String
+    headers: Dict[str, str] = {}
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
+# ================================================
+# AUSFÜHRUNG
+# ================================================
+
+def validate_batch(batch: BatchRequest) -> Optional[str]:
+    """Error message for an unacceptable batch, None if fine"""
+    if not batch.requests:
+        return "Empty batch"
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        return f"At most {BATCH_MAX_REQUESTS} requests per batch"
+    for item in batch.requests:
+        if item.method.upper() != "GET":
+            return f"Only GET sub-requests are supported ({item.method} {item.path})"
+        path = _normalize(item.path).split("?", 1)[0]
+        if path == BATCH_PATH or ".." in path:
+            return f"Invalid sub-request path {item.path}"
+    return None
+
+
+def _normalize(path: str) -> str:
+    if not path.startswith("/"):
+        path = "/" + path
+    return path if path.startswith("/api/") else "/api" + path
+
+
+async def _dispatch(app, parent_scope: Dict[str, Any], authorization: bytes,
+                    item: BatchItem) -> Tuple[int, Dict[str, str], bytes]:
+    path, _, query = _normalize(item.path).partition("?")
+    headers = [(b"authorization", authorization), (b"accept", b"application/json")]
+    headers += [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in item.headers.items() if name.lower() in FORWARDED_REQUEST_HEADERS]
+    scope = {
+        "type": "http",
+        "asgi": parent_scope.get("asgi", {"version": "3.0"}),
+        "http_version": parent_scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": parent_scope.get("scheme", "http"),
+        "path": path,
+        "raw_path": quote(path).encode(),
+        "root_path": "",
+        "query_string": query.encode("latin-1"),
+        "headers": headers,
+        "client": parent_scope.get("client"),
+        "server": parent_scope.get("server"),
+    }
+    if "state" in parent_scope:
+        scope["state"] = parent_scope["state"]
+
+    status = 500
+    response_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            for name, value in message.get("headers", []):
+                name = name.decode("latin-1").lower()
+                if name in RETURNED_RESPONSE_HEADERS:
+                    response_headers[name] = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await asyncio.wait_for(app(scope, receive, send), BATCH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return 504, {}, b'{"detail":"Sub-request timed out"}'
+    except Exception as e:
+        logger.error(f"❌ Batch sub-request {item.path} failed: {e}")
+        return 500, {}, b'{"detail":"Internal Server Error"}'
+    return status, response_headers, b"".join(chunks)
+
+
+async def run_batch(app, scope: Dict[str, Any], authorization: str, user: Any, batch: BatchRequest) -> bytes:
+    """Execute all sub-requests concurrently and return the multiplexed JSON body.
+
+    Sub-requests go through the full ASGI app (middleware, routing,
+    dependencies), only authentication is short-circuited via ``batch_user``.
+    JSON bodies are spliced into the envelope as-is instead of being decoded
+    and encoded again.
+    """
+    BATCH_SIZE.labels().observe(len(batch.requests))
+    token = authorization.partition(" ")[2]
+    context_token = batch_user.set((token, user))
+    try:
+        results = await asyncio.gather(*(
+            _dispatch(app, scope, authorization.encode("latin-1"), item) for item in batch.requests
+        ))
+    finally:
+        batch_user.reset(context_token)
+
+    parts = []
+    for index, (item, (status, headers, body)) in enumerate(zip(batch.requests, results)):
+        if not body:
+            payload = b"null"
+        elif headers.get("content-type", "").startswith("application/json"):
+            payload = body
+        else:
+            payload = json.dumps(body.decode("utf-8", errors="replace")).encode()
+        envelope = json.dumps({"id": item.id if item.id is not None else str(index), "status": status,
+                               "headers": headers}, ensure_ascii=False)
+        parts.append(envelope[:-1].encode() + b',"body":' + payload + b"}")
+    return b'{"responses":[' + b",".join(parts) + b"]}"
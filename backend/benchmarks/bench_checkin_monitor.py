@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Check-In-Überwachung mit Deadline-Heap bei 10.000 Beamten im Dienst
+Legt --users Beamte mit einem Check-In-Intervall von einer Minute an, deren Fristen nach --warmup Sekunden
+innerhalb von --spread Sekunden ablaufen; ein Teil (--check-in-ratio) checkt vorher ein. Gemessen werden:
+
+  - Aufbau des Heaps (Laden aller Beamten im Dienst) und Speicherbedarf
+  - Aufwachverzögerung gegenüber der Frist, Anzahl Durchläufe und Datenbank-Roundtrips
+  - Korrektheit: gemeldet, nicht gemeldet, doppelt und fälschlich gemeldet (Check-In vor der Frist);
+    zu spät gekommene Check-Ins des Lastgenerators werden getrennt ausgewiesen, nicht herausgerechnet
+  - Vergleich: naiver Scan aller Beamten im Dienst pro Sekunde
+
+Backends: eingebettetes SQLite (Standard), MongoDB (--mongo-url) oder mongomock (--mongomock; durchsucht
+jede Abfrage linear und ist daher nur für wenige tausend Beamte brauchbar).
+
+    python benchmarks/bench_checkin_monitor.py
+    python benchmarks/bench_checkin_monitor.py --mongo-url mongodb://localhost:27017 --users 50000
+    python benchmarks/bench_checkin_monitor.py --mongomock --users 1000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# ================================================
+# DATENBANK
+# ================================================
+
+async def open_database(args):
+    """(database, close coroutine) for the selected backend"""
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url)
+        await client.drop_database(args.db_name)
+
+        async def close():
+            await client.drop_database(args.db_name)
+            client.close()
+        return client[args.db_name], close
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+
+        async def close():
+            pass
+        return AsyncMongoMockClient()[args.db_name], close
+    from sqlite_store import EmbeddedStore
+    store = EmbeddedStore(f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/checkins.db")
+    await store.open()
+    return store.database(args.db_name), store.close
+
+
+class CountingDatabase:
+    """``db.users`` proxy for the monitor that counts its database roundtrips"""
+
+    def __init__(self, db):
+        self.db = db
+        self.users = self
+        self.roundtrips = 0
+
+    def find(self, *args, **kwargs):
+        self.roundtrips += 1
+        return self.db.users.find(*args, **kwargs)
+
+    def update_many(self, *args, **kwargs):
+        self.roundtrips += 1
+        return self.db.users.update_many(*args, **kwargs)
+
+
+async def seed_officers(db, args, start: datetime):
+    """Officers with 1-minute intervals whose deadlines fall into ``args.spread`` seconds from ``start``"""
+    rng = random.Random(args.seed)
+    teams = [{"id": str(uuid.uuid4()), "name": f"Streife {n}", "leader_id": None} for n in range(args.teams)]
+    users = []
+    for n in range(args.users):
+        team = teams[n % len(teams)]
+        users.append({
+            "id": str(uuid.uuid4()),
+            "email": f"beamter{n}@stadtwache.local",
+            "username": f"Beamter {n}",
+            "role": "police",
+            "status": rng.choice(("Im Dienst", "Streife", "Einsatz")),
+            "is_active": True,
+            "check_in_interval": 1,
+            "last_check_in": start - timedelta(seconds=60 - rng.uniform(0, args.spread)),
+            "missed_check_ins": 0,
+            "patrol_team": team["id"],
+        })
+        if team["leader_id"] is None:
+            team["leader_id"] = users[-1]["id"]
+    # Nicht im Dienst: darf nie gemeldet werden
+    users += [{**user, "id": str(uuid.uuid4()), "email": f"pause.{user['email']}", "status": "Pause"}
+              for user in users[:args.users // 10]]
+    for start in range(0, len(users), 5000):
+        await db.users.insert_many(users[start:start + 5000])
+    await db.teams.insert_many(teams)
+    await db.users.create_index("id", unique=True)
+    await db.users.create_index("status")
+    return users[:args.users]
+
+# ================================================
+# MESSUNG
+# ================================================
+
+async def run(args) -> dict:
+    from checkin_monitor import ON_DUTY_STATUSES, CheckInMonitor
+
+    db, close = await open_database(args)
+    setup_started = time.perf_counter()
+    # Fristen beginnen erst nach --warmup: Seed und Heap-Aufbau sollen keinen künstlichen Rückstau erzeugen
+    start = datetime.utcnow() + timedelta(seconds=args.warmup)
+    officers = await seed_officers(db, args, start)
+
+    alerts, batches = [], []
+
+    async def on_missed(batch):
+        received = datetime.utcnow()
+        batches.append(len(batch))
+        for alert in batch:
+            alerts.append((alert["user_id"], (received - alert["deadline"]).total_seconds()))
+
+    counting = CountingDatabase(db)
+    monitor = CheckInMonitor(counting, on_missed)
+    tracemalloc.start()
+    started = time.perf_counter()
+    await monitor.load()
+    load_seconds = time.perf_counter() - started
+    heap_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    setup_seconds = time.perf_counter() - setup_started
+    counting.roundtrips = 0
+
+    rng = random.Random(args.seed + 1)
+    checking_in = set(o["id"] for o in rng.sample(officers, int(len(officers) * args.check_in_ratio)))
+    task = asyncio.create_task(monitor.run_forever())
+    monitor_started = datetime.utcnow()
+    cpu_started = time.process_time()
+
+    # Check-Ins kurz vor der jeweiligen Frist, wie über /api/checkin
+    late = set()
+
+    async def check_in(officer):
+        deadline = officer["last_check_in"] + timedelta(minutes=1)
+        await asyncio.sleep(max(0.0, (deadline - datetime.utcnow()).total_seconds() - args.check_in_lead))
+        at = datetime.utcnow()
+        if at >= deadline:
+            late.add(officer["id"])  # Lastgenerator kam nach der Frist: das Versäumnis ist echt
+        await db.users.update_one({"id": officer["id"]}, {"$set": {"last_check_in": at, "missed_check_ins": 0}})
+        monitor.checked_in(officer["id"], at, 1)
+
+    await asyncio.gather(*(check_in(o) for o in officers if o["id"] in checking_in))
+    await asyncio.sleep(max(0.0, (start + timedelta(seconds=args.spread + 2) - datetime.utcnow()).total_seconds()))
+    cpu_seconds = time.process_time() - cpu_started
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    expected = {o["id"] for o in officers} - checking_in
+    reported = [user_id for user_id, _ in alerts]
+    reported_set = set(reported)
+    counted = await db.users.count_documents({"missed_check_ins": 1})
+    delays = sorted(delay for _, delay in alerts)
+
+    # Naiver Ansatz: jede Sekunde alle Beamten im Dienst lesen und Fristen prüfen
+    scans = []
+    for _ in range(args.naive_scans):
+        scan_started = time.perf_counter()
+        docs = await db.users.find(
+            {"is_active": {"$ne": False}, "status": {"$in": list(ON_DUTY_STATUSES)}},
+            {"_id": 0, "id": 1, "last_check_in": 1, "check_in_interval": 1, "missed_check_ins": 1}
+        ).to_list(None)
+        horizon = datetime.utcnow()
+        _ = [d for d in docs if d["last_check_in"] + timedelta(minutes=d["check_in_interval"]) <= horizon]
+        scans.append(time.perf_counter() - scan_started)
+
+    await close()
+    return {
+        "backend": "mongodb" if args.mongo_url else "mongomock" if args.mongomock else "sqlite",
+        "officers_on_duty": len(officers),
+        "heap": {"load_seconds": round(load_seconds, 3), "tracked": len(officers),
+                 "traced_kb_during_load": heap_bytes // 1024},
+        "run": {
+            "spread_seconds": args.spread,
+            "setup_seconds": round(setup_seconds, 2),
+            # > 0: --warmup zu kurz, der erste Durchlauf beginnt mit einem Rückstau
+            "overdue_when_monitor_started": sum(
+                1 for o in officers if o["last_check_in"] + timedelta(minutes=1) <= monitor_started),
+            "batches": len(batches),
+            "db_roundtrips": counting.roundtrips,
+            "largest_batch": max(batches, default=0),
+            "cpu_seconds": round(cpu_seconds, 3),
+            "wake_delay_ms": {
+                "p50": round(statistics.median(delays) * 1000, 1) if delays else None,
+                "p99": round(delays[int(len(delays) * 0.99) - 1] * 1000, 1) if delays else None,
+                "max": round(delays[-1] * 1000, 1) if delays else None,
+            },
+        },
+        "correct": {
+            "expected_missed": len(expected),
+            "reported": len(reported),
+            "not_reported": len(expected - reported_set),
+            "duplicate_alerts": len(reported) - len(reported_set),
+            # Gemeldet, obwohl der Check-In vor der Frist lag
+            "false_alerts": len(reported_set & (checking_in - late)),
+            # Check-In des Lastgenerators erst nach der Frist (überlastete Ereignisschleife)
+            "late_check_ins": len(late),
+            "alerts_for_late_check_ins": len(reported_set & late),
+            "reported_exactly_expected": reported_set == expected and len(reported) == len(reported_set),
+            "missed_check_ins_incremented": counted,
+        },
+        "naive_scan": {
+            "median_ms": round(statistics.median(scans) * 1000, 1) if scans else None,
+            "docs_per_scan": len(officers),
+            "docs_read_per_minute_at_1s": len(officers) * 60,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000, help="officers on duty")
+    parser.add_argument("--teams", type=int, default=200)
+    parser.add_argument("--warmup", type=float, default=10,
+                        help="seconds for seeding and loading before the first deadline")
+    parser.add_argument("--spread", type=float, default=20, help="deadlines fall into N seconds after the warmup")
+    parser.add_argument("--check-in-ratio", type=float, default=0.3, help="officers checking in before their deadline")
+    parser.add_argument("--check-in-lead", type=float, default=2, help="seconds before the deadline")
+    parser.add_argument("--naive-scans", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongomock", action="store_true",
+                        help="in-process mongomock instead of the embedded SQLite store")
+    parser.add_argument("--mongo-url", default=None, help="real MongoDB instead of the embedded SQLite store")
+    parser.add_argument("--db-name", default="stadtwache_bench_checkins")
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
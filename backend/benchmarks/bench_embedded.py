@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Startzeit und Speicherbedarf eingebettetes SQLite gegen MongoDB
+Startet den Server je Modus in einem eigenen Prozess (gleiche Seed-Daten) und misst Import,
+Startup-Hooks, Zeit bis die Nachrichtensuche bereit ist, erste Antworten sowie RSS/Peak-RSS
+aus /proc/self/status. Bei MongoDB zählt der mongod-Prozess mit (--mongod-pid).
+
+MongoDB: --mongo-url (empfohlen) oder mongomock im selben Prozess (nur als Näherung).
+
+    python benchmarks/bench_embedded.py
+    python benchmarks/bench_embedded.py --mongo-url mongodb://localhost:27017 --mongod-pid $(pidof mongod)
+    python benchmarks/bench_embedded.py --messages 200000 --locations 200000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+REQUESTS = ("/api/incidents", "/api/messages?channel=general", "/api/persons", "/api/users",
+            "/api/messages/search?q=einsatz", "/api/persons/search?q=mue")
+
+
+def _status_kb(pid="self"):
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                name, amount = line.split(":")
+                values[name] = int(amount.split()[0])
+    return values
+
+
+def _environment(args, mode: str, sqlite_path: str):
+    env = dict(os.environ, RETENTION_ENABLED="false", PYTHONDONTWRITEBYTECODE="1")
+    if mode == "sqlite":
+        env.update(STORAGE_BACKEND="sqlite", SQLITE_DB=sqlite_path)
+    else:
+        env["STORAGE_BACKEND"] = "mongo"
+        if args.mongo_url:
+            env.update(MONGO_URL=args.mongo_url, DB_NAME=args.db_name)
+    return env
+
+
+def _seed_config(args):
+    from seed import SeedConfig
+    return SeedConfig(users=args.users, teams=10, districts=4, incidents=args.incidents, image_kb=args.image_kb,
+                      persons=args.persons, reports=args.reports, messages=args.messages,
+                      locations=args.locations, days=7)
+
+
+async def _seed(server, args):
+    from seed import seed_database
+    if args.mongo_url and server.store is None:
+        await server.client.drop_database(args.db_name)
+    await seed_database(server.db, _seed_config(args))
+
+# ================================================
+# KINDPROZESS
+# ================================================
+
+async def child(args) -> dict:
+    started = time.perf_counter()
+    import server
+    imported = time.perf_counter()
+
+    if args.prepare:
+        if server.store is not None:
+            await server.store.open()
+        await _seed(server, args)
+        if server.store is not None:
+            await server.store.close()
+        return {"prepared": True}
+    if server.store is None and not args.mongo_url:
+        # mongomock lebt im Prozess: Daten vor dem Start laden, nicht mitgemessen
+        from mongomock_motor import AsyncMongoMockClient
+        from loadtest import _bind_database
+        client = AsyncMongoMockClient()
+        _bind_database(server, client, client[args.db_name])
+        await _seed(server, args)
+
+    before_startup = time.perf_counter()
+    await server.app.router.startup()
+    startup_done = time.perf_counter()
+    while not server.message_index.ready:
+        await asyncio.sleep(0.01)
+    search_ready = time.perf_counter()
+    idle = _status_kb()
+
+    import httpx
+    admin = await server.db.users.find_one({"role": "admin"})
+    token = server.create_access_token(data={"sub": admin["email"], "user_id": admin["id"], "role": "admin"},
+                                       expires_delta=timedelta(hours=1))
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "identity"}
+    first_requests = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench") as http:
+        for path in REQUESTS:
+            request_started = time.perf_counter()
+            response = await http.get(path, headers=headers)
+            response.raise_for_status()
+            first_requests[path] = round((time.perf_counter() - request_started) * 1000, 1)
+    await server.app.router.shutdown()
+    after = _status_kb()
+
+    return {
+        "import_s": round(imported - started, 3),
+        "startup_s": round(startup_done - before_startup, 3),
+        "search_ready_s": round(search_ready - before_startup, 3),
+        "idle_rss_mb": round(idle["VmRSS"] / 1024, 1),
+        "rss_mb": round(after["VmRSS"] / 1024, 1),
+        "peak_rss_mb": round(after["VmHWM"] / 1024, 1),
+        "first_requests_ms": first_requests,
+        "message_index_entries": len(server.message_index),
+    }
+
+# ================================================
+# STEUERUNG
+# ================================================
+
+def _run_child(args, mode: str, sqlite_path: str, prepare: bool = False) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--child", *sys.argv[1:]]
+    if prepare:
+        command.append("--prepare")
+    result = subprocess.run(command, env=_environment(args, mode, sqlite_path), capture_output=True, text=True,
+                            cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    if result.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(args) -> int:
+    sqlite_path = os.path.join(tempfile.mkdtemp(prefix="stadtwache-embedded-"), "stadtwache.db")
+    modes = ("sqlite", "mongo")
+    for mode in modes:
+        if mode == "sqlite" or args.mongo_url:
+            _run_child(args, mode, sqlite_path, prepare=True)
+
+    report = {"config": {"users": args.users, "messages": args.messages, "locations": args.locations,
+                         "mongo": args.mongo_url or "mongomock (in-process)"}}
+    for mode in modes:
+        runs = [_run_child(args, mode, sqlite_path) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run["startup_s"])
+        best["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+        report[mode] = best
+    report["sqlite"]["database_mb"] = round(sum(
+        os.path.getsize(path) for path in (sqlite_path, f"{sqlite_path}-wal") if os.path.exists(path)) / 2**20, 1)
+    if args.mongod_pid:
+        report["mongo"]["mongod_rss_mb"] = round(_status_kb(args.mongod_pid)["VmRSS"] / 1024, 1)
+
+    print(f"{'':22} {'sqlite':>10} {'mongo':>10}")
+    for key in ("import_s", "startup_s", "search_ready_s", "idle_rss_mb", "rss_mb", "peak_rss_mb"):
+        print(f"{key:22} {report['sqlite'][key]:>10} {report['mongo'][key]:>10}")
+    for path in REQUESTS:
+        print(f"{path[:22]:22} {report['sqlite']['first_requests_ms'][path]:>10} "
+              f"{report['mongo']['first_requests_ms'][path]:>10}")
+    extras = {"sqlite database_mb": report["sqlite"]["database_mb"]}
+    if "mongod_rss_mb" in report["mongo"]:
+        extras["mongod_rss_mb"] = report["mongo"]["mongod_rss_mb"]
+    print(json.dumps(extras))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-url", help="local MongoDB (default: in-process mongomock)")
+    parser.add_argument("--mongod-pid", type=int, help="add the RSS of this mongod process to the report")
+    parser.add_argument("--db-name", default="stadtwache_bench_embedded")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--incidents", type=int, default=500)
+    parser.add_argument("--image-kb", type=int, default=20)
+    parser.add_argument("--persons", type=int, default=500)
+    parser.add_argument("--reports", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--locations", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.child:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        print(json.dumps(asyncio.run(child(arguments))))
+        sys.exit(0)
+    sys.exit(main(arguments))
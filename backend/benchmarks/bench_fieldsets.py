@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Antwortgröße der Listen-Endpunkte mit und ohne ?fields=
+Legt eine Dienststelle über seed.py an (mongomock oder lokale MongoDB) und ruft jeden
+Listen-Endpunkt einmal vollständig und einmal mit den Feldern der jeweiligen App-Liste ab:
+Bytes roh und gzip, Einsparung in Prozent, Antwortzeit
+
+    python benchmarks/bench_fieldsets.py
+    python benchmarks/bench_fieldsets.py --incidents 100 --image-kb 200
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from seed import SeedConfig, seed_database  # noqa: E402
+
+# Felder, die die jeweilige Listenansicht der App tatsächlich anzeigt
+ENDPOINTS = {
+    "/api/incidents": "title,priority,status,address,location,created_at",
+    "/api/persons": "first_name,last_name,status,priority,case_number",
+    "/api/reports": "title,author_name,shift_date,status,created_at",
+    "/api/messages?channel=general": "content,sender_name,timestamp",
+    "/api/users": "username,rank,status,service_number",
+    "/api/admin/districts": "name",
+    "/api/admin/teams": "name,status",
+}
+
+
+def _separator(path: str) -> str:
+    return "&" if "?" in path else "?"
+
+
+async def _measure(http, path: str, headers, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await http.get(path, headers=headers)
+        timings.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return response.content, min(timings)
+
+
+async def main(args) -> int:
+    if args.mongo_url:
+        os.environ["MONGO_URL"] = args.mongo_url
+        os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("RETENTION_ENABLED", "false")
+
+    import httpx
+    import server
+    from loadtest import _bind_database
+
+    if args.mongo_url:
+        await server.client.drop_database(args.db_name)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+        _bind_database(server, client, client[args.db_name])
+
+    config = SeedConfig(users=args.users, teams=5, districts=4, incidents=args.incidents, image_kb=args.image_kb,
+                        persons=args.persons, reports=args.reports, messages=args.messages, locations=0, days=7)
+    await seed_database(server.db, config)
+    admin = await server.db.users.find_one({"role": "admin"})
+    token = server.create_access_token(data={"sub": admin["email"], "user_id": admin["id"], "role": "admin"},
+                                       expires_delta=timedelta(hours=1))
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "identity"}
+
+    rows = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench") as http:
+        for path, fields in ENDPOINTS.items():
+            full, full_time = await _measure(http, path, headers, args.repeat)
+            sparse, sparse_time = await _measure(http, f"{path}{_separator(path)}fields={fields}", headers, args.repeat)
+            assert len(json.loads(full)) == len(json.loads(sparse)), path
+            full_gz, sparse_gz = len(gzip.compress(full)), len(gzip.compress(sparse))
+            rows.append({
+                "endpoint": path,
+                "items": len(json.loads(full)),
+                "full_bytes": len(full),
+                "sparse_bytes": len(sparse),
+                "reduction_pct": round(100 * (1 - len(sparse) / len(full)), 1) if full else 0.0,
+                "full_gzip_bytes": full_gz,
+                "sparse_gzip_bytes": sparse_gz,
+                "full_ms": round(full_time * 1000, 2),
+                "sparse_ms": round(sparse_time * 1000, 2),
+            })
+
+    print(f"{'endpoint':32} {'items':>5} {'full':>10} {'sparse':>9} {'saved':>7} {'full gz':>9} "
+          f"{'sparse gz':>9} {'full ms':>8} {'sparse ms':>9}")
+    for row in rows:
+        print(f"{row['endpoint']:32} {row['items']:>5} {row['full_bytes']:>10} {row['sparse_bytes']:>9} "
+              f"{row['reduction_pct']:>6}% {row['full_gzip_bytes']:>9} {row['sparse_gzip_bytes']:>9} "
+              f"{row['full_ms']:>8} {row['sparse_ms']:>9}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-url", help="local MongoDB (default: in-process mongomock)")
+    parser.add_argument("--db-name", default="stadtwache_bench_fieldsets")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--incidents", type=int, default=100)
+    parser.add_argument("--image-kb", type=int, default=50)
+    parser.add_argument("--persons", type=int, default=100)
+    parser.add_argument("--reports", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the rows as JSON")
+    sys.exit(asyncio.run(main(parser.parse_args())))
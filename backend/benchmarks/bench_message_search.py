@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Nachrichtensuche mit 1M Nachrichten
+Misst Aufbauzeit, Speicherbedarf und Abfrage-Latenzen des MessageSearchIndex
+
+    python benchmarks/bench_message_search.py --messages 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from message_search import MessageSearchIndex  # noqa: E402
+
+WORDS = (
+    "einsatz streife marktplatz hauptstraße bahnhof verkehrsunfall ruhestörung kontrolle "
+    "fahrzeug kennzeichen zeuge verdächtig person vermisst gesucht gefunden bericht schicht "
+    "pause zentrale funk standort ankunft abfahrt notruf rettungswagen feuerwehr sperrung "
+    "parkverstoß diebstahl einbruch alarm lage ruhig unterstützung benötigt bestätigt erledigt "
+    "schwelm wuppertal hagen innenstadt nordstadt südring brücke schule kindergarten park"
+).split()
+RARE_WORDS = ["blaulichtkonvoi", "drohnensichtung", "wasserrohrbruch", "gasgeruch"]
+CHANNELS = ["general", "emergency", "incidents", "private"]
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def generate_messages(count, senders, seed):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    step = timedelta(days=270) / count
+    for i in range(count):
+        words = rng.choices(WORDS, k=rng.randint(4, 14))
+        if rng.random() < 0.001:
+            words.append(rng.choice(RARE_WORDS))
+        channel = rng.choice(CHANNELS)
+        sender = rng.choice(senders)
+        yield {
+            "id": str(uuid.uuid4()),
+            "content": " ".join(words).capitalize(),
+            "sender_id": sender[0],
+            "sender_name": sender[1],
+            "recipient_id": rng.choice(senders)[0] if channel == "private" else None,
+            "channel": channel,
+            "timestamp": start + step * i,
+        }
+
+
+def measure(index, label, runs, **kwargs):
+    latencies = []
+    hits = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        ids, _ = index.search(**kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits = len(ids)
+    latencies.sort()
+    return {
+        "query": label,
+        "hits": hits,
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message search index benchmark")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--senders", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    senders = [(str(uuid.uuid4()), f"Beamter {rng.randint(1000, 9999)}") for _ in range(args.senders)]
+    viewer = senders[0][0]
+
+    rss_before = rss_mb()
+    index = MessageSearchIndex()
+    started = time.perf_counter()
+    index.load(generate_messages(args.messages, senders, args.seed))
+    build_seconds = time.perf_counter() - started
+    rss_after = rss_mb()
+
+    # Echtzeit-Updates nach dem Aufbau
+    live = list(generate_messages(10_000, senders, args.seed + 1))
+    started = time.perf_counter()
+    for message in live:
+        index.add(message)
+    add_us = (time.perf_counter() - started) / len(live) * 1_000_000
+
+    first_page, cursor = index.search("einsatz", viewer_id=viewer, limit=20)
+    queries = [
+        measure(index, "common term", args.runs, query="einsatz", viewer_id=viewer),
+        measure(index, "two terms", args.runs, query="streife bahnhof", viewer_id=viewer),
+        measure(index, "rare term", args.runs, query="gasgeruch", viewer_id=viewer),
+        measure(index, "prefix", args.runs, query="verkehrs*", viewer_id=viewer),
+        measure(index, "channel filter", args.runs, query="alarm", channel="emergency", viewer_id=viewer),
+        measure(index, "sender filter", args.runs, query="lage", sender_id=senders[1][0], viewer_id=viewer),
+        measure(index, "date range", args.runs, query="notruf", viewer_id=viewer,
+                since=datetime(2025, 3, 1), until=datetime(2025, 3, 8)),
+        measure(index, "next page", args.runs, query="einsatz", viewer_id=viewer, cursor=cursor),
+    ]
+
+    report = {
+        "messages": len(index),
+        "build_seconds": round(build_seconds, 2),
+        "index_rss_mb": round(rss_after - rss_before, 1),
+        "incremental_add_us": round(add_us, 2),
+        "queries": queries,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Overhead der Metrik-Instrumentierung
+Ruft eine minimale ASGI-App mit und ohne MetricsMiddleware/InstrumentedRoute auf
+und misst die Zusatzkosten pro Request und pro Socket.IO-Event (Ziel: < 50 µs)
+
+    python benchmarks/bench_metrics.py --requests 100000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import PlainTextResponse  # noqa: E402
+from metrics import MetricsMiddleware, InstrumentedRoute, _instrument_handler, metrics  # noqa: E402
+
+
+def build_app(instrumented: bool):
+    app = FastAPI()
+    if instrumented:
+        app.router.route_class = InstrumentedRoute
+
+    @app.get("/api/items/{item_id}", response_class=PlainTextResponse)
+    async def item(item_id: str):
+        return item_id
+
+    return MetricsMiddleware(app) if instrumented else app
+
+
+async def drive(app, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(requests):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": f"/api/items/{i}", "raw_path": f"/api/items/{i}".encode(),
+            "root_path": "", "query_string": b"", "headers": [], "client": ("127.0.0.1", 1234),
+            "server": ("test", 80),
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / requests
+
+
+async def drive_socket(events: int) -> float:
+    async def handler(sid, data):
+        return None
+
+    wrapped = _instrument_handler("bench", handler)
+    started = time.perf_counter()
+    for _ in range(events):
+        await handler("sid", {})
+    plain = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(events):
+        await wrapped("sid", {})
+    return (time.perf_counter() - started - plain) / events
+
+
+async def main(requests: int, rounds: int):
+    plain_app = build_app(False)
+    instrumented_app = build_app(True)
+    await drive(plain_app, 1000)
+    await drive(instrumented_app, 1000)
+
+    plain, instrumented = [], []
+    for _ in range(rounds):
+        plain.append(await drive(plain_app, requests))
+        instrumented.append(await drive(instrumented_app, requests))
+
+    started = time.perf_counter()
+    body = metrics.render()
+    render_ms = (time.perf_counter() - started) * 1000
+
+    report = {
+        "requests_per_round": requests,
+        "plain_us": round(min(plain) * 1e6, 2),
+        "instrumented_us": round(min(instrumented) * 1e6, 2),
+        "overhead_us": round((min(instrumented) - min(plain)) * 1e6, 2),
+        "socket_event_overhead_us": round(await drive_socket(requests) * 1e6, 2),
+        "render_ms": round(render_ms, 2),
+        "render_bytes": len(body),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Speicherbedarf und Abfragezeit des Online-Status
+Vergleicht die bisherigen verschachtelten Dicts (online_users/user_sockets) mit der
+PresenceRegistry bei N simulierten Beamten: Bytes pro Beamtem (tracemalloc),
+Heartbeat-Kosten und "online in den letzten 2 Minuten"-Abfrage
+
+    python benchmarks/bench_presence.py --officers 10000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from presence import PresenceRegistry  # noqa: E402
+
+THRESHOLD = timedelta(minutes=2)
+
+
+def _officers(count: int, seed: int):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    return [(
+        str(uuid.UUID(int=rng.getrandbits(128), version=4)), f"Beamter {i}", f"sid-{rng.getrandbits(64):016x}",
+        now - timedelta(seconds=rng.uniform(0, 600)),
+    ) for i in range(count)]
+
+
+def build_dicts(officers):
+    online_users, user_sockets = {}, {}
+    for user_id, username, sid, last_seen in officers:
+        # wie im Server: jeder Heartbeat legt ein neues datetime an
+        online_users[user_id] = {"last_seen": last_seen + timedelta(0), "username": username, "socket_id": sid}
+        user_sockets[sid] = user_id
+    return online_users, user_sockets
+
+
+def build_registry(officers):
+    registry = PresenceRegistry()
+    for user_id, username, sid, last_seen in officers:
+        registry.touch(user_id, username, last_seen)
+        registry.attach_socket(sid, user_id)
+    return registry
+
+
+def measure_memory(build, officers) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    structure = build(officers)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del structure
+    return after - before
+
+
+def query_dicts(online_users, now):
+    return [user_id for user_id, data in online_users.items() if now - data["last_seen"] <= THRESHOLD]
+
+
+def _best(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(count: int, repeat: int, seed: int):
+    # Strings vorab anlegen, damit nur die Verwaltungsstrukturen gemessen werden
+    officers = _officers(count, seed)
+    dict_bytes = measure_memory(build_dicts, officers)
+    registry_bytes = measure_memory(build_registry, officers)
+
+    online_users, user_sockets = build_dicts(officers)
+    registry = build_registry(officers)
+    now = datetime.utcnow()
+    assert len(query_dicts(online_users, now)) == len(registry.online(THRESHOLD, now))
+
+    heartbeat_ids = [officer[0] for officer in officers]
+
+    def heartbeat_dicts():
+        for user_id in heartbeat_ids:
+            online_users[user_id]["last_seen"] = now
+
+    def heartbeat_registry():
+        for user_id in heartbeat_ids:
+            registry.touch(user_id, now=now)
+
+    report = {
+        "officers": count,
+        "dict_bytes_per_officer": round(dict_bytes / count, 1),
+        "registry_bytes_per_officer": round(registry_bytes / count, 1),
+        "memory_saved_pct": round(100 * (1 - registry_bytes / dict_bytes), 1),
+        "dict_online_query_ms": round(_best(lambda: query_dicts(online_users, now), repeat) * 1000, 3),
+        "registry_online_query_ms": round(_best(lambda: registry.online(THRESHOLD, now), repeat) * 1000, 3),
+        "dict_socket_lookup_ns": round(_best(lambda: [user_sockets[o[2]] for o in officers], repeat) / count * 1e9, 1),
+        "registry_socket_lookup_ns": round(
+            _best(lambda: [registry.user_for_socket(o[2]) for o in officers], repeat) / count * 1e9, 1),
+        "dict_heartbeat_ns": round(_best(heartbeat_dicts, repeat) / count * 1e9, 1),
+        "registry_heartbeat_ns": round(_best(heartbeat_registry, repeat) / count * 1e9, 1),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--officers", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    main(args.officers, args.repeat, args.seed)
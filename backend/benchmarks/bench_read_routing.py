@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Prüfstand: Read-Replica-Routing gegen ein lokales Single-Node-Replica-Set
+Startet (mit --start-mongod) einen temporären mongod mit --replSet, initialisiert das Set,
+legt eine kleine Dienststelle an und prüft über einen CommandListener, mit welcher
+Read Preference jeder Befehl den Server erreicht:
+
+  - deklarierte Lese-Routen lesen secondaryPreferred mit maxStalenessSeconds
+  - Schreibzugriffe und Reads kurz nach eigenem Schreiben gehen an den Primary
+  - ETag-Routen lesen nach einer Änderung ihrer Collection vom Primary
+
+Danach Latenz pro Route (Primary vs. secondaryPreferred). Replica-Set von Hand:
+
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0 --bind_ip 127.0.0.1
+    mongosh --port 27018 --eval 'rs.initiate({_id: "rs0", members: [{_id: 0, host: "127.0.0.1:27018"}]})'
+    python benchmarks/bench_read_routing.py --mongo-url "mongodb://127.0.0.1:27018/?replicaSet=rs0"
+
+    python benchmarks/bench_read_routing.py --start-mongod
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+ROUTES = ("/api/messages?channel=general", "/api/incidents", "/api/persons", "/api/locations/live")
+
+# ================================================
+# REPLICA-SET
+# ================================================
+
+def start_replica_set(args):
+    """Temporary single-node replica set; returns (process, url, data directory)"""
+    from pymongo import MongoClient
+
+    dbpath = tempfile.mkdtemp(prefix="stadtwache-rs-")
+    process = subprocess.Popen(
+        [args.mongod, "--replSet", args.replica_set, "--port", str(args.port), "--dbpath", dbpath,
+         "--bind_ip", "127.0.0.1", "--quiet"], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    host = f"127.0.0.1:{args.port}"
+    admin = MongoClient(host, directConnection=True, serverSelectionTimeoutMS=20000)
+    admin.admin.command("ping")
+    admin.admin.command("replSetInitiate", {"_id": args.replica_set, "members": [{"_id": 0, "host": host}]})
+    deadline = time.monotonic() + 30
+    while not admin.admin.command("hello").get("isWritablePrimary"):
+        if time.monotonic() > deadline:
+            raise RuntimeError("replica set did not elect a primary")
+        time.sleep(0.2)
+    admin.close()
+    return process, f"mongodb://{host}/?replicaSet={args.replica_set}", dbpath
+
+# ================================================
+# PRÜFUNG
+# ================================================
+
+class ReadPreferenceRecorder:
+    """CommandListener noting (collection, command, read preference mode) of every command"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        name = event.command_name
+        target = event.command.get(name)
+        mode = (event.command.get("$readPreference") or {}).get("mode", "primary")
+        staleness = (event.command.get("$readPreference") or {}).get("maxStalenessSeconds")
+        self.commands.append((target if isinstance(target, str) else "-", name, mode, staleness))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def take(self):
+        commands, self.commands = self.commands, []
+        return commands
+
+
+def _reads(commands):
+    return [c for c in commands if c[1] in ("find", "aggregate", "count")]
+
+
+async def run(args, url: str) -> int:
+    os.environ.update(MONGO_URL=url, DB_NAME=args.db_name, RETENTION_ENABLED="false")
+    recorder = ReadPreferenceRecorder()
+    import mongo_client
+    create = mongo_client.create_mongo_client
+    mongo_client.create_mongo_client = lambda u, event_listeners=(): create(u, [*event_listeners, recorder])
+
+    import httpx
+    import server
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from read_routing import READ_MAX_STALENESS_SECONDS
+    from seed import SeedConfig, seed_database
+
+    # Eigener Client fürs Seeding: die Schreibzugriffe sollen das Routing nicht beeinflussen
+    seed_client = AsyncIOMotorClient(url)
+    await seed_client.drop_database(args.db_name)
+    await seed_database(seed_client[args.db_name], SeedConfig(
+        users=20, teams=3, districts=2, incidents=50, image_kb=1, persons=50, reports=10, messages=500,
+        locations=500, days=1))
+
+    async def token(role=None):
+        user = await server.db.users.find_one({"role": role} if role else {"role": {"$ne": "admin"}})
+        return {"Authorization": "Bearer " + server.create_access_token(
+            data={"sub": user["email"], "user_id": user["id"], "role": user["role"]},
+            expires_delta=timedelta(hours=1))}
+
+    writer, reader = await token("admin"), await token()
+    checks = []
+
+    def check(name, commands, expected_mode):
+        reads = _reads(commands)
+        routed = [c for c in reads if c[0] not in ("users",)]  # Authentifizierung liest immer vom Primary
+        modes = {c[2] for c in routed}
+        ok = bool(routed) and modes == {expected_mode}
+        if ok and expected_mode == "secondaryPreferred":
+            ok = all(c[3] == READ_MAX_STALENESS_SECONDS for c in routed)
+        checks.append((name, ok, sorted(modes)))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://rs") as http:
+        recorder.take()
+        for path in ROUTES:
+            (await http.get(path, headers=reader)).raise_for_status()
+            check(f"GET {path} (no writes)", recorder.take(), "secondaryPreferred")
+
+        (await http.post("/api/messages", json={"content": "Lagemeldung", "channel": "general"},
+                         headers=writer)).raise_for_status()
+        writes = recorder.take()
+        checks.append(("POST /api/messages on primary", all(c[2] == "primary" for c in writes), []))
+        (await http.get(ROUTES[0], headers=writer)).raise_for_status()
+        check("GET messages after own write", recorder.take(), "primary")
+        (await http.get(ROUTES[0], headers=reader)).raise_for_status()
+        check("GET messages by another user", recorder.take(), "secondaryPreferred")
+
+        (await http.post("/api/incidents", json={"title": "Prüfung", "description": "x", "priority": "low",
+                                                 "location": {"lat": 51.2, "lng": 7.1}, "address": "Markt 1"},
+                         headers=writer)).raise_for_status()
+        recorder.take()
+        (await http.get("/api/incidents", headers=reader)).raise_for_status()
+        check("GET incidents after incident change (ETag)", recorder.take(), "primary")
+
+        # Latenz: Secondary-Route gegen Primary (Single-Node: derselbe Server, misst den Routing-Overhead)
+        latency = {}
+        for path in ROUTES:
+            for label, headers in (("secondaryPreferred", reader), ("primary", writer)):
+                timings = []
+                for _ in range(args.iterations):
+                    started = time.perf_counter()
+                    (await http.get(path, headers=headers)).raise_for_status()
+                    timings.append((time.perf_counter() - started) * 1000)
+                latency.setdefault(path, {})[label] = round(statistics.median(timings), 2)
+
+    await seed_client.drop_database(args.db_name)
+    seed_client.close()
+    print(f"{'check':48} result")
+    for name, ok, modes in checks:
+        print(f"{name:48} {'ok' if ok else 'FAILED ' + str(modes)}")
+    print(json.dumps({"median_ms": latency, "routing": server.read_router.status()["routes"]}, indent=2))
+    return 0 if all(ok for _, ok, _ in checks) else 1
+
+
+def main(args) -> int:
+    process = dbpath = None
+    url = args.mongo_url
+    if args.start_mongod:
+        process, url, dbpath = start_replica_set(args)
+    try:
+        return asyncio.run(run(args, url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+            shutil.rmtree(dbpath, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-url", default="mongodb://127.0.0.1:27018/?replicaSet=rs0",
+                        help="replica set URL (single node is enough)")
+    parser.add_argument("--start-mongod", action="store_true", help="start a temporary single-node replica set")
+    parser.add_argument("--mongod", default="mongod", help="mongod binary for --start-mongod")
+    parser.add_argument("--port", type=int, default=27018)
+    parser.add_argument("--replica-set", default="rs0")
+    parser.add_argument("--db-name", default="stadtwache_bench_read_routing")
+    parser.add_argument("--iterations", type=int, default=50)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Repository-Schicht MongoDB gegen SQL auf derselben Arbeitslast
+Lädt eine Dienststelle aus seed.py über die Repositories in beide Backends und misst
+die Hot Queries des Servers (Login-Lookup, Einsatzliste, Chat-Polling, private
+Nachrichten, Personen, Berichte, Live-Karte, Check-Ins) sowie Schreibzugriffe.
+
+MongoDB: mongomock-motor (Standard) oder --mongo-url; SQL: Engine aus database_config.py,
+standardmäßig SQLite in einer temporären Datei.
+
+    python benchmarks/bench_repositories.py
+    python benchmarks/bench_repositories.py --users 1000 --messages 100000 --locations 200000
+    python benchmarks/bench_repositories.py --mongo-url mongodb://localhost:27017 --sql postgresql
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from seed import Department, SeedConfig, hash_passwords, user_password  # noqa: E402
+
+
+def _checkins(department: Department, count: int, rng: random.Random):
+    return [{
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "user_id": rng.choice(department.user_ids), "user_name": "Beamter",
+        "timestamp": department.now - timedelta(minutes=rng.uniform(0, 7 * 24 * 60)), "status": "ok",
+    } for _ in range(count)]
+
+
+async def load(repos, department: Department, password_hashes, checkins):
+    sources = {
+        "users": department.users(password_hashes),
+        "incidents": department.incidents(),
+        "persons": department.persons(),
+        "reports": department.reports(),
+        "messages": department.messages(),
+        "locations": department.locations(),
+        "checkins": [checkins],
+    }
+    timings = {}
+    for name, batches in sources.items():
+        started = time.perf_counter()
+        for batch in batches:
+            await getattr(repos, name).insert_many(batch)
+        timings[name] = round(time.perf_counter() - started, 2)
+    return timings
+
+
+def workload(department: Department, incident_ids, rng: random.Random):
+    """(name, coroutine factory) pairs mirroring the server's hot paths"""
+    def user_id():
+        return rng.choice(department.user_ids)
+
+    live_since = department.now - timedelta(days=2)
+    return [
+        ("users.get (auth)", lambda r: r.users.get(user_id())),
+        ("users.by_email (login)", lambda r: r.users.find_one(
+            {"email": f"beamter{rng.randrange(department.config.users)}@seed.stadtwache.de"})),
+        ("incidents.recent", lambda r: r.incidents.find(sort=[("created_at", -1)], limit=100)),
+        ("messages.channel", lambda r: r.messages.find({"channel": "general"}, sort=[("timestamp", 1)], limit=100)),
+        ("messages.private_unread", lambda r: r.messages.find(
+            {"channel": "private", "recipient_id": user_id(), "is_read": {"$ne": True}},
+            sort=[("timestamp", -1)], limit=50)),
+        ("persons.active", lambda r: r.persons.find({"is_active": True}, sort=[("created_at", -1)], limit=100)),
+        ("reports.by_author", lambda r: r.reports.find(
+            {"author_id": user_id()}, sort=[("created_at", -1)], limit=100)),
+        ("locations.live", lambda r: r.locations.latest_per("user_id", live_since, ("location", "timestamp"))),
+        ("checkins.by_user", lambda r: r.checkins.find({"user_id": user_id()}, sort=[("timestamp", -1)], limit=50)),
+        ("incidents.update", lambda r: r.incidents.update(
+            rng.choice(incident_ids), {"status": rng.choice(["open", "in_progress"])})),
+        ("locations.insert", lambda r: r.locations.insert(
+            {"user_id": user_id(), "location": {"lat": 51.28, "lng": 7.29}, "timestamp": department.now})),
+    ]
+
+
+async def run(repos, operations, iterations: int):
+    results = {}
+    for name, operation in operations:
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await operation(repos)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[name] = {"mean_ms": round(statistics.mean(timings), 3),
+                         "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 3)}
+    return results
+
+
+async def main(args) -> int:
+    from indexes import IndexManager
+    from repositories import build_metadata, create_sql_schema, mongo_repositories, sql_repositories
+
+    config = SeedConfig(users=args.users, teams=10, districts=4, incidents=args.incidents, image_kb=1,
+                        max_images_per_incident=1, persons=args.persons, reports=args.reports,
+                        messages=args.messages, locations=args.locations, days=7)
+    department = Department(config)
+    password_hashes = hash_passwords({user_password(config, i) for i in range(config.users)}, workers=1)
+    checkins = _checkins(department, args.checkins, random.Random(args.seed))
+    incident_ids = [doc["id"] for batch in department.incidents() for doc in batch]
+
+    # MongoDB
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url)
+        await client.drop_database(args.db_name)
+        backend = "mongodb"
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+        backend = "mongomock"
+    db = client[args.db_name]
+    mongo = mongo_repositories(db)
+    mongo_load = await load(mongo, department, password_hashes, checkins)
+    await IndexManager(db).reconcile()
+
+    # SQL
+    if args.sql == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(prefix="stadtwache-bench-"), "bench.db")
+        os.environ["SQLITE_DB"] = path
+    from database_config import create_database_engine
+    engine = create_database_engine(args.sql, echo=False)
+    metadata = build_metadata()
+    await create_sql_schema(engine, metadata)
+    sql = sql_repositories(engine, metadata)
+    sql_load = await load(sql, department, password_hashes, checkins)
+
+    report = {"config": {"users": args.users, "messages": args.messages, "locations": args.locations,
+                         "iterations": args.iterations},
+              "load_seconds": {backend: mongo_load, args.sql: sql_load}}
+    rng_mongo, rng_sql = random.Random(args.seed), random.Random(args.seed)
+    report[backend] = await run(mongo, workload(department, incident_ids, rng_mongo), args.iterations)
+    report[args.sql] = await run(sql, workload(department, incident_ids, rng_sql), args.iterations)
+    await engine.dispose()
+
+    print(f"{'operation':28} {backend + ' mean':>16} {backend + ' p95':>15} {args.sql + ' mean':>12} {args.sql + ' p95':>11}")
+    for name in report[backend]:
+        left, right = report[backend][name], report[args.sql][name]
+        print(f"{name:28} {left['mean_ms']:>16} {left['p95_ms']:>15} {right['mean_ms']:>12} {right['p95_ms']:>11}")
+    print(json.dumps(report["load_seconds"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-url", help="local MongoDB (default: in-process mongomock)")
+    parser.add_argument("--db-name", default="stadtwache_bench_repositories")
+    parser.add_argument("--sql", choices=("sqlite", "mysql", "postgresql"), default="sqlite",
+                        help="SQL backend from database_config.py (connection settings from the environment)")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--incidents", type=int, default=1000)
+    parser.add_argument("--persons", type=int, default=1000)
+    parser.add_argument("--reports", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--locations", type=int, default=20000)
+    parser.add_argument("--checkins", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the report as JSON")
+    sys.exit(asyncio.run(main(parser.parse_args())))
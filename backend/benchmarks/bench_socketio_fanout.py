@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Socket.IO Fan-out
+Startet den Server (uvicorn, eigener Prozess) und verbindet N python-socketio Clients,
+die ihrem Benutzer-, Team-, Notfall- und einem privaten Raum beitreten. Danach werden
+Standort-Updates (an alle), Team-Chat, Notfall-Nachrichten und Privatnachrichten
+gesendet. Gemessen werden Zustell-Latenz, Server-Speicher pro Verbindung und
+Server-CPU pro zugestellter Nachricht. Ergebnis als JSON-Report.
+
+    python benchmarks/bench_socketio_fanout.py --clients 100,500,1000,5000 --output fanout.json
+    python benchmarks/bench_socketio_fanout.py --clients 1000 --mongo-url mongodb://localhost:27017
+
+Benötigt aiohttp (python-socketio AsyncClient). Ohne --mongo-url läuft der Server
+mit mongomock-motor.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+TEAM_SIZE = 10
+EVENT_TYPES = ("location", "chat", "emergency", "private")
+
+# ================================================
+# SERVER-PROZESS
+# ================================================
+
+def serve(port: int, mongo_url: str, db_name: str):
+    """Run the app with uvicorn (called in the server subprocess)"""
+    os.environ.setdefault("RETENTION_ENABLED", "false")
+    if mongo_url:
+        os.environ["MONGO_URL"] = mongo_url
+        os.environ["DB_NAME"] = db_name
+    import uvicorn
+    import server
+    if not mongo_url:
+        from mongomock_motor import AsyncMongoMockClient
+        from loadtest import _bind_database
+        client = AsyncMongoMockClient()
+        _bind_database(server, client, client[db_name])
+    uvicorn.run(server.socket_app, host="127.0.0.1", port=port, log_level="warning", ws_max_queue=1024)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not start on port {port}")
+
+
+def _proc_rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _proc_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime und stime (Felder 14/15, hier ab Feld 3 gezählt)
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+# ================================================
+# CLIENT-PROZESSE
+# ================================================
+
+def _percentiles(values) -> Dict[str, Any]:
+    if not values:
+        return {"samples": 0}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"samples": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def client_worker(index: int, url: str, users: List[Dict[str, str]], config: Dict[str, Any],
+                  ready, start, results):
+    asyncio.run(_run_clients(index, url, users, config, ready, start, results))
+
+
+async def _run_clients(index, url, users, config, ready, start, results):
+    import socketio
+
+    latencies = {kind: array("d") for kind in EVENT_TYPES}
+    emitted = {kind: 0 for kind in EVENT_TYPES}
+    errors = 0
+    clients = []
+    gate = asyncio.Semaphore(config["connect_concurrency"])
+
+    def record(kind: str, sent_at):
+        if isinstance(sent_at, (int, float)):
+            latencies[kind].append(time.time() - sent_at)
+
+    async def open_client(user):
+        nonlocal errors
+        sio = socketio.AsyncClient(reconnection=False)
+
+        @sio.on("location_updated")
+        async def on_location(data):
+            record("location", (data.get("location") or {}).get("sent_at"))
+
+        @sio.on("new_message")
+        async def on_message(data):
+            kind, _, sent_at = (data.get("content") or "").partition("|")
+            if kind in latencies:
+                record(kind, float(sent_at))
+
+        try:
+            async with gate:
+                await sio.connect(url, transports=["websocket"], wait_timeout=30)
+                await sio.emit("join_user_room", user["id"])
+                await sio.emit("join_channel", user["team"])
+                await sio.emit("join_channel", "emergency")
+                await sio.emit("join_private_room", {"user1": user["id"], "user2": user["peer"]})
+            clients.append((sio, user))
+        except Exception:
+            errors += 1
+
+    await asyncio.gather(*(open_client(user) for user in users))
+    await asyncio.sleep(1)  # letzte Joins verarbeiten lassen
+    ready.put({"worker": index, "connected": len(clients), "errors": errors})
+    await asyncio.to_thread(start.wait)
+
+    rng = random.Random(index)
+    share = config["workers"]
+    rates = {kind: config[f"{kind}_rate"] / share for kind in EVENT_TYPES}
+
+    async def send(kind: str):
+        if not clients or rates[kind] <= 0:
+            return
+        period = 1 / rates[kind]
+        deadline = time.time() + config["duration"]
+        next_at = time.time() + rng.uniform(0, period)
+        while next_at < deadline:
+            await asyncio.sleep(max(0.0, next_at - time.time()))
+            sio, user = rng.choice(clients)
+            now = time.time()
+            try:
+                if kind == "location":
+                    await sio.emit("location_update", {"user_id": user["id"], "location": {
+                        "lat": 51.28 + rng.uniform(-0.02, 0.02), "lng": 7.29 + rng.uniform(-0.02, 0.02), "sent_at": now,
+                    }})
+                elif kind == "private":
+                    await sio.emit("send_message", {"sender_id": user["id"], "recipient_id": user["peer"],
+                                                    "channel": "private", "content": f"private|{now}"})
+                else:
+                    channel = user["team"] if kind == "chat" else "emergency"
+                    await sio.emit("send_message", {"sender_id": user["id"], "channel": channel,
+                                                    "content": f"{kind}|{now}"})
+                emitted[kind] += 1
+            except Exception:
+                pass
+            next_at += period
+
+    await asyncio.gather(*(send(kind) for kind in EVENT_TYPES))
+    await asyncio.sleep(config["drain"])
+    await asyncio.gather(*(sio.disconnect() for sio, _ in clients), return_exceptions=True)
+    results.put({"worker": index, "emitted": emitted, "latencies": {k: v.tolist() for k, v in latencies.items()}})
+
+# ================================================
+# BENCHMARK
+# ================================================
+
+def _users(count: int, seed: int) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(count)]
+    users = []
+    for i, user_id in enumerate(ids):
+        # Paare (0,1), (2,3), ... chatten privat miteinander
+        peer = ids[i + 1] if i % 2 == 0 and i + 1 < count else ids[i - 1] if i % 2 else user_id
+        users.append({"id": user_id, "team": f"team_{i // TEAM_SIZE}", "peer": peer})
+    return users
+
+
+def run_level(clients: int, args) -> Dict[str, Any]:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+         "--db-name", args.db_name] + (["--mongo-url", args.mongo_url] if args.mongo_url else []),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_port(port)
+        time.sleep(1)
+        rss_baseline = _proc_rss_kb(server.pid)
+
+        users = _users(clients, args.seed)
+        workers = max(1, min(args.client_processes, clients))
+        config = {
+            "workers": workers, "duration": args.duration, "drain": args.drain,
+            "connect_concurrency": args.connect_concurrency,
+            "location_rate": args.location_rate, "chat_rate": args.chat_rate,
+            "emergency_rate": args.emergency_rate, "private_rate": args.private_rate,
+        }
+        context = multiprocessing.get_context("spawn")
+        ready, results, start = context.Queue(), context.Queue(), context.Event()
+        processes = [
+            context.Process(target=client_worker, args=(
+                i, f"http://127.0.0.1:{port}", users[i::workers], config, ready, start, results))
+            for i in range(workers)
+        ]
+        connect_started = time.perf_counter()
+        for process in processes:
+            process.start()
+        readiness = [ready.get(timeout=600) for _ in processes]
+        connect_seconds = time.perf_counter() - connect_started
+        connected = sum(r["connected"] for r in readiness)
+        rss_connected = _proc_rss_kb(server.pid)
+
+        cpu_before = _proc_cpu_seconds(server.pid)
+        start.set()
+        reports = [results.get(timeout=args.duration + args.drain + 600) for _ in processes]
+        cpu_seconds = _proc_cpu_seconds(server.pid) - cpu_before
+        for process in processes:
+            process.join(timeout=30)
+
+        emitted = {kind: sum(r["emitted"][kind] for r in reports) for kind in EVENT_TYPES}
+        latency = {kind: [value for r in reports for value in r["latencies"][kind]] for kind in EVENT_TYPES}
+        delivered = {kind: len(values) for kind, values in latency.items()}
+        total_delivered = sum(delivered.values())
+        return {
+            "clients": clients,
+            "connected": connected,
+            "connect_errors": sum(r["errors"] for r in readiness),
+            "connect_seconds": round(connect_seconds, 2),
+            "server_rss_mb_baseline": round(rss_baseline / 1024, 1),
+            "server_rss_mb_connected": round(rss_connected / 1024, 1),
+            "memory_per_connection_kb": round((rss_connected - rss_baseline) / max(1, connected), 2),
+            "duration_s": args.duration,
+            "emitted": emitted,
+            "delivered": delivered,
+            "delivered_per_second": round(total_delivered / args.duration, 1),
+            "latency": {kind: _percentiles(values) for kind, values in latency.items()},
+            "server_cpu_seconds": round(cpu_seconds, 3),
+            "server_cpu_us_per_delivered_message": round(cpu_seconds / total_delivered * 1e6, 2) if total_delivered else None,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main(args):
+    import socketio
+    levels = []
+    for clients in [int(c) for c in args.clients.split(",")]:
+        print(f"🔌 {clients} clients...")
+        result = run_level(clients, args)
+        levels.append(result)
+        location = result["latency"]["location"]
+        print(f"   connected {result['connected']}/{clients} in {result['connect_seconds']}s, "
+              f"{result['memory_per_connection_kb']} KB/conn, "
+              f"location p50/p99 {location.get('p50_ms')}/{location.get('p99_ms')} ms, "
+              f"{result['server_cpu_us_per_delivered_message']} µs CPU/msg")
+
+    report = {
+        "benchmark": "socketio_fanout",
+        "generated_at": datetime.utcnow().isoformat(),
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "python_socketio": socketio.__version__ if hasattr(socketio, "__version__") else None,
+            "backend": "mongodb" if args.mongo_url else "mongomock",
+        },
+        "config": {
+            "duration_s": args.duration, "client_processes": args.client_processes, "seed": args.seed,
+            "rates_per_s": {kind: getattr(args, f"{kind}_rate") for kind in EVENT_TYPES}, "team_size": TEAM_SIZE,
+        },
+        "levels": levels,
+    }
+    print(json.dumps(report, indent=2) if not args.output else f"💾 Report written to {args.output}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Socket.IO fan-out benchmark")
+    parser.add_argument("--clients", default="100,500,1000,5000", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=20, help="traffic seconds per level")
+    parser.add_argument("--drain", type=float, default=3, help="seconds to wait for late deliveries")
+    parser.add_argument("--client-processes", type=int, default=max(1, min(8, os.cpu_count() or 1)))
+    parser.add_argument("--connect-concurrency", type=int, default=50)
+    parser.add_argument("--location-rate", type=float, default=2, help="location_update/s, broadcast to all")
+    parser.add_argument("--chat-rate", type=float, default=5, help="team channel messages/s")
+    parser.add_argument("--emergency-rate", type=float, default=0.2, help="emergency channel messages/s")
+    parser.add_argument("--private-rate", type=float, default=2, help="private messages/s")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-url")
+    parser.add_argument("--db-name", default="stadtwache_loadtest")
+    parser.add_argument("--output")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.mongo_url, args.db_name)
+    else:
+        main(args)
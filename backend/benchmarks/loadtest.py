@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Lasttest: synthetische Dienststelle mit realistischem Mischverkehr
+Legt eine Dienststelle an (Beamte, Teams, Bezirke, Einsätze mit Bildern, Personen,
+Monate an Nachrichten und Standorten) und simuliert danach die App-Clients:
+Nachrichten-Polling (5 s), Karten-Polling (10 s), Standort-Pings über Socket.IO,
+SOS-Alarme und Dashboard-Aufrufe. Ausgabe: Durchsatz und p50/p95/p99 pro Endpunkt.
+
+Die App läuft in-process (ASGI); als Datenbank dient eine lokale MongoDB oder
+mongomock-motor als In-Process-Ersatz (Standard, für CI). Standort-Pings laufen über echte
+Socket.IO-Clients gegen die per uvicorn auf 127.0.0.1 bediente App (Transport, Serialisierung,
+Ack); --socket-transport direct ruft stattdessen den Handler direkt auf.
+
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --mongo-url mongodb://localhost:27017 --officers 300 --duration 120
+    python benchmarks/loadtest.py --output report.json
+    python benchmarks/loadtest.py --baseline report.json --max-regression 0.3   # Exit-Code 1 bei Regression
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from seed import CHANNELS, SeedConfig, _position, _sentence, seed_database
+
+# Client-Verhalten der App (Sekunden Echtzeit, wird durch --speedup geteilt)
+INTERVALS = {
+    "poll_messages": 5,
+    "poll_map": 10,
+    "location_ping": 10,
+    "send_message": 60,
+    "dashboard": 60,
+    "sos": 1800,
+}
+
+# ================================================
+# SEEDING
+# ================================================
+
+async def seed_department(db, args) -> Dict[str, Any]:
+    """Create a deterministic department via seed.py; returns the seeded users"""
+    config = SeedConfig(
+        seed=args.seed, users=args.officers, teams=args.teams, districts=args.districts,
+        incidents=args.incidents, image_kb=args.image_kb, persons=args.persons, reports=0,
+        messages=args.days * args.messages_per_day,
+        # eine 8-Stunden-Schicht pro Beamtem und Tag
+        locations=args.officers * args.days * (8 * 3600 // args.location_interval),
+        days=args.days, location_interval=args.location_interval, password="loadtest",
+    )
+    summary = await seed_database(db, config)
+    users = await db.users.find({}, {"_id": 0, "id": 1, "email": 1, "role": 1}).sort("email", 1).to_list(None)
+    counts = {name: result["inserted"] for name, result in summary["collections"].items()}
+    return {"users": users, "counts": counts}
+
+# ================================================
+# TRAFFIC
+# ================================================
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(seconds * 1000)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))
+    return round(ordered[index], 2)
+
+
+class SimulatedOfficer:
+    """One app client: polls on fixed intervals, pings its location and occasionally raises SOS"""
+
+    def __init__(self, user: Dict[str, Any], token: str, http, sio, recorder: Recorder,
+                 rng: random.Random, speedup: float, socket_url: str = None):
+        self.user = user
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.http = http
+        self.sio = sio
+        self.socket_url = socket_url
+        self.socket = None
+        self.recorder = recorder
+        self.rng = rng
+        self.speedup = speedup
+        self.sid = f"loadtest-{user['id']}"
+        self.position = _position(rng)
+        self.channel = rng.choice(CHANNELS)
+
+    async def _request(self, method: str, endpoint: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, headers=self.headers, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        self.recorder.record(endpoint, time.perf_counter() - started, ok)
+
+    async def poll_messages(self):
+        await self._request("GET", "GET /api/messages", "/api/messages", params={"channel": self.channel})
+
+    async def poll_map(self):
+        await self._request("GET", "GET /api/locations/live", "/api/locations/live")
+
+    async def connect(self):
+        """Open the app's Socket.IO connection and join the personal room like the client does"""
+        if self.socket_url is None:
+            return
+        import socketio
+        self.socket = socketio.AsyncClient(reconnection=False)
+        await self.socket.connect(self.socket_url, transports=["websocket"])
+        await self.socket.call("join_user_room", self.user["id"], timeout=30)
+
+    async def disconnect(self):
+        if self.socket is not None:
+            await self.socket.disconnect()
+
+    async def location_ping(self):
+        self.position = {"lat": self.position["lat"] + self.rng.gauss(0, 0.0002),
+                         "lng": self.position["lng"] + self.rng.gauss(0, 0.0002)}
+        data = {"user_id": self.user["id"], "location": self.position}
+        started = time.perf_counter()
+        try:
+            if self.socket is not None:
+                # call() wartet auf das Ack: Latenz inklusive Transport und Serialisierung
+                await self.socket.call("location_update", data, timeout=30)
+            else:
+                await self.sio.handlers["/"]["location_update"](self.sid, data)
+            ok = True
+        except Exception:
+            ok = False
+        self.recorder.record("SOCKET location_update", time.perf_counter() - started, ok)
+
+    async def send_message(self):
+        await self._request("POST", "POST /api/messages", "/api/messages",
+                            json={"content": _sentence(self.rng, 6), "channel": self.channel})
+
+    async def dashboard(self):
+        await self._request("GET", "GET /api/incidents", "/api/incidents")
+        await self._request("GET", "GET /api/users/by-status", "/api/users/by-status")
+        if self.user["role"] == "admin":
+            await self._request("GET", "GET /api/admin/stats", "/api/admin/stats")
+
+    async def sos(self):
+        await self._request("POST", "POST /api/emergency/broadcast", "/api/emergency/broadcast", json={
+            "type": "sos_alarm", "message": "Notfall-Alarm", "priority": "urgent",
+            "location": {"latitude": self.position["lat"], "longitude": self.position["lng"], "accuracy": 8},
+        })
+
+    async def run(self, deadline: float):
+        # Start jeder Aktion zufällig im ersten Intervall, damit nicht alle Clients gleichzeitig feuern
+        schedule = []
+        for action, interval in INTERVALS.items():
+            period = interval / self.speedup
+            heapq.heappush(schedule, (time.perf_counter() + self.rng.uniform(0, period), action, period))
+        while schedule:
+            due, action, period = heapq.heappop(schedule)
+            if due >= deadline:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await getattr(self, action)()
+            heapq.heappush(schedule, (due + period * self.rng.uniform(0.9, 1.1), action, period))
+
+# ================================================
+# REPORT & REGRESSION
+# ================================================
+
+def build_report(recorder: Recorder, duration: float, args, counts: Dict[str, int]) -> Dict[str, Any]:
+    endpoints = {}
+    for endpoint, values in sorted(recorder.latencies.items()):
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(endpoint, 0),
+            "throughput_rps": round(len(values) / duration, 2),
+            "p50_ms": _percentile(values, 0.50),
+            "p95_ms": _percentile(values, 0.95),
+            "p99_ms": _percentile(values, 0.99),
+            "max_ms": round(max(values), 2),
+        }
+    total = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "backend": "mongodb" if args.mongo_url else "mongomock",
+        "config": {"officers": args.officers, "duration_s": args.duration, "speedup": args.speedup, "seed": args.seed},
+        # direct: Handler ohne Socket.IO-Transport aufgerufen, Latenzen nicht mit socketio vergleichbar
+        "socket_transport": args.socket_transport,
+        "seeded": counts,
+        "duration_s": round(duration, 2),
+        "total_requests": total,
+        "throughput_rps": round(total / duration, 2),
+        "errors": sum(recorder.errors.values()),
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n📊 {report['total_requests']} requests in {report['duration_s']}s "
+          f"({report['throughput_rps']} req/s, {report['errors']} errors, backend={report['backend']}, "
+          f"socket={report['socket_transport']})")
+    print(f"{'endpoint':<34} {'req':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<34} {row['requests']:>7} {row['errors']:>5} {row['throughput_rps']:>8} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float,
+            min_delta_ms: float, max_error_rate: float) -> List[str]:
+    """Regressions against a previous report (p95 per endpoint and error rate)"""
+    failures = []
+    for endpoint, row in report["endpoints"].items():
+        if row["requests"] and row["errors"] / row["requests"] > max_error_rate:
+            failures.append(f"{endpoint}: error rate {row['errors']}/{row['requests']}")
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous:
+            continue
+        limit = previous["p95_ms"] * (1 + max_regression)
+        if row["p95_ms"] > limit and row["p95_ms"] - previous["p95_ms"] > min_delta_ms:
+            failures.append(f"{endpoint}: p95 {row['p95_ms']}ms > {previous['p95_ms']}ms baseline")
+    return failures
+
+# ================================================
+# MAIN
+# ================================================
+
+def _bind_database(server, client, db):
+    """Point the server module and its background components at another database"""
+    server.client = client
+    server.db = db
+    server.stats_db = server.read_mostly(db)
+    for component in ("retention_manager", "index_manager", "track_history", "roster", "repos", "read_router",
+                      "change_feed", "job_queue", "incident_archive", "checkin_monitor"):
+        if hasattr(getattr(server, component, None), "db"):
+            getattr(server, component).db = db
+
+
+async def serve_socket_app(app):
+    """Serve the Socket.IO ASGI app on a free loopback port; returns (url, uvicorn server, serve task)"""
+    import socket
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    # lifespan off: wie beim HTTP-Verkehr über ASGITransport laufen keine Startup-Dienste
+    uv_server = uvicorn.Server(uvicorn.Config(app, lifespan="off", log_level="warning", ws="wsproto"))
+    task = asyncio.create_task(uv_server.serve(sockets=[sock]))
+    while not uv_server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return f"http://127.0.0.1:{sock.getsockname()[1]}", uv_server, task
+
+
+async def main(args) -> int:
+    if args.mongo_url:
+        if "loadtest" not in args.db_name and not args.force:
+            print(f"❌ Refusing to drop '{args.db_name}' - use a *loadtest* database name or --force")
+            return 2
+        os.environ["MONGO_URL"] = args.mongo_url
+        os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("RETENTION_ENABLED", "false")
+
+    import httpx
+    import server
+
+    if args.mongo_url:
+        await server.client.drop_database(args.db_name)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            print("❌ mongomock-motor is required without --mongo-url (pip install mongomock-motor)")
+            return 2
+        client = AsyncMongoMockClient()
+        _bind_database(server, client, client[args.db_name])
+
+    print(f"🌱 Seeding department (seed={args.seed})...")
+    started = time.perf_counter()
+    seeded = await seed_department(server.db, args)
+    # Indizes erst nach dem Bulk-Load: schneller als bei jedem Insert mitpflegen
+    await server.index_manager.reconcile()
+    print(f"✅ Seeded {seeded['counts']} in {time.perf_counter() - started:.1f}s")
+    server.message_index.finish_loading()
+
+    socket_url = uv_server = serve_task = None
+    if args.socket_transport == "socketio":
+        socket_url, uv_server, serve_task = await serve_socket_app(server.socket_app)
+        print(f"🔌 Socket.IO clients connect to {socket_url}")
+    else:
+        print("⚠️ Socket pings call the location_update handler directly (no Socket.IO transport)")
+
+    recorder = Recorder()
+    rng = random.Random(args.seed + 1)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as http:
+        officers = []
+        for user in seeded["users"]:
+            token = server.create_access_token(
+                data={"sub": user["email"], "user_id": user["id"], "role": user["role"]},
+                expires_delta=timedelta(hours=2),
+            )
+            officers.append(SimulatedOfficer(user, token, http, server.sio, recorder,
+                                             random.Random(rng.getrandbits(32)), args.speedup, socket_url))
+        await asyncio.gather(*(officer.connect() for officer in officers))
+
+        print(f"🚓 Driving {len(officers)} officers for {args.duration}s (speedup x{args.speedup})...")
+        started = time.perf_counter()
+        deadline = started + args.duration
+        try:
+            await asyncio.gather(*(officer.run(deadline) for officer in officers))
+        finally:
+            duration = time.perf_counter() - started
+            await asyncio.gather(*(officer.disconnect() for officer in officers), return_exceptions=True)
+            if uv_server is not None:
+                uv_server.should_exit = True
+                await serve_task
+
+    report = build_report(recorder, duration, args, seeded["counts"])
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = compare(report, baseline, args.max_regression, args.min_delta_ms, args.max_error_rate)
+        for failure in failures:
+            print(f"❌ {failure}")
+        if failures:
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stadtwache load test")
+    parser.add_argument("--mongo-url", help="local MongoDB (default: in-process mongomock)")
+    parser.add_argument("--db-name", default="stadtwache_loadtest")
+    parser.add_argument("--force", action="store_true", help="allow dropping a database without 'loadtest' in its name")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--officers", type=int, default=20)
+    parser.add_argument("--teams", type=int, default=8)
+    parser.add_argument("--districts", type=int, default=4)
+    parser.add_argument("--incidents", type=int, default=200)
+    parser.add_argument("--image-kb", type=int, default=20)
+    parser.add_argument("--persons", type=int, default=100)
+    parser.add_argument("--days", type=int, default=14, help="history of messages and locations")
+    parser.add_argument("--messages-per-day", type=int, default=100)
+    parser.add_argument("--location-interval", type=int, default=1800, help="seconds between seeded GPS points")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--speedup", type=float, default=2, help="divide client intervals by this factor")
+    parser.add_argument("--socket-transport", choices=("socketio", "direct"), default="socketio",
+                        help="location pings via real Socket.IO clients or a direct handler call")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline", help="previous report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.5, help="allowed relative p95 increase")
+    parser.add_argument("--min-delta-ms", type=float, default=5, help="ignore p95 changes below this")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    sys.exit(asyncio.run(main(args)))
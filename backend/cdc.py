@@ -0,0 +1,303 @@
+# 🔁 Change Data Capture für Stadtwache
+# Änderungen an Einsätzen, Personen, Berichten, Benutzern und App-Konfiguration aus MongoDB Change Streams,
+# Polling auf updated_at als Fallback für Standalone-Server - speist Cache-Invalidierung und Socket-Pushes
+
+import os
+import time
+import asyncio
+import inspect
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+CDC_ENABLED = os.getenv("CDC_ENABLED", "true").lower() == "true"
+# auto = Change Streams auf Replica-Sets/mongos, sonst Polling
+CDC_MODE = os.getenv("CDC_MODE", "auto")
+# teams/districts: ETags von /api/admin/teams und /api/admin/districts über alle App-Server aktuell halten
+CDC_COLLECTIONS = ("incidents", "persons", "reports", "users", "app_config", "teams", "districts")
+CDC_POLL_SECONDS = float(os.getenv("CDC_POLL_SECONDS", "2"))
+# updated_at kommt von den App-Servern: etwas ältere Zeitstempel können noch nachträglich committen
+CDC_POLL_OVERLAP_SECONDS = float(os.getenv("CDC_POLL_OVERLAP_SECONDS", "5"))
+CDC_POLL_BATCH = int(os.getenv("CDC_POLL_BATCH", "500"))
+CDC_RETRY_MAX_SECONDS = float(os.getenv("CDC_RETRY_MAX_SECONDS", "60"))
+# Preimages (MongoDB 6+), damit Lösch-Ereignisse die fachliche id tragen
+CDC_PRE_IMAGES = os.getenv("CDC_PRE_IMAGES", "true").lower() == "true"
+
+# Große oder sensible Felder verlassen die Datenbank nicht über den Feed
+EXCLUDED_FIELDS = ("images", "photo", "password", "hashed_password", "edit_history")
+
+# Fehler, nach denen ein Resume-Token nicht mehr hilft (History verloren, Stream fatal)
+HISTORY_LOST_CODES = {136, 280, 286}
+# Change Streams gibt es nur auf Replica-Sets/Sharded Clustern
+STREAMS_UNSUPPORTED_CODES = {40573}
+
+CDC_EVENTS = metrics.counter(
+    "cdc_events_total", "Change events dispatched by collection, operation and source",
+    ("collection", "operation", "source"))
+CDC_LAG = metrics.histogram(
+    "cdc_lag_seconds", "Delay between a write and the dispatch of its change event", ("source",))
+CDC_ERRORS = metrics.counter("cdc_errors_total", "Change feed errors by source", ("source",))
+
+# ================================================
+# EREIGNISSE
+# ================================================
+
+@dataclass
+class ChangeEvent:
+    collection: str
+    operation: str  # insert, update, delete, invalidate (ganze Collection neu laden)
+    id: Optional[str] = None
+    document: Optional[Dict[str, Any]] = None
+    source: str = "stream"  # stream, poll, local
+
+    def payload(self, document: bool = True) -> Dict[str, Any]:
+        """Socket.IO payload; ``document=False`` for collections clients must refetch themselves"""
+        data: Dict[str, Any] = {"collection": self.collection, "operation": self.operation, "id": self.id}
+        if document and self.document is not None and self.operation != "delete":
+            data["document"] = {key: value for key, value in self.document.items() if key != "_id"}
+        return data
+
+
+Handler = Callable[[ChangeEvent], Union[None, Awaitable[None]]]
+
+
+def _lag_from(written_at: Optional[datetime]) -> Optional[float]:
+    return (datetime.utcnow() - written_at).total_seconds() if isinstance(written_at, datetime) else None
+
+# ================================================
+# FEED
+# ================================================
+
+class ChangeFeed(monitoring.CommandListener):
+    """Publishes changes of CDC_COLLECTIONS to subscribed handlers.
+
+    Replica sets and mongos are followed with one database-level change
+    stream (resumable, post-images via updateLookup). Standalone servers,
+    mongomock and the embedded store are polled on ``updated_at``; hard
+    deletes are invisible there, so deletes by ``{"id": ...}`` issued by
+    this process are picked up from the command stream (or the embedded
+    store's delete hook) instead.
+    """
+
+    def __init__(self, db=None, collections: Tuple[str, ...] = CDC_COLLECTIONS):
+        self.db = db
+        self.collections = collections
+        self.mode: Optional[str] = None
+        self._handlers: List[Handler] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self._watermarks: Dict[str, datetime] = {}
+        self._seen: Dict[str, Dict[str, datetime]] = {}
+        self._pending: Dict[Tuple[Any, int], List[Tuple[str, Any]]] = {}
+        self._last_event_at: Optional[float] = None
+
+    def subscribe(self, handler: Handler):
+        self._handlers.append(handler)
+
+    async def publish(self, event: ChangeEvent, lag: Optional[float] = None):
+        CDC_EVENTS.labels(event.collection, event.operation, event.source).inc()
+        if lag is not None:
+            CDC_LAG.labels(event.source).observe(max(0.0, lag))
+        self._last_event_at = time.time()
+        for handler in self._handlers:
+            try:
+                result = handler(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"❌ Change handler failed for {event.collection}/{event.operation}: {e}")
+
+    # ---------- Ablauf ----------
+
+    async def _detect_mode(self) -> str:
+        if CDC_MODE in ("stream", "poll"):
+            return CDC_MODE
+        if type(self.db) is not AsyncIOMotorDatabase:
+            return "poll"  # eingebetteter Speicher / mongomock
+        hello = await self.db.client.admin.command("hello")
+        return "stream" if hello.get("setName") or hello.get("msg") == "isdbgrid" else "poll"
+
+    async def run_forever(self):
+        self._loop = asyncio.get_running_loop()
+        delay = 1.0
+        while True:
+            try:
+                if self.mode is None:
+                    self.mode = await self._detect_mode()
+                    logger.info(f"🔁 Change feed: {self.mode} on {', '.join(self.collections)}")
+                if self.mode == "stream":
+                    await self._watch()
+                else:
+                    await self._poll_forever()
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                CDC_ERRORS.labels(self.mode or "detect").inc()
+                if e.code in STREAMS_UNSUPPORTED_CODES:
+                    logger.warning(f"⚠️ Change streams unavailable ({e}), falling back to polling")
+                    self.mode = "poll"
+                    continue
+                if e.code in HISTORY_LOST_CODES:
+                    logger.warning(f"⚠️ Change stream history lost ({e}), invalidating all collections")
+                    self._resume_token = None
+                    await self._invalidate_all("stream")
+                    continue
+                logger.error(f"❌ Change feed failed: {e}")
+            except Exception as e:
+                CDC_ERRORS.labels(self.mode or "detect").inc()
+                logger.error(f"❌ Change feed failed: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CDC_RETRY_MAX_SECONDS)
+
+    async def _invalidate_all(self, source: str):
+        for name in self.collections:
+            await self.publish(ChangeEvent(name, "invalidate", source=source))
+
+    # ---------- Change Streams ----------
+
+    async def _enable_pre_images(self):
+        for name in self.collections:
+            try:
+                await self.db.command("collMod", name, changeStreamPreAndPostImages={"enabled": True})
+            except OperationFailure as e:
+                logger.info(f"ℹ️ No change stream pre-images for {name}: {e}")
+                return False
+        return True
+
+    async def _watch(self):
+        pre_images = CDC_PRE_IMAGES and await self._enable_pre_images()
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": list(self.collections)},
+                        "operationType": {"$in": ["insert", "update", "replace", "delete", "drop", "rename"]}}},
+            {"$project": {**{f"fullDocument.{name}": 0 for name in EXCLUDED_FIELDS},
+                          **{f"fullDocumentBeforeChange.{name}": 0 for name in EXCLUDED_FIELDS}}},
+        ]
+        options: Dict[str, Any] = {"full_document": "updateLookup"}
+        if pre_images:
+            options["full_document_before_change"] = "whenAvailable"
+        async with self.db.watch(pipeline, resume_after=self._resume_token, **options) as stream:
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                event = self._stream_event(change)
+                cluster_time = change.get("clusterTime")
+                lag = time.time() - cluster_time.time if cluster_time is not None else None
+                await self.publish(event, lag)
+
+    def _stream_event(self, change: Dict[str, Any]) -> ChangeEvent:
+        collection = change["ns"]["coll"]
+        operation = change["operationType"]
+        if operation in ("drop", "rename"):
+            return ChangeEvent(collection, "invalidate")
+        if operation == "delete":
+            # Preimage (falls aktiviert) nur fürs Routing, z.B. Autor eines Berichts - wird nicht gesendet
+            before = change.get("fullDocumentBeforeChange")
+            return ChangeEvent(collection, "delete", (before or {}).get("id"), before)
+        document = change.get("fullDocument")
+        if document is None:  # zwischen Update und Lookup gelöscht
+            return ChangeEvent(collection, "update", None, None)
+        return ChangeEvent(collection, "insert" if operation == "insert" else "update", document.get("id"), document)
+
+    # ---------- Polling ----------
+
+    async def _poll_forever(self):
+        now = datetime.utcnow()
+        for name in self.collections:
+            if name not in self._watermarks:
+                self._watermarks[name] = now
+                # Erster Durchlauf merkt sich nur, was im Überlappungsfenster schon vor dem Start lag
+                await self._poll(name, publish=False)
+        while True:
+            await asyncio.sleep(CDC_POLL_SECONDS)
+            for name in self.collections:
+                await self._poll(name)
+
+    async def _poll(self, name: str, publish: bool = True):
+        overlap = timedelta(seconds=CDC_POLL_OVERLAP_SECONDS)
+        position = self._watermarks[name] - overlap
+        seen = self._seen.setdefault(name, {})  # id -> zuletzt gemeldetes updated_at
+        projection = {field: 0 for field in EXCLUDED_FIELDS}
+        while True:
+            docs = await self.db[name].find({"updated_at": {"$gte": position}}, projection) \
+                .sort("updated_at", 1).limit(CDC_POLL_BATCH).to_list(CDC_POLL_BATCH)
+            for doc in docs:
+                updated_at = doc.get("updated_at")
+                key = doc.get("id") or str(doc.get("_id"))
+                if not isinstance(updated_at, datetime) or seen.get(key) == updated_at:
+                    continue
+                known = key in seen
+                seen[key] = updated_at
+                if updated_at > self._watermarks[name]:
+                    self._watermarks[name] = updated_at
+                if not publish:
+                    continue
+                created_at = doc.get("created_at")
+                # Beim Anlegen setzen die Endpunkte created_at und updated_at im selben Moment
+                inserted = not known and isinstance(created_at, datetime) \
+                    and abs((updated_at - created_at).total_seconds()) < 1
+                await self.publish(ChangeEvent(name, "insert" if inserted else "update", doc.get("id"), doc, "poll"),
+                                   _lag_from(updated_at))
+            if len(docs) < CDC_POLL_BATCH or docs[-1].get("updated_at") == position:
+                break
+            position = docs[-1]["updated_at"]
+        horizon = self._watermarks[name] - overlap
+        for key in [key for key, updated_at in seen.items() if updated_at < horizon]:
+            del seen[key]
+
+    # ---------- Lokale Löschungen (nur Polling) ----------
+
+    def deleted(self, collection: str, filter: Optional[Dict[str, Any]]):
+        """Delete issued by this process; hook of the embedded store, also fed by the command listener"""
+        if self.mode != "poll" or collection not in self.collections or self._loop is None:
+            return
+        target = (filter or {}).get("id")
+        event = ChangeEvent(collection, "delete", target, None, "local") if isinstance(target, str) \
+            else ChangeEvent(collection, "invalidate", source="local")
+        self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self.publish(event)))
+
+    def started(self, event):
+        if self.mode != "poll" or event.command_name != "delete":
+            return
+        collection = event.command.get("delete")
+        if collection in self.collections:
+            self._pending[(event.connection_id, event.request_id)] = [
+                (collection, statement.get("q")) for statement in event.command.get("deletes", [])]
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending and event.reply.get("n"):
+            for collection, filter in pending:
+                self.deleted(collection, filter)
+
+    def failed(self, event):
+        self._pending.pop((event.connection_id, event.request_id), None)
+
+    def status(self) -> Dict[str, Any]:
+        events: Dict[str, Dict[str, int]] = {}
+        for (collection, operation, source), child in list(CDC_EVENTS.children.items()):
+            events.setdefault(collection, {})[f"{operation}:{source}"] = int(child.value)
+        return {
+            "enabled": CDC_ENABLED,
+            "mode": self.mode,
+            "collections": list(self.collections),
+            "last_event_at": datetime.utcfromtimestamp(self._last_event_at) if self._last_event_at else None,
+            "resumable": self._resume_token is not None,
+            "watermarks": dict(self._watermarks),
+            "events": events,
+        }
+
+
+change_feed = ChangeFeed()
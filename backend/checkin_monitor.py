@@ -0,0 +1,263 @@
+# ⏰ Check-In-Überwachung für Stadtwache
+# Beamte im Dienst liegen in einem Deadline-Heap (last_check_in + check_in_interval); der Dienst schläft bis zur
+# nächsten Frist, erhöht missed_check_ins gebündelt und meldet verpasste Check-Ins an Vorgesetzte
+
+import os
+import time
+import uuid
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from asyncutil import wait_for_event
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+CHECKIN_MONITOR_ENABLED = os.getenv("CHECKIN_MONITOR_ENABLED", "true").lower() == "true"
+# Status, in denen ein Beamter sich regelmäßig melden muss (wie /team-status)
+ON_DUTY_STATUSES = ("Im Dienst", "Einsatz", "Streife")
+DEFAULT_CHECK_IN_MINUTES = 30
+# Standard: genau zur nächsten Frist aufwachen; was während eines Durchlaufs fällig wird, landet im nächsten.
+# Optional so lange nach einer Frist warten, damit kurz danach fällige Fristen im selben Durchlauf landen
+CHECKIN_BATCH_WINDOW_SECONDS = float(os.getenv("CHECKIN_BATCH_WINDOW_SECONDS", "0"))
+# Vollständiger Abgleich mit der Datenbank als Sicherheitsnetz für verpasste Änderungen
+CHECKIN_RELOAD_SECONDS = float(os.getenv("CHECKIN_RELOAD_SECONDS", "900"))
+# Beamte pro Update ($in-Liste; hält die Anzahl gebundener Parameter klein)
+CHECKIN_UPDATE_CHUNK = 1000
+
+# Kennung des Durchlaufs, der missed_check_ins zuletzt erhöht hat (nur diese Instanz meldet das Versäumnis)
+MISSED_BATCH_FIELD = "missed_check_in_batch"
+MONITOR_FIELDS = ("id", "username", "status", "is_active", "check_in_interval", "last_check_in",
+                  "missed_check_ins", "patrol_team", MISSED_BATCH_FIELD)
+MONITOR_PROJECTION = {"_id": 0, **{field: 1 for field in MONITOR_FIELDS}}
+
+MISSED_TOTAL = metrics.counter("checkin_missed_total", "Missed check-ins detected")
+BATCH_SECONDS = metrics.histogram("checkin_monitor_batch_seconds", "Time to process one batch of due deadlines")
+WAKE_DELAY = metrics.histogram("checkin_monitor_wake_delay_seconds", "Delay between a deadline and its processing")
+
+AlertHandler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+# ================================================
+# ÜBERWACHUNG
+# ================================================
+
+def on_duty(doc: Dict[str, Any]) -> bool:
+    return doc.get("is_active", True) and doc.get("status", "Im Dienst") in ON_DUTY_STATUSES
+
+
+class CheckInMonitor:
+    """Deadline heap over all on-duty officers.
+
+    The deadline of an officer is ``base + interval * (missed_check_ins + 1)``
+    with ``base`` = last check-in (or the moment tracking started), so applying
+    the same user document twice - e.g. the change feed echoing our own
+    increment - never produces a second miss. Heap entries are invalidated
+    lazily: an entry only counts while it matches ``_deadlines``.
+    """
+
+    def __init__(self, db, on_missed: Optional[AlertHandler] = None):
+        self.db = db
+        self.on_missed = on_missed
+        self._heap: List[Tuple[datetime, str]] = []
+        self._deadlines: Dict[str, datetime] = {}
+        self._since: Dict[str, datetime] = {}  # Beginn der Überwachung ohne bisherigen Check-In
+        self._wake = asyncio.Event()
+        self.last_batch: Optional[Dict[str, Any]] = None
+        self.loaded_at: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    # ---------- Fristen ----------
+
+    def _deadline(self, doc: Dict[str, Any], now: datetime) -> datetime:
+        base = doc.get("last_check_in") or self._since.setdefault(doc["id"], now)
+        interval = timedelta(minutes=doc.get("check_in_interval") or DEFAULT_CHECK_IN_MINUTES)
+        return base + interval * ((doc.get("missed_check_ins") or 0) + 1)
+
+    def _schedule(self, user_id: str, deadline: datetime):
+        previous = self._deadlines.get(user_id)
+        if previous == deadline:
+            return
+        self._deadlines[user_id] = deadline
+        heapq.heappush(self._heap, (deadline, user_id))
+        if self._heap[0][1] == user_id:
+            self._wake.set()  # neue früheste Frist: Schlaf verkürzen
+
+    def track(self, doc: Dict[str, Any], now: Optional[datetime] = None):
+        """Apply a created or updated user document"""
+        user_id = doc.get("id")
+        if not user_id:
+            return
+        if not on_duty(doc):
+            self.untrack(user_id)
+            return
+        self._schedule(user_id, self._deadline(doc, now or datetime.utcnow()))
+
+    def untrack(self, user_id: str):
+        self._deadlines.pop(user_id, None)
+        self._since.pop(user_id, None)
+
+    def checked_in(self, user_id: str, at: datetime, interval_minutes: Optional[int] = None):
+        if user_id in self._deadlines:
+            self._since.pop(user_id, None)
+            self._schedule(user_id, at + timedelta(minutes=interval_minutes or DEFAULT_CHECK_IN_MINUTES))
+
+    def invalidate(self):
+        """Reload from the database on the next wake-up"""
+        self.loaded_at = None
+        self._wake.set()
+
+    def next_deadline(self) -> Optional[datetime]:
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, until: datetime) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= until:
+            deadline, user_id = heapq.heappop(self._heap)
+            if self._deadlines.get(user_id) == deadline:
+                due.append(user_id)
+        return due
+
+    # ---------- Datenbank ----------
+
+    async def load(self):
+        """Rebuild the heap from all on-duty officers"""
+        now = datetime.utcnow()
+        docs = await self.db.users.find(
+            {"is_active": {"$ne": False}, "status": {"$in": list(ON_DUTY_STATUSES)}}, MONITOR_PROJECTION
+        ).to_list(None)
+        self._deadlines = {doc["id"]: self._deadline(doc, now) for doc in docs if doc.get("id")}
+        self._since = {user_id: since for user_id, since in self._since.items() if user_id in self._deadlines}
+        self._heap = [(deadline, user_id) for user_id, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+        self.loaded_at = now
+        self._wake.set()
+        logger.info(f"⏰ Check-in monitor tracking {len(self._deadlines)} officers on duty")
+
+    async def process_due(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Handle all deadlines up to now; returns the alerts sent"""
+        now = now or datetime.utcnow()
+        due = self._pop_due(now)
+        if not due:
+            return []
+        started = time.perf_counter()
+        docs = await self.db.users.find({"id": {"$in": due}}, MONITOR_PROJECTION).to_list(None)
+        missed: List[Dict[str, Any]] = []
+        for doc in docs:
+            if not on_duty(doc):
+                self.untrack(doc["id"])
+                continue
+            deadline = self._deadline(doc, now)
+            if deadline <= now:
+                WAKE_DELAY.labels().observe((now - deadline).total_seconds())
+                missed.append(doc)
+            else:
+                self._schedule(doc["id"], deadline)  # inzwischen eingecheckt oder Intervall geändert
+        for user_id in set(due) - {doc["id"] for doc in docs}:
+            self.untrack(user_id)  # gelöscht
+
+        if missed:
+            # Gebündelte Updates je (Intervall, Zählerstand) über die ids: getroffen wird nur, wessen Frist laut
+            # aktuellem Dokument abgelaufen ist - ein Check-In zwischen Lesen und Schreiben oder die Erhöhung einer
+            # parallelen Instanz schließt den Beamten aus. Die Durchlauf-Kennung zeigt danach, welche Erhöhungen
+            # von dieser Instanz stammen - eine parallele Instanz hinterlässt denselben Zähler
+            batch = uuid.uuid4().hex
+            groups: Dict[Tuple[Any, Any, bool], List[str]] = {}
+            for doc in missed:
+                key = (doc.get("check_in_interval"), doc.get("missed_check_ins"), not doc.get("last_check_in"))
+                groups.setdefault(key, []).append(doc["id"])
+            modified = 0
+            for (interval, count, never_checked_in), ids in groups.items():
+                overdue: Dict[str, Any] = {"check_in_interval": interval, "missed_check_ins": count}
+                if never_checked_in:
+                    overdue["last_check_in"] = None  # Frist ab Überwachungsbeginn, nur dieser Instanz bekannt
+                else:
+                    overdue["last_check_in"] = {"$lte": now - timedelta(
+                        minutes=interval or DEFAULT_CHECK_IN_MINUTES) * ((count or 0) + 1)}
+                for start in range(0, len(ids), CHECKIN_UPDATE_CHUNK):
+                    result = await self.db.users.update_many(
+                        {"id": {"$in": ids[start:start + CHECKIN_UPDATE_CHUNK]}, **overdue},
+                        {"$inc": {"missed_check_ins": 1}, "$set": {MISSED_BATCH_FIELD: batch}}
+                    )
+                    modified += result.modified_count
+            if modified < len(missed):
+                current = {doc["id"]: doc for doc in await self.db.users.find(
+                    {"id": {"$in": [doc["id"] for doc in missed]}}, MONITOR_PROJECTION).to_list(None)}
+                ours = []
+                for doc in missed:
+                    fresh = current.get(doc["id"])
+                    if fresh is not None and fresh.get(MISSED_BATCH_FIELD) == batch:
+                        ours.append(doc)
+                    elif fresh is not None:
+                        self.track(fresh, now)  # eingecheckt oder von einer parallelen Instanz gezählt
+                    else:
+                        self.untrack(doc["id"])
+                missed = ours
+
+        alerts = []
+        for doc in missed:
+            count = doc.get("missed_check_ins") or 0
+            deadline = self._deadline(doc, now)
+            doc["missed_check_ins"] = count + 1
+            self._schedule(doc["id"], self._deadline(doc, now))
+            alerts.append({
+                "user_id": doc["id"],
+                "username": doc.get("username"),
+                "status": doc.get("status"),
+                "team_id": doc.get("patrol_team"),
+                "last_check_in": doc.get("last_check_in"),
+                "missed_check_ins": count + 1,
+                "deadline": deadline,
+            })
+        MISSED_TOTAL.labels().inc(len(alerts))
+        elapsed = time.perf_counter() - started
+        BATCH_SECONDS.labels().observe(elapsed)
+        self.last_batch = {"at": now, "due": len(due), "missed": len(alerts), "duration_seconds": elapsed}
+        if alerts and self.on_missed is not None:
+            try:
+                await self.on_missed(alerts)
+            except Exception as e:
+                logger.error(f"❌ Missed check-in alert failed: {e}")
+        return alerts
+
+    # ---------- Ablauf ----------
+
+    async def run_forever(self):
+        while True:
+            try:
+                if self.loaded_at is None or \
+                        (datetime.utcnow() - self.loaded_at).total_seconds() > CHECKIN_RELOAD_SECONDS:
+                    await self.load()
+                await self.process_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Check-in monitor error: {e}")
+            self._wake.clear()
+            deadline = self.next_deadline()
+            timeout = CHECKIN_RELOAD_SECONDS
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, (deadline - datetime.utcnow()).total_seconds()
+                                           + CHECKIN_BATCH_WINDOW_SECONDS))
+            await wait_for_event(self._wake, timeout)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": CHECKIN_MONITOR_ENABLED,
+            "tracked": len(self._deadlines),
+            "heap_entries": len(self._heap),
+            "next_deadline": self.next_deadline(),
+            "loaded_at": self.loaded_at,
+            "last_batch": self.last_batch,
+            "missed_total": int(MISSED_TOTAL.labels().value),
+        }
@@ -0,0 +1,280 @@
+# 🗜️ Komprimierung für Stadtwache
+# gzip/brotli für API-Antworten ab einer Mindestgröße (große Bodies im Thread-Pool),
+# vorkomprimierte statische Dateien (.br/.gz) mit langlebigen Cache-Headern
+#
+#   python compression.py precompress ../frontend/dist    # beim Build, sonst beim Serverstart
+
+import os
+import sys
+import gzip
+import time
+import asyncio
+import logging
+import mimetypes
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # optional - ohne Paket nur gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Ab dieser Größe läuft die Komprimierung im Thread-Pool statt auf dem Event-Loop
+COMPRESSION_OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", "65536"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+# Statische Dateien werden nur einmal komprimiert - höchste Stufe lohnt sich
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "text/", "image/svg+xml", "application/xml",
+    "application/manifest+json", "font/ttf", "application/vnd.ms-fontobject",
+)
+COMPRESSIBLE_EXTENSIONS = (".js", ".css", ".html", ".json", ".map", ".svg", ".txt", ".xml", ".ttf", ".wasm")
+
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSION_BYTES = metrics.counter(
+    "http_compression_bytes_total", "Response bytes before and after compression", ("encoding", "stage"))
+COMPRESSION_DURATION = metrics.histogram(
+    "http_compression_duration_seconds", "Time spent compressing response bodies", ("encoding", "offloaded"))
+
+# ================================================
+# ENCODING
+# ================================================
+
+def negotiate(accept_encoding: Optional[str], available: Iterable[str] = SUPPORTED_ENCODINGS) -> Optional[str]:
+    """Best content coding from an Accept-Encoding header (br preferred on equal q)"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in available:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+
+def _compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+# ================================================
+# MIDDLEWARE
+# ================================================
+
+class CompressionMiddleware:
+    """Pure ASGI middleware: gzip/brotli for single-message responses above a size threshold.
+
+    The response start is held back until the body is known. Streamed
+    responses (more_body), already encoded bodies and small or binary
+    payloads pass through untouched. Bodies from COMPRESSION_OFFLOAD_SIZE
+    upwards are compressed in a worker thread so a large incident list does
+    not stall other requests.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 offload_size: int = COMPRESSION_OFFLOAD_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if ("content-encoding" in headers or message["status"] in (204, 304)
+                        or not _compressible(headers.get("content-type", ""))):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming oder zu klein: unverändert weiterreichen
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            started = time.perf_counter()
+            offloaded = len(body) >= self.offload_size
+            if offloaded:
+                compressed = await asyncio.to_thread(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            COMPRESSION_DURATION.labels(encoding, str(offloaded).lower()).observe(time.perf_counter() - started)
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(compressed) >= len(body):
+                await send(start_message)
+                await send(message)
+                return
+            COMPRESSION_BYTES.labels(encoding, "in").inc(len(body))
+            COMPRESSION_BYTES.labels(encoding, "out").inc(len(compressed))
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # Andere Repräsentation - ein starkes ETag darf nicht gleich bleiben
+                headers["ETag"] = "W/" + etag
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
+
+# ================================================
+# STATISCHE DATEIEN
+# ================================================
+
+def _should_precompress(path: str, size: int) -> bool:
+    return size >= COMPRESSION_MIN_SIZE and path.endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves .br/.gz siblings written by precompress().
+
+    Variants are registered in memory after they exist on disk, so requests
+    arriving before precompression finishes get the plain file. With
+    ``immutable`` (content-hashed bundle names) responses carry a one-year
+    immutable Cache-Control.
+    """
+
+    def __init__(self, *args, immutable: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable = immutable
+        self.variants: Dict[str, Dict[str, Tuple[str, os.stat_result]]] = {}
+
+    def precompress(self) -> Dict[str, int]:
+        """Write missing or stale .br/.gz files next to the originals (blocking, run in a thread)"""
+        stats = {"files": 0, "written": 0, "bytes_in": 0, "bytes_out": 0}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.realpath(os.path.join(root, name))
+                original = os.stat(path)
+                if not _should_precompress(path, original.st_size):
+                    continue
+                stats["files"] += 1
+                body = None
+                variants = {}
+                for encoding in SUPPORTED_ENCODINGS:
+                    target = path + (".br" if encoding == "br" else ".gz")
+                    try:
+                        current = os.stat(target)
+                        if current.st_mtime < original.st_mtime:
+                            raise FileNotFoundError(target)
+                    except FileNotFoundError:
+                        if body is None:
+                            with open(path, "rb") as f:
+                                body = f.read()
+                        data = compress(body, encoding, static=True)
+                        if len(data) >= original.st_size:
+                            continue
+                        try:
+                            with open(target, "wb") as f:
+                                f.write(data)
+                        except OSError as e:
+                            logger.warning(f"⚠️ Cannot write {target}: {e}")
+                            continue
+                        stats["written"] += 1
+                        current = os.stat(target)
+                    stats["bytes_in"] += original.st_size
+                    stats["bytes_out"] += current.st_size
+                    variants[encoding] = (target, current)
+                if variants:
+                    self.variants[path] = variants
+        return stats
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        variants = self.variants.get(os.path.realpath(full_path))
+        encoding = negotiate(request_headers.get("accept-encoding"), variants) if variants else None
+        if encoding is not None:
+            variant_path, variant_stat = variants[encoding]
+            media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+            response = FileResponse(variant_path, status_code=status_code, stat_result=variant_stat,
+                                    media_type=media_type, headers={"Content-Encoding": encoding})
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        if variants:
+            response.headers.add_vary_header("Accept-Encoding")
+        if self.immutable and status_code == 200:
+            response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+async def precompress_static(mounts: Iterable[PrecompressedStaticFiles]):
+    """Precompress all mounts off the event loop (startup hook)"""
+    for mount in mounts:
+        started = time.perf_counter()
+        try:
+            stats = await asyncio.to_thread(mount.precompress)
+        except Exception as e:
+            logger.error(f"❌ Precompressing {mount.directory} failed: {e}")
+            continue
+        logger.info(
+            f"🗜️ {mount.directory}: {stats['files']} files, {stats['written']} variants written, "
+            f"{stats['bytes_in']} -> {stats['bytes_out']} bytes in {time.perf_counter() - started:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    if len(sys.argv) < 3 or sys.argv[1] != "precompress":
+        print("usage: python compression.py precompress <directory> [<directory> ...]")
+        sys.exit(2)
+    asyncio.run(precompress_static([PrecompressedStaticFiles(directory=path) for path in sys.argv[2:]]))
@@ -63,14 +63,14 @@ def get_sqlite_url():
 # DATABASE CONNECTION FACTORY
 # ================================================
 
-def create_database_engine(db_type="mysql"):
-    """Database Engine basierend auf Typ erstellen"""
+def create_database_engine(db_type="mysql", echo=True):
+    """Database Engine basierend auf Typ erstellen (echo=False für Benchmarks und Betrieb)"""
     
     if db_type.lower() == "mysql":
         database_url = get_mysql_url()
         engine = create_async_engine(
             database_url,
-            echo=True,  # SQL-Queries loggen
+            echo=echo,  # SQL-Queries loggen
             pool_size=20,
             max_overflow=30,
             pool_pre_ping=True,
@@ -82,7 +82,7 @@ def create_database_engine(db_type="mysql"):
         database_url = get_postgres_url()
         engine = create_async_engine(
             database_url,
-            echo=True,
+            echo=echo,
             pool_size=20,
             max_overflow=30,
             pool_pre_ping=True,
@@ -94,7 +94,7 @@ def create_database_engine(db_type="mysql"):
         database_url = get_sqlite_url()
         engine = create_async_engine(
             database_url,
-            echo=True,
+            echo=echo,
             connect_args={"check_same_thread": False}
         )
         print(f"🔗 SQLite Engine erstellt: {database_url}")
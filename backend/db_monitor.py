@@ -0,0 +1,203 @@
+# 🧭 MongoDB Command-Monitoring für Stadtwache
+# Dauer und Dokumentanzahl pro Collection/Befehl, Slow-Query-Log mit Route, Abfragen pro Request
+
+import os
+import logging
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from metrics import metrics, route_template
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+DB_MONITOR_ENABLED = os.getenv("DB_MONITOR_ENABLED", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_HISTORY = int(os.getenv("SLOW_QUERY_HISTORY", "200"))
+
+# Handshake/Auth/Session-Befehle sind kein Anwendungs-Traffic
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "buildinfo", "saslStart", "saslContinue",
+    "authenticate", "getnonce", "endSessions", "killCursors",
+}
+
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+DB_COMMAND_DURATION = metrics.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection and command", ("collection", "command"))
+DB_COMMAND_DOCUMENTS = metrics.counter(
+    "mongodb_command_documents_total", "Documents returned or written by collection and command",
+    ("collection", "command"))
+DB_COMMAND_FAILURES = metrics.counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands by collection and command", ("collection", "command"))
+DB_SLOW_COMMANDS = metrics.counter(
+    "mongodb_slow_commands_total", "MongoDB commands slower than SLOW_QUERY_MS", ("collection", "command", "route"))
+HTTP_DB_QUERIES = metrics.histogram(
+    "http_request_db_queries", "MongoDB commands issued per HTTP request", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS)
+HTTP_DB_SECONDS = metrics.histogram(
+    "http_request_db_seconds", "Time spent in MongoDB per HTTP request", ("method", "route"))
+
+# ================================================
+# REQUEST-KONTEXT
+# ================================================
+
+class RequestQueries:
+    """Query counter of one HTTP request; Motor copies the context into its executor threads"""
+
+    __slots__ = ("scope", "count", "seconds")
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        return f"{self.scope.get('method')} {route_template(self.scope)}"
+
+
+current_request: ContextVar[Optional[RequestQueries]] = ContextVar("current_request", default=None)
+
+
+class QueryCountMiddleware:
+    """Pure ASGI middleware that attributes MongoDB commands to the current request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = RequestQueries(scope)
+        token = current_request.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
+            key = (scope["method"], route_template(scope))
+            HTTP_DB_QUERIES.labels(*key).observe(queries.count)
+            HTTP_DB_SECONDS.labels(*key).observe(queries.seconds)
+
+# ================================================
+# COMMAND LISTENER
+# ================================================
+
+def _collection(command_name: str, command: Dict[str, Any]) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", "-"))
+    target = command.get(command_name)
+    return target if isinstance(target, str) else "-"
+
+
+def _document_count(command_name: str, reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+
+def _shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """Query shape without values (field names only) for the slow-query log"""
+    shape: Dict[str, Any] = {}
+    for key in ("filter", "sort", "projection", "query", "update"):
+        value = command.get(key)
+        if isinstance(value, dict):
+            shape[key] = sorted(value.keys())
+    if command_name == "aggregate" and isinstance(command.get("pipeline"), list):
+        shape["pipeline"] = [next(iter(stage), "?") for stage in command["pipeline"] if isinstance(stage, dict)]
+    for key in ("updates", "deletes"):
+        if isinstance(command.get(key), list):
+            shape[key] = len(command[key])
+    if isinstance(command.get("documents"), list):
+        shape["documents"] = len(command["documents"])
+    return shape
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """pymongo CommandListener registered on the shared AsyncIOMotorClient.
+
+    Callbacks run on Motor's executor threads inside a copy of the caller's
+    context, so ``current_request`` still points at the originating request.
+    """
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, history: int = SLOW_QUERY_HISTORY):
+        self.slow_seconds = slow_ms / 1000
+        self.slow_queries: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Any, Optional[RequestQueries]]] = {}
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = _collection(event.command_name, event.command)
+        # Befehl nur referenzieren - die Query-Form wird erst für langsame Befehle berechnet
+        self._pending[(event.connection_id, event.request_id)] = (collection, event.command, current_request.get())
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        collection, command_document, request = pending
+        seconds = event.duration_micros / 1e6
+        command = event.command_name
+        DB_COMMAND_DURATION.labels(collection, command).observe(seconds)
+        DB_COMMAND_DOCUMENTS.labels(collection, command).inc(_document_count(command, event.reply))
+        if request is not None:
+            request.count += 1
+            request.seconds += seconds
+        if seconds >= self.slow_seconds:
+            self._record_slow(collection, command, seconds, _shape(command, command_document), request,
+                              _document_count(command, event.reply))
+
+    def failed(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        collection, _, request = pending
+        seconds = event.duration_micros / 1e6
+        DB_COMMAND_DURATION.labels(collection, event.command_name).observe(seconds)
+        DB_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+        if request is not None:
+            request.count += 1
+            request.seconds += seconds
+
+    def _record_slow(self, collection: str, command: str, seconds: float, shape: Dict[str, Any],
+                     request: Optional[RequestQueries], documents: int):
+        route = request.route if request is not None else "background"
+        DB_SLOW_COMMANDS.labels(collection, command, route).inc()
+        entry = {
+            "at": datetime.utcnow(),
+            "collection": collection,
+            "command": command,
+            "duration_ms": round(seconds * 1000, 1),
+            "documents": documents,
+            "route": route,
+            "shape": shape,
+        }
+        self.slow_queries.append(entry)
+        logger.warning(
+            f"🐢 Slow {command} on {collection}: {entry['duration_ms']}ms, {documents} docs, "
+            f"route={route}, shape={shape}"
+        )
+
+    def recent_slow_queries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return list(self.slow_queries)[-limit:][::-1]
+
+
+command_monitor = CommandMonitor()
+
+
+def client_event_listeners() -> List[monitoring.CommandListener]:
+    """event_listeners argument for AsyncIOMotorClient"""
+    return [command_monitor] if DB_MONITOR_ENABLED else []
@@ -0,0 +1,123 @@
+# 🎯 Sparse Fieldsets für Stadtwache
+# ?fields=id,title,status auf Listen-Endpunkten: Auswahl wird als MongoDB-Projektion an die Datenbank
+# durchgereicht und über ein reduziertes Antwortmodell serialisiert - keine base64-Bilder mehr in Listen
+
+import os
+import re
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter, create_model
+
+from metrics import SIZE_BUCKETS, metrics, route_template
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+FIELDSETS_MAX_FIELDS = int(os.getenv("FIELDSETS_MAX_FIELDS", "40"))
+# Wird immer mitgeliefert - Clients brauchen einen Schlüssel für Listen
+ALWAYS_INCLUDED = ("id",)
+FIELD_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+SPARSE_RESPONSE_SIZE = metrics.histogram(
+    "http_sparse_response_size_bytes", "Body size of list responses restricted with ?fields=", ("route",),
+    buckets=SIZE_BUCKETS)
+
+# ================================================
+# AUSWAHL
+# ================================================
+
+@lru_cache(maxsize=256)
+def _partial_adapter(model: Type[BaseModel], fields: FrozenSet[str]) -> TypeAdapter:
+    """List adapter for a copy of ``model`` reduced to ``fields``; required fields become optional"""
+    definitions = {}
+    for name, info in model.model_fields.items():  # Reihenfolge wie im vollen Modell
+        if name not in fields:
+            continue
+        if info.is_required():
+            definitions[name] = (Optional[info.annotation], None)
+        else:
+            definitions[name] = (info.annotation, info)
+    partial = create_model(f"{model.__name__}Fields", **definitions)
+    return TypeAdapter(List[partial])
+
+
+class FieldSelection:
+    """Fields requested via ``?fields=`` for one list request"""
+
+    __slots__ = ("fields", "model", "route")
+
+    def __init__(self, fields: Tuple[str, ...], model: Optional[Type[BaseModel]], route: str):
+        self.fields = fields
+        self.model = model
+        self.route = route
+
+    def projection(self) -> Dict[str, int]:
+        return {"_id": 0, **{field: 1 for field in self.fields}}
+
+    def response(self, docs: Iterable[Dict[str, Any]]) -> Response:
+        """Serialize projected documents, bypassing the endpoint's full response_model"""
+        if self.model is not None:
+            adapter = _partial_adapter(self.model, frozenset(self.fields))
+            body = adapter.dump_json(adapter.validate_python(list(docs)))
+        else:
+            body = json.dumps(jsonable_encoder(list(docs)), ensure_ascii=False).encode()
+        SPARSE_RESPONSE_SIZE.labels(self.route).observe(len(body))
+        return Response(content=body, media_type="application/json")
+
+
+def projection(selection: Optional[FieldSelection], default: Optional[Dict[str, int]] = None):
+    """Projection for find(): the selection's, else ``default`` (full documents when None)"""
+    return selection.projection() if selection is not None else default
+
+
+def field_names(selection: Optional[FieldSelection]) -> Optional[Tuple[str, ...]]:
+    """Selected field names for the repository layer (None = full documents)"""
+    return selection.fields if selection is not None else None
+
+
+def sparse_fields(model: Optional[Type[BaseModel]] = None):
+    """Dependency parsing ``?fields=a,b,c`` against ``model``'s fields.
+
+    Returns None without the parameter, so endpoints keep their full
+    response. Unknown fields are a 400 - for endpoints without a response
+    model any plain top-level field name is accepted.
+    """
+    allowed = frozenset(model.model_fields) if model is not None else None
+
+    async def dependency(request: Request, fields: Optional[str] = Query(
+            None, description="Comma-separated fields to return, e.g. id,title,status")) -> Optional[FieldSelection]:
+        if not fields:
+            return None
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        if len(requested) > FIELDSETS_MAX_FIELDS:
+            raise HTTPException(status_code=400, detail=f"At most {FIELDSETS_MAX_FIELDS} fields")
+        if allowed is not None:
+            unknown = sorted(set(requested) - allowed)
+        else:
+            unknown = sorted(name for name in requested if not FIELD_NAME.match(name))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        selected = tuple(dict.fromkeys([*(f for f in ALWAYS_INCLUDED if allowed is None or f in allowed),
+                                        *requested]))
+        return FieldSelection(selected, model, route_template(request.scope))
+
+    return dependency
+
+# ================================================
+# STATISTIK
+# ================================================
+
+def fieldset_stats() -> Dict[str, Dict[str, Any]]:
+    """{route: {requests, avg_bytes}} of sparse responses for the admin overview"""
+    return {
+        route: {"requests": child.count, "avg_bytes": round(child.sum / child.count) if child.count else None}
+        for (route,), child in list(SPARSE_RESPONSE_SIZE.children.items())
+    }
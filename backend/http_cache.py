@@ -0,0 +1,213 @@
+# 🏷️ Conditional GET für Stadtwache
+# Versions-Tags aus Änderungszählern pro Collection, If-None-Match -> 304 vor der eigentlichen Abfrage,
+# Statistik über eingesparte Bytes
+
+import os
+import time
+import hashlib
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from pymongo import monitoring
+
+from metrics import metrics, route_template
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+# Obergrenze für die Gültigkeit eines Tags - Schreibzugriffe anderer Prozesse sieht der Zähler nicht
+HTTP_CACHE_MAX_AGE_SECONDS = int(os.getenv("HTTP_CACHE_MAX_AGE_SECONDS", "300"))
+HTTP_CACHE_SIZE_ENTRIES = int(os.getenv("HTTP_CACHE_SIZE_ENTRIES", "4096"))
+
+WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify", "drop", "create", "createIndexes"}
+
+HTTP_CONDITIONAL = metrics.counter(
+    "http_conditional_requests_total", "Conditional GETs by route and outcome (hit = 304)", ("route", "outcome"))
+HTTP_BYTES_SAVED = metrics.counter(
+    "http_conditional_bytes_saved_total", "Response bytes not sent thanks to 304 Not Modified", ("route",))
+
+# ================================================
+# ETAGS
+# ================================================
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+# ================================================
+# ÄNDERUNGSZÄHLER
+# ================================================
+
+class ChangeTracker(monitoring.CommandListener):
+    """Counts writes per collection on the shared MongoDB client.
+
+    Counters are bumped after a write command finished (succeeded or
+    failed - an unordered bulk write may have applied a part), so a version
+    read before a query never describes newer data than the query returns.
+    The epoch changes on every start, tags from a previous process never match.
+    """
+
+    def __init__(self):
+        self.epoch = secrets.token_hex(4)
+        self._versions: Dict[str, int] = {}
+        self._generation = 0  # dropDatabase und Reset: alle Collections
+        self._pending: Dict[Tuple[Any, int], str] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, collection: Optional[str] = None):
+        with self._lock:
+            if collection is None:
+                self._generation += 1
+            else:
+                self._versions[collection] = self._versions.get(collection, 0) + 1
+
+    def version(self, *collections: str) -> Tuple[int, ...]:
+        versions = self._versions
+        return (self._generation,) + tuple(versions.get(name, 0) for name in collections)
+
+    # ---------- CommandListener (Motor-Executor-Threads) ----------
+
+    def started(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            target = event.command.get(event.command_name)
+            if isinstance(target, str):
+                # Collection steht nur im Befehl, nicht im Reply
+                self._pending[(event.connection_id, event.request_id)] = target
+
+    def _finished(self, event):
+        if event.command_name == "dropDatabase":
+            self.bump()
+            return
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            self.bump(collection)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+
+change_tracker = ChangeTracker()
+
+# ================================================
+# CONDITIONAL GET
+# ================================================
+
+def conditional_get(*collections: str, per_user: bool = False):
+    """Dependency for list endpoints: 304 when nothing in ``collections`` changed.
+
+    Declare it after ``get_current_user`` so authentication still runs first.
+    The tag covers path, query string, the collections' change counters and
+    - with ``per_user`` - the caller's token, for endpoints whose result
+    depends on who asks (own reports, admin-only lists).
+    """
+    async def dependency(request: Request, response: Response):
+        if not HTTP_CACHE_ENABLED:
+            return
+        parts = [
+            change_tracker.epoch,
+            request.url.path,
+            request.url.query,
+            repr(change_tracker.version(*collections)),
+            str(int(time.time() // HTTP_CACHE_MAX_AGE_SECONDS)),
+        ]
+        if per_user:
+            parts.append(request.headers.get("authorization", ""))
+        etag = 'W/' + make_etag("\x1f".join(parts).encode())
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
+
+# ================================================
+# STATISTIK
+# ================================================
+
+class ConditionalStatsMiddleware:
+    """Pure ASGI middleware counting 304 hits and the body bytes they saved.
+
+    Remembers the body size of every 200 that carried an ETag; a later 304
+    for the same tag counts that size as saved.
+    """
+
+    def __init__(self, app, max_entries: int = HTTP_CACHE_SIZE_ENTRIES):
+        self.app = app
+        self.max_entries = max_entries
+        self.sizes: "OrderedDict[str, int]" = OrderedDict()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        conditional = any(name == b"if-none-match" for name, _ in scope["headers"])
+        state = {"status": 0, "etag": None, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"etag":
+                        state["etag"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        etag = state["etag"]
+        if etag is None:
+            return
+        route = route_template(scope)
+        if state["status"] == 304:
+            HTTP_CONDITIONAL.labels(route, "hit").inc()
+            HTTP_BYTES_SAVED.labels(route).inc(self.sizes.get(etag, 0))
+        elif state["status"] == 200:
+            if conditional:
+                HTTP_CONDITIONAL.labels(route, "miss").inc()
+            self.sizes[etag] = state["size"]
+            self.sizes.move_to_end(etag)
+            if len(self.sizes) > self.max_entries:
+                self.sizes.popitem(last=False)
+
+
+
+def conditional_stats() -> Dict[str, Dict[str, int]]:
+    """{route: {hits, misses, bytes_saved}} for the admin overview"""
+    routes: Dict[str, Dict[str, int]] = {}
+
+    def row(route):
+        return routes.setdefault(route, {"hits": 0, "misses": 0, "bytes_saved": 0})
+
+    for (route, outcome), child in list(HTTP_CONDITIONAL.children.items()):
+        row(route)["hits" if outcome == "hit" else "misses"] = int(child.value)
+    for (route,), child in list(HTTP_BYTES_SAVED.children.items()):
+        row(route)["bytes_saved"] = int(child.value)
+    return routes
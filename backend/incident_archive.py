@@ -0,0 +1,210 @@
+# 🗄️ Einsatz-Archiv für Stadtwache
+# Abgeschlossene Einsätze wandern idempotent in incidents_archive; Archivberichte verweisen nur auf die Bilder
+# statt sie zu kopieren. Blättern und Auswertungen laufen über Indizes auf archived_at.
+
+import os
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+ARCHIVE_COLLECTION = "incidents_archive"
+ARCHIVE_PAGE_LIMIT = int(os.getenv("INCIDENT_ARCHIVE_PAGE_LIMIT", "200"))
+ARCHIVE_MIGRATION_BATCH = int(os.getenv("INCIDENT_ARCHIVE_MIGRATION_BATCH", "50"))
+
+# Große Felder bleiben beim Blättern in der Datenbank
+LIST_PROJECTION = {"_id": 0, "images": 0}
+
+
+def image_refs(incident_id: str, count: int) -> List[str]:
+    """API paths of the archived images of an incident"""
+    return [f"/api/archive/incidents/{incident_id}/images/{index}" for index in range(count)]
+
+
+def _report_content(archived: Dict[str, Any]) -> str:
+    return (f"Vorfall abgeschlossen:\n\nTitel: {archived['title']}\nBeschreibung: {archived['description']}\n"
+            f"Ort: {archived['address']}\nPriorität: {archived['priority']}\n\n"
+            f"Abgeschlossen von: {archived['completed_by_name']}\n"
+            f"Datum: {archived['completed_at'].strftime('%d.%m.%Y %H:%M')}")
+
+# ================================================
+# ARCHIV
+# ================================================
+
+class IncidentArchive:
+    """Moves completed incidents into ``incidents_archive``.
+
+    The move is an idempotent two-phase step instead of a transaction, so it
+    works on standalone servers and the embedded store alike: the archive
+    document is upserted with ``state: "pending"``, the incident is deleted,
+    the archive report is upserted, then the archive document is marked
+    ``archived``. A retried job resumes at whichever step was missing.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def collection(self):
+        return self.db[ARCHIVE_COLLECTION]
+
+    # ---------- Verschieben ----------
+
+    async def archive(self, incident_id: str, report_id: str, completed_by_id: str, completed_by_name: str,
+                      completed_at: datetime) -> Optional[Dict[str, Any]]:
+        """Archive one incident; returns the archive document (without images), None if unknown"""
+        incident = await self.db.incidents.find_one({"id": incident_id}, {"_id": 0})
+        if incident is not None:
+            # Phase 1: Kopie inklusive Bilder anlegen (bei Wiederholung überschreiben)
+            images = incident.get("images") or []
+            created_at = incident.get("created_at")
+            archived = {
+                **incident,
+                "state": "pending",
+                "report_id": report_id,
+                "completed_by_id": completed_by_id,
+                "completed_by_name": completed_by_name,
+                "completed_at": completed_at,
+                "archived_at": completed_at,
+                "archived_day": completed_at.strftime("%Y-%m-%d"),
+                "resolution_seconds": (completed_at - created_at).total_seconds()
+                if isinstance(created_at, datetime) else None,
+                "image_count": len(images),
+            }
+            await self.collection.replace_one({"id": incident_id}, archived, upsert=True)
+            # Phase 2: aktiven Einsatz entfernen
+            await self.db.incidents.delete_one({"id": incident_id})
+
+        archived = await self.collection.find_one({"id": incident_id}, LIST_PROJECTION)
+        if archived is None:
+            return None
+        if archived["state"] != "archived":
+            await self._write_report(archived)
+            await self.collection.update_one({"id": incident_id}, {"$set": {"state": "archived"}})
+            archived["state"] = "archived"
+        return archived
+
+    async def _write_report(self, archived: Dict[str, Any]):
+        report = {
+            "id": archived["report_id"],
+            "title": f"Archiv: {archived['title']}",
+            "content": _report_content(archived),
+            "author_id": archived["completed_by_id"],
+            "author_name": archived["completed_by_name"],
+            "shift_date": archived["completed_at"].strftime('%Y-%m-%d'),
+            "status": "archived",
+            "incident_id": archived["id"],
+            "images": [],
+            "image_refs": image_refs(archived["id"], archived.get("image_count", 0)),
+            "created_at": archived["completed_at"],
+            "updated_at": datetime.utcnow()
+        }
+        try:
+            await self.db.reports.update_one({"id": report["id"]}, {"$setOnInsert": report}, upsert=True)
+        except DuplicateKeyError:
+            pass  # paralleler Versuch hat den Bericht bereits angelegt
+
+    # ---------- Lesen ----------
+
+    async def browse(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     priority: Optional[str] = None, completed_by: Optional[str] = None,
+                     before: Optional[datetime] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Archived incidents, newest first; page with ``before`` = archived_at of the last entry"""
+        query: Dict[str, Any] = {"state": "archived"}
+        if priority:
+            query["priority"] = priority
+        if completed_by:
+            query["completed_by_id"] = completed_by
+        archived_at: Dict[str, Any] = {}
+        if start:
+            archived_at["$gte"] = start
+        if end:
+            archived_at["$lt"] = end
+        if before and (end is None or before < end):
+            archived_at["$lt"] = before
+        if archived_at:
+            query["archived_at"] = archived_at
+        limit = max(1, min(limit, ARCHIVE_PAGE_LIMIT))
+        return await self.collection.find(query, LIST_PROJECTION).sort("archived_at", -1).limit(limit) \
+            .to_list(limit)
+
+    async def get(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": incident_id}, LIST_PROJECTION)
+
+    async def image(self, incident_id: str, index: int) -> Optional[str]:
+        doc = await self.collection.find_one({"id": incident_id}, {"_id": 0, "images": 1})
+        images = (doc or {}).get("images") or []
+        return images[index] if 0 <= index < len(images) else None
+
+    async def stats(self, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Counts and resolution times per priority, officer and day (archived_at range, indexed)"""
+        match = {"$match": {"state": "archived", "archived_at": {"$gte": start, "$lt": end}}}
+
+        async def group(key: str, **extra) -> List[Dict[str, Any]]:
+            return await self.collection.aggregate([
+                match,
+                {"$group": {"_id": f"${key}", "count": {"$sum": 1},
+                            "avg_resolution_seconds": {"$avg": "$resolution_seconds"},
+                            "images": {"$sum": "$image_count"}, **extra}},
+            ]).to_list(None)
+
+        by_priority = await group("priority")
+        by_officer = await group("completed_by_id", name={"$first": "$completed_by_name"})
+        by_day = await group("archived_day")
+        return {
+            "start": start,
+            "end": end,
+            "total": sum(row["count"] for row in by_priority),
+            "by_priority": {row["_id"]: {k: v for k, v in row.items() if k != "_id"} for row in by_priority},
+            "by_officer": sorted(({"user_id": row["_id"], **{k: v for k, v in row.items() if k != "_id"}}
+                                  for row in by_officer), key=lambda row: -row["count"]),
+            "by_day": sorted(({"day": row["_id"], "count": row["count"]} for row in by_day),
+                             key=lambda row: row["day"]),
+        }
+
+    # ---------- Altbestand ----------
+
+    async def migrate_legacy_reports(self, batch: int = ARCHIVE_MIGRATION_BATCH) -> int:
+        """Move images out of archive reports written before the archive existed; returns reports migrated"""
+        migrated = 0
+        while True:
+            # Nur Berichte mit mindestens einem Bild ($ne: [] träfe auch null/fehlend und käme nie zum Ende)
+            reports = await self.db.reports.find(
+                {"status": "archived", "incident_id": {"$ne": None}, "images.0": {"$exists": True}}
+            ).limit(batch).to_list(batch)
+            if not reports:
+                return migrated
+            for report in reports:
+                incident_id = report["incident_id"]
+                images = report["images"]
+                existing = await self.collection.find_one({"id": incident_id}, {"_id": 0, "image_count": 1})
+                if existing is None:
+                    await self.collection.update_one({"id": incident_id}, {"$setOnInsert": {
+                        "id": incident_id,
+                        "title": report["title"].removeprefix("Archiv: "),
+                        "state": "archived",
+                        "legacy": True,
+                        "report_id": report["id"],
+                        "completed_by_id": report.get("author_id"),
+                        "completed_by_name": report.get("author_name"),
+                        "completed_at": report["created_at"],
+                        "archived_at": report["created_at"],
+                        "archived_day": report["created_at"].strftime("%Y-%m-%d"),
+                        "resolution_seconds": None,
+                        "images": images,
+                        "image_count": len(images),
+                    }}, upsert=True)
+                elif not existing.get("image_count"):
+                    await self.collection.update_one(
+                        {"id": incident_id}, {"$set": {"images": images, "image_count": len(images)}})
+                await self.db.reports.update_one({"id": report["id"]}, {"$set": {
+                    "images": [], "image_refs": image_refs(incident_id, len(images))}})
+                migrated += 1
+            logger.info(f"🗄️ Moved images of {migrated} archive reports into {ARCHIVE_COLLECTION}")
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# 🔍 Index-Verwaltung für Stadtwache
+# Deklarative Index-Registry, Abgleich beim Start und explain()-Prüfung der Hot Queries
+#
+#   python indexes.py status   # fehlende / unbenutzte / unbekannte Indizes
+#   python indexes.py sync     # fehlende Indizes anlegen
+#   python indexes.py check    # Exit-Code 1, wenn eine Hot Query einen COLLSCAN braucht
+
+import os
+import sys
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure
+
+from cdc import CDC_COLLECTIONS, CDC_ENABLED
+from jobs import JOBS_COLLECTION, JOBS_KEEP_DAYS
+from incident_archive import ARCHIVE_COLLECTION
+from retention import RETENTION_POLICIES, TTL_GRACE_DAYS
+from timeseries import TIMESERIES_COLLECTIONS, timeseries_enabled
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# REGISTRY
+# ================================================
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    unique: bool = False
+    sparse: bool = False
+    expire_after_seconds: Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        # gleiche Namenskonvention wie pymongo
+        return "_".join(f"{field_name}_{direction}" for field_name, direction in self.keys)
+
+    def options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.sparse:
+            options["sparse"] = True
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        return options
+
+
+def _id(collection: str) -> IndexSpec:
+    # sparse: Alt-Daten aus init_database.py haben teilweise kein "id"-Feld
+    return IndexSpec(collection, (("id", 1),), unique=True, sparse=True)
+
+
+def declared_indexes() -> List[IndexSpec]:
+    """All indexes the server relies on"""
+    specs = [
+        _id("users"),
+        IndexSpec("users", (("email", 1),), unique=True),
+        IndexSpec("users", (("status", 1),)),
+        IndexSpec("users", (("is_active", 1),)),
+
+        _id("incidents"),
+        IndexSpec("incidents", (("created_at", -1),)),
+        IndexSpec("incidents", (("status", 1),)),
+
+        _id("messages"),
+        IndexSpec("messages", (("channel", 1), ("timestamp", 1))),
+        IndexSpec("messages", (("channel", 1), ("recipient_id", 1), ("timestamp", -1))),
+        IndexSpec("messages", (("timestamp", 1),)),
+
+        _id("persons"),
+        IndexSpec("persons", (("is_active", 1), ("status", 1), ("created_at", -1))),
+        IndexSpec("persons", (("is_active", 1), ("created_at", -1))),
+
+        _id("reports"),
+        IndexSpec("reports", (("author_id", 1), ("created_at", -1))),
+        IndexSpec("reports", (("created_at", -1),)),
+
+        IndexSpec("locations", (("timestamp", -1), ("user_id", 1))),
+        IndexSpec("locations", (("user_id", 1), ("timestamp", -1))),
+        IndexSpec("checkins", (("timestamp", -1),)),
+        IndexSpec("checkins", (("user_id", 1), ("timestamp", -1))),
+
+        IndexSpec("emergency_broadcasts", (("timestamp", -1),)),
+        IndexSpec("notifications", (("recipient_id", 1), ("created_at", -1))),
+        _id("vacations"),
+        IndexSpec("vacations", (("user_id", 1), ("created_at", -1))),
+        _id("teams"),
+        _id("districts"),
+        _id("app_config"),
+
+        IndexSpec("track_buckets", (("user_id", 1), ("bucket_start", 1)), unique=True),
+
+        _id(ARCHIVE_COLLECTION),
+        IndexSpec(ARCHIVE_COLLECTION, (("state", 1), ("archived_at", -1))),
+        IndexSpec(ARCHIVE_COLLECTION, (("priority", 1), ("archived_at", -1))),
+        IndexSpec(ARCHIVE_COLLECTION, (("completed_by_id", 1), ("archived_at", -1))),
+
+        _id(JOBS_COLLECTION),
+        IndexSpec(JOBS_COLLECTION, (("status", 1), ("run_at", 1))),
+        IndexSpec(JOBS_COLLECTION, (("unique_key", 1),), unique=True, sparse=True),
+        # Abgeschlossene Jobs (done/failed) verfallen; offene haben kein finished_at
+        IndexSpec(JOBS_COLLECTION, (("finished_at", 1),), expire_after_seconds=JOBS_KEEP_DAYS * 86400),
+    ]
+
+    # Polling-Fallback des Change Feeds liest updated_at aufsteigend ab dem Wasserstand
+    if CDC_ENABLED:
+        specs += [IndexSpec(name, (("updated_at", 1),)) for name in CDC_COLLECTIONS if name != "app_config"]
+
+    # TTL-Indizes aus den Aufbewahrungsregeln (Time-Series nutzen expireAfterSeconds der Collection)
+    for policy in RETENTION_POLICIES.values():
+        if policy.ttl_index and not (timeseries_enabled() and policy.collection in TIMESERIES_COLLECTIONS):
+            specs.append(IndexSpec(
+                policy.collection,
+                ((policy.time_field, 1),),
+                expire_after_seconds=(policy.raw_days + TTL_GRACE_DAYS) * 86400,
+            ))
+    return specs
+
+
+# Häufige Abfragen aus server.py, die ohne COLLSCAN laufen müssen
+HOT_QUERIES = [
+    {"name": "user by id", "collection": "users", "filter": {"id": "x"}},
+    {"name": "user by email", "collection": "users", "filter": {"email": "x@example.com"}},
+    {"name": "incident by id", "collection": "incidents", "filter": {"id": "x"}},
+    {"name": "incident list", "collection": "incidents", "filter": {}, "sort": [("created_at", -1)], "limit": 100},
+    {"name": "channel messages", "collection": "messages", "filter": {"channel": "general"},
+     "sort": [("timestamp", 1)], "limit": 100},
+    {"name": "private messages", "collection": "messages", "filter": {"channel": "private", "recipient_id": "x"},
+     "sort": [("timestamp", -1)], "limit": 50},
+    {"name": "active persons", "collection": "persons", "filter": {"is_active": True},
+     "sort": [("created_at", -1)], "limit": 100},
+    {"name": "persons by status", "collection": "persons", "filter": {"is_active": True, "status": "vermisst"},
+     "sort": [("created_at", -1)], "limit": 100},
+    {"name": "own reports", "collection": "reports", "filter": {"author_id": "x"},
+     "sort": [("created_at", -1)], "limit": 100},
+    {"name": "recent locations", "collection": "locations", "filter": {"timestamp": {"$gte": datetime(2020, 1, 1)}}},
+    {"name": "own checkins", "collection": "checkins", "filter": {"user_id": "x"},
+     "sort": [("timestamp", -1)], "limit": 50},
+    {"name": "incident archive", "collection": "incidents_archive", "filter": {"state": "archived"},
+     "sort": [("archived_at", -1)], "limit": 50},
+    {"name": "incident archive by priority", "collection": "incidents_archive",
+     "filter": {"state": "archived", "priority": "high"}, "sort": [("archived_at", -1)], "limit": 50},
+    {"name": "incident archive stats", "collection": "incidents_archive",
+     "filter": {"state": "archived", "archived_at": {"$gte": datetime(2020, 1, 1), "$lt": datetime(2030, 1, 1)}}},
+]
+
+# ================================================
+# ABGLEICH
+# ================================================
+
+def _direction(value: Any) -> Any:
+    # 1.0 -> 1, Sonderindizes ("text", "2dsphere") bleiben unverändert
+    return int(value) if isinstance(value, (int, float)) else value
+
+
+def _key_tuple(index_info: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    return tuple((name, _direction(direction)) for name, direction in index_info["key"])
+
+
+class IndexManager:
+    """Reconciles the declared indexes with the database and reports drift"""
+
+    def __init__(self, db, specs: Optional[List[IndexSpec]] = None):
+        self.db = db
+        self.specs = specs if specs is not None else declared_indexes()
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    async def _existing(self, collection: str) -> Dict[Tuple[Tuple[str, int], ...], Dict[str, Any]]:
+        try:
+            info = await self.db[collection].index_information()
+        except OperationFailure:
+            return {}
+        return {_key_tuple(details): dict(details, name=name) for name, details in info.items()}
+
+    async def reconcile(self, create: bool = True) -> Dict[str, Any]:
+        """Create missing indexes (in the background on the server) and update TTL values"""
+        started = datetime.utcnow()
+        report: Dict[str, Any] = {"created": [], "updated": [], "missing": [], "failed": [], "conflicts": []}
+        by_collection: Dict[str, List[IndexSpec]] = {}
+        for spec in self.specs:
+            by_collection.setdefault(spec.collection, []).append(spec)
+
+        for collection, specs in by_collection.items():
+            existing = await self._existing(collection)
+            for spec in specs:
+                label = f"{collection}.{spec.name}"
+                current = existing.get(spec.keys)
+                if current is None:
+                    if not create:
+                        report["missing"].append(label)
+                        continue
+                    try:
+                        await self.db[collection].create_index(list(spec.keys), **spec.options())
+                        report["created"].append(label)
+                    except OperationFailure as e:
+                        # z.B. Duplikate bei unique-Indizes
+                        logger.error(f"❌ Creating index {label} failed: {e}")
+                        report["failed"].append({"index": label, "error": str(e)})
+                    continue
+
+                if spec.expire_after_seconds != current.get("expireAfterSeconds") and spec.expire_after_seconds:
+                    try:
+                        await self.db.command({
+                            "collMod": collection,
+                            "index": {"name": current["name"], "expireAfterSeconds": spec.expire_after_seconds},
+                        })
+                        report["updated"].append(label)
+                    except OperationFailure as e:
+                        report["failed"].append({"index": label, "error": str(e)})
+                elif bool(current.get("unique")) != spec.unique:
+                    report["conflicts"].append({
+                        "index": label,
+                        "reason": f"exists as {current['name']} with unique={bool(current.get('unique'))}",
+                    })
+
+        report.update(await self.usage())
+        report["duration_seconds"] = (datetime.utcnow() - started).total_seconds()
+        report["checked_at"] = started
+        self.last_report = report
+        if report["created"] or report["failed"]:
+            logger.info(f"🔍 Indexes created: {len(report['created'])}, failed: {len(report['failed'])}")
+        return report
+
+    async def usage(self) -> Dict[str, Any]:
+        """Undeclared indexes and indexes without accesses since the last server restart ($indexStats)"""
+        declared = {(spec.collection, spec.keys) for spec in self.specs}
+        collections = {spec.collection for spec in self.specs}
+        undeclared = []
+        unused = []
+        for collection in sorted(collections):
+            try:
+                stats = await self.db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+            except (OperationFailure, NotImplementedError):
+                continue  # keine Rechte oder In-Process-Ersatz ohne $indexStats
+            for stat in stats:
+                if stat["name"] == "_id_":
+                    continue
+                keys = tuple((name, _direction(direction)) for name, direction in stat["key"].items())
+                label = f"{collection}.{stat['name']}"
+                if (collection, keys) not in declared:
+                    undeclared.append(label)
+                accesses = stat.get("accesses", {})
+                if accesses.get("ops", 0) == 0:
+                    unused.append({"index": label, "since": accesses.get("since")})
+        return {"undeclared": undeclared, "unused": unused}
+
+    async def run_in_background(self):
+        try:
+            await self.reconcile()
+        except Exception as e:
+            logger.error(f"❌ Index reconciliation failed: {e}")
+
+# ================================================
+# EXPLAIN-PRÜFUNG
+# ================================================
+
+def _find_winning_plan(explanation: Any) -> Optional[Dict[str, Any]]:
+    """Locate queryPlanner.winningPlan (nested in $cursor stages for time-series collections)"""
+    if isinstance(explanation, dict):
+        planner = explanation.get("queryPlanner")
+        if isinstance(planner, dict) and "winningPlan" in planner:
+            return planner["winningPlan"]
+        children = explanation.values()
+    elif isinstance(explanation, list):
+        children = explanation
+    else:
+        return None
+    for child in children:
+        plan = _find_winning_plan(child)
+        if plan is not None:
+            return plan
+    return None
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def explain_stages(db, collection: str, query_filter: Dict[str, Any],
+                         sort: Optional[List[Tuple[str, int]]] = None, limit: int = 0) -> List[str]:
+    """Stages of the winning plan for a find() query"""
+    command: Dict[str, Any] = {"find": collection, "filter": query_filter}
+    if sort:
+        command["sort"] = dict(sort)
+    if limit:
+        command["limit"] = limit
+    explanation = await db.command({"explain": command, "verbosity": "queryPlanner"})
+    return _plan_stages(_find_winning_plan(explanation) or {})
+
+
+async def assert_index_covered(db, collection: str, query_filter: Dict[str, Any],
+                               sort: Optional[List[Tuple[str, int]]] = None, limit: int = 0):
+    """Raise AssertionError if the query needs a collection scan or an in-memory sort"""
+    stages = await explain_stages(db, collection, query_filter, sort, limit)
+    if "COLLSCAN" in stages:
+        raise AssertionError(f"{collection} {query_filter} uses a collection scan: {stages}")
+    if sort and "SORT" in stages:
+        raise AssertionError(f"{collection} {query_filter} sorts in memory: {stages}")
+
+
+async def check_hot_queries(db) -> List[Dict[str, Any]]:
+    """Run explain for all HOT_QUERIES, return the failing ones"""
+    failures = []
+    for query in HOT_QUERIES:
+        try:
+            await assert_index_covered(
+                db, query["collection"], query["filter"], query.get("sort"), query.get("limit", 0)
+            )
+        except AssertionError as e:
+            failures.append({"query": query["name"], "error": str(e)})
+    return failures
+
+
+if __name__ == "__main__":
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def main() -> int:
+        client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017/stadtwache_db"))
+        db = client[os.getenv("DB_NAME", "stadtwache_db")]
+        command = sys.argv[1] if len(sys.argv) > 1 else "status"
+        manager = IndexManager(db)
+        try:
+            if command == "check":
+                await manager.reconcile()
+                failures = await check_hot_queries(db)
+                for failure in failures:
+                    print(f"❌ {failure['query']}: {failure['error']}")
+                if not failures:
+                    print(f"✅ All {len(HOT_QUERIES)} hot queries are index-covered")
+                return 1 if failures else 0
+            report = await manager.reconcile(create=command == "sync")
+            for key in ("created", "updated", "missing", "failed", "conflicts", "undeclared", "unused"):
+                for entry in report[key]:
+                    print(f"{key:>10}: {entry}")
+            return 0
+        finally:
+            client.close()
+
+    sys.exit(asyncio.run(main()))
@@ -6,20 +6,18 @@ Erstellt alle notwendigen Collections und Standard-Benutzer
 
 import asyncio
 import motor.motor_asyncio
-from passlib.context import CryptContext
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from indexes import IndexManager
+from seed import hash_passwords
 
 # Lade Umgebungsvariablen
 load_dotenv()
 
 # MongoDB Verbindung
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-DATABASE_NAME = "stadtwache"
-
-# Password Hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+DATABASE_NAME = os.getenv("DB_NAME", "stadtwache_db")  # gleiche Datenbank wie server.py
 
 async def init_database():
     """Initialisiert die komplette Datenbank"""
@@ -56,12 +54,13 @@ async def init_database():
         print("\n👥 Erstelle Standard-Benutzer...")
         
         users_collection = db.users
+        passwords = await asyncio.to_thread(hash_passwords, ["admin123", "waechter123"])
         
         # Admin-Benutzer
         admin_user = {
             "email": "admin@stadtwache.de",
             "username": "Administrator",
-            "password_hash": pwd_context.hash("admin123"),
+            "password_hash": passwords["admin123"],
             "role": "admin",
             "department": "Leitung",
             "badge_number": "ADM001",
@@ -82,7 +81,7 @@ async def init_database():
         waechter_user = {
             "email": "waechter@stadtwache.de", 
             "username": "Wächter Demo",
-            "password_hash": pwd_context.hash("waechter123"),
+            "password_hash": passwords["waechter123"],
             "role": "wächter",
             "department": "Streifendienst",
             "badge_number": "SW001",
@@ -99,10 +98,8 @@ async def init_database():
         }
         
         # Benutzer einfügen
-        await users_collection.insert_one(admin_user)
+        await users_collection.insert_many([admin_user, waechter_user], ordered=False)
         print("✅ Admin-Benutzer erstellt: admin@stadtwache.de")
-        
-        await users_collection.insert_one(waechter_user)
         print("✅ Wächter-Benutzer erstellt: waechter@stadtwache.de")
         
         # Demo-Vorfälle erstellen
@@ -148,7 +145,7 @@ async def init_database():
             }
         ]
         
-        await incidents_collection.insert_many(demo_incidents)
+        await incidents_collection.insert_many(demo_incidents, ordered=False)
         print(f"✅ {len(demo_incidents)} Demo-Vorfälle erstellt")
         
         # Demo-Nachrichten erstellen
@@ -182,7 +179,7 @@ async def init_database():
             }
         ]
         
-        await messages_collection.insert_many(demo_messages)
+        await messages_collection.insert_many(demo_messages, ordered=False)
         print(f"✅ {len(demo_messages)} Demo-Nachrichten erstellt")
         
         # Team-Daten erstellen
@@ -208,27 +205,16 @@ async def init_database():
             }
         ]
         
-        await teams_collection.insert_many(team_data)
+        await teams_collection.insert_many(team_data, ordered=False)
         print(f"✅ {len(team_data)} Team-Einträge erstellt")
         
         # Indizes erstellen für bessere Performance
         print("\n🔍 Erstelle Datenbank-Indizes...")
         
-        # Benutzer-Indizes
-        await users_collection.create_index("email", unique=True)
-        await users_collection.create_index("badge_number", unique=True)
-        
-        # Vorfälle-Indizes
-        await incidents_collection.create_index("status")
-        await incidents_collection.create_index("priority")
-        await incidents_collection.create_index("created_at")
-        
-        # Nachrichten-Indizes
-        await messages_collection.create_index("channel")
-        await messages_collection.create_index("timestamp")
-        
-        # Team-Indizes
-        await teams_collection.create_index("user_email", unique=True)
+        # Gleiche Index-Registry wie beim Server-Start (indexes.py)
+        report = await IndexManager(db).reconcile()
+        for failure in report["failed"]:
+            print(f"⚠️ Index {failure['index']} übersprungen: {failure['error']}")
         
         print("✅ Alle Indizes erstellt")
         
@@ -246,6 +232,7 @@ async def init_database():
         print("👨‍💼 Admin: admin@stadtwache.de / admin123")
         print("👮‍♂️ Wächter: waechter@stadtwache.de / waechter123")
         print("\n🚀 Backend ist bereit für Anmeldungen!")
+        print("🌱 Testdaten in größerem Umfang: python seed.py --profile staging")
         
     except Exception as e:
         print(f"❌ Fehler bei der Datenbank-Initialisierung: {e}")
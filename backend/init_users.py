@@ -7,12 +7,10 @@ Erstellt Standard-Benutzer für die Stadtwache App
 import asyncio
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
-from passlib.context import CryptContext
 from datetime import datetime
 import uuid
 
-# Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from seed import hash_passwords
 
 # Database connection
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
@@ -21,13 +19,19 @@ DB_NAME = os.getenv("DB_NAME", "stadtwache_db")
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    return pwd_context.hash(password)
-
 async def create_standard_users():
     """Erstelle Standard-Benutzer für die Stadtwache"""
     
+    # Prüfe ob Benutzer bereits existieren
+    existing_users = await db.users.count_documents({})
+    
+    if existing_users > 0:
+        print(f"⚠️  {existing_users} Benutzer bereits vorhanden - überspringe Initialisierung")
+        return
+    
+    # Jedes Passwort nur einmal hashen (bcrypt ist absichtlich langsam)
+    passwords = await asyncio.to_thread(hash_passwords, ["admin2024", "stadtwache2024"])
+    
     users_to_create = [
         {
             "id": str(uuid.uuid4()),
@@ -43,7 +47,7 @@ async def create_standard_users():
             "is_active": True,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
-            "hashed_password": hash_password("admin2024")
+            "hashed_password": passwords["admin2024"]
         },
         {
             "id": str(uuid.uuid4()),
@@ -59,7 +63,7 @@ async def create_standard_users():
             "is_active": True,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
-            "hashed_password": hash_password("stadtwache2024")
+            "hashed_password": passwords["stadtwache2024"]
         },
         {
             "id": str(uuid.uuid4()),
@@ -75,7 +79,7 @@ async def create_standard_users():
             "is_active": True,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
-            "hashed_password": hash_password("stadtwache2024")
+            "hashed_password": passwords["stadtwache2024"]
         },
         {
             "id": str(uuid.uuid4()),
@@ -91,22 +95,15 @@ async def create_standard_users():
             "is_active": True,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
-            "hashed_password": hash_password("stadtwache2024")
+            "hashed_password": passwords["stadtwache2024"]
         }
     ]
     
-    # Prüfe ob Benutzer bereits existieren
-    existing_users = await db.users.count_documents({})
-    
-    if existing_users > 0:
-        print(f"⚠️  {existing_users} Benutzer bereits vorhanden - überspringe Initialisierung")
-        return
-    
     # Erstelle Standard-Benutzer
     print("🏗️  Erstelle Standard-Benutzer für Stadtwache Schwelm...")
     
+    await db.users.insert_many(users_to_create, ordered=False)
     for user in users_to_create:
-        await db.users.insert_one(user)
         print(f"✅ Benutzer erstellt: {user['username']} ({user['email']})")
     
     print(f"\n🎉 Erfolgreich {len(users_to_create)} Benutzer erstellt!")
@@ -166,8 +163,8 @@ async def create_sample_incidents():
     
     print("📝 Erstelle Beispiel-Vorfälle...")
     
+    await db.incidents.insert_many(sample_incidents, ordered=False)
     for incident in sample_incidents:
-        await db.incidents.insert_one(incident)
         print(f"✅ Vorfall erstellt: {incident['title']}")
 
 async def main():
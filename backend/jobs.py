@@ -0,0 +1,308 @@
+# ⚙️ Hintergrund-Jobs für Stadtwache
+# In-Process asyncio Job-Queue: Jobs liegen in MongoDB (überleben Neustarts), werden mit Lease geclaimt,
+# bei Fehlern mit exponentiellem Backoff wiederholt; Laufzeit und Wartezeit pro Job-Typ als Metriken
+
+import os
+import time
+import uuid
+import socket
+import random
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from asyncutil import wait_for_event
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() == "true"
+JOBS_COLLECTION = "jobs"
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "4"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+JOBS_RETRY_BASE_SECONDS = float(os.getenv("JOBS_RETRY_BASE_SECONDS", "5"))
+JOBS_RETRY_MAX_SECONDS = float(os.getenv("JOBS_RETRY_MAX_SECONDS", "900"))
+# Fällige Jobs anderer Instanzen bzw. verzögerte Wiederholungen werden spätestens nach dieser Zeit gesehen
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "2"))
+# Läuft ein Job länger ohne Abschluss (Absturz, Neustart), wird er wieder freigegeben;
+# solange der Handler läuft, verlängert die Instanz den Lease alle JOBS_LEASE_SECONDS / 4
+JOBS_LEASE_SECONDS = int(os.getenv("JOBS_LEASE_SECONDS", "600"))
+JOBS_KEEP_DAYS = int(os.getenv("JOBS_KEEP_DAYS", "7"))
+
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+JOBS_TOTAL = metrics.counter("jobs_total", "Finished job attempts by type and outcome", ("type", "outcome"))
+JOB_DURATION = metrics.histogram("job_duration_seconds", "Handler run time per job type", ("type",),
+                                 buckets=JOB_BUCKETS)
+JOB_WAIT = metrics.histogram("job_wait_seconds", "Delay between a job becoming due and its start", ("type",),
+                             buckets=JOB_BUCKETS)
+JOBS_RUNNING = metrics.gauge("jobs_running", "Jobs currently executed by this process", ("type",))
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class PermanentJobError(Exception):
+    """Raised by handlers for failures a retry cannot fix"""
+
+# ================================================
+# QUEUE
+# ================================================
+
+@dataclass
+class JobType:
+    name: str
+    handler: JobHandler
+    max_attempts: int = JOBS_MAX_ATTEMPTS
+    concurrency: int = JOBS_CONCURRENCY
+    timeout_seconds: float = JOBS_LEASE_SECONDS
+    # Vorrang vor allen anderen Typen und nicht durch JOBS_CONCURRENCY begrenzt (z. B. Notruf-Zustellung)
+    reserved: bool = False
+
+
+class JobQueue:
+    """Persistent job queue worked by this process.
+
+    ``enqueue`` stores a job document and wakes the dispatcher; the
+    dispatcher claims due jobs atomically (status queued -> running with a
+    lease), so several app servers can share one ``jobs`` collection.
+    ``unique_key`` keeps at most one pending job per key. ``running`` is
+    only true while this process dispatches; callers must not rely on
+    queued work being picked up otherwise.
+    """
+
+    def __init__(self, db, concurrency: int = JOBS_CONCURRENCY):
+        self.db = db
+        self.concurrency = concurrency
+        self.types: Dict[str, JobType] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._active: Dict[str, int] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._wake = asyncio.Event()
+        self.running = False
+
+    @property
+    def collection(self):
+        return self.db[JOBS_COLLECTION]
+
+    def job(self, name: str, **options):
+        """Decorator registering a handler ``async def handler(payload) -> Optional[dict]``"""
+        def register(handler: JobHandler) -> JobHandler:
+            self.types[name] = JobType(name, handler, **options)
+            self._active.setdefault(name, 0)
+            return handler
+        return register
+
+    # ---------- Einstellen ----------
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], delay_seconds: float = 0,
+                      unique_key: Optional[str] = None) -> Dict[str, Any]:
+        """Store a job; with ``unique_key`` an already pending job of that key is returned instead"""
+        if job_type not in self.types:
+            raise ValueError(f"Unknown job type {job_type}")
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": self.types[job_type].max_attempts,
+            "run_at": now + timedelta(seconds=delay_seconds),
+            "created_at": now,
+            "updated_at": now,
+        }
+        if unique_key:
+            job["unique_key"] = unique_key
+        try:
+            await self.collection.insert_one(job)
+        except DuplicateKeyError:
+            existing = await self.collection.find_one({"unique_key": unique_key}, {"_id": 0})
+            if existing is not None:
+                return existing
+            raise
+        job.pop("_id", None)
+        self._wake.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": job_id}, {"_id": 0})
+
+    async def retry(self, job_id: str) -> bool:
+        """Requeue a failed job with a fresh attempt budget"""
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"id": job_id, "status": "failed"},
+            {"$set": {"status": "queued", "attempts": 0, "run_at": now, "updated_at": now},
+             "$unset": {"finished_at": ""}})
+        self._wake.set()
+        return result.modified_count > 0
+
+    # ---------- Abarbeiten ----------
+
+    async def release_expired(self) -> int:
+        """Requeue running jobs whose lease expired (crashed or restarted worker)"""
+        now = datetime.utcnow()
+        result = await self.collection.update_many(
+            {"status": "running", "lease_until": {"$lt": now}},
+            {"$set": {"status": "queued", "run_at": now, "updated_at": now}})
+        if result.modified_count:
+            logger.warning(f"⚠️ Requeued {result.modified_count} jobs with expired lease")
+        return result.modified_count
+
+    async def _claim(self, reserved_only: bool = False) -> Optional[Dict[str, Any]]:
+        # Reservierte Typen zuerst, damit sie nie hinter langen Jobs warten
+        for reserved in (True,) if reserved_only else (True, False):
+            free = [name for name, spec in self.types.items()
+                    if self._active[name] < spec.concurrency and (spec.reserved or not reserved)]
+            if not free:
+                continue
+            now = datetime.utcnow()
+            # ohne Projektion: mongomock (Lasttest) liefert mit {"_id": 0} kein Dokument zurück
+            job = await self.collection.find_one_and_update(
+                {"status": "queued", "run_at": {"$lte": now}, "type": {"$in": free}},
+                {"$set": {"status": "running", "started_at": now, "worker": self.worker_id, "updated_at": now,
+                          "lease_until": now + timedelta(seconds=JOBS_LEASE_SECONDS)},
+                 "$inc": {"attempts": 1}},
+                sort=[("run_at", 1)], return_document=ReturnDocument.AFTER)
+            if job is not None:
+                job.pop("_id", None)
+                return job
+        return None
+
+    async def run_forever(self):
+        self.running = True
+        try:
+            await self._dispatch()
+        finally:
+            self.running = False
+            await self.stop()
+
+    async def _dispatch(self):
+        last_release = float("-inf")
+        while True:
+            try:
+                if time.monotonic() - last_release > JOBS_LEASE_SECONDS / 4:
+                    await self.release_expired()
+                    last_release = time.monotonic()
+                self._wake.clear()
+                while True:
+                    job = await self._claim(reserved_only=len(self._tasks) >= self.concurrency)
+                    if job is None:
+                        break
+                    self._active[job["type"]] += 1
+                    JOBS_RUNNING.labels(job["type"]).inc()
+                    self._tasks[job["id"]] = asyncio.create_task(self._execute(job))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Job dispatcher error: {e}")
+            await wait_for_event(self._wake, JOBS_POLL_SECONDS)
+
+    async def stop(self):
+        """Cancel running jobs; they are put back into the queue for the next start"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _renew_lease(self, job: Dict[str, Any]):
+        """Keep the lease of a running job alive, so long handlers (timeout_seconds > lease) are not requeued"""
+        while True:
+            await asyncio.sleep(JOBS_LEASE_SECONDS / 4)
+            try:
+                result = await self.collection.update_one(
+                    {"id": job["id"], "worker": self.worker_id, "status": "running"},
+                    {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=JOBS_LEASE_SECONDS)}})
+                if not result.matched_count:
+                    logger.warning(f"⚠️ Job {job['type']} {job['id']} lost its lease")
+                    return
+            except Exception as e:
+                logger.error(f"❌ Lease renewal for job {job['id']} failed: {e}")
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(JOBS_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOBS_RETRY_MAX_SECONDS)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _finish(self, job: Dict[str, Any], changes: Dict[str, Any], unset_key: bool):
+        update: Dict[str, Any] = {"$set": {**changes, "updated_at": datetime.utcnow()}}
+        update["$unset"] = {"lease_until": "", **({"unique_key": ""} if unset_key else {})}
+        await self.collection.update_one({"id": job["id"], "worker": self.worker_id}, update)
+
+    async def _execute(self, job: Dict[str, Any]):
+        spec = self.types[job["type"]]
+        started_at = job["started_at"]
+        JOB_WAIT.labels(spec.name).observe(max(0.0, (started_at - job["run_at"]).total_seconds()))
+        started = time.perf_counter()
+        lease = asyncio.create_task(self._renew_lease(job))
+        try:
+            if job["attempts"] > job.get("max_attempts", spec.max_attempts):
+                raise PermanentJobError("attempts exhausted (lease expired repeatedly)")
+            result = await asyncio.wait_for(spec.handler(job["payload"]), spec.timeout_seconds)
+        except asyncio.CancelledError:
+            # Shutdown: sofort wieder einreihen statt auf den Lease-Ablauf zu warten
+            await self._finish(job, {"status": "queued", "run_at": datetime.utcnow(),
+                                     "attempts": job["attempts"] - 1}, unset_key=False)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if isinstance(e, PermanentJobError) or job["attempts"] >= job.get("max_attempts", spec.max_attempts):
+                outcome = "failed"
+                logger.error(f"❌ Job {spec.name} {job['id']} failed after {job['attempts']} attempts: {error}")
+                await self._finish(job, {"status": "failed", "last_error": error,
+                                         "finished_at": datetime.utcnow()}, unset_key=True)
+            else:
+                outcome = "retry"
+                delay = self._backoff(job["attempts"])
+                logger.warning(f"⚠️ Job {spec.name} {job['id']} attempt {job['attempts']} failed, "
+                               f"retrying in {delay:.0f}s: {error}")
+                await self._finish(job, {"status": "queued", "last_error": error,
+                                         "run_at": datetime.utcnow() + timedelta(seconds=delay)}, unset_key=False)
+        else:
+            outcome = "done"
+            await self._finish(job, {"status": "done", "result": result, "finished_at": datetime.utcnow()},
+                               unset_key=True)
+        finally:
+            lease.cancel()
+            JOB_DURATION.labels(spec.name).observe(time.perf_counter() - started)
+            self._active[spec.name] -= 1
+            JOBS_RUNNING.labels(spec.name).dec()
+            self._tasks.pop(job["id"], None)
+            self._wake.set()
+        JOBS_TOTAL.labels(spec.name, outcome).inc()
+
+    # ---------- Status ----------
+
+    async def status(self, failed_limit: int = 20) -> Dict[str, Any]:
+        counts: Dict[str, Dict[str, int]] = {name: {} for name in self.types}
+        async for row in self.collection.aggregate([
+            {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}},
+        ]):
+            counts.setdefault(row["_id"]["type"], {})[row["_id"]["status"]] = row["count"]
+        failed = await self.collection.find({"status": "failed"}, {"_id": 0, "payload": 0, "result": 0}) \
+            .sort("finished_at", -1).limit(failed_limit).to_list(failed_limit)
+        latency: Dict[str, Any] = {}
+        for (name,), child in list(JOB_DURATION.children.items()):
+            wait = JOB_WAIT.children.get((name,))
+            latency[name] = {"runs": child.count, "p50_seconds": child.quantile(0.5),
+                             "p95_seconds": child.quantile(0.95),
+                             "wait_p95_seconds": wait.quantile(0.95) if wait is not None else None}
+        return {
+            "enabled": JOBS_ENABLED,
+            "dispatching": self.running,
+            "worker": self.worker_id,
+            "concurrency": self.concurrency,
+            "running": dict(self._active),
+            "jobs": counts,
+            "latency": latency,
+            "recent_failures": failed,
+        }
+
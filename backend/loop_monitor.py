@@ -0,0 +1,151 @@
+# ⏲️ Event-Loop Überwachung für Stadtwache
+# Misst die Planungsverzögerung des asyncio-Loops; im Debug-Modus Stacktraces blockierender Callbacks
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_SAMPLE_INTERVAL_MS = float(os.getenv("LOOP_SAMPLE_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+# Watchdog-Thread mit Stacktraces nur im Debug-Modus (sys._current_frames kostet bei jedem Stall)
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", str(DEBUG)).lower() == "true"
+LOOP_STALL_HISTORY = int(os.getenv("LOOP_STALL_HISTORY", "50"))
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LOOP_LAG = metrics.histogram(
+    "event_loop_lag_seconds", "Delay between scheduled and actual wake-up of the sampling task",
+    buckets=LAG_BUCKETS)
+LOOP_LAG_MAX = metrics.gauge(
+    "event_loop_lag_max_seconds", "Largest event loop lag since startup")
+LOOP_STALLS = metrics.counter(
+    "event_loop_stalls_total", "Callbacks that held the event loop longer than LOOP_BLOCK_THRESHOLD_MS")
+LOOP_TASKS = metrics.gauge(
+    "event_loop_tasks", "Pending asyncio tasks",
+    collect=lambda: [((), len(asyncio.all_tasks(_monitored_loop)))] if _monitored_loop else [])
+
+_monitored_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# ================================================
+# LOOP LAG MONITOR
+# ================================================
+
+class LoopLagMonitor:
+    """Samples scheduling delay with a sleeping task; optional watchdog thread for stack traces.
+
+    The sampling task sleeps for a fixed interval and measures how late it
+    wakes up - everything above zero is time the loop spent on other
+    callbacks. The watchdog watches the heartbeat the task leaves behind: if
+    it stops moving for longer than the threshold, the loop thread is stuck
+    in a single callback and its current stack is captured.
+    """
+
+    def __init__(self, interval_ms: float = LOOP_SAMPLE_INTERVAL_MS,
+                 threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS,
+                 watchdog: bool = LOOP_WATCHDOG_ENABLED,
+                 history: int = LOOP_STALL_HISTORY):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.watchdog = watchdog
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start sampling on the running loop (call from a startup hook)"""
+        global _monitored_loop
+        _monitored_loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._sample())
+        if self.watchdog:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+            logger.info(f"🐕 Event loop watchdog active (threshold {self.threshold * 1000:.0f}ms)")
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _sample(self):
+        interval = self.interval
+        lag_histogram = LOOP_LAG.labels()
+        lag_max = LOOP_LAG_MAX.labels()
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            lag_histogram.observe(lag)
+            if lag > lag_max.value:
+                lag_max.set(lag)
+            if lag >= self.threshold and not self.watchdog:
+                LOOP_STALLS.labels().inc()
+                logger.warning(f"⏲️ Event loop blocked for ~{lag * 1000:.0f}ms (set DEBUG=true for stack traces)")
+
+    # ---------- Watchdog (eigener Thread) ----------
+
+    def _watch(self):
+        reported_heartbeat = None
+        poll = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(poll):
+            heartbeat = self._heartbeat
+            # Erwarteter Herzschlag: Intervall + Schwelle, erst danach gilt der Loop als blockiert
+            stalled_for = time.monotonic() - heartbeat - self.interval
+            if stalled_for < self.threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            self._record_stall(stalled_for, stack)
+
+    def _record_stall(self, stalled_for: float, stack: List[str]):
+        LOOP_STALLS.labels().inc()
+        stall = {
+            "at": datetime.utcnow(),
+            "blocked_ms": round(stalled_for * 1000, 1),
+            "stack": [line.rstrip() for line in stack[-15:]],
+        }
+        self.stalls.append(stall)
+        logger.warning(
+            f"⏲️ Event loop blocked for >{stall['blocked_ms']}ms, loop thread stack:\n" + "".join(stack[-15:])
+        )
+
+    def status(self) -> Dict[str, Any]:
+        histogram = LOOP_LAG.labels()
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "watchdog": self.watchdog,
+            "samples": histogram.count,
+            "mean_lag_ms": round(histogram.sum / histogram.count * 1000, 3) if histogram.count else None,
+            "p99_lag_ms": (histogram.quantile(0.99) or 0) * 1000 if histogram.count else None,
+            "max_lag_ms": round(LOOP_LAG_MAX.labels().value * 1000, 3),
+            "stalls": list(self.stalls)[::-1],
+        }
+
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,362 @@
+# 🔎 Nachrichtensuche für Stadtwache
+# In-Memory Volltext-Index über Chat-Nachrichten (Inhalt, Absender, Kanal)
+
+import re
+import html
+import uuid
+import asyncio
+import heapq
+import logging
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from timeutil import utc_timestamp
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# TOKENIZER
+# ================================================
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+MIN_TOKEN_LENGTH = 2
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    return [t for t in TOKEN_PATTERN.findall(text.casefold()) if len(t) >= MIN_TOKEN_LENGTH]
+
+
+def parse_query(query: str) -> Tuple[List[str], Optional[str]]:
+    """Split a search query into exact terms and an optional trailing prefix term (``abc*``)"""
+    query = (query or "").strip()
+    prefix = None
+    if query.endswith("*"):
+        head, _, last = query[:-1].rpartition(" ")
+        last_tokens = tokenize(last)
+        if last_tokens:
+            prefix = last_tokens[-1]
+            query = f"{head} {' '.join(last_tokens[:-1])}"
+    return sorted(set(tokenize(query))), prefix
+
+
+def highlight(content: str, terms: Iterable[str], prefix: Optional[str] = None,
+              snippet_length: int = 160) -> Dict[str, Any]:
+    """Find match offsets in content and build a short HTML snippet with <mark> tags.
+
+    Offsets refer to the raw content; the snippet is HTML-escaped apart from
+    the <mark> tags, so clients may render it as HTML.
+    """
+    terms = set(terms)
+    spans = []
+    for match in TOKEN_PATTERN.finditer(content or ""):
+        token = match.group(0).casefold()
+        if token in terms or (prefix and token.startswith(prefix)):
+            spans.append({"start": match.start(), "end": match.end()})
+
+    if not spans:
+        return {"highlights": [], "snippet": html.escape((content or "")[:snippet_length])}
+
+    # Snippet rund um den ersten Treffer
+    start = max(0, spans[0]["start"] - snippet_length // 4)
+    end = min(len(content), start + snippet_length)
+    parts = []
+    cursor = start
+    for span in spans:
+        if span["start"] < start or span["end"] > end:
+            continue
+        parts.append(html.escape(content[cursor:span["start"]]))
+        parts.append(f"<mark>{html.escape(content[span['start']:span['end']])}</mark>")
+        cursor = span["end"]
+    parts.append(html.escape(content[cursor:end]))
+    snippet = "".join(parts)
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(content):
+        snippet = snippet + "…"
+    return {"highlights": spans, "snippet": snippet}
+
+
+# ================================================
+# INDEX
+# ================================================
+
+class MessageSearchIndex:
+    """Inverted index over messages.
+
+    Documents get a dense ordinal in ingestion order. Postings are ``array('I')``
+    of ordinals, per-document metadata lives in parallel columns, so a million
+    messages stay in the tens of megabytes. Results are returned newest first
+    (highest ordinal first) and the cursor is the last returned ordinal.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._vocabulary: List[str] = []  # sorted, for prefix queries
+        self._vocabulary_dirty = False
+        self._ids = bytearray()  # 16 bytes per document (uuid)
+        self._foreign_ids: Dict[int, str] = {}  # non-uuid ids
+        self._timestamps = array("d")
+        self._channels = array("I")
+        self._senders = array("I")
+        self._recipients = array("I")  # 0 = keine Privatnachricht
+        self._strings: List[str] = [""]
+        self._string_ids: Dict[str, int] = {"": 0}
+        self._deleted = set()
+        self.ready = False
+        self._pending: List[Dict[str, Any]] = []
+
+    def __len__(self):
+        return len(self._timestamps) - len(self._deleted)
+
+    # ---------- interning ----------
+
+    def _intern(self, value: Optional[str]) -> int:
+        if not value:
+            return 0
+        key = self._string_ids.get(value)
+        if key is None:
+            key = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = key
+        return key
+
+    def _lookup(self, value: Optional[str]) -> Optional[int]:
+        if not value:
+            return 0
+        return self._string_ids.get(value)
+
+    # ---------- ids ----------
+
+    def _encode_id(self, ordinal: int, message_id: str) -> bytes:
+        try:
+            return uuid.UUID(message_id).bytes
+        except (ValueError, AttributeError, TypeError):
+            self._foreign_ids[ordinal] = str(message_id)
+            return bytes(16)
+
+    def message_id(self, ordinal: int) -> str:
+        if ordinal in self._foreign_ids:
+            return self._foreign_ids[ordinal]
+        return str(uuid.UUID(bytes=bytes(self._ids[ordinal * 16:ordinal * 16 + 16])))
+
+    def _find_ordinal(self, message_id: str) -> Optional[int]:
+        for ordinal, foreign in self._foreign_ids.items():
+            if foreign == message_id:
+                return ordinal
+        try:
+            needle = uuid.UUID(message_id).bytes
+        except (ValueError, AttributeError, TypeError):
+            return None
+        position = self._ids.find(needle)
+        while position != -1:
+            if position % 16 == 0:
+                return position // 16
+            position = self._ids.find(needle, position + 1)
+        return None
+
+    # ---------- updates ----------
+
+    def add(self, message: Dict[str, Any]):
+        """Index a single message; queued until the backfill has finished"""
+        if not self.ready:
+            self._pending.append(message)
+            return
+        self._add(message)
+
+    def _add(self, message: Dict[str, Any]):
+        ordinal = len(self._timestamps)
+        timestamp = message.get("timestamp")
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        self._ids += self._encode_id(ordinal, message.get("id"))
+        self._timestamps.append(utc_timestamp(timestamp) if isinstance(timestamp, datetime) else 0.0)
+        self._channels.append(self._intern(message.get("channel") or "general"))
+        self._senders.append(self._intern(message.get("sender_id")))
+        self._recipients.append(self._intern(message.get("recipient_id")))
+
+        tokens = set(tokenize(message.get("content")))
+        tokens.update(tokenize(message.get("sender_name")))
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array("I")
+                self._vocabulary_dirty = True
+            postings.append(ordinal)
+
+    def remove(self, message_id: str) -> bool:
+        """Tombstone a message (e.g. after DELETE /messages/{id})"""
+        if not self.ready:
+            self._pending = [m for m in self._pending if m.get("id") != message_id]
+        ordinal = self._find_ordinal(message_id)
+        if ordinal is None:
+            return False
+        self._deleted.add(ordinal)
+        return True
+
+    def expire_before(self, cutoff: datetime) -> int:
+        """Tombstone all messages older than cutoff (after they were archived)"""
+        cutoff_ts = utc_timestamp(cutoff)
+        expired = 0
+        for ordinal, timestamp in enumerate(self._timestamps):
+            if timestamp < cutoff_ts and ordinal not in self._deleted:
+                self._deleted.add(ordinal)
+                expired += 1
+        return expired
+
+    def load(self, messages: Iterable[Dict[str, Any]]):
+        """Bulk-load messages (sorted by timestamp) and apply queued live messages"""
+        for message in messages:
+            self._add(message)
+        self.finish_loading()
+
+    def finish_loading(self):
+        # Live-Nachrichten, die der Backfill-Cursor ebenfalls geliefert hat, nicht doppelt indizieren
+        for message in self._pending:
+            if self._find_ordinal(message.get("id")) is None:
+                self._add(message)
+        self._pending = []
+        self.ready = True
+
+    # ---------- queries ----------
+
+    def _terms_postings(self, terms: List[str], prefix: Optional[str]) -> Optional[List[List[array]]]:
+        """Postings per query term; a prefix term expands to all matching vocabulary entries"""
+        groups = []
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                return None
+            groups.append([postings])
+        if prefix:
+            if self._vocabulary_dirty:
+                self._vocabulary = sorted(self._postings)
+                self._vocabulary_dirty = False
+            expanded = []
+            position = bisect_left(self._vocabulary, prefix)
+            while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+                expanded.append(self._postings[self._vocabulary[position]])
+                position += 1
+            if not expanded:
+                return None
+            groups.append(expanded)
+        return groups
+
+    def search(
+        self,
+        query: str,
+        viewer_id: Optional[str] = None,
+        channel: Optional[str] = None,
+        sender_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[int] = None,
+        limit: int = 20,
+    ) -> Tuple[List[str], Optional[int]]:
+        """Return (message ids newest first, next cursor)"""
+        terms, prefix = parse_query(query)
+        if not terms and not prefix:
+            return [], None
+        groups = self._terms_postings(terms, prefix)
+        if not groups:
+            return [], None
+
+        channel_key = self._lookup(channel) if channel else None
+        sender_key = self._lookup(sender_id) if sender_id else None
+        if (channel and channel_key is None) or (sender_id and sender_key is None):
+            return [], None
+        viewer_key = self._lookup(viewer_id) if viewer_id else None
+        private_key = self._lookup("private")
+        since_ts = utc_timestamp(since) if since else None
+        until_ts = utc_timestamp(until) if until else None
+
+        # Kürzeste Posting-Liste treibt die Suche, die übrigen werden per Bisection geprüft
+        groups.sort(key=lambda group: sum(len(p) for p in group))
+        driver, others = groups[0], groups[1:]
+
+        hits: List[int] = []
+        for ordinal in _descending(driver, cursor):
+            if ordinal in self._deleted:
+                continue
+            if channel_key is not None and self._channels[ordinal] != channel_key:
+                continue
+            if sender_key is not None and self._senders[ordinal] != sender_key:
+                continue
+            timestamp = self._timestamps[ordinal]
+            if since_ts is not None and timestamp < since_ts:
+                continue
+            if until_ts is not None and timestamp > until_ts:
+                continue
+            # Privatnachrichten nur für Absender und Empfänger sichtbar
+            recipient = self._recipients[ordinal]
+            if recipient or (private_key and self._channels[ordinal] == private_key):
+                if viewer_key is None or viewer_key not in (recipient, self._senders[ordinal]):
+                    continue
+            if not all(any(_contains(p, ordinal) for p in group) for group in others):
+                continue
+            hits.append(ordinal)
+            if len(hits) > limit:
+                break
+
+        next_cursor = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            next_cursor = hits[-1]
+        return [self.message_id(ordinal) for ordinal in hits], next_cursor
+
+
+def _descending(group: List[array], cursor: Optional[int]) -> Iterator[int]:
+    """Iterate the union of sorted postings from the highest ordinal below cursor downwards"""
+    iterators = []
+    for postings in group:
+        upper = bisect_left(postings, cursor) if cursor is not None else len(postings)
+        iterators.append(postings[i] for i in range(upper - 1, -1, -1))
+    if len(iterators) == 1:
+        return iterators[0]
+    return _dedupe(heapq.merge(*iterators, reverse=True))
+
+
+def _dedupe(ordinals: Iterator[int]) -> Iterator[int]:
+    previous = None
+    for ordinal in ordinals:
+        if ordinal != previous:
+            yield ordinal
+            previous = ordinal
+
+
+def _contains(postings: array, ordinal: int) -> bool:
+    position = bisect_left(postings, ordinal)
+    return position < len(postings) and postings[position] == ordinal
+
+
+# ================================================
+# BACKFILL
+# ================================================
+
+SEARCH_PROJECTION = {
+    "_id": 0, "id": 1, "content": 1, "sender_id": 1, "sender_name": 1,
+    "recipient_id": 1, "channel": 1, "timestamp": 1,
+}
+
+
+async def build_index_from_db(index: MessageSearchIndex, db, batch_size: int = 5000):
+    """Load all stored messages into the index (runs as background task on startup)"""
+    started = datetime.utcnow()
+    try:
+        cursor = db.messages.find({}, SEARCH_PROJECTION).sort("timestamp", 1).batch_size(batch_size)
+        loaded = 0
+        async for message in cursor:
+            index._add(message)
+            loaded += 1
+            if loaded % batch_size == 0:
+                await asyncio.sleep(0)  # Event-Loop nicht blockieren
+        index.finish_loading()
+        seconds = (datetime.utcnow() - started).total_seconds()
+        logger.info(f"🔎 Message search index ready: {loaded} messages in {seconds:.1f}s")
+    except Exception as e:
+        logger.error(f"❌ Message search index backfill failed: {e}")
+        index.finish_loading()
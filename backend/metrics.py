@@ -0,0 +1,340 @@
+# 📈 Metriken für Stadtwache
+# Latenz-Histogramme pro Route und Socket.IO-Event, Prometheus-Textformat unter /metrics
+
+import os
+import time
+import asyncio
+import inspect
+import logging
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+# Kommagetrennte IP-Präfixe (z.B. "127.0.0.1,10.0."), leer = alle dürfen scrapen
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv("METRICS_ALLOWED_IPS", "").split(",") if ip.strip()]
+METRICS_PREFIX = "stadtwache"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+# ================================================
+# METRIK-TYPEN
+# ================================================
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts are stored per bucket and summed up on render"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # letzter Eintrag = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket bound containing the q-quantile (for admin overviews)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+_KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricFamily:
+    """One metric name with a fixed set of label names; children are created on first use"""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Iterable[str] = (),
+                 buckets: Optional[Tuple[float, ...]] = None,
+                 collect: Optional[Callable[[], Iterable[Tuple[Tuple[Any, ...], float]]]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets or LATENCY_BUCKETS
+        self.collect = collect  # für Werte, die erst beim Scrape berechnet werden
+        self.children: Dict[Tuple[Any, ...], Any] = {}
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = Histogram(self.buckets) if self.kind == "histogram" else _KINDS[self.kind]()
+            self.children[values] = child
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if self.collect is not None:
+            try:
+                for values, value in self.collect():
+                    lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+            except Exception as e:
+                logger.warning(f"⚠️ Collecting {self.name} failed: {e}")
+            return lines
+        for values, child in list(self.children.items()):
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(child.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self.families: Dict[str, MetricFamily] = {}
+
+    def _family(self, name: str, documentation: str, kind: str, labelnames: Iterable[str],
+                **kwargs) -> MetricFamily:
+        full_name = f"{self.prefix}_{name}"
+        family = self.families.get(full_name)
+        if family is None:
+            family = self.families[full_name] = MetricFamily(full_name, documentation, kind, labelnames, **kwargs)
+        return family
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> MetricFamily:
+        return self._family(name, documentation, "counter", labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              collect: Optional[Callable] = None) -> MetricFamily:
+        return self._family(name, documentation, "gauge", labelnames, collect=collect)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> MetricFamily:
+        return self._family(name, documentation, "histogram", labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in list(self.families.values()):
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+HTTP_DURATION = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+HTTP_RESPONSE_SIZE = metrics.histogram(
+    "http_response_size_bytes", "HTTP response body size by route template", ("method", "route"),
+    buckets=SIZE_BUCKETS)
+HTTP_RESPONSES = metrics.counter(
+    "http_responses_total", "HTTP responses by route template and status code", ("method", "route", "status"))
+HTTP_IN_FLIGHT = metrics.gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled by route template", ("method", "route"))
+SOCKET_DURATION = metrics.histogram(
+    "socketio_event_duration_seconds", "Socket.IO event handler latency", ("event",))
+SOCKET_EVENTS = metrics.counter(
+    "socketio_events_total", "Socket.IO events handled", ("event", "outcome"))
+SOCKET_IN_FLIGHT = metrics.gauge(
+    "socketio_events_in_flight", "Socket.IO event handlers currently running", ("event",))
+
+# ================================================
+# HTTP INSTRUMENTIERUNG
+# ================================================
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """Route template (``/api/incidents/{incident_id}``) instead of the raw path to keep label cardinality bounded"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" in scope:  # Mount (StaticFiles)
+        return f"{scope.get('root_path', '')}/{{path}}"
+    return "unmatched"
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that tracks in-flight requests per route; used as route_class for app and routers"""
+
+    async def handle(self, scope, receive, send):
+        gauge = HTTP_IN_FLIGHT.labels(scope["method"], self.path)
+        gauge.value += 1
+        try:
+            await super().handle(scope, receive, send)
+        finally:
+            gauge.value -= 1
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: latency, status and body size per route template, plus the scrape endpoint.
+
+    No BaseHTTPMiddleware - the per-request cost is a closure, two perf_counter
+    calls and a few dict lookups.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = metrics, path: str = METRICS_PATH,
+                 allowed_ips: Iterable[str] = METRICS_ALLOWED_IPS):
+        self.app = app
+        self.registry = registry
+        self.path = path
+        self.allowed_ips = tuple(allowed_ips)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope["path"] == self.path:
+            await self._serve(scope, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            key = (scope["method"], route_template(scope))
+            HTTP_DURATION.labels(*key).observe(elapsed)
+            HTTP_RESPONSE_SIZE.labels(*key).observe(size)
+            HTTP_RESPONSES.labels(*key, status).value += 1
+
+    async def _serve(self, scope, send):
+        client = (scope.get("client") or ("", 0))[0] or ""
+        if self.allowed_ips and not client.startswith(self.allowed_ips):
+            body, status_code = b"Forbidden", 403
+        else:
+            body, status_code = self.registry.render().encode(), 200
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+# ================================================
+# SOCKET.IO INSTRUMENTIERUNG
+# ================================================
+
+def _positional_limit(handler: Callable) -> Optional[int]:
+    """Number of positional parameters, None if the handler takes *args"""
+    parameters = inspect.signature(handler).parameters.values()
+    if any(p.kind == p.VAR_POSITIONAL for p in parameters):
+        return None
+    return sum(1 for p in parameters if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+
+
+def _instrument_handler(event: str, handler: Callable) -> Callable:
+    duration = SOCKET_DURATION.labels(event)
+    in_flight = SOCKET_IN_FLIGHT.labels(event)
+    succeeded = SOCKET_EVENTS.labels(event, "ok")
+    failed = SOCKET_EVENTS.labels(event, "error")
+    # python-socketio übergibt disconnect zusätzlich den Grund - ältere Handler nehmen nur sid
+    limit = _positional_limit(handler)
+
+    async def instrumented(*args):
+        if limit is not None:
+            args = args[:limit]
+        in_flight.value += 1
+        started = time.perf_counter()
+        try:
+            result = await handler(*args)
+        except Exception:
+            failed.value += 1
+            raise
+        else:
+            succeeded.value += 1
+            return result
+        finally:
+            in_flight.value -= 1
+            duration.observe(time.perf_counter() - started)
+
+    instrumented.__wrapped__ = handler
+    instrumented.__name__ = getattr(handler, "__name__", event)
+    return instrumented
+
+
+def instrument_socketio(sio) -> int:
+    """Wrap all registered async event handlers of a socketio.AsyncServer, returns the number wrapped"""
+    wrapped = 0
+    for handlers in sio.handlers.values():
+        for event, handler in list(handlers.items()):
+            if getattr(handler, "__wrapped__", None) is not None or not asyncio.iscoroutinefunction(handler):
+                continue
+            handlers[event] = _instrument_handler(event, handler)
+            wrapped += 1
+    return wrapped
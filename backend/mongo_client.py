@@ -0,0 +1,310 @@
+# 🔌 MongoDB-Client für Stadtwache
+# Ein zentral konfigurierter AsyncIOMotorClient: Pool-Grenzen, Wire-Kompression, Timeouts,
+# Read Preference und Retryable Writes aus der Umgebung; Pool-Auslastung und Warteschlange als Metriken
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+from metrics import metrics
+
+try:
+    import zstandard  # noqa: F401
+except ImportError:
+    zstandard = None
+try:
+    import snappy  # noqa: F401
+except ImportError:
+    snappy = None
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+MONGO_APP_NAME = os.getenv("MONGO_APP_NAME", "stadtwache")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_CONNECTING = int(os.getenv("MONGO_MAX_CONNECTING", "4"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+# Begrenzte Wartezeit auf eine freie Verbindung: lieber ein schneller 5xx als hängende Requests
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))  # 0 = kein Limit (Retention-Läufe)
+# Bevorzugte Reihenfolge; nur installierte Codecs werden angeboten, der Server wählt den ersten gemeinsamen
+MONGO_COMPRESSORS = [name.strip() for name in os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib").split(",")
+                     if name.strip()]
+MONGO_ZLIB_LEVEL = int(os.getenv("MONGO_ZLIB_LEVEL", "1"))
+MONGO_RETRY_WRITES = os.getenv("MONGO_RETRY_WRITES", "true").lower() == "true"
+MONGO_RETRY_READS = os.getenv("MONGO_RETRY_READS", "true").lower() == "true"
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# Statistik- und Übersichts-Endpunkte vertragen leicht veraltete Daten
+MONGO_READ_MOSTLY_PREFERENCE = os.getenv("MONGO_READ_MOSTLY_PREFERENCE", "primaryPreferred")
+
+WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ================================================
+# POOL-MONITORING
+# ================================================
+
+class _PoolState:
+    __slots__ = ("max_size", "open", "in_use", "waiting", "cleared", "ready")
+
+    def __init__(self, max_size: Optional[int]):
+        self.max_size = max_size
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.cleared = 0
+        self.ready = False
+
+
+def _address(address: Tuple[str, int]) -> str:
+    host, port = address
+    return f"{host}:{port}"
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Connection pool listener: open/in-use connections, wait queue and checkout wait time per server.
+
+    Checkout started and checked out/failed fire on the same Motor executor
+    thread, so the wait time is measured with a thread-local start time.
+    """
+
+    def __init__(self):
+        self.pools: Dict[str, _PoolState] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _pool(self, address: Tuple[str, int]) -> _PoolState:
+        key = _address(address)
+        state = self.pools.get(key)
+        if state is None:
+            state = self.pools[key] = _PoolState(MONGO_MAX_POOL_SIZE or None)
+        return state
+
+    def pool_created(self, event):
+        with self._lock:
+            self.pools[_address(event.address)] = _PoolState(event.options.get("maxPoolSize", MONGO_MAX_POOL_SIZE))
+
+    def pool_ready(self, event):
+        with self._lock:
+            self._pool(event.address).ready = True
+
+    def pool_cleared(self, event):
+        with self._lock:
+            state = self._pool(event.address)
+            state.cleared += 1
+            state.ready = False
+        POOL_CLEARED.labels(_address(event.address)).inc()
+        logger.warning(f"⚠️ MongoDB connection pool for {_address(event.address)} cleared")
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools.pop(_address(event.address), None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            state = self._pool(event.address)
+            state.open = max(0, state.open - 1)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self._pool(event.address).waiting += 1
+
+    def _checkout_done(self, address: Tuple[str, int]) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        state = self._pool(address)
+        state.waiting = max(0, state.waiting - 1)
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            waited = self._checkout_done(event.address)
+        POOL_CHECKOUT_FAILURES.labels(_address(event.address), event.reason).inc()
+        logger.warning(f"⚠️ MongoDB checkout on {_address(event.address)} failed after "
+                       f"{waited * 1000:.0f}ms: {event.reason}")
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            waited = self._checkout_done(event.address)
+            self._pool(event.address).in_use += 1
+        POOL_CHECKOUT_WAIT.labels(_address(event.address)).observe(waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            state = self._pool(event.address)
+            state.in_use = max(0, state.in_use - 1)
+
+    def collect(self, field: str) -> Iterable[Tuple[Tuple[Any, ...], float]]:
+        with self._lock:
+            states = list(self.pools.items())
+        for address, state in states:
+            if field == "utilization":
+                yield (address,), state.in_use / state.max_size if state.max_size else 0.0
+            else:
+                yield (address,), getattr(state, field)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """{address: {...}} for the admin overview"""
+        result = {}
+        with self._lock:
+            states = list(self.pools.items())
+        for address, state in states:
+            wait = POOL_CHECKOUT_WAIT.labels(address)
+            result[address] = {
+                "ready": state.ready,
+                "max_size": state.max_size,
+                "open": state.open,
+                "in_use": state.in_use,
+                "waiting": state.waiting,
+                "utilization": round(state.in_use / state.max_size, 3) if state.max_size else None,
+                "cleared": state.cleared,
+                "checkouts": wait.count,
+                "avg_wait_ms": round(wait.sum / wait.count * 1000, 2) if wait.count else None,
+                "p99_wait_ms": (wait.quantile(0.99) or 0) * 1000 if wait.count else None,
+            }
+        return result
+
+
+class ServerMonitor(monitoring.ServerListener):
+    """Logs server type changes (primary lost, secondary recovered) and keeps the current view"""
+
+    def __init__(self):
+        self.servers: Dict[str, str] = {}
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        address = _address(event.server_address)
+        previous, current = event.previous_description, event.new_description
+        self.servers[address] = current.server_type_name
+        if previous.server_type != current.server_type:
+            log = logger.warning if current.server_type_name == "Unknown" else logger.info
+            log(f"🔄 MongoDB {address}: {previous.server_type_name} → {current.server_type_name}"
+                + (f" ({current.error})" if current.error else ""))
+
+    def closed(self, event):
+        self.servers.pop(_address(event.server_address), None)
+
+
+pool_monitor = PoolMonitor()
+server_monitor = ServerMonitor()
+
+POOL_CONNECTIONS = metrics.gauge(
+    "mongodb_pool_connections", "Open connections in the MongoDB pool by server", ("address",),
+    collect=lambda: pool_monitor.collect("open"))
+POOL_IN_USE = metrics.gauge(
+    "mongodb_pool_connections_in_use", "Checked-out MongoDB connections by server", ("address",),
+    collect=lambda: pool_monitor.collect("in_use"))
+POOL_WAIT_QUEUE = metrics.gauge(
+    "mongodb_pool_wait_queue", "Operations waiting for a MongoDB connection by server", ("address",),
+    collect=lambda: pool_monitor.collect("waiting"))
+POOL_UTILIZATION = metrics.gauge(
+    "mongodb_pool_utilization", "Checked-out connections relative to maxPoolSize by server", ("address",),
+    collect=lambda: pool_monitor.collect("utilization"))
+POOL_CHECKOUT_WAIT = metrics.histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled MongoDB connection", ("address",),
+    buckets=WAIT_BUCKETS)
+POOL_CHECKOUT_FAILURES = metrics.counter(
+    "mongodb_pool_checkout_failures_total", "Failed connection checkouts by server and reason", ("address", "reason"))
+POOL_CLEARED = metrics.counter(
+    "mongodb_pool_cleared_total", "Connection pool clears (network errors, failover) by server", ("address",))
+
+# ================================================
+# CLIENT-FABRIK
+# ================================================
+
+def available_compressors() -> List[str]:
+    installed = {"zstd": zstandard is not None, "snappy": snappy is not None, "zlib": True}
+    return [name for name in MONGO_COMPRESSORS if installed.get(name)]
+
+
+def client_options(url: str) -> Dict[str, Any]:
+    """Client keyword arguments from the environment; options given in the URL take precedence"""
+    options = {
+        "appname": MONGO_APP_NAME,
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxConnecting": MONGO_MAX_CONNECTING,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS or None,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS or None,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+        "retryWrites": MONGO_RETRY_WRITES,
+        "retryReads": MONGO_RETRY_READS,
+        "readPreference": MONGO_READ_PREFERENCE,
+    }
+    compressors = available_compressors()
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = MONGO_ZLIB_LEVEL
+    in_url = {key.lower() for key, _ in parse_qsl(urlsplit(url).query)}
+    return {key: value for key, value in options.items() if key.lower() not in in_url and value is not None}
+
+
+def create_mongo_client(url: str, event_listeners: Iterable[Any] = ()) -> AsyncIOMotorClient:
+    """The shared AsyncIOMotorClient with pool/server monitoring attached"""
+    options = client_options(url)
+    client = AsyncIOMotorClient(url, event_listeners=[*event_listeners, pool_monitor, server_monitor], **options)
+    logger.info(f"🔌 MongoDB client: pool {options.get('minPoolSize', '-')}..{options.get('maxPoolSize', '-')}, "
+                f"compressors={options.get('compressors', 'none')}, readPreference={options.get('readPreference')}, "
+                f"retryWrites={options.get('retryWrites')}")
+    return client
+
+
+def read_mostly(db):
+    """``db`` with MONGO_READ_MOSTLY_PREFERENCE for statistics endpoints.
+
+    Only real Motor databases are rebound - the embedded store and
+    mongomock have a single node anyway.
+    """
+    if type(db) is not AsyncIOMotorDatabase:
+        return db
+    mode = read_pref_mode_from_name(MONGO_READ_MOSTLY_PREFERENCE)
+    return db.with_options(read_preference=make_read_preference(mode, None))
+
+
+def pool_status(client) -> Dict[str, Any]:
+    """Effective pool configuration, pool state and server types for /api/admin/db-pool"""
+    if type(client) is not AsyncIOMotorClient:  # mongomock-motor gibt sich per __class__ als Motor aus
+        return {"config": None, "servers": {}, "pools": {}}
+    options = client.options
+    pool = options.pool_options
+    return {
+        "config": {
+            "max_pool_size": pool.max_pool_size,
+            "min_pool_size": pool.min_pool_size,
+            "max_connecting": pool.max_connecting,
+            "wait_queue_timeout_s": pool.wait_queue_timeout,
+            "server_selection_timeout_s": options.server_selection_timeout,
+            "compressors": available_compressors(),
+            "read_preference": options.read_preference.mongos_mode,
+            "read_mostly_preference": MONGO_READ_MOSTLY_PREFERENCE,
+            "retry_writes": options.retry_writes,
+            "retry_reads": options.retry_reads,
+        },
+        "servers": dict(server_monitor.servers),
+        "pools": pool_monitor.stats(),
+    }
@@ -0,0 +1,176 @@
+# 🟢 Online-Status für Stadtwache
+# Kompakte Presence-Registry: Slot-Records pro Beamten, Index nach user_id und Socket-ID,
+# last_seen als numpy-Spalte für vektorisierte "online seit X"-Abfragen
+
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Union
+
+import numpy as np
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+PRESENCE_OFFLINE_SECONDS = float(os.getenv("PRESENCE_OFFLINE_SECONDS", "120"))
+PRESENCE_INITIAL_CAPACITY = int(os.getenv("PRESENCE_INITIAL_CAPACITY", "1024"))
+
+EPOCH = datetime(1970, 1, 1)
+
+Moment = Union[datetime, float, None]
+
+
+def _seconds(moment: Moment) -> float:
+    """Naive UTC datetime (as stored by the server) or unix seconds -> unix seconds"""
+    if moment is None:
+        return time.time()
+    if isinstance(moment, datetime):
+        return (moment - EPOCH).total_seconds()
+    return float(moment)
+
+
+def _threshold(threshold: Union[timedelta, float, None]) -> float:
+    if threshold is None:
+        return PRESENCE_OFFLINE_SECONDS
+    return threshold.total_seconds() if isinstance(threshold, timedelta) else float(threshold)
+
+# ================================================
+# REGISTRY
+# ================================================
+
+class Presence:
+    """Presence of one officer; last_seen lives in the registry's column at ``slot``"""
+
+    __slots__ = ("user_id", "username", "socket_id", "slot")
+
+    def __init__(self, user_id: str, username: Optional[str], slot: int):
+        self.user_id = user_id
+        self.username = username
+        self.socket_id: Optional[str] = None
+        self.slot = slot
+
+
+class PresenceRegistry:
+    """Online officers with O(1) lookup by user_id and socket id.
+
+    Records are slotted objects; their last-seen timestamps are kept in one
+    float64 array indexed by slot, so threshold queries are a single numpy
+    comparison instead of a loop over per-user dicts. Freed slots are reused,
+    the column doubles when full. Not thread-safe - used from the event loop only.
+    """
+
+    def __init__(self, capacity: int = PRESENCE_INITIAL_CAPACITY):
+        capacity = max(1, capacity)
+        self._by_user: Dict[str, Presence] = {}
+        self._by_socket: Dict[str, str] = {}  # {socket_id: user_id}
+        self._unclaimed: Dict[str, str] = {}  # {user_id: socket_id} - Socket vor dem ersten Heartbeat
+        self._last_seen = np.zeros(capacity, dtype=np.float64)  # 0 = freier Slot
+        self._records: List[Optional[Presence]] = [None] * capacity
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return len(self._by_user)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._by_user
+
+    def __iter__(self) -> Iterator[Presence]:
+        return iter(list(self._by_user.values()))
+
+    def _grow(self):
+        capacity = len(self._records)
+        self._last_seen = np.concatenate([self._last_seen, np.zeros(capacity, dtype=np.float64)])
+        self._records.extend([None] * capacity)
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    # ---------- Schreiben ----------
+
+    def touch(self, user_id: str, username: Optional[str] = None, now: Moment = None) -> bool:
+        """Mark a user as seen; returns True if the user was not tracked before"""
+        record = self._by_user.get(user_id)
+        created = record is None
+        if created:
+            if not self._free:
+                self._grow()
+            record = Presence(user_id, username, self._free.pop())
+            record.socket_id = self._unclaimed.pop(user_id, None)
+            self._records[record.slot] = record
+            self._by_user[user_id] = record
+        elif username is not None:
+            record.username = username
+        self._last_seen[record.slot] = _seconds(now)
+        return created
+
+    def remove(self, user_id: str) -> Optional[Presence]:
+        record = self._by_user.pop(user_id, None)
+        if record is not None:
+            self._last_seen[record.slot] = 0.0
+            self._records[record.slot] = None
+            self._free.append(record.slot)
+            if record.socket_id is not None:
+                self._unclaimed[user_id] = record.socket_id
+        return record
+
+    def attach_socket(self, socket_id: str, user_id: str):
+        self._by_socket[socket_id] = user_id
+        record = self._by_user.get(user_id)
+        if record is not None:
+            record.socket_id = socket_id
+        else:
+            self._unclaimed[user_id] = socket_id
+
+    def detach_socket(self, socket_id: str) -> Optional[str]:
+        """Forget a socket; returns the user it belonged to"""
+        user_id = self._by_socket.pop(socket_id, None)
+        record = self._by_user.get(user_id) if user_id else None
+        if record is not None and record.socket_id == socket_id:
+            record.socket_id = None
+        if user_id and self._unclaimed.get(user_id) == socket_id:
+            del self._unclaimed[user_id]
+        return user_id
+
+    # ---------- Lesen ----------
+
+    def get(self, user_id: str) -> Optional[Presence]:
+        return self._by_user.get(user_id)
+
+    def user_for_socket(self, socket_id: str) -> Optional[str]:
+        return self._by_socket.get(socket_id)
+
+    def last_seen(self, record: Presence) -> datetime:
+        return EPOCH + timedelta(seconds=float(self._last_seen[record.slot]))
+
+    def seconds_since(self, record: Presence, now: Moment = None) -> float:
+        return _seconds(now) - float(self._last_seen[record.slot])
+
+    def online(self, threshold: Union[timedelta, float, None] = None, now: Moment = None) -> List[Presence]:
+        """Users seen within ``threshold`` (default PRESENCE_OFFLINE_SECONDS)"""
+        cutoff = _seconds(now) - _threshold(threshold)
+        column = self._last_seen
+        return [self._records[slot] for slot in np.flatnonzero((column > 0) & (column >= cutoff))]
+
+    def online_ids(self, threshold: Union[timedelta, float, None] = None, now: Moment = None) -> Set[str]:
+        return {record.user_id for record in self.online(threshold, now)}
+
+    def online_last_seen(self, threshold: Union[timedelta, float, None] = None, now: Moment = None,
+                         resolution: float = 1.0) -> Dict[str, float]:
+        """{user_id: last seen in unix seconds} of online users, rounded down to ``resolution`` seconds"""
+        cutoff = _seconds(now) - _threshold(threshold)
+        column = self._last_seen
+        slots = np.flatnonzero((column > 0) & (column >= cutoff))
+        seen = np.floor(column[slots] / resolution) * resolution
+        records = self._records
+        return {records[slot].user_id: value for slot, value in zip(slots.tolist(), seen.tolist())}
+
+    def expired(self, threshold: Union[timedelta, float, None] = None, now: Moment = None) -> List[Presence]:
+        cutoff = _seconds(now) - _threshold(threshold)
+        column = self._last_seen
+        return [self._records[slot] for slot in np.flatnonzero((column > 0) & (column < cutoff))]
+
+    def sweep(self, threshold: Union[timedelta, float, None] = None, now: Moment = None) -> List[str]:
+        """Remove users not seen within ``threshold``; returns their ids"""
+        removed = [record.user_id for record in self.expired(threshold, now)]
+        for user_id in removed:
+            self.remove(user_id)
+        return removed
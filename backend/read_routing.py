@@ -0,0 +1,171 @@
+# 🪞 Read-Replica-Routing für Stadtwache
+# Deklarierte Lese-Endpunkte (Polling: Nachrichten, Einsätze, Personen, Live-Karte) lesen von Secondaries
+# mit begrenzter Staleness; Schreibzugriffe und Read-your-writes bleiben auf dem Primary
+
+import os
+import time
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Depends, Request
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import monitoring
+from pymongo.read_preferences import SecondaryPreferred
+
+from http_cache import WRITE_COMMANDS
+from metrics import metrics, route_template
+from repositories import Repositories, mongo_repositories
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+READ_REPLICAS_ENABLED = os.getenv("READ_REPLICAS_ENABLED", "true").lower() == "true"
+# MongoDB verlangt mindestens 90 s (heartbeatFrequencyMS + idleWritePeriodMS)
+READ_MAX_STALENESS_SECONDS = max(90, int(os.getenv("READ_MAX_STALENESS_SECONDS", "90")))
+# So lange nach eigenem Schreiben bzw. nach Änderung einer ETag-Collection wird vom Primary gelesen:
+# Staleness-Grenze plus ein Heartbeat, danach ist jeder auswählbare Secondary nachgezogen
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", str(READ_MAX_STALENESS_SECONDS + 10)))
+WRITER_PRUNE_INTERVAL_SECONDS = 60
+
+READS_ROUTED = metrics.counter(
+    "mongodb_reads_routed_total", "Reads of declared read-only routes by target and reason",
+    ("route", "target", "reason"))
+
+# Benutzer des laufenden Requests, gesetzt von get_current_user; Motor kopiert den Kontext in seine Threads
+current_user_id: ContextVar[Optional[str]] = ContextVar("current_user_id", default=None)
+
+# ================================================
+# SCHREIB-TRACKING
+# ================================================
+
+class WriteTracker(monitoring.CommandListener):
+    """Remembers when each user and each collection was last written.
+
+    Registered on the shared client next to the change tracker; the writing
+    user comes from ``current_user_id`` of the request that issued the command.
+    """
+
+    def __init__(self, window_seconds: float = READ_YOUR_WRITES_SECONDS):
+        self.window = window_seconds
+        self._users: Dict[str, float] = {}
+        self._collections: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._pruned = time.monotonic()
+
+    def note_user(self, user_id: Optional[str]):
+        if not user_id:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._users[user_id] = now
+            if now - self._pruned > WRITER_PRUNE_INTERVAL_SECONDS:
+                self._users = {user: at for user, at in self._users.items() if now - at < self.window}
+                self._pruned = now
+
+    def wrote_recently(self, user_id: Optional[str]) -> bool:
+        at = self._users.get(user_id) if user_id else None
+        return at is not None and time.monotonic() - at < self.window
+
+    def changed_recently(self, collections: Iterable[str]) -> bool:
+        now = time.monotonic()
+        return any(now - self._collections.get(name, float("-inf")) < self.window for name in collections)
+
+    def writers(self) -> int:
+        now = time.monotonic()
+        return sum(1 for at in list(self._users.values()) if now - at < self.window)
+
+    # ---------- CommandListener (Motor-Executor-Threads) ----------
+
+    def started(self, event):
+        if event.command_name not in WRITE_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        if isinstance(target, str):
+            self._collections[target] = time.monotonic()
+        self.note_user(current_user_id.get())
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+write_tracker = WriteTracker()
+
+# ================================================
+# ROUTING
+# ================================================
+
+def secondary_database(db) -> Optional[AsyncIOMotorDatabase]:
+    """``db`` with secondaryPreferred and bounded staleness, None without a real Motor database"""
+    if not READ_REPLICAS_ENABLED or type(db) is not AsyncIOMotorDatabase:
+        return None  # eingebetteter Speicher / mongomock: nur ein Knoten
+    return db.with_options(read_preference=SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS))
+
+
+class ReadRouter:
+    """Chooses primary or secondary repositories per request of a declared read-only route.
+
+    The primary is used when replicas are off, when the caller wrote within
+    the read-your-writes window, or - for routes answering conditional GETs -
+    when one of their collections changed within it, so no ETag is ever
+    minted for data a secondary has not caught up with yet.
+    """
+
+    def __init__(self, primary: Repositories, db, tracker: WriteTracker = write_tracker):
+        self.primary = primary
+        self.tracker = tracker
+        self.db = db
+
+    @property
+    def db(self):
+        return self._db
+
+    @db.setter
+    def db(self, db):
+        # Lasttest/Benchmarks binden den Server an eine andere Datenbank
+        self._db = db
+        replica_db = secondary_database(db)
+        self.replica = mongo_repositories(replica_db) if replica_db is not None else None
+
+    def repositories(self, user_id: Optional[str], conditional: Tuple[str, ...] = (),
+                     route: str = "-") -> Repositories:
+        if self.replica is None:
+            target, reason = self.primary, "single_node"
+        elif self.tracker.wrote_recently(user_id):
+            target, reason = self.primary, "own_write"
+        elif conditional and self.tracker.changed_recently(conditional):
+            target, reason = self.primary, "recent_change"
+        else:
+            target, reason = self.replica, "replica"
+        READS_ROUTED.labels(route, "secondary" if target is self.replica else "primary", reason).inc()
+        return target
+
+    def replica_reads(self, user_dependency: Callable[..., Any], conditional: Tuple[str, ...] = ()):
+        """Dependency declaring a handler read-only: yields the repositories to read from.
+
+        ``conditional`` lists the collections behind the route's ETag.
+        """
+        async def dependency(request: Request, user=Depends(user_dependency)) -> Repositories:
+            return self.repositories(getattr(user, "id", None), conditional, route_template(request.scope))
+
+        return dependency
+
+    def status(self) -> Dict[str, Any]:
+        routed: Dict[str, Dict[str, int]] = {}
+        for (route, target, reason), child in list(READS_ROUTED.children.items()):
+            routed.setdefault(route, {})[f"{target}:{reason}"] = int(child.value)
+        return {
+            "enabled": self.replica is not None,
+            "read_preference": "secondaryPreferred" if self.replica is not None else "primary",
+            "max_staleness_seconds": READ_MAX_STALENESS_SECONDS,
+            "read_your_writes_seconds": self.tracker.window,
+            "recent_writers": self.tracker.writers(),
+            "routes": routed,
+        }
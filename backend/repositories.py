@@ -0,0 +1,404 @@
+# 🗃️ Repository-Schicht für Stadtwache
+# Einheitlicher Zugriff auf users, incidents, messages, persons, reports, locations und checkins
+# mit MongoDB- (Motor) und SQL-Implementierung (SQLAlchemy, Engines aus database_config.py)
+#
+# Filter nutzen die MongoDB-Schreibweise, beschränkt auf indizierte Spalten:
+#   {"channel": "general"}, {"id": {"$in": [...]}}, {"is_read": {"$ne": True}}, {"timestamp": {"$gte": t}}
+
+import base64
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import sqlalchemy as sa
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from indexes import declared_indexes
+from timeutil import naive_utc
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# ENTITÄTEN
+# ================================================
+
+Where = Optional[Dict[str, Any]]
+Sort = Sequence[Tuple[str, int]]
+
+
+@dataclass(frozen=True)
+class EntitySpec:
+    name: str
+    # Spalten, nach denen gefiltert und sortiert werden darf (in SQL eigene, indizierte Spalten)
+    columns: Tuple[Tuple[str, type], ...]
+    keyed: bool = True  # Dokumente haben ein "id"-Feld
+    time_field: Optional[str] = None
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return (("id",) if self.keyed else ()) + tuple(name for name, _ in self.columns)
+
+
+ENTITIES = {
+    spec.name: spec for spec in (
+        EntitySpec("users", (("email", str), ("username", str), ("role", str), ("status", str),
+                             ("is_active", bool), ("created_at", datetime))),
+        EntitySpec("incidents", (("status", str), ("priority", str), ("reported_by", str),
+                                 ("assigned_to", str), ("created_at", datetime)), time_field="created_at"),
+        EntitySpec("messages", (("channel", str), ("sender_id", str), ("recipient_id", str), ("is_read", bool),
+                                ("timestamp", datetime)), time_field="timestamp"),
+        EntitySpec("persons", (("status", str), ("is_active", bool), ("created_at", datetime)),
+                   time_field="created_at"),
+        EntitySpec("reports", (("author_id", str), ("status", str), ("created_at", datetime)),
+                   time_field="created_at"),
+        EntitySpec("locations", (("user_id", str), ("timestamp", datetime)), keyed=False, time_field="timestamp"),
+        EntitySpec("checkins", (("user_id", str), ("timestamp", datetime)), time_field="timestamp"),
+    )
+}
+
+
+def _check_fields(spec: EntitySpec, names: Iterable[str]):
+    unknown = [name for name in names if name not in spec.fields]
+    if unknown:
+        raise ValueError(f"{spec.name}: {', '.join(unknown)} not indexed - add it to ENTITIES first")
+
+
+def _select_fields(doc: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return doc
+    return {name: doc[name] for name in fields if name in doc}
+
+# ================================================
+# MONGODB
+# ================================================
+
+class MongoRepository:
+    """Repository over a Motor collection; filters are passed through unchanged"""
+
+    def __init__(self, db, spec: EntitySpec):
+        self.db = db
+        self.spec = spec
+
+    @property
+    def collection(self):
+        return self.db[self.spec.name]
+
+    @staticmethod
+    def _projection(fields: Optional[Sequence[str]]) -> Dict[str, int]:
+        return {"_id": 0, **{name: 1 for name in fields or ()}}
+
+    async def get(self, doc_id: str, fields: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": doc_id}, self._projection(fields))
+
+    async def find_one(self, where: Where = None, fields: Optional[Sequence[str]] = None):
+        _check_fields(self.spec, where or {})
+        return await self.collection.find_one(where or {}, self._projection(fields))
+
+    async def find(self, where: Where = None, sort: Sort = (), limit: int = 0,
+                   fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        _check_fields(self.spec, [*(where or {}), *(name for name, _ in sort)])
+        cursor = self.collection.find(where or {}, self._projection(fields))
+        if sort:
+            cursor = cursor.sort(list(sort))
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(limit or None)
+
+    async def count(self, where: Where = None) -> int:
+        _check_fields(self.spec, where or {})
+        return await self.collection.count_documents(where or {})
+
+    async def insert(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        await self.collection.insert_one(dict(doc))  # insert_one würde _id in das Original schreiben
+        return doc
+
+    async def insert_many(self, docs: Sequence[Dict[str, Any]]):
+        if docs:
+            await self.collection.insert_many([dict(doc) for doc in docs], ordered=False)
+
+    async def update(self, doc_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """$set ``changes``, return the updated document (None if missing)"""
+        return await self.collection.find_one_and_update(
+            {"id": doc_id}, {"$set": changes}, projection={"_id": 0}, return_document=ReturnDocument.AFTER)
+
+    async def delete(self, doc_id: str) -> bool:
+        result = await self.collection.delete_one({"id": doc_id})
+        return result.deleted_count > 0
+
+    async def latest_per(self, group_field: str, since: datetime,
+                         fields: Sequence[str]) -> List[Dict[str, Any]]:
+        """Newest document per ``group_field`` since ``since`` (live map)"""
+        time_field = self.spec.time_field
+        # Sort auf (group, time) + $first nutzt den Index bzw. die Time-Series "last point"-Optimierung
+        pipeline = [
+            {"$match": {time_field: {"$gte": since}}},
+            {"$sort": {group_field: 1, time_field: -1}},
+            {"$group": {"_id": f"${group_field}", **{name: {"$first": f"${name}"} for name in fields}}},
+        ]
+        groups = await self.collection.aggregate(pipeline).to_list(None)
+        return [{group_field: group.pop("_id"), **group} for group in groups]
+
+# ================================================
+# SQL
+# ================================================
+
+# Datumswerte mit fester Breite: Textvergleich in SQL entspricht der zeitlichen Reihenfolge
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": naive_utc(value).strftime(DATE_FORMAT)}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, bytes):  # auch bson.Binary (Track-Buckets)
+        return {"$binary": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode_object(obj: Dict[str, Any]):
+    if len(obj) == 1:
+        if "$date" in obj:
+            return datetime.fromisoformat(obj["$date"])
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+        if "$binary" in obj:
+            return base64.b64decode(obj["$binary"])
+    return obj
+
+
+def encode_value(value: Any) -> str:
+    """Canonical JSON text of a single value (``_id`` column, datetime operands)"""
+    return json.dumps(value, default=_encode_value, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_value(text: str) -> Any:
+    return json.loads(text, object_hook=_decode_object)
+
+
+def encode_document(doc: Dict[str, Any]) -> str:
+    return json.dumps({key: value for key, value in doc.items() if key != "_id"},
+                      default=_encode_value, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_document(text: str) -> Dict[str, Any]:
+    return json.loads(text, object_hook=_decode_object)
+
+
+def _column_value(value: Any) -> Any:
+    return naive_utc(value) if isinstance(value, datetime) else value
+
+
+def entity_row(spec: EntitySpec, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Table row for a document: _id, indexed columns and the full document"""
+    row = {name: _column_value(doc.get(name)) for name, _ in spec.columns}
+    if spec.keyed:
+        row["id"] = doc.get("id")
+    row["_id"] = encode_value(doc.get("_id") or ObjectId())
+    row["doc"] = encode_document(doc)
+    return row
+
+
+_COLUMN_TYPES = {str: lambda: sa.String(255), bool: sa.Boolean, datetime: sa.DateTime, int: sa.Integer}
+
+
+def build_metadata(metadata: Optional[sa.MetaData] = None) -> sa.MetaData:
+    """Tables for all ENTITIES: indexed columns plus the full document as JSON text.
+
+    Every table has an integer ``pk`` (row order, FTS rowid) and the encoded
+    MongoDB ``_id``, so the embedded store (sqlite_store.py) shares the layout.
+    Indexes mirror the MongoDB registry in indexes.py (unique email, compound
+    (channel, timestamp), ...), so both backends serve the same hot queries
+    from an index.
+    """
+    metadata = metadata or sa.MetaData()
+    mongo_indexes = declared_indexes()
+    for spec in ENTITIES.values():
+        columns = [sa.Column("pk", sa.Integer, primary_key=True, autoincrement=True),
+                   sa.Column("_id", sa.String(64), nullable=False, unique=True)]
+        if spec.keyed:
+            columns.append(sa.Column("id", sa.String(36), nullable=True, unique=True))
+        columns += [sa.Column(name, _COLUMN_TYPES[kind](), nullable=True) for name, kind in spec.columns]
+        columns.append(sa.Column("doc", sa.Text, nullable=False))
+        table = sa.Table(spec.name, metadata, *columns, sqlite_autoincrement=True)
+        for index in mongo_indexes:
+            names = [name for name, _ in index.keys]
+            if (index.collection != spec.name or index.expire_after_seconds is not None or names == ["id"]
+                    or any(name not in table.c for name in names)):
+                continue
+            expressions = [table.c[name].desc() if direction == -1 else table.c[name]
+                           for name, direction in index.keys]
+            sa.Index(f"ix_{spec.name}_{index.name}", *expressions, unique=index.unique)
+    return metadata
+
+
+async def create_sql_schema(engine, metadata: sa.MetaData):
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+
+
+class SqlRepository:
+    """Repository over one SQLAlchemy table (async engine); same API as MongoRepository.
+
+    ``write_engine`` takes the writes when reads and writes use separate pools
+    (SQLite: one writer), ``on_write`` is called with the table name after
+    every committed write (HTTP cache versions).
+    """
+
+    def __init__(self, engine, table: sa.Table, spec: EntitySpec, write_engine=None,
+                 on_write: Optional[Callable[[str], None]] = None):
+        self.engine = engine
+        self.write_engine = write_engine or engine
+        self.table = table
+        self.spec = spec
+        self.on_write = on_write
+
+    # ---------- Übersetzung ----------
+
+    def _row(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return entity_row(self.spec, doc)
+
+    def _written(self):
+        if self.on_write is not None:
+            self.on_write(self.spec.name)
+
+    def _condition(self, where: Where):
+        _check_fields(self.spec, where or {})
+        conditions = []
+        for name, value in (where or {}).items():
+            column = self.table.c[name]
+            if not isinstance(value, dict):
+                conditions.append(column.is_(None) if value is None else column == value)
+                continue
+            for operator, operand in value.items():
+                if operator == "$in":
+                    conditions.append(column.in_(list(operand)))
+                elif operator == "$nin":
+                    conditions.append(sa.or_(column.not_in(list(operand)), column.is_(None)))
+                elif operator == "$ne":
+                    # wie MongoDB: fehlende Werte sind "ungleich"
+                    conditions.append(column.is_not(None) if operand is None
+                                      else sa.or_(column != operand, column.is_(None)))
+                elif operator == "$gt":
+                    conditions.append(column > operand)
+                elif operator == "$gte":
+                    conditions.append(column >= operand)
+                elif operator == "$lt":
+                    conditions.append(column < operand)
+                elif operator == "$lte":
+                    conditions.append(column <= operand)
+                else:
+                    raise ValueError(f"Unsupported operator {operator}")
+        return sa.and_(sa.true(), *conditions)
+
+    def _order(self, sort: Sort):
+        _check_fields(self.spec, [name for name, _ in sort])
+        return [self.table.c[name].desc() if direction == -1 else self.table.c[name].asc()
+                for name, direction in sort]
+
+    # ---------- Lesen ----------
+
+    async def get(self, doc_id: str, fields: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        return await self.find_one({"id": doc_id}, fields)
+
+    async def find_one(self, where: Where = None, fields: Optional[Sequence[str]] = None):
+        docs = await self.find(where, limit=1, fields=fields)
+        return docs[0] if docs else None
+
+    async def find(self, where: Where = None, sort: Sort = (), limit: int = 0,
+                   fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        query = sa.select(self.table.c.doc).where(self._condition(where)).order_by(*self._order(sort))
+        if limit:
+            query = query.limit(limit)
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(query)).scalars().all()
+        return [_select_fields(decode_document(text), fields) for text in rows]
+
+    async def count(self, where: Where = None) -> int:
+        query = sa.select(sa.func.count()).select_from(self.table).where(self._condition(where))
+        async with self.engine.connect() as conn:
+            return (await conn.execute(query)).scalar_one()
+
+    async def latest_per(self, group_field: str, since: datetime,
+                         fields: Sequence[str]) -> List[Dict[str, Any]]:
+        time_column = self.table.c[self.spec.time_field]
+        ranked = sa.select(
+            self.table.c.doc,
+            sa.func.row_number().over(partition_by=self.table.c[group_field],
+                                      order_by=time_column.desc()).label("position"),
+        ).where(time_column >= since).subquery()
+        query = sa.select(ranked.c.doc).where(ranked.c.position == 1)
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(query)).scalars().all()
+        return [_select_fields(decode_document(text), (group_field, *fields)) for text in rows]
+
+    # ---------- Schreiben ----------
+
+    async def insert(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        async with self.write_engine.begin() as conn:
+            await conn.execute(self.table.insert(), self._row(doc))
+        self._written()
+        return doc
+
+    async def insert_many(self, docs: Sequence[Dict[str, Any]]):
+        if docs:
+            async with self.write_engine.begin() as conn:
+                await conn.execute(self.table.insert(), [self._row(doc) for doc in docs])
+            self._written()
+
+    async def update(self, doc_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        async with self.write_engine.begin() as conn:
+            row = (await conn.execute(
+                sa.select(self.table.c._id, self.table.c.doc).where(self.table.c.id == doc_id).with_for_update()
+            )).one_or_none()
+            if row is None:
+                return None
+            doc = {**decode_document(row.doc), **changes}
+            values = self._row({**doc, "_id": decode_value(row._id)})
+            await conn.execute(self.table.update().where(self.table.c.id == doc_id).values(**values))
+        self._written()
+        return doc
+
+    async def delete(self, doc_id: str) -> bool:
+        async with self.write_engine.begin() as conn:
+            result = await conn.execute(self.table.delete().where(self.table.c.id == doc_id))
+        self._written()
+        return result.rowcount > 0
+
+# ================================================
+# FACTORY
+# ================================================
+
+class Repositories:
+    """One repository per entity (repos.users, repos.messages, ...)"""
+
+    def __init__(self, repositories: Dict[str, Any], backend: str):
+        self.backend = backend
+        self._repositories = repositories
+        for name, repository in repositories.items():
+            setattr(self, name, repository)
+
+    @property
+    def db(self):
+        return getattr(next(iter(self._repositories.values())), "db", None)
+
+    @db.setter
+    def db(self, db):
+        # Tests und Lasttest binden den Server an eine andere MongoDB
+        for repository in self._repositories.values():
+            if isinstance(repository, MongoRepository):
+                repository.db = db
+
+
+def mongo_repositories(db) -> Repositories:
+    return Repositories({name: MongoRepository(db, spec) for name, spec in ENTITIES.items()}, "mongo")
+
+
+def sql_repositories(engine, metadata: Optional[sa.MetaData] = None, write_engine=None,
+                     on_write: Optional[Callable[[str], None]] = None) -> Repositories:
+    metadata = metadata or build_metadata()
+    return Repositories({name: SqlRepository(engine, metadata.tables[name], spec, write_engine, on_write)
+                         for name, spec in ENTITIES.items()}, engine.dialect.name)
@@ -0,0 +1,285 @@
+# 🗃️ Datenaufbewahrung & Archivierung für Stadtwache
+# TTL für Roh-Standorte, Roll-up alter Daten in komprimierte Parquet-Archive
+
+import os
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+from pymongo.errors import OperationFailure
+
+from timeutil import naive_utc
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", Path(__file__).parent / "archive"))
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "6"))
+# TTL läuft erst nach Ablauf der Frist + Puffer, damit der Archivierer zuerst greift
+TTL_GRACE_DAYS = int(os.getenv("RETENTION_TTL_GRACE_DAYS", "2"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100000"))
+PARQUET_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+
+
+@dataclass
+class RetentionPolicy:
+    collection: str
+    raw_days: int
+    time_field: str = "timestamp"
+    ttl_index: bool = False
+    drop_fields: List[str] = field(default_factory=lambda: ["_id"])
+
+
+RETENTION_POLICIES = {
+    "locations": RetentionPolicy("locations", int(os.getenv("LOCATIONS_RETENTION_DAYS", "30")), ttl_index=True),
+    "messages": RetentionPolicy("messages", int(os.getenv("MESSAGES_RETENTION_DAYS", "180"))),
+    "checkins": RetentionPolicy("checkins", int(os.getenv("CHECKINS_RETENTION_DAYS", "180"))),
+    "emergency_broadcasts": RetentionPolicy(
+        "emergency_broadcasts", int(os.getenv("EMERGENCY_BROADCASTS_RETENTION_DAYS", "365"))
+    ),
+}
+
+# ================================================
+# PARQUET HILFSFUNKTIONEN
+# ================================================
+
+def _plain(value: Any) -> Any:
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    return str(value)
+
+
+def _to_frame(documents: List[Dict[str, Any]], policy: RetentionPolicy) -> pd.DataFrame:
+    """Flatten documents into columns (``location.lat`` etc.)"""
+    rows = [{k: v for k, v in doc.items() if k not in policy.drop_fields} for doc in documents]
+    frame = pd.json_normalize(rows, sep=".")
+    # Gemischte Objekt-Spalten als String speichern, damit Parquet ein festes Schema bekommt
+    for column in frame.columns:
+        if frame[column].dtype == object and column != policy.time_field:
+            frame[column] = frame[column].map(_plain)
+    return frame
+
+
+def _unflatten(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn ``{"location.lat": 1}`` back into ``{"location": {"lat": 1}}``"""
+    result: Dict[str, Any] = {}
+    for key, value in record.items():
+        if value is not None and value != value:  # NaN
+            value = None
+        parts = key.split(".")
+        target = result
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return result
+
+
+def _write_partition(frame: pd.DataFrame, directory: Path, part_key: str) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / f"part-{part_key}.parquet"
+    temporary = directory / f".part-{part_key}.parquet.tmp"
+    frame.to_parquet(temporary, engine="pyarrow", compression=PARQUET_COMPRESSION, index=False)
+    os.replace(temporary, target)  # atomar - halbe Dateien werden nie gelesen
+    return target
+
+
+# ================================================
+# RETENTION MANAGER
+# ================================================
+
+class RetentionManager:
+    """Rolls expired documents into day-partitioned Parquet files and reads them back"""
+
+    def __init__(self, db, archive_dir: Path = ARCHIVE_DIR,
+                 policies: Dict[str, RetentionPolicy] = None,
+                 on_archived: Optional[Callable[[str, datetime], None]] = None,
+                 timeseries: Iterable[str] = ()):
+        self.db = db
+        self.archive_dir = Path(archive_dir)
+        self.policies = policies or RETENTION_POLICIES
+        self.on_archived = on_archived
+        # Time-Series Collections laufen über expireAfterSeconds statt TTL-Index + delete
+        self.timeseries = set(timeseries)
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+
+    # ---------- TTL ----------
+
+    async def ensure_collection_expiry(self):
+        """Set expireAfterSeconds on time-series collections.
+
+        Regular collections use the TTL indexes declared in indexes.py.
+        """
+        for policy in self.policies.values():
+            if policy.collection not in self.timeseries:
+                continue
+            expire_seconds = (policy.raw_days + TTL_GRACE_DAYS) * 86400
+            try:
+                await self.db.command({"collMod": policy.collection, "expireAfterSeconds": expire_seconds})
+                logger.info(f"⏳ Time-series expiry on {policy.collection}: {expire_seconds // 86400} days")
+            except OperationFailure as e:
+                logger.warning(f"⚠️ Could not set expiry on {policy.collection}: {e}")
+
+    # ---------- Archivierung ----------
+
+    def cutoff(self, policy: RetentionPolicy, now: Optional[datetime] = None) -> datetime:
+        now = now or datetime.utcnow()
+        return (now - timedelta(days=policy.raw_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    async def _write_batch(self, policy: RetentionPolicy, batch: List[Dict[str, Any]]) -> int:
+        """Write one batch as Parquet, partitioned by day so queries can skip whole files"""
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in batch:
+            timestamp = doc.get(policy.time_field)
+            day = timestamp.strftime("%Y-%m-%d") if isinstance(timestamp, datetime) else "unknown"
+            by_day.setdefault(day, []).append(doc)
+
+        for day, documents in by_day.items():
+            # Deterministischer Dateiname: Wiederholung nach Absturz überschreibt statt zu duplizieren
+            digest = hashlib.sha1(
+                f"{documents[0]['_id']}-{documents[-1]['_id']}-{len(documents)}".encode()
+            ).hexdigest()[:16]
+            frame = _to_frame(documents, policy)
+            await asyncio.to_thread(
+                _write_partition, frame, self.archive_dir / policy.collection / day, digest
+            )
+        return len(by_day)
+
+    async def archive_collection(self, policy: RetentionPolicy, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Move all documents older than the policy cutoff into the archive"""
+        collection = self.db[policy.collection]
+        cutoff = self.cutoff(policy, now)
+        if policy.collection in self.timeseries:
+            return await self._archive_timeseries(policy, cutoff)
+
+        archived = 0
+        files = 0
+        while True:
+            batch = await collection.find(
+                {policy.time_field: {"$lt": cutoff}}
+            ).sort("_id", 1).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+            if not batch:
+                break
+            files += await self._write_batch(policy, batch)
+            await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+            archived += len(batch)
+
+        if archived and self.on_archived:
+            self.on_archived(policy.collection, cutoff)
+        return {"collection": policy.collection, "cutoff": cutoff, "archived": archived, "files": files}
+
+    async def _archive_timeseries(self, policy: RetentionPolicy, cutoff: datetime) -> Dict[str, Any]:
+        """Copy whole days up to cutoff; deletion is left to the collection's expireAfterSeconds"""
+        collection = self.db[policy.collection]
+        state_id = f"archive_{policy.collection}"
+        state = await self.db.retention_state.find_one({"_id": state_id})
+        day = state["archived_until"] if state else None
+        if day is None:
+            oldest = await collection.find({}, {policy.time_field: 1}).sort(policy.time_field, 1).limit(1).to_list(1)
+            if not oldest:
+                return {"collection": policy.collection, "cutoff": cutoff, "archived": 0, "files": 0}
+            day = oldest[0][policy.time_field].replace(hour=0, minute=0, second=0, microsecond=0)
+
+        archived = 0
+        files = 0
+        while day < cutoff:
+            next_day = day + timedelta(days=1)
+            last_id = None
+            while True:
+                query: Dict[str, Any] = {policy.time_field: {"$gte": day, "$lt": next_day}}
+                if last_id is not None:
+                    query["_id"] = {"$gt": last_id}
+                batch = await collection.find(query).sort("_id", 1).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+                if not batch:
+                    break
+                files += await self._write_batch(policy, batch)
+                archived += len(batch)
+                last_id = batch[-1]["_id"]
+            day = next_day
+            await self.db.retention_state.update_one(
+                {"_id": state_id}, {"$set": {"archived_until": day}}, upsert=True
+            )
+
+        if archived and self.on_archived:
+            self.on_archived(policy.collection, cutoff)
+        return {"collection": policy.collection, "cutoff": cutoff, "archived": archived, "files": files}
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        async with self._lock:
+            started = datetime.utcnow()
+            results = []
+            for policy in self.policies.values():
+                try:
+                    results.append(await self.archive_collection(policy, now))
+                except Exception as e:
+                    logger.error(f"❌ Archiving {policy.collection} failed: {e}")
+                    results.append({"collection": policy.collection, "error": str(e)})
+            self.last_run = {
+                "started_at": started,
+                "duration_seconds": (datetime.utcnow() - started).total_seconds(),
+                "collections": results,
+            }
+            total = sum(r.get("archived", 0) for r in results)
+            logger.info(f"🗃️ Retention run archived {total} documents")
+            return self.last_run
+
+    async def run_forever(self, interval_hours: float = RETENTION_INTERVAL_HOURS):
+        await self.ensure_collection_expiry()
+        while True:
+            await self.run_once()
+            await asyncio.sleep(interval_hours * 3600)
+
+    # ---------- Abfragen ----------
+
+    def _partition_files(self, collection: str, start: datetime, end: datetime) -> List[Path]:
+        directory = self.archive_dir / collection
+        if not directory.exists():
+            return []
+        files = []
+        for day_dir in sorted(directory.iterdir()):
+            try:
+                day = datetime.strptime(day_dir.name, "%Y-%m-%d")
+            except ValueError:
+                continue
+            if day + timedelta(days=1) <= start or day > end:
+                continue
+            files.extend(sorted(day_dir.glob("part-*.parquet")))
+        return files
+
+    def _read(self, collection: str, start: datetime, end: datetime,
+              equals: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        policy = self.policies[collection]
+        filters = [(policy.time_field, ">=", pd.Timestamp(start)), (policy.time_field, "<=", pd.Timestamp(end))]
+        filters += [(column, "==", value) for column, value in equals.items() if value is not None]
+        columns = {column for column, _, _ in filters}
+        frames = []
+        for path in self._partition_files(collection, start, end):
+            try:
+                # Spalte fehlt in dieser Datei (älteres Schema) -> keine Treffer
+                if not columns.issubset(pq.read_schema(path).names):
+                    continue
+                frames.append(pd.read_parquet(path, engine="pyarrow", filters=filters))
+            except Exception as e:
+                # Defekte Partition: lieber Fehler als stillschweigend unvollständige Ergebnisse
+                logger.error(f"❌ Archive partition {path} unreadable: {e}")
+                raise
+        if not frames:
+            return []
+        frame = pd.concat(frames, ignore_index=True).sort_values(policy.time_field).head(limit)
+        frame = frame.astype(object).where(frame.notna(), None)
+        return [_unflatten(record) for record in frame.to_dict("records")]
+
+    async def query(self, collection: str, start: datetime, end: datetime,
+                    equals: Optional[Dict[str, Any]] = None, limit: int = 10000) -> List[Dict[str, Any]]:
+        """Read archived documents between start and end without restoring them to Mongo"""
+        # Partitionstage und Parquet-Zeitstempel sind naive UTC
+        return await asyncio.to_thread(self._read, collection, naive_utc(start), naive_utc(end), equals or {}, limit)
@@ -0,0 +1,145 @@
+# 👮 Dienstübersicht für Stadtwache
+# Materialisierte Liste der Beamten nach Status (/api/users/by-status), aktualisiert bei Änderungen,
+# ausgeliefert mit ETag - unveränderte Abfragen bekommen 304 ohne Body
+
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from http_cache import make_etag
+from presence import EPOCH, PresenceRegistry
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+# Wie bisher die ersten N Benutzer in natürlicher Reihenfolge (0 = alle)
+ROSTER_MAX_USERS = int(os.getenv("ROSTER_MAX_USERS", "100"))
+# Vollständiges Neuladen als Absicherung gegen Schreibzugriffe anderer Prozesse
+ROSTER_REFRESH_SECONDS = float(os.getenv("ROSTER_REFRESH_SECONDS", "300"))
+ROSTER_OFFLINE_SECONDS = float(os.getenv("ROSTER_OFFLINE_SECONDS", "120"))
+# last_activity der Online-Beamten wird auf diese Auflösung abgerundet, sonst ändert jeder Heartbeat das ETag
+ROSTER_ACTIVITY_RESOLUTION_SECONDS = float(os.getenv("ROSTER_ACTIVITY_RESOLUTION_SECONDS", "60"))
+
+ROSTER_FIELDS = ("id", "username", "phone", "service_number", "rank", "department", "status", "last_activity")
+# Nur die angezeigten Felder - kein base64-Foto, kein Passwort-Hash
+ROSTER_PROJECTION = {"_id": 0, **{field: 1 for field in ROSTER_FIELDS}}
+
+# ================================================
+# ROSTER
+# ================================================
+
+def _entry(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": doc.get("id"),
+        "username": doc.get("username"),
+        "phone": doc.get("phone"),
+        "service_number": doc.get("service_number"),
+        "rank": doc.get("rank"),
+        "department": doc.get("department"),
+        "status": doc.get("status", "Im Dienst"),
+    }
+
+
+def _default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+class Roster:
+    """Officers grouped by status, kept in memory and patched on every user write.
+
+    Profile data changes through upsert()/remove(), online state comes from
+    the presence registry. The rendered body and its ETag are cached per
+    (version, online snapshot), so a poll without changes costs one
+    vectorized presence query and no database round trip.
+    """
+
+    def __init__(self, db, presence: PresenceRegistry, max_users: int = ROSTER_MAX_USERS,
+                 refresh_seconds: float = ROSTER_REFRESH_SECONDS):
+        self.db = db
+        self.presence = presence
+        self.max_users = max_users
+        self.refresh_seconds = refresh_seconds
+        self.version = 0
+        self._members: Dict[str, Dict[str, Any]] = {}  # Einfügereihenfolge = natürliche Reihenfolge
+        self._last_activity: Dict[str, Any] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._rendered: Optional[Tuple[Tuple[int, FrozenSet], str, bytes]] = None
+
+    # ---------- Laden ----------
+
+    async def reload(self):
+        cursor = self.db.users.find({}, ROSTER_PROJECTION)
+        docs = await cursor.to_list(self.max_users or None)
+        self._members = {doc["id"]: _entry(doc) for doc in docs if doc.get("id")}
+        self._last_activity = {doc["id"]: doc.get("last_activity") for doc in docs if doc.get("id")}
+        self._loaded_at = time.monotonic()
+        self.version += 1
+
+    async def _ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+                await self.reload()
+
+    def invalidate(self):
+        """Reload from the database on the next request"""
+        self._loaded_at = None
+
+    # ---------- Änderungen ----------
+
+    def upsert(self, doc: Dict[str, Any]):
+        """Apply a created or updated user document"""
+        user_id = doc.get("id")
+        if not user_id:
+            return
+        if user_id not in self._members and self.max_users and len(self._members) >= self.max_users:
+            return
+        entry = _entry(doc)
+        if self._members.get(user_id) == entry and self._last_activity.get(user_id) == doc.get("last_activity"):
+            return
+        self._members[user_id] = entry
+        self._last_activity[user_id] = doc.get("last_activity")
+        self.version += 1
+
+    def remove(self, user_id: str):
+        if self._members.pop(user_id, None) is not None:
+            self._last_activity.pop(user_id, None)
+            self.version += 1
+            if self.max_users:
+                # Nachrücker aus der Datenbank holen
+                self.invalidate()
+
+    # ---------- Ausgabe ----------
+
+    async def render(self) -> Tuple[str, bytes]:
+        """(etag, JSON body) of the grouped roster"""
+        await self._ensure_loaded()
+        online = self.presence.online_last_seen(
+            ROSTER_OFFLINE_SECONDS, resolution=ROSTER_ACTIVITY_RESOLUTION_SECONDS)
+        key = (self.version, frozenset(online.items()))
+        if self._rendered is not None and self._rendered[0] == key:
+            return self._rendered[1], self._rendered[2]
+
+        users_by_status: Dict[str, list] = {}
+        for user_id, entry in self._members.items():
+            seen = online.get(user_id)
+            last_activity = EPOCH + timedelta(seconds=seen) if seen is not None else self._last_activity.get(user_id)
+            users_by_status.setdefault(entry["status"], []).append({
+                **entry,
+                "is_online": seen is not None,
+                "online_status": "Online" if seen is not None else "Offline",
+                "last_activity": last_activity,
+            })
+        body = json.dumps(users_by_status, default=_default, ensure_ascii=False).encode()
+        etag = "W/" + make_etag(body)  # schwach: gilt auch für die komprimierte Darstellung
+        self._rendered = (key, etag, body)
+        return etag, body
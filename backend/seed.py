@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# 🌱 Testdaten-Generator für Stadtwache
+# Deterministische Massendaten (Beamte, Teams, Einsätze, Nachrichten, Standorte) per insert_many
+#
+#   python seed.py --profile demo
+#   python seed.py --profile staging --drop
+#   python seed.py --profile perf --drop            # 100k Benutzer, 1M Nachrichten, 10M Standorte
+#   python seed.py --users 5000 --messages 200000 --seed 7
+
+import os
+import time
+import uuid
+import asyncio
+import base64
+import random
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace, fields
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from passlib.context import CryptContext
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+@dataclass
+class SeedConfig:
+    seed: int = 42
+    users: int = 100
+    teams: int = 10
+    districts: int = 4
+    incidents: int = 200
+    max_images_per_incident: int = 2
+    image_kb: int = 20
+    persons: int = 100
+    reports: int = 100
+    messages: int = 10000
+    locations: int = 100000
+    days: int = 30
+    location_interval: int = 30  # Sekunden zwischen GPS-Punkten einer Schicht
+    password: str = "stadtwache2024"
+    # False: ein bcrypt-Hash für alle (Template), True: eigenes Passwort je Benutzer (Prozess-Pool)
+    unique_passwords: bool = False
+    batch_size: int = 5000
+    concurrency: int = 4  # gleichzeitige insert_many pro Collection
+    hash_workers: int = os.cpu_count() or 1
+
+
+PROFILES = {
+    "demo": SeedConfig(users=10, teams=2, districts=2, incidents=20, persons=10, reports=10,
+                       messages=500, locations=5000, days=7),
+    "staging": SeedConfig(users=1000, teams=50, districts=8, incidents=5000, persons=2000, reports=2000,
+                          messages=100_000, locations=1_000_000, days=90),
+    "perf": SeedConfig(users=100_000, teams=2000, districts=40, incidents=100_000, persons=50_000,
+                       reports=50_000, messages=1_000_000, locations=10_000_000, days=180,
+                       max_images_per_incident=1, image_kb=10, batch_size=10_000, concurrency=8),
+}
+
+STATUSES = ["Im Dienst", "Streife", "Einsatz", "Pause", "Nicht verfügbar"]
+RANKS = ["Polizeimeister", "Polizeiobermeister", "Polizeihauptmeister", "Kommissar", "Oberkommissar"]
+CHANNELS = ["general", "emergency", "incidents"]
+STREETS = ["Hauptstraße", "Bahnhofstraße", "Marktplatz", "Südring", "Kölner Straße", "Schulstraße", "Am Park"]
+WORDS = (
+    "einsatz streife marktplatz bahnhof verkehrsunfall ruhestörung kontrolle fahrzeug kennzeichen "
+    "zeuge person vermisst bericht schicht pause zentrale standort ankunft notruf sperrung diebstahl "
+    "einbruch alarm lage ruhig unterstützung benötigt bestätigt erledigt"
+).split()
+CENTER = (51.2878, 7.2936)  # Schwelm
+SHIFT_HOURS = 8
+
+# ================================================
+# PASSWÖRTER
+# ================================================
+
+_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> str:
+    return _pwd_context.hash(password)
+
+
+def hash_passwords(passwords: Iterable[str], workers: int = os.cpu_count() or 1) -> Dict[str, str]:
+    """bcrypt each distinct password once; several distinct passwords are hashed in a process pool"""
+    distinct = sorted(set(passwords))
+    if len(distinct) <= 1 or workers <= 1:
+        return {password: _hash(password) for password in distinct}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(distinct, pool.map(_hash, distinct, chunksize=max(1, len(distinct) // (workers * 4)))))
+
+
+def user_password(config: SeedConfig, index: int) -> str:
+    return f"{config.password}-{index}" if config.unique_passwords else config.password
+
+# ================================================
+# GENERATOREN
+# ================================================
+
+def _rng(config: SeedConfig, *scope: Any) -> random.Random:
+    """Independent, reproducible random stream per collection (and chunk)"""
+    return random.Random(":".join(str(part) for part in (config.seed,) + scope))
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _position(rng: random.Random, spread: float = 0.03) -> Dict[str, float]:
+    return {"lat": CENTER[0] + rng.uniform(-spread, spread), "lng": CENTER[1] + rng.uniform(-spread, spread)}
+
+
+def _ids(config: SeedConfig, collection: str, count: int) -> List[str]:
+    rng = _rng(config, collection, "ids")
+    return [_uuid(rng) for _ in range(count)]
+
+
+class Department:
+    """Ids shared between collections so every reference points at a seeded document"""
+
+    def __init__(self, config: SeedConfig, now: Optional[datetime] = None):
+        self.config = config
+        self.now = now or datetime.utcnow().replace(microsecond=0)
+        self.district_ids = _ids(config, "districts", config.districts)
+        self.team_ids = _ids(config, "teams", config.teams)
+        self.user_ids = _ids(config, "users", config.users)
+
+    def team_of(self, user_index: int) -> int:
+        return user_index % max(1, self.config.teams)
+
+    def username(self, user_index: int) -> str:
+        return f"Beamter {user_index}"
+
+    def _chunks(self, total: int, build: Callable[[random.Random, int, int], List[Dict[str, Any]]],
+                collection: str) -> Iterator[List[Dict[str, Any]]]:
+        size = self.config.batch_size
+        for chunk, start in enumerate(range(0, total, size)):
+            yield build(_rng(self.config, collection, chunk), start, min(total, start + size))
+
+    # ---------- Stammdaten ----------
+
+    def districts(self) -> Iterator[List[Dict[str, Any]]]:
+        rng = _rng(self.config, "districts")
+        yield [{
+            "id": district_id, "name": f"Bezirk {i + 1}", "area_description": rng.choice(STREETS),
+            "coordinates": _position(rng), "created_at": self.now,
+        } for i, district_id in enumerate(self.district_ids)]
+
+    def teams(self) -> Iterator[List[Dict[str, Any]]]:
+        members: Dict[int, List[str]] = {}
+        for index, user_id in enumerate(self.user_ids):
+            members.setdefault(self.team_of(index), []).append(user_id)
+        yield [{
+            "id": team_id, "name": f"Streife {i + 1}",
+            "district_id": self.district_ids[i % len(self.district_ids)] if self.district_ids else None,
+            "members": members.get(i, []), "leader_id": (members.get(i) or [None])[0],
+            "status": "Einsatzbereit", "created_at": self.now,
+        } for i, team_id in enumerate(self.team_ids)]
+
+    def users(self, password_hashes: Dict[str, str]) -> Iterator[List[Dict[str, Any]]]:
+        config = self.config
+        admins = max(1, config.users // 50)
+
+        def build(rng, start, end):
+            batch = []
+            for i in range(start, end):
+                team = self.team_of(i)
+                batch.append({
+                    "id": self.user_ids[i], "email": f"beamter{i}@seed.stadtwache.de", "username": self.username(i),
+                    "role": "admin" if i < admins else "police", "badge_number": f"B-{i:06d}",
+                    "department": "Stadtwache Schwelm", "phone": f"+49 2336 {i:06d}",
+                    "service_number": f"D-{i:06d}", "rank": rng.choice(RANKS), "status": rng.choice(STATUSES),
+                    "is_active": True, "hashed_password": password_hashes[user_password(config, i)],
+                    "assigned_district": self.district_ids[team % len(self.district_ids)] if self.district_ids else None,
+                    "patrol_team": self.team_ids[team] if self.team_ids else None,
+                    "notification_sound": "default", "vibration_pattern": "standard", "battery_saver_mode": False,
+                    "check_in_interval": 30, "missed_check_ins": 0, "created_at": self.now, "updated_at": self.now,
+                })
+            return batch
+
+        return self._chunks(config.users, build, "users")
+
+    # ---------- Vorgänge ----------
+
+    def incidents(self) -> Iterator[List[Dict[str, Any]]]:
+        config = self.config
+
+        def build(rng, start, end):
+            batch = []
+            for _ in range(start, end):
+                created = self.now - timedelta(seconds=rng.uniform(0, config.days * 86400))
+                reporter = rng.randrange(config.users)
+                images = [
+                    "data:image/jpeg;base64," + base64.b64encode(rng.randbytes(config.image_kb * 1024)).decode()
+                    for _ in range(rng.randint(0, config.max_images_per_incident))
+                ]
+                batch.append({
+                    "id": _uuid(rng), "title": _sentence(rng, 3), "description": _sentence(rng, 20),
+                    "priority": rng.choice(["high", "medium", "low"]),
+                    "status": rng.choice(["open", "in_progress", "closed"]),
+                    "location": _position(rng), "address": f"{rng.choice(STREETS)} {rng.randint(1, 120)}, 58332 Schwelm",
+                    "reported_by": self.user_ids[reporter], "assigned_to": None, "assigned_to_name": None,
+                    "images": images, "created_at": created, "updated_at": created,
+                })
+            return batch
+
+        return self._chunks(config.incidents, build, "incidents")
+
+    def persons(self) -> Iterator[List[Dict[str, Any]]]:
+        config = self.config
+
+        def build(rng, start, end):
+            batch = []
+            for i in range(start, end):
+                creator = rng.randrange(config.users)
+                created = self.now - timedelta(seconds=rng.uniform(0, config.days * 86400))
+                batch.append({
+                    "id": _uuid(rng), "first_name": f"Vorname{i}", "last_name": f"Nachname{i}",
+                    "age": rng.randint(8, 90), "status": rng.choice(["gesucht", "vermisst", "gefunden", "erledigt"]),
+                    "description": _sentence(rng, 12), "last_seen_location": rng.choice(STREETS),
+                    "case_number": f"AZ-{i:07d}", "priority": rng.choice(["low", "medium", "high"]),
+                    "created_by": self.user_ids[creator], "created_by_name": self.username(creator),
+                    "is_active": True, "created_at": created, "updated_at": created,
+                })
+            return batch
+
+        return self._chunks(config.persons, build, "persons")
+
+    def reports(self) -> Iterator[List[Dict[str, Any]]]:
+        config = self.config
+
+        def build(rng, start, end):
+            batch = []
+            for _ in range(start, end):
+                author = rng.randrange(config.users)
+                created = self.now - timedelta(seconds=rng.uniform(0, config.days * 86400))
+                batch.append({
+                    "id": _uuid(rng), "title": f"Schichtbericht {created:%d.%m.%Y}", "content": _sentence(rng, 60),
+                    "author_id": self.user_ids[author], "author_name": self.username(author),
+                    "shift_date": created.strftime("%Y-%m-%d"), "images": [],
+                    "status": rng.choice(["draft", "submitted", "reviewed"]), "edit_history": [],
+                    "created_at": created, "updated_at": created,
+                })
+            return batch
+
+        return self._chunks(config.reports, build, "reports")
+
+    # ---------- Zeitreihen ----------
+
+    def messages(self) -> Iterator[List[Dict[str, Any]]]:
+        config = self.config
+
+        def build(rng, start, end):
+            batch = []
+            for _ in range(start, end):
+                sender = rng.randrange(config.users)
+                timestamp = self.now - timedelta(seconds=rng.uniform(0, config.days * 86400))
+                message = {
+                    "id": _uuid(rng), "content": _sentence(rng, rng.randint(3, 15)),
+                    "sender_id": self.user_ids[sender], "sender_name": self.username(sender),
+                    "channel": rng.choice(CHANNELS), "message_type": "text",
+                    "timestamp": timestamp, "created_at": timestamp,
+                }
+                if rng.random() < 0.1:
+                    message["channel"] = "private"
+                    message["recipient_id"] = self.user_ids[rng.randrange(config.users)]
+                batch.append(message)
+            return batch
+
+        return self._chunks(config.messages, build, "messages")
+
+    def locations(self) -> Iterator[List[Dict[str, Any]]]:
+        """GPS tracks: random walks over whole shifts of randomly chosen officers"""
+        config = self.config
+        shift_points = max(1, SHIFT_HOURS * 3600 // config.location_interval)
+
+        def build(rng, start, end):
+            batch = []
+            while len(batch) < end - start:
+                user_id = self.user_ids[rng.randrange(config.users)]
+                day = rng.randrange(max(1, config.days))
+                moment = (self.now - timedelta(days=day + 1)).replace(
+                    hour=rng.choice([6, 14, 22]), minute=0, second=0)
+                position = _position(rng)
+                lat, lng = position["lat"], position["lng"]
+                for _ in range(min(shift_points, end - start - len(batch))):
+                    lat += rng.gauss(0, 0.0002)
+                    lng += rng.gauss(0, 0.0002)
+                    batch.append({"user_id": user_id, "location": {"lat": lat, "lng": lng}, "timestamp": moment})
+                    moment += timedelta(seconds=config.location_interval)
+            return batch
+
+        return self._chunks(config.locations, build, "locations")
+
+# ================================================
+# LADEN
+# ================================================
+
+# Time-Series Collections nicht droppen (Optionen würden verloren gehen)
+_TIMESERIES = {"locations", "checkins"}
+
+
+async def _insert_batch(collection, batch: List[Dict[str, Any]]) -> int:
+    try:
+        result = await collection.insert_many(batch, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        # Unordered: alle übrigen Dokumente sind geschrieben, Duplikate (erneuter Lauf) werden übersprungen
+        return e.details.get("nInserted", 0)
+
+
+async def load_collection(collection, batches: Iterable[List[Dict[str, Any]]], concurrency: int) -> int:
+    """Insert generated batches with up to ``concurrency`` unordered insert_many calls in flight.
+
+    Batches are generated on the event loop while Motor encodes and sends the
+    previous ones on its executor threads.
+    """
+    inserted = 0
+    in_flight = set()
+    for batch in batches:
+        if not batch:
+            continue
+        if len(in_flight) >= concurrency:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            inserted += sum(task.result() for task in done)
+        in_flight.add(asyncio.create_task(_insert_batch(collection, batch)))
+        await asyncio.sleep(0)
+    if in_flight:
+        inserted += sum(await asyncio.gather(*in_flight))
+    return inserted
+
+
+async def seed_database(db, config: SeedConfig, drop: bool = False,
+                        collections: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Generate and load all collections in parallel, returns counts and timings"""
+    department = Department(config)
+    started = time.perf_counter()
+    passwords = [user_password(config, i) for i in range(config.users)]
+    password_hashes = await asyncio.to_thread(hash_passwords, passwords, config.hash_workers)
+    hash_seconds = time.perf_counter() - started
+
+    sources = {
+        "districts": department.districts(),
+        "teams": department.teams(),
+        "users": department.users(password_hashes),
+        "incidents": department.incidents(),
+        "persons": department.persons(),
+        "reports": department.reports(),
+        "messages": department.messages(),
+        "locations": department.locations(),
+    }
+    if collections is not None:
+        sources = {name: source for name, source in sources.items() if name in set(collections)}
+
+    if drop:
+        for name in sources:
+            if name in _TIMESERIES:
+                await db[name].delete_many({})
+            else:
+                await db[name].drop()
+
+    results: Dict[str, Any] = {}
+
+    async def load(name: str, batches):
+        collection_started = time.perf_counter()
+        inserted = await load_collection(db[name], batches, config.concurrency)
+        seconds = time.perf_counter() - collection_started
+        results[name] = {"inserted": inserted, "seconds": round(seconds, 2),
+                         "docs_per_second": round(inserted / seconds) if seconds else None}
+        logger.info(f"🌱 {name}: {inserted} documents in {seconds:.1f}s")
+
+    await asyncio.gather(*(load(name, batches) for name, batches in sources.items()))
+    return {
+        "seed": config.seed,
+        "password_hashing_seconds": round(hash_seconds, 2),
+        "distinct_passwords": len(password_hashes),
+        "collections": results,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+if __name__ == "__main__":
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+    from pathlib import Path
+    from indexes import IndexManager
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Stadtwache seed generator")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="demo")
+    parser.add_argument("--drop", action="store_true", help="empty the seeded collections first")
+    parser.add_argument("--only", help="comma-separated collections to seed")
+    for option in fields(SeedConfig):
+        if option.type in (int, "int"):
+            parser.add_argument(f"--{option.name.replace('_', '-')}", type=int)
+    parser.add_argument("--password")
+    parser.add_argument("--unique-passwords", action="store_true")
+    args = parser.parse_args()
+
+    overrides = {option.name: getattr(args, option.name) for option in fields(SeedConfig)
+                 if getattr(args, option.name, None) not in (None, False)}
+    seed_config = replace(PROFILES[args.profile], **overrides)
+
+    async def main():
+        client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+        db = client[os.getenv("DB_NAME", "stadtwache_db")]
+        try:
+            await client.admin.command('ping')
+            only = args.only.split(",") if args.only else None
+            summary = await seed_database(db, seed_config, drop=args.drop, collections=only)
+            # Indizes nach dem Bulk-Load: ein Index-Build statt Pflege bei jedem Insert
+            await IndexManager(db).reconcile()
+            for name, result in summary["collections"].items():
+                print(f"✅ {name:<10} {result['inserted']:>10} docs  {result['docs_per_second'] or 0:>8} docs/s")
+            print(f"🏁 Seed {summary['seed']} loaded in {summary['seconds']}s "
+                  f"({summary['distinct_passwords']} bcrypt hashes in {summary['password_hashing_seconds']}s)")
+        finally:
+            client.close()
+
+    asyncio.run(main())
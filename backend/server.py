@@ -1,10 +1,9 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 # from bson import ObjectId
 import socketio
 import os
@@ -18,6 +17,34 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 import hashlib
 import secrets
+import json
+import asyncio
+import inspect
+import re
+from message_search import MessageSearchIndex, build_index_from_db, parse_query, highlight
+from retention import RetentionManager
+from track_history import TrackHistory
+from timeseries import TIMESERIES_COLLECTIONS, timeseries_enabled, ensure_timeseries_collections
+from indexes import IndexManager, check_hot_queries
+from metrics import METRICS_ENABLED, MetricsMiddleware, InstrumentedRoute, instrument_socketio
+from db_monitor import DB_MONITOR_ENABLED, QueryCountMiddleware, command_monitor, client_event_listeners
+from loop_monitor import LOOP_MONITOR_ENABLED, loop_monitor
+from presence import PresenceRegistry
+from roster import Roster
+from compression import COMPRESSION_ENABLED, CompressionMiddleware, PrecompressedStaticFiles, precompress_static
+from http_cache import (HTTP_CACHE_ENABLED, ConditionalStatsMiddleware, change_tracker, conditional_get,
+                        conditional_stats, etag_matches)
+from batch import BatchRequest, batch_user, run_batch, validate_batch
+from fieldsets import FieldSelection, field_names, fieldset_stats, projection, sparse_fields
+from repositories import Repositories, mongo_repositories, naive_utc
+from sqlite_store import PERSON_SEARCH_FIELDS, EmbeddedStore, embedded_enabled
+from mongo_client import create_mongo_client, pool_status, read_mostly
+from read_routing import ReadRouter, current_user_id, write_tracker
+from cdc import CDC_ENABLED, ChangeEvent, change_feed
+from jobs import JOBS_ENABLED, JobQueue, PermanentJobError
+from incident_archive import IncidentArchive, image_refs
+from checkin_monitor import CHECKIN_MONITOR_ENABLED, CheckInMonitor
+from roster import ROSTER_FIELDS
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -26,18 +53,35 @@ load_dotenv(ROOT_DIR / '.env')
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/stadtwache_db")
 DB_NAME = os.getenv("DB_NAME", "stadtwache_db")
 
+# Embedded SQLite for single-node and offline stations (STORAGE_BACKEND=sqlite), otherwise MongoDB
+store = None
+if embedded_enabled():
+    store = EmbeddedStore(on_write=change_tracker.bump, on_delete=change_feed.deleted)
+    client = store.client
+    db = client[DB_NAME]
+    print(f"🔗 Embedded SQLite store: {store.url}")
 # Handle both local and cloud MongoDB URLs
-if MONGO_URL.startswith("mongodb://localhost") or MONGO_URL.startswith("mongodb://127.0.0.1"):
+elif MONGO_URL.startswith("mongodb://localhost") or MONGO_URL.startswith("mongodb://127.0.0.1"):
     # Local development
-    client = AsyncIOMotorClient(MONGO_URL)
+    client = create_mongo_client(MONGO_URL, event_listeners=client_event_listeners() + [change_tracker, write_tracker, change_feed])
     db = client[DB_NAME]
     print(f"🔗 Connected to local MongoDB: {MONGO_URL}")
 else:
     # Production/Cloud MongoDB
-    client = AsyncIOMotorClient(MONGO_URL)
+    client = create_mongo_client(MONGO_URL, event_listeners=client_event_listeners() + [change_tracker, write_tracker, change_feed])
     db = client[DB_NAME]  
     print(f"🔗 Connected to cloud MongoDB: {MONGO_URL[:20]}...")
 
+# Statistics endpoints read with MONGO_READ_MOSTLY_PREFERENCE (secondaries when available)
+stats_db = read_mostly(db)
+
+# Repository layer for the hot entities (users, incidents, messages, persons, reports, locations, checkins)
+repos = store.repositories if store is not None else mongo_repositories(db)
+# Declared read-only polling routes read from secondaries (secondaryPreferred, bounded staleness)
+read_router = ReadRouter(repos, db)
+# Change feed (change streams, polling fallback) pushes data_changed events instead of client polling
+change_feed.db = db
+
 # Test connection
 async def test_db_connection():
     try:
@@ -55,15 +99,60 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 # Socket.IO server
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+class SocketJSON:
+    """JSON for Socket.IO packets - payloads are raw Mongo documents (datetime, ObjectId)"""
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return json.dumps(obj, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value), **kwargs)
+
+    loads = staticmethod(json.loads)
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', json=SocketJSON)
+
+# Online users tracking (indexed by user_id and socket id)
+presence = PresenceRegistry()
+
+# Materialized /users/by-status roster, patched on every user write
+roster = Roster(db, presence)
+
+# Full-text index over chat messages, filled on startup and on every new message (FTS5 when embedded)
+message_index = store.message_index if store is not None else MessageSearchIndex()
+
+def on_collection_archived(collection: str, cutoff: datetime):
+    """Drop archived data from in-memory structures"""
+    if collection == "messages":
+        message_index.expire_before(cutoff)
+
+# Retention: TTL for raw locations, expired data is rolled up into Parquet archives
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "true").lower() == "true"
+retention_manager = RetentionManager(
+    db,
+    on_archived=on_collection_archived,
+    timeseries=TIMESERIES_COLLECTIONS if timeseries_enabled() and store is None else ()
+)
 
-# Online users tracking
-online_users = {}  # {user_id: {"last_seen": datetime, "socket_id": str, "username": str}}
-user_sockets = {}  # {socket_id: user_id}
+# Declared indexes, reconciled in the background on startup
+index_manager = IndexManager(db)
+
+# Compressed per-officer track history for route replay
+track_history = TrackHistory(db)
+
+# Missed check-ins: deadline heap over on-duty officers, supervisors are alerted via socket.io
+checkin_monitor = CheckInMonitor(db)
+
+# Completed incidents move to incidents_archive, archive reports only reference their images
+incident_archive = IncidentArchive(db)
+
+# Persistent background jobs (archiving, emergency retries, retention runs); without a dispatcher in this
+# process (JOBS_ENABLED=false) the endpoints do the work inline instead of queueing it
+job_queue = JobQueue(db)
 
 # Create FastAPI app
 app = FastAPI()
-api_router = APIRouter(prefix="/api")
+# Instrumented routes track in-flight requests per route template (see metrics.py)
+if METRICS_ENABLED:
+    app.router.route_class = InstrumentedRoute
+api_router = APIRouter(prefix="/api", route_class=app.router.route_class)
 
 # Wrap FastAPI app with Socket.IO
 socket_app = socketio.ASGIApp(sio, app)
@@ -351,6 +440,12 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Teilanfrage eines Batches: Benutzer wurde für genau dieses Token schon geladen
+    cached = batch_user.get()
+    if cached is not None and cached[0] == credentials.credentials:
+        current_user_id.set(cached[1].id)
+        return cached[1]
+    
     try:
         token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -367,21 +462,26 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     
     # First, try to find by ID (if the identifier looks like a UUID)
     if user_identifier and '-' in user_identifier and len(user_identifier) == 36:
-        user = await db.users.find_one({"id": user_identifier})
+        user = await repos.users.get(user_identifier)
     
     # If not found by ID, try by email
     if user is None:
-        user = await db.users.find_one({"email": user_identifier})
+        user = await repos.users.find_one({"email": user_identifier})
     
     # If still not found and we have a separate user_id, try that
     if user is None and user_id:
-        user = await db.users.find_one({"id": user_id})
+        user = await repos.users.get(user_id)
     
     if user is None:
         raise credentials_exception
     
+    current_user_id.set(user["id"])  # Read-your-writes: Schreibzugriffe dieses Requests merken
     return User(**user)
 
+def replica_reads(*conditional: str):
+    """Declare a GET handler read-only; ``conditional`` = collections behind its ETag"""
+    return read_router.replica_reads(get_current_user, conditional)
+
 # Socket.IO events
 @sio.event
 async def connect(sid, environ):
@@ -390,21 +490,18 @@ async def connect(sid, environ):
 @sio.event
 async def disconnect(sid):
     print(f"🔌 Client {sid} disconnected")
-    # Remove from user_sockets mapping
-    if sid in user_sockets:
-        user_id = user_sockets[sid]
-        del user_sockets[sid]
-        # Update online status
-        if user_id in online_users:
-            online_users[user_id]["socket_id"] = None
+    # Remove socket mapping, the user stays online until the heartbeat expires
+    presence.detach_socket(sid)
 
 @sio.event
 async def join_user_room(sid, user_id):
     """Join user to their personal room for notifications"""
     await sio.enter_room(sid, f"user_{user_id}")
-    user_sockets[sid] = user_id
-    if user_id in online_users:
-        online_users[user_id]["socket_id"] = sid
+    presence.attach_socket(sid, user_id)
+    # Admins receive data_changed for every report
+    user = await db.users.find_one({"id": user_id}, {"role": 1})
+    if user and user.get("role") == UserRole.ADMIN:
+        await sio.enter_room(sid, "admins")
     print(f"👤 User {user_id} joined personal room")
 
 @sio.event
@@ -434,6 +531,8 @@ async def send_message(sid, data):
         recipient_id = data.get('recipient_id')
         message_type = data.get('message_type', 'text')
         
+        write_tracker.note_user(sender_id)
+        
         # Create message object
         message_data = {
             "id": str(uuid.uuid4()),
@@ -450,6 +549,7 @@ async def send_message(sid, data):
             message_data["recipient_id"] = recipient_id
             # Save to database
             await db.messages.insert_one(message_data)
+            message_index.add(message_data)
             
             # Send to private room
             users = sorted([sender_id, recipient_id])
@@ -461,6 +561,7 @@ async def send_message(sid, data):
         else:
             # Channel message
             await db.messages.insert_one(message_data)
+            message_index.add(message_data)
             # Send to channel room
             await sio.emit('new_message', message_data, room=f"channel_{channel}")
             
@@ -483,7 +584,7 @@ async def location_update(sid, data):
         "location": data.get('location'),
         "timestamp": datetime.utcnow()
     }
-    await db.locations.insert_one(location_data)
+    await repos.locations.insert(location_data)
     
     # Broadcast to all connected clients
     await sio.emit('location_updated', location_data)
@@ -519,6 +620,8 @@ async def register_user(user_data: UserCreate):
     
     # Insert user into database
     await db.users.insert_one(user_dict)
+    roster.upsert(user_dict)
+    checkin_monitor.track(user_dict)
     
     # Return user without password
     user_dict.pop('hashed_password')
@@ -552,6 +655,16 @@ async def login(user_data: UserLogin):
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
+@api_router.post("/batch")
+async def batch_requests(batch: BatchRequest, request: Request, current_user: User = Depends(get_current_user)):
+    """Mehrere GET-Anfragen in einem Round-Trip (Dashboard-Start), parallel ausgeführt"""
+    error = validate_batch(batch)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    
+    body = await run_batch(request.app, request.scope, request.headers["authorization"], current_user, batch)
+    return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-store"})
+
 @api_router.put("/auth/profile", response_model=User)
 async def update_profile(user_updates: UserUpdate, current_user: User = Depends(get_current_user)):
     # Prepare update data
@@ -569,6 +682,8 @@ async def update_profile(user_updates: UserUpdate, current_user: User = Depends(
     
     # Get updated user
     updated_user = await db.users.find_one({"id": current_user.id})
+    roster.upsert(updated_user)
+    checkin_monitor.track(updated_user)
     return User(**updated_user)
 
 @api_router.put("/incidents/{incident_id}/assign", response_model=Incident)
@@ -603,40 +718,13 @@ async def assign_incident(incident_id: str, current_user: User = Depends(get_cur
     return incident_obj
 
 @api_router.get("/users/by-status")
-async def get_users_by_status(current_user: User = Depends(get_current_user)):
+async def get_users_by_status(request: Request, current_user: User = Depends(get_current_user)):
     """Get users grouped by their work status with online information"""
-    users = await db.users.find().to_list(100)
-    now = datetime.utcnow()
-    offline_threshold = timedelta(minutes=2)
-    
-    users_by_status = {}
-    for user_doc in users:
-        user_status = user_doc.get("status", "Im Dienst")
-        
-        # Check if user is online (last activity within 2 minutes)
-        last_activity = user_doc.get("last_activity")
-        is_online = False
-        if last_activity and isinstance(last_activity, datetime):
-            is_online = now - last_activity < offline_threshold
-        
-        if user_status not in users_by_status:
-            users_by_status[user_status] = []
-            
-        user_data = {
-            "id": user_doc.get("id"),
-            "username": user_doc.get("username"),
-            "phone": user_doc.get("phone"),
-            "service_number": user_doc.get("service_number"),
-            "rank": user_doc.get("rank"),
-            "department": user_doc.get("department"),
-            "status": user_status,
-            "is_online": is_online,
-            "online_status": "Online" if is_online else "Offline",
-            "last_activity": last_activity.isoformat() if last_activity else None
-        }
-        users_by_status[user_status].append(user_data)
-    
-    return users_by_status
+    etag, body = await roster.render()
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @api_router.delete("/messages/{message_id}")
 async def delete_message(message_id: str, current_user: User = Depends(get_current_user)):
@@ -655,6 +743,7 @@ async def delete_message(message_id: str, current_user: User = Depends(get_curre
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Message not found")
+    message_index.remove(message_id)
     
     # Notify about message deletion
     await sio.emit('message_deleted', {'message_id': message_id, 'channel': message['channel']})
@@ -668,7 +757,9 @@ class Report(BaseModel):
     author_id: str
     author_name: str
     shift_date: str
-    images: List[str] = []  # base64 encoded images from incidents
+    images: List[str] = []  # base64 encoded images (archive reports reference them via image_refs)
+    incident_id: Optional[str] = None  # archive reports: completed incident in incidents_archive
+    image_refs: List[str] = []  # archive reports: /api/archive/incidents/{id}/images/{n}
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     status: str = "draft"  # draft, submitted, reviewed
@@ -763,14 +854,20 @@ async def delete_report(report_id: str, current_user: User = Depends(get_current
     return {"status": "success", "message": "Report deleted"}
 
 @api_router.get("/reports", response_model=List[Report])
-async def get_reports(current_user: User = Depends(get_current_user)):
+async def get_reports(current_user: User = Depends(get_current_user),
+                      _cache: None = Depends(conditional_get("reports", per_user=True)),
+                      fields: Optional[FieldSelection] = Depends(sparse_fields(Report))):
     if current_user.role == UserRole.ADMIN:
         # Admin can see all reports
-        reports = await db.reports.find().sort("created_at", -1).to_list(100)
+        reports = await repos.reports.find(sort=[("created_at", -1)], limit=100, fields=field_names(fields))
     else:
         # Users can only see their own reports
-        reports = await db.reports.find({"author_id": current_user.id}).sort("created_at", -1).to_list(100)
+        reports = await repos.reports.find(
+            {"author_id": current_user.id}, sort=[("created_at", -1)], limit=100, fields=field_names(fields)
+        )
     
+    if fields:
+        return fields.response(reports)
     return [Report(**report) for report in reports]
 
 @api_router.put("/users/{user_id}", response_model=User)
@@ -788,6 +885,8 @@ async def update_user(user_id: str, updates: UserUpdate, current_user: User = De
         raise HTTPException(status_code=404, detail="User not found")
     
     updated_user = await db.users.find_one({"id": user_id})
+    roster.upsert(updated_user)
+    checkin_monitor.track(updated_user)
     return User(**updated_user)
 
 @api_router.delete("/users/{user_id}")
@@ -803,6 +902,8 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    roster.remove(user_id)
+    checkin_monitor.untrack(user_id)
     
     return {"status": "success", "message": "User deleted"}
 
@@ -831,38 +932,27 @@ async def complete_incident(incident_id: str, current_user: User = Depends(get_c
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
-    # Create archive report with images
-    archive_report = {
-        "id": str(uuid.uuid4()),
-        "title": f"Archiv: {incident['title']}",
-        "content": f"Vorfall abgeschlossen:\n\nTitel: {incident['title']}\nBeschreibung: {incident['description']}\nOrt: {incident['address']}\nPriorität: {incident['priority']}\n\nAbgeschlossen von: {current_user.username}\nDatum: {datetime.utcnow().strftime('%d.%m.%Y %H:%M')}",
-        "author_id": current_user.id,
-        "author_name": current_user.username,
-        "shift_date": datetime.utcnow().strftime('%Y-%m-%d'),
-        "status": "archived",
+    # Mark as completed right away, moving it into the archive runs as a job
+    completed_at = datetime.utcnow()
+    await db.incidents.update_one(
+        {"id": incident_id},
+        {"$set": {"status": "completed", "completed_at": completed_at, "updated_at": completed_at}}
+    )
+    payload = {
         "incident_id": incident_id,
-        "images": incident.get('images', []),  # Transfer images from incident to report
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
+        "report_id": str(uuid.uuid4()),
+        "completed_by_id": current_user.id,
+        "completed_by_name": current_user.username,
+        "completed_at": completed_at,
     }
+    if not job_queue.running:
+        # Kein Dispatcher in diesem Prozess: sofort archivieren statt unbearbeitet einzureihen
+        await archive_incident(payload)
+        return {"status": "success", "message": "Incident completed and archived", "archive_id": payload["report_id"]}
+    job = await job_queue.enqueue("incident.archive", payload, unique_key=f"incident.archive:{incident_id}")
     
-    # Save to archive
-    await db.reports.insert_one(archive_report)
-    
-    # Delete the incident from active incidents
-    result = await db.incidents.delete_one({"id": incident_id})
-    
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Incident not found")
-    
-    # Notify about incident completion
-    await sio.emit('incident_completed', {
-        'incident_id': incident_id,
-        'completed_by': current_user.username,
-        'archived_as': archive_report['id']
-    })
-    
-    return {"status": "success", "message": "Incident completed and archived", "archive_id": archive_report['id']}
+    return {"status": "success", "message": "Incident completed, archiving queued",
+            "archive_id": job["payload"]["report_id"], "job_id": job["id"]}
 
 @api_router.get("/reports/folders")
 async def get_report_folders(current_user: User = Depends(get_current_user)):
@@ -973,13 +1063,35 @@ async def create_person(person_data: PersonCreate, current_user: User = Depends(
     return person_obj
 
 @api_router.get("/persons", response_model=List[Person])
-async def get_persons(status: Optional[str] = None, current_user: User = Depends(get_current_user)):
+async def get_persons(status: Optional[str] = None, current_user: User = Depends(get_current_user),
+                      _cache: None = Depends(conditional_get("persons")),
+                      fields: Optional[FieldSelection] = Depends(sparse_fields(Person)),
+                      reads: Repositories = Depends(replica_reads("persons"))):
     """Lade alle Personen oder nach Status gefiltert"""
     query = {"is_active": True}
     if status:
         query["status"] = status
     
-    persons = await db.persons.find(query).sort("created_at", -1).to_list(100)
+    persons = await reads.persons.find(query, sort=[("created_at", -1)], limit=100, fields=field_names(fields))
+    if fields:
+        return fields.response(persons)
+    return [Person(**person) for person in persons]
+
+@api_router.get("/persons/search", response_model=List[Person])
+async def search_persons(q: str, limit: int = 20, current_user: User = Depends(get_current_user)):
+    """Personensuche über Name, Aktenzeichen, Adresse und Beschreibung (FTS5 im eingebetteten Modus)"""
+    limit = max(1, min(limit, 100))
+    if store is not None:
+        persons = await store.search_persons(q, limit)
+    else:
+        terms = [re.escape(term) for term in q.split() if term]
+        if not terms:
+            return []
+        query = {"is_active": True, "$and": [
+            {"$or": [{field: {"$regex": term, "$options": "i"}} for field in PERSON_SEARCH_FIELDS]}
+            for term in terms
+        ]}
+        persons = await db.persons.find(query, {"_id": 0}).sort("created_at", -1).to_list(limit)
     return [Person(**person) for person in persons]
 
 @api_router.get("/persons/{person_id}", response_model=Person)
@@ -1033,10 +1145,10 @@ async def delete_person(person_id: str, current_user: User = Depends(get_current
 @api_router.get("/persons/stats/overview")
 async def get_person_stats(current_user: User = Depends(get_current_user)):
     """Statistiken über Personen-Datenbank"""
-    total_persons = await db.persons.count_documents({"is_active": True})
-    missing_persons = await db.persons.count_documents({"is_active": True, "status": "vermisst"})
-    wanted_persons = await db.persons.count_documents({"is_active": True, "status": "gesucht"})
-    found_persons = await db.persons.count_documents({"is_active": True, "status": "gefunden"})
+    total_persons = await stats_db.persons.count_documents({"is_active": True})
+    missing_persons = await stats_db.persons.count_documents({"is_active": True, "status": "vermisst"})
+    wanted_persons = await stats_db.persons.count_documents({"is_active": True, "status": "gesucht"})
+    found_persons = await stats_db.persons.count_documents({"is_active": True, "status": "gefunden"})
     
     return {
         "total_persons": total_persons,
@@ -1099,16 +1211,26 @@ async def broadcast_emergency_alert(
             
         logger.info(f"🚨 EMERGENCY BROADCAST: {broadcast_dict['id']} by {current_user.username}{location_info}")
         
-        # TODO: Implement real-time notification to all users via WebSocket/Push notifications
-        # This would trigger push notifications to all team members with GPS coordinates
+        # Real-time push to all connected users happens right here; only a failed push is retried as a job
+        job_id = None
+        try:
+            await push_emergency_broadcast({k: v for k, v in broadcast_dict.items() if k != "_id"})
+            message = "Emergency alert broadcasted to all team members"
+        except Exception as e:
+            logger.error(f"❌ Emergency broadcast push failed: {e}")
+            if not job_queue.running:
+                raise
+            job_id = (await job_queue.enqueue("emergency.fanout", {"broadcast_id": broadcast_dict["id"]}))["id"]
+            message = "Emergency alert stored, delivery is being retried"
         
         return {
             "success": True,
             "broadcast_id": broadcast_dict["id"],
-            "message": "Emergency alert broadcasted to all team members",
+            "message": message,
             "location_transmitted": location_data is not None,
             "location_status": location_status,
-            "timestamp": broadcast_dict["timestamp"].isoformat()
+            "timestamp": broadcast_dict["timestamp"].isoformat(),
+            "job_id": job_id
         }
         
     except Exception as e:
@@ -1174,13 +1296,18 @@ async def create_incident(incident_data: IncidentCreate, current_user: User = De
     return Incident(**incident_dict)
 
 @api_router.get("/incidents", response_model=List[Incident])
-async def get_incidents(current_user: User = Depends(get_current_user)):
-    incidents = await db.incidents.find().sort("created_at", -1).to_list(100)
+async def get_incidents(current_user: User = Depends(get_current_user),
+                        _cache: None = Depends(conditional_get("incidents")),
+                        fields: Optional[FieldSelection] = Depends(sparse_fields(Incident)),
+                        reads: Repositories = Depends(replica_reads("incidents"))):
+    incidents = await reads.incidents.find(sort=[("created_at", -1)], limit=100, fields=field_names(fields))
+    if fields:
+        return fields.response(incidents)
     return [Incident(**incident) for incident in incidents]
 
 @api_router.get("/incidents/{incident_id}", response_model=Incident)
 async def get_incident(incident_id: str, current_user: User = Depends(get_current_user)):
-    incident = await db.incidents.find_one({"id": incident_id})
+    incident = await repos.incidents.get(incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     return Incident(**incident)
@@ -1207,17 +1334,24 @@ async def update_incident(incident_id: str, updates: Dict[str, Any], current_use
     return incident_obj
 
 @api_router.get("/messages", response_model=List[Message])
-async def get_messages(channel: str = "general", current_user: User = Depends(get_current_user)):
+async def get_messages(channel: str = "general", current_user: User = Depends(get_current_user),
+                       fields: Optional[FieldSelection] = Depends(sparse_fields(Message)),
+                       reads: Repositories = Depends(replica_reads())):
     """Get messages from specified channel"""
     try:
-        messages = await db.messages.find({"channel": channel}).sort("timestamp", 1).limit(100).to_list(100)
+        messages = await reads.messages.find(
+            {"channel": channel}, sort=[("timestamp", 1)], limit=100, fields=field_names(fields)
+        )
+        if fields:
+            return fields.response(messages)
         return [Message(**message) for message in messages]
     except Exception as e:
         # Return empty list if no messages found
         return []
 
 @api_router.get("/messages/private", response_model=List[Message])
-async def get_private_messages(unread_only: bool = False, current_user: User = Depends(get_current_user)):
+async def get_private_messages(unread_only: bool = False, current_user: User = Depends(get_current_user),
+                               fields: Optional[FieldSelection] = Depends(sparse_fields(Message))):
     """Get private messages for current user"""
     query = {
         "channel": "private",
@@ -1228,9 +1362,55 @@ async def get_private_messages(unread_only: bool = False, current_user: User = D
     if unread_only:
         query["is_read"] = {"$ne": True}
     
-    messages = await db.messages.find(query).sort("timestamp", -1).limit(50).to_list(50)
+    messages = await repos.messages.find(query, sort=[("timestamp", -1)], limit=50, fields=field_names(fields))
+    if fields:
+        return fields.response(messages)
     return [Message(**message) for message in messages]
 
+@api_router.get("/messages/search")
+async def search_messages(
+    q: str,
+    channel: Optional[str] = None,
+    sender_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user)
+):
+    """Full-text search over message content and sender names across channels"""
+    if not message_index.ready:
+        raise HTTPException(status_code=503, detail="Search index is still loading", headers={"Retry-After": "5"})
+    
+    limit = max(1, min(limit, 100))
+    found = message_index.search(
+        q,
+        viewer_id=current_user.id,
+        channel=channel,
+        sender_id=sender_id,
+        since=naive_utc(since) if since else None,
+        until=naive_utc(until) if until else None,
+        cursor=cursor,
+        limit=limit
+    )
+    # Embedded mode queries the FTS5 table asynchronously
+    message_ids, next_cursor = await found if inspect.isawaitable(found) else found
+    
+    # Load only the current page from the database, keep index order (newest first)
+    documents = await db.messages.find({"id": {"$in": message_ids}}, {"_id": 0}).to_list(len(message_ids))
+    by_id = {doc["id"]: doc for doc in documents}
+    terms, prefix = parse_query(q)
+    
+    results = []
+    for message_id in message_ids:
+        doc = by_id.get(message_id)
+        if doc is None:
+            continue
+        doc.update(highlight(doc.get("content", ""), terms, prefix))
+        results.append(doc)
+    
+    return {"results": results, "next_cursor": next_cursor}
+
 @api_router.post("/messages", response_model=Message)
 async def send_message(message_data: MessageCreate, current_user: User = Depends(get_current_user)):
     message_dict = message_data.dict()
@@ -1241,6 +1421,7 @@ async def send_message(message_data: MessageCreate, current_user: User = Depends
     message_obj = Message(**message_dict)
     
     await db.messages.insert_one(message_obj.dict())
+    message_index.add(message_obj.dict())
     
     # Emit to socket room
     await sio.emit('new_message', message_obj.dict(), room=message_data.channel)
@@ -1278,74 +1459,48 @@ async def create_notification(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create notification: {str(e)}")
 
-@api_router.get("/locations/live")
-async def get_live_locations(current_user: User = Depends(get_current_user)):
-    """Get live officer locations"""
-    try:
-        # Mock officer locations for demo - in production this would come from GPS tracking
-        officers = await db.users.find({"status": "Im Dienst"}).to_list(100)
-        
-        live_locations = []
-        for i, officer in enumerate(officers):
-            # Generate mock locations around Schwelm area
-            base_lat = 51.2878
-            base_lng = 7.3372
-            
-            location = {
-                "id": officer.get("id", str(uuid.uuid4())),
-                "username": officer.get("username", f"Officer {i+1}"),
-                "status": officer.get("status", "Im Dienst"),
-                "location": {
-                    "lat": base_lat + (i * 0.001) + (0.002 * (i % 3)),
-                    "lng": base_lng + (i * 0.0015) + (0.003 * (i % 2))
-                },
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            live_locations.append(location)
-        
-        return live_locations
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get live locations: {str(e)}")
-
 @api_router.get("/users", response_model=List[User])
-async def get_users(current_user: User = Depends(get_current_user)):
+async def get_users(current_user: User = Depends(get_current_user),
+                    fields: Optional[FieldSelection] = Depends(sparse_fields(User))):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    users = await db.users.find().to_list(100)
+    users = await repos.users.find(limit=100, fields=field_names(fields))
+    if fields:
+        return fields.response(users)
     return [User(**user) for user in users]
 
 @api_router.get("/locations/live")
-async def get_live_locations(current_user: User = Depends(get_current_user)):
-    # Get latest location for each user (last 10 minutes)
+async def get_live_locations(current_user: User = Depends(get_current_user),
+                             reads: Repositories = Depends(replica_reads())):
+    """Get latest location for each officer (last 10 minutes)"""
     cutoff_time = datetime.utcnow() - timedelta(minutes=10)
     
-    pipeline = [
-        {"$match": {"timestamp": {"$gte": cutoff_time}}},
-        {"$sort": {"timestamp": -1}},
-        {"$group": {
-            "_id": "$user_id",
-            "latest_location": {"$first": "$$ROOT"}
-        }}
-    ]
+    locations = await reads.locations.latest_per("user_id", cutoff_time, ("location", "timestamp"))
     
-    locations = await db.locations.aggregate(pipeline).to_list(100)
+    # Add name and work status for the map markers
+    user_ids = [loc["user_id"] for loc in locations]
+    users = await reads.users.find({"id": {"$in": user_ids}}, fields=("id", "username", "status"))
+    users_by_id = {user["id"]: user for user in users}
     
-    # Convert ObjectId to string for JSON serialization
     result = []
     for loc in locations:
-        location_data = loc["latest_location"]
-        if "_id" in location_data:
-            location_data["_id"] = str(location_data["_id"])
-        result.append(location_data)
+        user = users_by_id.get(loc["user_id"], {})
+        result.append({
+            "id": loc["user_id"],
+            "user_id": loc["user_id"],
+            "username": user.get("username"),
+            "status": user.get("status"),
+            "location": loc["location"],
+            "timestamp": loc["timestamp"]
+        })
     
     return result
 
 @api_router.post("/locations/update")
 async def update_location(location_data: LocationUpdate, current_user: User = Depends(get_current_user)):
     location_data.user_id = current_user.id
-    await db.locations.insert_one(location_data.dict())
+    await repos.locations.insert(location_data.dict())
     
     # Emit location update
     await sio.emit('location_updated', location_data.dict())
@@ -1358,10 +1513,10 @@ async def get_admin_stats(current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    total_users = await db.users.count_documents({})
-    total_incidents = await db.incidents.count_documents({})
-    open_incidents = await db.incidents.count_documents({"status": "open"})
-    total_messages = await db.messages.count_documents({})
+    total_users = await stats_db.users.count_documents({})
+    total_incidents = await stats_db.incidents.count_documents({})
+    open_incidents = await stats_db.incidents.count_documents({"status": "open"})
+    total_messages = await stats_db.messages.count_documents({})
     
     return {
         "total_users": total_users,
@@ -1377,11 +1532,7 @@ async def set_online_status(current_user: User = Depends(get_current_user)):
     user_id = current_user.id
     now = datetime.utcnow()
     
-    online_users[user_id] = {
-        "last_seen": now,
-        "username": current_user.username,
-        "socket_id": None  # Will be updated when socket connects
-    }
+    presence.touch(user_id, current_user.username, now)
     
     # Notify all clients about user coming online
     await sio.emit('user_online', {
@@ -1398,14 +1549,7 @@ async def user_heartbeat(current_user: User = Depends(get_current_user)):
     user_id = current_user.id
     now = datetime.utcnow()
     
-    if user_id in online_users:
-        online_users[user_id]["last_seen"] = now
-    else:
-        online_users[user_id] = {
-            "last_seen": now,
-            "username": current_user.username,
-            "socket_id": None
-        }
+    presence.touch(user_id, current_user.username, now)
     
     return {"status": "heartbeat", "timestamp": now}
 
@@ -1415,24 +1559,15 @@ async def get_online_users(current_user: User = Depends(get_current_user)):
     now = datetime.utcnow()
     offline_threshold = timedelta(minutes=2)  # Consider offline after 2 minutes
     
-    online_list = []
-    users_to_remove = []
-    
-    for user_id, data in online_users.items():
-        time_diff = now - data["last_seen"]
-        if time_diff <= offline_threshold:
-            online_list.append({
-                "user_id": user_id,
-                "username": data["username"],
-                "last_seen": data["last_seen"].isoformat(),
-                "minutes_ago": int(time_diff.total_seconds() / 60)
-            })
-        else:
-            users_to_remove.append(user_id)
+    online_list = [{
+        "user_id": record.user_id,
+        "username": record.username,
+        "last_seen": presence.last_seen(record).isoformat(),
+        "minutes_ago": int(presence.seconds_since(record, now) / 60)
+    } for record in presence.online(offline_threshold, now)]
     
     # Clean up offline users
-    for user_id in users_to_remove:
-        del online_users[user_id]
+    for user_id in presence.sweep(offline_threshold, now):
         await sio.emit('user_offline', {'user_id': user_id})
     
     return online_list
@@ -1442,8 +1577,7 @@ async def logout_user(current_user: User = Depends(get_current_user)):
     """Mark user as offline when logging out"""
     user_id = current_user.id
     
-    if user_id in online_users:
-        del online_users[user_id]
+    presence.remove(user_id)
         
     # Notify all clients about user going offline
     await sio.emit('user_offline', {'user_id': user_id})
@@ -1473,6 +1607,8 @@ async def create_first_user(user_data: UserCreate):
     user_dict["status"] = "Im Dienst"
     
     await db.users.insert_one(user_dict)
+    roster.upsert(user_dict)
+    checkin_monitor.track(user_dict)
     
     # Return user without password
     user_dict.pop("hashed_password", None)
@@ -1499,6 +1635,8 @@ async def reset_database():
             collections_cleared += 1
             total_documents_deleted += result.deleted_count
             collection_names.append(collection_name)
+        roster.invalidate()
+        checkin_monitor.invalidate()
         
         return {
             "message": "Database completely reset!",
@@ -1511,7 +1649,7 @@ async def reset_database():
 
 # App Configuration Endpoints
 @api_router.get("/app/config", response_model=AppConfiguration)
-async def get_app_configuration():
+async def get_app_configuration(_cache: None = Depends(conditional_get("app_config"))):
     """Get current app configuration"""
     config = await db.app_config.find_one()
     if not config:
@@ -1571,14 +1709,19 @@ expo_static_path = os.path.join(static_path, "_expo")
 assets_path = os.path.join(static_path, "assets")
 fonts_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../frontend/node_modules/@expo/vector-icons/build/vendor/react-native-vector-icons/Fonts"))
 
+# .br/.gz variants are written on startup (or at build time: python compression.py precompress ../frontend/dist)
+static_mounts = []
+
 if os.path.exists(expo_static_path):
-    # Mount _expo directory to /_expo path
-    app.mount("/_expo", StaticFiles(directory=expo_static_path), name="expo_static")
+    # Mount _expo directory to /_expo path (content-hashed bundle names -> immutable)
+    static_mounts.append(PrecompressedStaticFiles(directory=expo_static_path, immutable=True))
+    app.mount("/_expo", static_mounts[-1], name="expo_static")
     print(f"✅ Expo static files mounted from: {expo_static_path}")
 
 if os.path.exists(assets_path):
     # Mount assets directory to /assets path  
-    app.mount("/assets", StaticFiles(directory=assets_path), name="assets")
+    static_mounts.append(PrecompressedStaticFiles(directory=assets_path))
+    app.mount("/assets", static_mounts[-1], name="assets")
     print(f"✅ Assets mounted from: {assets_path}")
 
 if os.path.exists(fonts_path):
@@ -1604,6 +1747,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for JSON and text above COMPRESSION_MIN_SIZE (large bodies compressed in a thread)
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Latency/size/status per route + Prometheus endpoint (METRICS_PATH, default /metrics)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Attributes MongoDB commands to the current request (query counts, slow-query routes)
+if DB_MONITOR_ENABLED:
+    app.add_middleware(QueryCountMiddleware)
+
+# 304 hits and saved bytes of conditional GETs (ETags from conditional_get and the roster)
+if HTTP_CACHE_ENABLED:
+    app.add_middleware(ConditionalStatsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1624,27 +1783,34 @@ async def check_in(current_user: User = Depends(get_current_user)):
             "status": "ok"
         }
         
-        await db.checkins.insert_one(checkin_data)
+        await repos.checkins.insert(checkin_data)
         
         # Update user's last check-in time and reset missed check-ins
         await db.users.update_one(
             {"id": current_user.id},
-            {"$set": {"last_check_in": datetime.utcnow(), "missed_check_ins": 0}}
+            {"$set": {"last_check_in": checkin_data["timestamp"], "missed_check_ins": 0}}
         )
+        checkin_monitor.checked_in(current_user.id, checkin_data["timestamp"], current_user.check_in_interval)
         
         return checkin_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/checkins")
-async def get_checkins(current_user: User = Depends(get_current_user)):
+async def get_checkins(current_user: User = Depends(get_current_user),
+                       fields: Optional[FieldSelection] = Depends(sparse_fields())):
     """Lade Check-Ins"""
     try:
+        # Explicit limit lets MongoDB do a bounded top-k sort on the timestamp indexes
         if current_user.role == "admin":
-            checkins = await db.checkins.find().sort("timestamp", -1).to_list(100)
+            checkins = await repos.checkins.find(sort=[("timestamp", -1)], limit=100, fields=field_names(fields))
         else:
-            checkins = await db.checkins.find({"user_id": current_user.id}).sort("timestamp", -1).to_list(50)
+            checkins = await repos.checkins.find(
+                {"user_id": current_user.id}, sort=[("timestamp", -1)], limit=50, fields=field_names(fields)
+            )
         
+        if fields:
+            return fields.response(checkins)
         return checkins
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1670,14 +1836,19 @@ async def request_vacation(vacation_data: VacationCreate, current_user: User = D
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/vacations")
-async def get_vacations(current_user: User = Depends(get_current_user)):
+async def get_vacations(current_user: User = Depends(get_current_user),
+                        fields: Optional[FieldSelection] = Depends(sparse_fields())):
     """Lade Urlaubsanträge"""
     try:
         if current_user.role == "admin":
-            vacations = await db.vacations.find().sort("created_at", -1).to_list(100)
+            vacations = await db.vacations.find({}, projection(fields, {"_id": 0})).sort("created_at", -1).to_list(100)
         else:
-            vacations = await db.vacations.find({"user_id": current_user.id}).sort("created_at", -1).to_list(100)
+            vacations = await db.vacations.find(
+                {"user_id": current_user.id}, projection(fields, {"_id": 0})
+            ).sort("created_at", -1).to_list(100)
         
+        if fields:
+            return fields.response(vacations)
         return vacations
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1691,18 +1862,22 @@ async def create_district(district_data: DistrictCreate, current_user: User = De
     
     district_dict = district_data.dict()
     district_dict['id'] = str(uuid.uuid4())
-    district_dict['created_at'] = datetime.utcnow()
+    district_dict['created_at'] = district_dict['updated_at'] = datetime.utcnow()
     
     await db.districts.insert_one(district_dict)
     return district_dict
 
 @app.get("/api/admin/districts")
-async def get_districts(current_user: User = Depends(get_current_user)):
+async def get_districts(current_user: User = Depends(get_current_user),
+                        _cache: None = Depends(conditional_get("districts", per_user=True)),
+                        fields: Optional[FieldSelection] = Depends(sparse_fields())):
     """Alle Bezirke abrufen"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    districts = await db.districts.find().to_list(100)
+    districts = await db.districts.find({}, projection(fields, {"_id": 0})).to_list(100)
+    if fields:
+        return fields.response(districts)
     return districts
 
 @app.post("/api/admin/teams")
@@ -1713,7 +1888,7 @@ async def create_team(team_data: TeamCreate, current_user: User = Depends(get_cu
     
     team_dict = team_data.dict()
     team_dict['id'] = str(uuid.uuid4())
-    team_dict['created_at'] = datetime.utcnow()
+    team_dict['created_at'] = team_dict['updated_at'] = datetime.utcnow()
     team_dict['members'] = []
     team_dict['status'] = 'Einsatzbereit'
     
@@ -1721,12 +1896,16 @@ async def create_team(team_data: TeamCreate, current_user: User = Depends(get_cu
     return team_dict
 
 @app.get("/api/admin/teams")
-async def get_teams(current_user: User = Depends(get_current_user)):
+async def get_teams(current_user: User = Depends(get_current_user),
+                    _cache: None = Depends(conditional_get("teams", per_user=True)),
+                    fields: Optional[FieldSelection] = Depends(sparse_fields())):
     """Alle Teams abrufen"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    teams = await db.teams.find().to_list(100)
+    teams = await db.teams.find({}, projection(fields, {"_id": 0})).to_list(100)
+    if fields:
+        return fields.response(teams)
     return teams
 
 @app.put("/api/admin/assign-user")
@@ -1741,7 +1920,7 @@ async def assign_user_to_team_district(assignment: TeamAssignment, current_user:
         # User zu Team hinzufügen
         await db.teams.update_one(
             {"id": assignment.team_id},
-            {"$addToSet": {"members": assignment.user_id}}
+            {"$addToSet": {"members": assignment.user_id}, "$set": {"updated_at": datetime.utcnow()}}
         )
     
     if assignment.district_id:
@@ -1862,7 +2041,7 @@ async def create_district(district_data: DistrictCreate, current_user: User = De
     
     district_dict = district_data.dict()
     district_dict['id'] = str(uuid.uuid4())
-    district_dict['created_at'] = datetime.utcnow()
+    district_dict['created_at'] = district_dict['updated_at'] = datetime.utcnow()
     
     await db.districts.insert_one(district_dict)
     return district_dict
@@ -1884,7 +2063,7 @@ async def create_team(team_data: TeamCreate, current_user: User = Depends(get_cu
     
     team_dict = team_data.dict()
     team_dict['id'] = str(uuid.uuid4())
-    team_dict['created_at'] = datetime.utcnow()
+    team_dict['created_at'] = team_dict['updated_at'] = datetime.utcnow()
     team_dict['members'] = []
     team_dict['status'] = 'Einsatzbereit'
     
@@ -1912,7 +2091,7 @@ async def assign_user_to_team_district(assignment: TeamAssignment, current_user:
         # User zu Team hinzufügen
         await db.teams.update_one(
             {"id": assignment.team_id},
-            {"$addToSet": {"members": assignment.user_id}}
+            {"$addToSet": {"members": assignment.user_id}, "$set": {"updated_at": datetime.utcnow()}}
         )
     
     if assignment.district_id:
@@ -2026,12 +2205,403 @@ async def get_team_status(current_user: User = Depends(get_current_user)):
     
     return team_status_list
 
+# Archiv-Abfragen (Parquet, ohne Wiederherstellung in MongoDB)
+@app.get("/api/archive/locations")
+async def get_archived_locations(
+    start: datetime,
+    end: datetime,
+    user_id: Optional[str] = None,
+    limit: int = 10000,
+    current_user: User = Depends(get_current_user)
+):
+    """Archivierte Standort-Verläufe abrufen"""
+    if current_user.role != "admin":
+        # Beamte sehen nur ihren eigenen Verlauf
+        if user_id and user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        user_id = current_user.id
+    
+    points = await retention_manager.query("locations", start, end, {"user_id": user_id}, limit=min(limit, 100000))
+    return {"user_id": user_id, "start": start, "end": end, "count": len(points), "points": points}
+
+@app.get("/api/archive/messages")
+async def get_archived_messages(
+    start: datetime,
+    end: datetime,
+    channel: Optional[str] = None,
+    sender_id: Optional[str] = None,
+    limit: int = 1000,
+    current_user: User = Depends(get_current_user)
+):
+    """Archivierte Nachrichten abrufen"""
+    messages = await retention_manager.query(
+        "messages", start, end, {"channel": channel, "sender_id": sender_id}, limit=min(limit, 10000)
+    )
+    if current_user.role != "admin":
+        # Privatnachrichten nur für Beteiligte
+        messages = [
+            m for m in messages
+            if not m.get("recipient_id") or current_user.id in (m.get("recipient_id"), m.get("sender_id"))
+        ]
+    return messages
+
+# Einsatz-Archiv (incidents_archive, Bilder nur über die Bild-Route)
+@app.get("/api/archive/incidents")
+async def get_archived_incidents(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    priority: Optional[str] = None,
+    completed_by: Optional[str] = None,
+    before: Optional[datetime] = None,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user)
+):
+    """Archivierte Einsätze, neueste zuerst; weiterblättern mit before=archived_at des letzten Eintrags"""
+    # archived_at ist naive UTC gespeichert
+    start, end, before = (naive_utc(value) if value else None for value in (start, end, before))
+    return await incident_archive.browse(start, end, priority, completed_by, before, limit)
+
+@app.get("/api/archive/incidents/stats")
+async def get_archived_incident_stats(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Abgeschlossene Einsätze pro Priorität, Beamter und Tag mit mittlerer Bearbeitungszeit"""
+    end = naive_utc(end) if end else datetime.utcnow()
+    start = naive_utc(start) if start else end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    return await incident_archive.stats(start, end)
+
+@app.get("/api/archive/incidents/{incident_id}")
+async def get_archived_incident(incident_id: str, current_user: User = Depends(get_current_user)):
+    """Archivierter Einsatz mit Bild-Verweisen"""
+    archived = await incident_archive.get(incident_id)
+    if not archived:
+        raise HTTPException(status_code=404, detail="Archived incident not found")
+    return {**archived, "image_refs": image_refs(incident_id, archived.get("image_count", 0))}
+
+@app.get("/api/archive/incidents/{incident_id}/images/{index}")
+async def get_archived_incident_image(incident_id: str, index: int, current_user: User = Depends(get_current_user)):
+    """Einzelnes Bild eines archivierten Einsatzes (base64)"""
+    image = await incident_archive.image(incident_id, index)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return {"incident_id": incident_id, "index": index, "image": image}
+
+@app.get("/api/tracks/{user_id}/replay")
+async def replay_track(
+    user_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Streifen-Verlauf einer Schicht als kompakte Delta-Arrays"""
+    if current_user.role != "admin" and user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # Zeitzonen-Angaben (…Z, +02:00) wie gespeichert als naive UTC vergleichen
+    end = naive_utc(end) if end else datetime.utcnow()
+    start = naive_utc(start) if start else end - timedelta(hours=12)  # Standard: eine Schicht
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    return await track_history.replay(user_id, start, end)
+
+@app.get("/api/admin/indexes")
+async def get_index_status(check: bool = False, current_user: User = Depends(get_current_user)):
+    """Index-Status: fehlende, unbenutzte und nicht deklarierte Indizes (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    report = await index_manager.reconcile(create=False)
+    if check:
+        report["hot_query_failures"] = await check_hot_queries(db)
+    return report
+
+@app.get("/api/admin/slow-queries")
+async def get_slow_queries(limit: int = 50, current_user: User = Depends(get_current_user)):
+    """Zuletzt protokollierte langsame MongoDB-Befehle mit Route (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return {
+        "enabled": DB_MONITOR_ENABLED,
+        "threshold_ms": command_monitor.slow_seconds * 1000,
+        "slow_queries": command_monitor.recent_slow_queries(limit)
+    }
+
+@app.get("/api/admin/db-pool")
+async def get_db_pool_status(current_user: User = Depends(get_current_user)):
+    """MongoDB Pool-Auslastung, Warteschlange und Server-Status (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if store is not None:
+        return {"backend": "sqlite"}
+    
+    return {"backend": "mongodb", **pool_status(client), "read_routing": read_router.status()}
+
+@app.get("/api/admin/cdc")
+async def get_change_feed_status(current_user: User = Depends(get_current_user)):
+    """Change-Feed Modus, Wasserstände und Ereignisse pro Collection (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return change_feed.status()
+
+@app.get("/api/admin/checkin-monitor")
+async def get_checkin_monitor_status(current_user: User = Depends(get_current_user)):
+    """Überwachte Beamte, nächste Check-In-Frist und letzter Durchlauf (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return checkin_monitor.status()
+
+@app.get("/api/admin/http-cache")
+async def get_http_cache_stats(current_user: User = Depends(get_current_user)):
+    """304-Treffer und eingesparte Bytes pro Route (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return {"enabled": HTTP_CACHE_ENABLED, "routes": conditional_stats()}
+
+@app.get("/api/admin/fieldsets")
+async def get_fieldset_stats(current_user: User = Depends(get_current_user)):
+    """Anzahl und durchschnittliche Größe der ?fields=-Antworten pro Route (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return {"routes": fieldset_stats()}
+
+@app.get("/api/admin/event-loop")
+async def get_event_loop_status(current_user: User = Depends(get_current_user)):
+    """Event-Loop Verzögerung und erkannte Blockaden mit Stacktrace (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return {"enabled": LOOP_MONITOR_ENABLED, **loop_monitor.status()}
+
+@app.get("/api/admin/retention")
+async def get_retention_status(current_user: User = Depends(get_current_user)):
+    """Status der Datenaufbewahrung (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return {
+        "enabled": RETENTION_ENABLED,
+        "archive_dir": str(retention_manager.archive_dir),
+        "policies": {
+            name: {"raw_days": policy.raw_days, "ttl_index": policy.ttl_index}
+            for name, policy in retention_manager.policies.items()
+        },
+        "last_run": retention_manager.last_run
+    }
+
+@app.post("/api/admin/retention/run")
+async def run_retention(current_user: User = Depends(get_current_user)):
+    """Archivierung als Job einreihen bzw. ohne Dispatcher sofort ausführen (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if not job_queue.running:
+        return await retention_manager.run_once()
+    return await job_queue.enqueue("retention.run", {"requested_by": current_user.id}, unique_key="retention.run")
+
+@app.get("/api/admin/jobs")
+async def get_jobs_status(current_user: User = Depends(get_current_user)):
+    """Jobs pro Typ und Status, Latenzen und letzte Fehlschläge (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    return await job_queue.status()
+
+@app.get("/api/admin/jobs/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Einzelner Job mit Ergebnis bzw. letztem Fehler (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/admin/jobs/{job_id}/retry")
+async def retry_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Fehlgeschlagenen Job erneut einreihen (nur Admin)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if not await job_queue.retry(job_id):
+        raise HTTPException(status_code=404, detail="No failed job with this id")
+    return {"status": "queued", "job_id": job_id}
+
 # Include router - MUST be after all endpoint definitions
 app.include_router(api_router)
 
+# ================================================
+# CHANGE FEED
+# ================================================
+
+async def on_data_change(event: ChangeEvent):
+    """Invalidate caches and push data_changed for changes from any app server or direct DB writes"""
+    change_tracker.bump(event.collection)
+    if event.collection == "users":
+        if event.operation == "delete" and event.id:
+            roster.remove(event.id)
+            checkin_monitor.untrack(event.id)
+        elif event.operation in ("delete", "invalidate"):
+            roster.invalidate()
+            checkin_monitor.invalidate()
+        elif event.document is not None:
+            roster.upsert(event.document)
+            checkin_monitor.track(event.document)
+        # Nur die öffentlichen Roster-Felder, keine Hashes oder Kontaktdaten darüber hinaus
+        document = {key: event.document[key] for key in ROSTER_FIELDS if key in event.document} \
+            if event.document is not None and event.operation != "delete" else None
+        await sio.emit("data_changed", {**event.payload(document=False), "document": document})
+    elif event.collection == "reports":
+        # Berichte sehen nur Autor und Admins; Clients laden den Bericht selbst nach
+        author_id = (event.document or {}).get("author_id")
+        rooms = ["admins"] + ([f"user_{author_id}"] if author_id else [])
+        await sio.emit("data_changed", event.payload(document=False), room=rooms)
+    elif event.collection in ("teams", "districts"):
+        # Teams und Bezirke verwaltet und sieht nur die Administration
+        await sio.emit("data_changed", event.payload(), room="admins")
+    else:
+        await sio.emit("data_changed", event.payload())
+
+change_feed.subscribe(on_data_change)
+
+# ================================================
+# CHECK-IN-ÜBERWACHUNG
+# ================================================
+
+async def alert_missed_check_ins(alerts: List[Dict[str, Any]]):
+    """Send one batch of missed check-ins to all admins and each team leader's share to the leader"""
+    await sio.emit("missed_check_ins", {"alerts": alerts}, room="admins")
+    team_ids = {alert["team_id"] for alert in alerts if alert["team_id"]}
+    if not team_ids:
+        return
+    teams = await db.teams.find({"id": {"$in": list(team_ids)}}, {"_id": 0, "id": 1, "leader_id": 1}).to_list(None)
+    leaders = {team["id"]: team["leader_id"] for team in teams if team.get("leader_id")}
+    by_leader: Dict[str, List[Dict[str, Any]]] = {}
+    for alert in alerts:
+        leader_id = leaders.get(alert["team_id"])
+        if leader_id and leader_id != alert["user_id"]:
+            by_leader.setdefault(leader_id, []).append(alert)
+    for leader_id, leader_alerts in by_leader.items():
+        await sio.emit("missed_check_ins", {"alerts": leader_alerts}, room=f"user_{leader_id}")
+
+checkin_monitor.on_missed = alert_missed_check_ins
+
+# ================================================
+# JOBS
+# ================================================
+
+@job_queue.job("incident.archive", max_attempts=8)
+async def archive_incident(payload: Dict[str, Any]):
+    """Move a completed incident into incidents_archive and write its archive report"""
+    archived = await incident_archive.archive(
+        payload["incident_id"], payload["report_id"], payload["completed_by_id"], payload["completed_by_name"],
+        payload["completed_at"])
+    if archived is None:
+        raise PermanentJobError(f"Incident {payload['incident_id']} not found")
+    await sio.emit('incident_completed', {
+        'incident_id': archived["id"],
+        'completed_by': archived["completed_by_name"],
+        'archived_as': archived["report_id"]
+    })
+    return {"report_id": archived["report_id"], "images": archived.get("image_count", 0)}
+
+@job_queue.job("incident_archive.migrate", max_attempts=3, concurrency=1, timeout_seconds=3600)
+async def migrate_archive_reports(payload: Dict[str, Any]):
+    """Move images out of archive reports written before incidents_archive existed"""
+    return {"migrated": await incident_archive.migrate_legacy_reports()}
+
+async def push_emergency_broadcast(broadcast: Dict[str, Any]):
+    """Push an emergency broadcast to all connected users and mark it delivered"""
+    await sio.emit('emergency_broadcast', broadcast)
+    await db.emergency_broadcasts.update_one(
+        {"id": broadcast["id"]},
+        {"$set": {"status": "delivered", "delivered_at": datetime.utcnow()}}
+    )
+
+@job_queue.job("emergency.fanout", max_attempts=10, reserved=True)
+async def fan_out_emergency_broadcast(payload: Dict[str, Any]):
+    """Retry the push of an emergency broadcast that failed in the request"""
+    broadcast = await db.emergency_broadcasts.find_one({"id": payload["broadcast_id"]}, {"_id": 0})
+    if not broadcast:
+        raise PermanentJobError(f"Broadcast {payload['broadcast_id']} not found")
+    await push_emergency_broadcast(broadcast)
+    return {"online_users": len(presence.online_ids())}
+
+@job_queue.job("retention.run", max_attempts=3, concurrency=1, timeout_seconds=3600)
+async def run_retention_job(payload: Dict[str, Any]):
+    run = await retention_manager.run_once()
+    return {"duration_seconds": run["duration_seconds"], "collections": run["collections"]}
+
+# Wrap all Socket.IO handlers for per-event metrics - MUST be after all @sio.event definitions
+if METRICS_ENABLED:
+    instrument_socketio(sio)
+
+# Hintergrunddienste beim Shutdown beenden, bevor die Datenbank-Verbindungen schließen
+background_tasks: List[asyncio.Task] = []
+
+
+def _background(coroutine) -> None:
+    background_tasks.append(asyncio.create_task(coroutine))
+
+@app.on_event("startup")
+async def start_background_services():
+    if store is not None:
+        await store.open()
+    else:
+        await test_db_connection()
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    # Time-series collections must exist before the first insert creates regular ones
+    if timeseries_enabled() and store is None:
+        try:
+            await ensure_timeseries_collections(db)
+        except Exception as e:
+            logger.error(f"❌ Time-series setup failed: {e}")
+    _background(index_manager.run_in_background())
+    # TTL-Indizes (z.B. jobs.finished_at) löscht im eingebetteten Modus der Store selbst
+    if store is not None:
+        _background(store.run_ttl_forever())
+    # Build the message search index without delaying readiness (FTS5 needs no warm-up)
+    if store is None:
+        _background(build_index_from_db(message_index, db))
+    if RETENTION_ENABLED:
+        _background(retention_manager.run_forever())
+    _background(track_history.run_forever())
+    if CDC_ENABLED:
+        _background(change_feed.run_forever())
+    if JOBS_ENABLED:
+        _background(job_queue.run_forever())
+    if CHECKIN_MONITOR_ENABLED:
+        _background(checkin_monitor.run_forever())
+    if JOBS_ENABLED:
+        try:
+            await job_queue.enqueue("incident_archive.migrate", {}, unique_key="incident_archive.migrate")
+        except Exception as e:
+            logger.error(f"❌ Could not queue archive report migration: {e}")
+    if static_mounts:
+        _background(precompress_static(static_mounts))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    loop_monitor.stop()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
     client.close()
+    if store is not None:
+        await store.close()
 
 # Server starten
 if __name__ == "__main__":
@@ -0,0 +1,1544 @@
+# 🪶 Eingebetteter SQLite-Speicher für Stadtwache
+# Einzelplatz- und Offline-Wachen ohne MongoDB: STORAGE_BACKEND=sqlite legt alle Collections in der
+# SQLite-Datei aus database_config.get_sqlite_url() ab. Eine Motor-kompatible Fassade (Client,
+# Datenbank, Collection, Cursor) hält server.py, retention.py, track_history.py usw. unverändert.
+#
+#   - WAL, synchronous=NORMAL, mmap und Statement-Cache pro Verbindung
+#   - Lese-Pool mit mehreren Verbindungen, genau ein Schreiber (BEGIN IMMEDIATE)
+#   - Tabellenlayout der Repository-Schicht: pk, _id, indizierte Spalten, Dokument als JSON
+#   - FTS5 für Nachrichten- und Personensuche, gepflegt über Trigger
+
+import os
+import re
+import copy
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import sqlalchemy as sa
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
+from pymongo.results import DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from database_config import get_sqlite_url
+from message_search import MIN_TOKEN_LENGTH, TOKEN_PATTERN
+from repositories import (ENTITIES, build_metadata, decode_document, decode_value, encode_document,
+                          encode_value, entity_row, naive_utc, sql_repositories)
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()  # "mongo" oder "sqlite"
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "32"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+# Vorbereitete Statements pro Verbindung (sqlite3-Cache, Standard 128)
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "512"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # WAL + NORMAL: kein fsync pro Commit
+# TTL-Indizes: MongoDB löscht abgelaufene Dokumente etwa minütlich, der eingebettete Store im selben Takt
+SQLITE_TTL_INTERVAL_SECONDS = float(os.getenv("SQLITE_TTL_INTERVAL_SECONDS", "60"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}",
+    f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=OFF",
+)
+
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+# Volltext-Spalten je Collection (rowid der FTS-Tabelle = pk der Collection)
+FTS_COLUMNS = {
+    "messages": ("content", "sender_name"),
+    "persons": ("first_name", "last_name", "case_number", "address", "description", "last_seen_location"),
+}
+PERSON_SEARCH_FIELDS = FTS_COLUMNS["persons"]
+
+INDEX_REGISTRY = "_store_indexes"
+# Trigger tragen jeden Pfad ein, der in einem Dokument ein Array enthält: nur auf diesen Feldern prüft SQL
+# zusätzlich die Mitgliedschaft ({"members": user_id}), alle anderen vergleicht es als Skalar,
+# damit die Ausdrucks-Indizes greifen
+ARRAY_REGISTRY = "_store_arrays"
+CURSOR_PAGE_SIZE = 1000
+
+
+def embedded_enabled() -> bool:
+    return STORAGE_BACKEND == "sqlite"
+
+# ================================================
+# ENGINES
+# ================================================
+
+def _configure(dbapi_connection, immediate: bool):
+    cursor = dbapi_connection.cursor()
+    for pragma in PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+    if immediate:
+        # Transaktionen selbst steuern: BEGIN IMMEDIATE statt des impliziten BEGIN von sqlite3
+        dbapi_connection.isolation_level = None
+
+
+def create_sqlite_engines(url: Optional[str] = None):
+    """(reader, writer) engines on one database file.
+
+    Readers run concurrently thanks to WAL; all writes go through a single
+    connection that takes the write lock up front, so transactions never
+    fail on a lock upgrade and waiting happens in the pool, not in busy loops.
+    """
+    url = url or get_sqlite_url()
+    connect_args = {"check_same_thread": False, "cached_statements": SQLITE_STATEMENT_CACHE}
+    reader = create_async_engine(url, poolclass=AsyncAdaptedQueuePool, pool_size=SQLITE_READ_POOL_SIZE,
+                                 max_overflow=0, connect_args=connect_args)
+    writer = create_async_engine(url, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0,
+                                 pool_timeout=60, connect_args=connect_args)
+
+    sa.event.listen(reader.sync_engine, "connect", lambda conn, _record: _configure(conn, immediate=False))
+    sa.event.listen(writer.sync_engine, "connect", lambda conn, _record: _configure(conn, immediate=True))
+    sa.event.listen(writer.sync_engine, "begin", lambda conn: conn.exec_driver_sql("BEGIN IMMEDIATE"))
+    return reader, writer
+
+
+def _database_path(url: str) -> Optional[Path]:
+    path = url.split(":///", 1)[-1]
+    return None if not path or path == ":memory:" else Path(path)
+
+# ================================================
+# DOKUMENT-LOGIK (Filter, Updates, Projektion)
+# ================================================
+
+_MISSING = object()
+_TYPE_ORDER = {type(None): 0, int: 1, float: 1, str: 2, dict: 3, list: 4, ObjectId: 5, bool: 6, datetime: 7}
+
+
+def _get(doc: Any, path: str) -> Any:
+    for part in path.split("."):
+        if isinstance(doc, dict):
+            doc = doc.get(part, _MISSING)
+        elif isinstance(doc, list) and part.isdigit():
+            doc = doc[int(part)] if int(part) < len(doc) else _MISSING
+        else:
+            return _MISSING
+        if doc is _MISSING:
+            return _MISSING
+    return doc
+
+
+def _set(doc: Dict[str, Any], path: str, value: Any):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset(doc: Dict[str, Any], path: str):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def _sort_key(value: Any):
+    if value is _MISSING:
+        value = None
+    return (_TYPE_ORDER.get(type(value), 8), value if value is not None else 0)
+
+
+def _comparable(left: Any, right: Any) -> bool:
+    if isinstance(left, bool) or isinstance(right, bool):
+        return isinstance(left, bool) and isinstance(right, bool)
+    for kind in ((int, float), str, datetime):
+        if isinstance(left, kind) and isinstance(right, kind):
+            return True
+    return type(left) is type(right)
+
+
+def _utc(value: Any) -> Any:
+    """Datetimes as stored (naive UTC), so aware filter values compare like in SQL"""
+    return naive_utc(value) if isinstance(value, datetime) else value
+
+
+def _equals(value: Any, operand: Any) -> bool:
+    if value is _MISSING:
+        return operand is None
+    operand = _utc(operand)
+    if value == operand and _comparable(value, operand) or (value is None and operand is None):
+        return True
+    return isinstance(value, list) and not isinstance(operand, list) and any(
+        item == operand and _comparable(item, operand) for item in value)
+
+
+def _compare(value: Any, operand: Any, test: Callable[[Any, Any], bool]) -> bool:
+    operand = _utc(operand)
+    candidates = value if isinstance(value, list) else [value]
+    return any(item is not _MISSING and item is not None and _comparable(item, operand) and test(item, operand)
+               for item in candidates)
+
+
+def _match_operator(value: Any, operator: str, operand: Any, options: str = "") -> bool:
+    if operator == "$eq":
+        return _equals(value, operand)
+    if operator == "$ne":
+        return not _equals(value, operand)
+    if operator == "$in":
+        return any(_equals(value, item) for item in operand)
+    if operator == "$nin":
+        return not any(_equals(value, item) for item in operand)
+    if operator == "$gt":
+        return _compare(value, operand, lambda a, b: a > b)
+    if operator == "$gte":
+        return _compare(value, operand, lambda a, b: a >= b)
+    if operator == "$lt":
+        return _compare(value, operand, lambda a, b: a < b)
+    if operator == "$lte":
+        return _compare(value, operand, lambda a, b: a <= b)
+    if operator == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if operator == "$regex":
+        flags = re.IGNORECASE if "i" in options else 0
+        pattern = operand if isinstance(operand, re.Pattern) else re.compile(operand, flags)
+        candidates = value if isinstance(value, list) else [value]
+        return any(isinstance(item, str) and pattern.search(item) for item in candidates)
+    if operator == "$size":
+        return isinstance(value, list) and len(value) == operand
+    if operator == "$all":
+        return isinstance(value, list) and all(_equals(value, item) for item in operand)
+    if operator == "$not":
+        return not _match_field(value, operand)
+    raise OperationFailure(f"Operator {operator} is not supported by the embedded store")
+
+
+def _match_field(value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        options = condition.get("$options", "")
+        return all(_match_operator(value, operator, operand, options)
+                   for operator, operand in condition.items() if operator != "$options")
+    if isinstance(condition, re.Pattern):
+        return _match_operator(value, "$regex", condition)
+    return _equals(value, condition)
+
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a MongoDB filter against a document in Python"""
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(matches(doc, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, part) for part in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, part) for part in condition):
+                return False
+        elif key.startswith("$"):
+            raise OperationFailure(f"Operator {key} is not supported by the embedded store")
+        elif not _match_field(_get(doc, key), condition):
+            return False
+    return True
+
+
+def apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool = False) -> Dict[str, Any]:
+    """Apply $set/$unset/$inc/$push/$addToSet/$pull/... to a copy of ``doc``"""
+    if not update or not all(key.startswith("$") for key in update):
+        raise ValueError("update only works with $ operators")
+    doc = copy.deepcopy(doc)
+    for operator, fields in update.items():
+        for path, operand in fields.items():
+            current = _get(doc, path)
+            if operator == "$set" or (operator == "$setOnInsert" and inserting):
+                _set(doc, path, operand)
+            elif operator == "$setOnInsert":
+                continue
+            elif operator == "$unset":
+                _unset(doc, path)
+            elif operator == "$inc":
+                _set(doc, path, (0 if current in (_MISSING, None) else current) + operand)
+            elif operator in ("$min", "$max"):
+                if current in (_MISSING, None) or (operand < current if operator == "$min" else operand > current):
+                    _set(doc, path, operand)
+            elif operator in ("$push", "$addToSet"):
+                items = operand["$each"] if isinstance(operand, dict) and "$each" in operand else [operand]
+                values = list(current) if isinstance(current, list) else []
+                for item in items:
+                    if operator == "$push" or item not in values:
+                        values.append(item)
+                _set(doc, path, values)
+            elif operator == "$pull":
+                if isinstance(current, list):
+                    _set(doc, path, [item for item in current if not (
+                        matches(item, operand) if isinstance(operand, dict) and isinstance(item, dict)
+                        else _match_field(item, operand))])
+            elif operator == "$currentDate":
+                _set(doc, path, datetime.utcnow())
+            else:
+                raise OperationFailure(f"Update operator {operator} is not supported by the embedded store")
+    return doc
+
+
+def project(doc: Dict[str, Any], projection: Optional[Any]) -> Dict[str, Any]:
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {name: 1 for name in projection}
+    include_id = bool(projection.get("_id", 1))
+    fields = {name: flag for name, flag in projection.items() if name != "_id"}
+    if fields and any(fields.values()):
+        result = {"_id": doc["_id"]} if include_id and "_id" in doc else {}
+        for name in fields:
+            value = _get(doc, name)
+            if value is not _MISSING:
+                _set(result, name, value)
+        return result
+    result = copy.copy(doc) if fields or not include_id else doc
+    if not include_id:
+        result = {key: value for key, value in result.items() if key != "_id"}
+    for name in fields:
+        _unset(result, name)
+    return result
+
+
+def _upsert_seed(query: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Equality parts of a filter become fields of an upserted document"""
+    seed: Dict[str, Any] = {}
+    for key, condition in (query or {}).items():
+        if key.startswith("$"):
+            continue
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            if "$eq" in condition:
+                _set(seed, key, condition["$eq"])
+            continue
+        _set(seed, key, condition)
+    return seed
+
+
+def _sort_spec(key_or_list: Any, direction: Optional[int] = None) -> List[Tuple[str, int]]:
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(name, order) for name, order in key_or_list]
+
+
+def _sort_documents(docs: List[Dict[str, Any]], sort: Sequence[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    for name, direction in reversed(sort):
+        docs.sort(key=lambda doc: _sort_key(_get(doc, name)), reverse=direction == -1)
+    return docs
+
+# ================================================
+# AGGREGATION (Teilmenge)
+# ================================================
+
+def _expression(doc: Dict[str, Any], expression: Any) -> Any:
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict):
+        return {key: _expression(doc, value) for key, value in expression.items()}
+    return expression
+
+
+def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    groups: Dict[str, Dict[str, Any]] = {}
+    for doc in docs:
+        key = _expression(doc, spec["_id"])
+        group = groups.setdefault(encode_value(key), {"_id": key, "_count": {}})
+        for name, accumulator in spec.items():
+            if name == "_id":
+                continue
+            (operator, argument), = accumulator.items()
+            value = _expression(doc, argument)
+            if operator == "$first":
+                group.setdefault(name, value)
+            elif operator == "$last":
+                group[name] = value
+            elif operator == "$sum":
+                group[name] = group.get(name, 0) + (value if isinstance(value, (int, float)) else 0)
+            elif operator == "$avg":
+                if isinstance(value, (int, float)):
+                    group[name] = group.get(name, 0) + value
+                    group["_count"][name] = group["_count"].get(name, 0) + 1
+            elif operator in ("$min", "$max"):
+                if value is not None and (name not in group or (
+                        value < group[name] if operator == "$min" else value > group[name])):
+                    group[name] = value
+            elif operator in ("$push", "$addToSet"):
+                values = group.setdefault(name, [])
+                if operator == "$push" or value not in values:
+                    values.append(value)
+            else:
+                raise NotImplementedError(f"Accumulator {operator} is not supported by the embedded store")
+    results = []
+    for group in groups.values():
+        for name, count in group.pop("_count").items():
+            group[name] = group[name] / count
+        results.append(group)
+    return results
+
+
+def run_pipeline(docs: List[Dict[str, Any]], pipeline: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [doc for doc in docs if matches(doc, spec)]
+        elif name == "$sort":
+            docs = _sort_documents(docs, list(spec.items()))
+        elif name == "$limit":
+            docs = docs[:spec]
+        elif name == "$skip":
+            docs = docs[spec:]
+        elif name == "$project":
+            docs = [project(doc, spec) for doc in docs]
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        else:
+            # $indexStats, $lookup, ... gibt es nur auf einem MongoDB-Server
+            raise NotImplementedError(f"Pipeline stage {name} is not supported by the embedded store")
+    return docs
+
+# ================================================
+# SQL-ÜBERSETZUNG
+# ================================================
+
+def _json_path(name: str) -> str:
+    return "$" + "".join(f'."{part}"' for part in name.split("."))
+
+
+class _Untranslatable(Exception):
+    """Filter part that is evaluated in Python instead"""
+
+
+def _json_operand(value: Any) -> Any:
+    """Bind value for comparisons with json_extract(): objects compare as their JSON text"""
+    if isinstance(value, (datetime, ObjectId)):
+        return encode_value(value)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise _Untranslatable()
+
+
+class _TableView:
+    """Field expressions for one collection table"""
+
+    def __init__(self, table: sa.Table, typed: Iterable[str] = (), arrays: Iterable[str] = ()):
+        self.table = table
+        self.typed = set(typed)
+        self.arrays = frozenset(arrays)
+
+    def is_json(self, name: str) -> bool:
+        return name != "_id" and name not in self.typed
+
+    def is_array(self, name: str) -> bool:
+        return self.is_json(name) and name in self.arrays
+
+    def inside_array(self, name: str) -> bool:
+        """Path below an array field ("edit_history.editor"): json_extract() does not reach the elements"""
+        parts = name.split(".")
+        return any(".".join(parts[:count]) in self.arrays for count in range(1, len(parts)))
+
+    def field(self, name: str):
+        if name == "_id":
+            return self.table.c._id
+        if name in self.typed:
+            return self.table.c[name]
+        # Pfad als Literal: nur dann nutzt SQLite die Ausdrucks-Indizes auf json_extract()
+        return sa.func.json_extract(self.table.c.doc, sa.literal_column(f"'{_json_path(name)}'"))
+
+    def operand(self, name: str, value: Any) -> Any:
+        if name == "_id":
+            return encode_value(value)
+        if name in self.typed:
+            if isinstance(value, (dict, list)):
+                raise _Untranslatable()
+            return naive_utc(value) if isinstance(value, datetime) else value
+        return _json_operand(value)
+
+    def _contains(self, name: str, values: List[Any]):
+        """Array fields: any element equal to one of ``values`` (None: any null element)"""
+        path = sa.literal_column(f"'{_json_path(name)}'")
+        elements = sa.func.json_each(self.table.c.doc, path).table_valued("value", "type")
+        element = elements.c.type == "null" if values is None else elements.c.value.in_(values)
+        return sa.and_(sa.func.json_type(self.table.c.doc, path) == "array",
+                       sa.exists(sa.select(sa.literal(1)).select_from(elements).where(element)))
+
+    def equals(self, name: str, value: Any):
+        column = self.field(name)
+        if value is None:
+            return sa.or_(column.is_(None), self._contains(name, None)) if self.is_array(name) else column.is_(None)
+        operand = self.operand(name, value)
+        if not self.is_array(name):
+            return column == operand
+        return sa.or_(column == operand, self._contains(name, [operand]))
+
+    def one_of(self, name: str, values: Sequence[Any]):
+        values = list(values)
+        column = self.field(name)
+        present = [self.operand(name, value) for value in values if value is not None]
+        conditions = [column.in_(present)] if present else []
+        if present and self.is_array(name):
+            conditions.append(self._contains(name, present))
+        if len(present) != len(values):
+            conditions.append(self.equals(name, None))
+        return sa.or_(sa.false(), *conditions)
+
+    def condition(self, name: str, value: Any):
+        if isinstance(value, re.Pattern) or (isinstance(value, (dict, list)) and not (
+                isinstance(value, dict) and value and all(key.startswith("$") for key in value))):
+            raise _Untranslatable()
+        if self.is_json(name) and self.inside_array(name):
+            raise _Untranslatable()
+        if not isinstance(value, dict):
+            return self.equals(name, value)
+        column = self.field(name)
+        conditions = []
+        for operator, operand in value.items():
+            if operator == "$eq":
+                conditions.append(self.equals(name, operand))
+            elif operator == "$ne":
+                conditions.append(sa.not_(self.equals(name, None)) if operand is None
+                                  else sa.or_(column.is_(None), sa.not_(self.equals(name, operand))))
+            elif operator == "$in":
+                conditions.append(self.one_of(name, operand))
+            elif operator == "$nin":
+                nulls = any(item is None for item in operand)
+                excluded = sa.not_(self.one_of(name, [item for item in operand if item is not None]))
+                conditions.append(sa.and_(sa.not_(self.equals(name, None)), excluded) if nulls
+                                  else sa.or_(column.is_(None), excluded))
+            elif operator in ("$gt", "$gte", "$lt", "$lte"):
+                # Arrays vergleicht MongoDB elementweise - das übernimmt matches()
+                if operand is None or isinstance(operand, bool) or self.is_array(name):
+                    raise _Untranslatable()
+                bound = self.operand(name, operand)
+                comparison = {"$gt": column > bound, "$gte": column >= bound,
+                              "$lt": column < bound, "$lte": column <= bound}[operator]
+                if self.is_json(name):
+                    # Datum nur mit Datum vergleichen, Zahl nur mit Zahl (wie MongoDB)
+                    kind = "object" if isinstance(operand, (datetime, ObjectId)) else (
+                        "text" if isinstance(operand, str) else None)
+                    path = sa.literal_column(f"'{_json_path(name)}'")
+                    if kind is not None:
+                        comparison = sa.and_(comparison, sa.func.json_type(self.table.c.doc, path) == kind)
+                    else:
+                        comparison = sa.and_(comparison,
+                                             sa.func.json_type(self.table.c.doc, path).in_(("integer", "real")))
+                conditions.append(comparison)
+            elif operator == "$exists":
+                if not self.is_json(name):
+                    raise _Untranslatable()
+                path = sa.literal_column(f"'{_json_path(name)}'")
+                kind = sa.func.json_type(self.table.c.doc, path)
+                conditions.append(kind.is_not(None) if operand else kind.is_(None))
+            else:
+                raise _Untranslatable()
+        return sa.and_(sa.true(), *conditions)
+
+    def translate(self, query: Optional[Dict[str, Any]]):
+        """(SQL condition, residual filter for Python or None)"""
+        conditions = []
+        residual: Dict[str, Any] = {}
+        for key, value in (query or {}).items():
+            try:
+                if key in ("$and", "$or"):
+                    parts = []
+                    for part in value:
+                        condition, rest = self.translate(part)
+                        if rest:
+                            raise _Untranslatable()
+                        parts.append(condition)
+                    conditions.append(sa.and_(sa.true(), *parts) if key == "$and" else sa.or_(sa.false(), *parts))
+                elif key.startswith("$"):
+                    raise _Untranslatable()
+                else:
+                    conditions.append(self.condition(key, value))
+            except _Untranslatable:
+                residual[key] = value
+        return sa.and_(sa.true(), *conditions), residual or None
+
+    def order(self, sort: Sequence[Tuple[str, int]]):
+        clauses = [self.field(name).desc() if direction == -1 else self.field(name).asc()
+                   for name, direction in sort]
+        return clauses + [self.table.c.pk.asc()]
+
+# ================================================
+# CURSOR
+# ================================================
+
+class EmbeddedCursor:
+    """Chainable find() cursor: sort/skip/limit/batch_size, to_list() and ``async for``"""
+
+    def __init__(self, collection: "EmbeddedCollection", query: Optional[Dict[str, Any]] = None,
+                 projection: Any = None, sort: Any = None, skip: int = 0, limit: int = 0):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort = _sort_spec(sort)
+        self._skip = skip
+        self._limit = limit
+
+    def sort(self, key_or_list, direction: Optional[int] = None) -> "EmbeddedCursor":
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, count: int) -> "EmbeddedCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "EmbeddedCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, _size: int) -> "EmbeddedCursor":
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        limit = self._limit
+        if length:
+            limit = min(limit, length) if limit else length
+        docs = await self.collection._select(self.query, self._sort, self._skip, limit)
+        return [project(doc, self.projection) for doc in docs]
+
+    async def __aiter__(self):
+        # Seitenweise, damit große Collections nicht komplett im Speicher landen
+        offset, remaining = self._skip, self._limit or None
+        while remaining is None or remaining > 0:
+            page = CURSOR_PAGE_SIZE if remaining is None else min(CURSOR_PAGE_SIZE, remaining)
+            docs = await self.collection._select(self.query, self._sort, offset, page)
+            for doc in docs:
+                yield project(doc, self.projection)
+            if len(docs) < page:
+                return
+            offset += len(docs)
+            if remaining is not None:
+                remaining -= len(docs)
+
+
+class _ListCursor:
+    """Result cursor of aggregate() and list_collections()"""
+
+    def __init__(self, load: Callable[[], Any]):
+        self._load = load
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        docs = await self._load()
+        return docs[:length] if length else docs
+
+    async def __aiter__(self):
+        for doc in await self._load():
+            yield doc
+
+# ================================================
+# COLLECTION
+# ================================================
+
+class EmbeddedCollection:
+    """Motor-compatible collection stored in one SQLite table"""
+
+    def __init__(self, store: "EmbeddedStore", name: str):
+        self.store = store
+        self.name = name
+        self.spec = ENTITIES.get(name)
+
+    @property
+    def full_name(self) -> str:
+        return f"embedded.{self.name}"
+
+    def _view(self) -> Optional[_TableView]:
+        table = self.store.tables.get(self.name)
+        if table is None:
+            return None
+        return _TableView(table, self.spec.fields if self.spec else (), self.store.array_fields.get(self.name, ()))
+
+    async def _current_view(self, conn=None) -> Optional[_TableView]:
+        """View with the array fields as of the last write (read on ``conn`` if given)"""
+        await self.store.ensure_open()
+        if self.name not in self.store.tables:
+            return None
+        await self.store.refresh_arrays(self.name, conn)
+        return self._view()
+
+    async def _writable(self) -> _TableView:
+        await self.store.ensure_table(self.name)
+        return self._view()
+
+    def _row(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        if self.spec is not None:
+            return entity_row(self.spec, doc)
+        return {"_id": encode_value(doc["_id"]), "doc": encode_document(doc)}
+
+    @staticmethod
+    def _document(row) -> Dict[str, Any]:
+        return {"_id": decode_value(row._id), **decode_document(row.doc)}
+
+    def _written(self, documents: Optional[Iterable[Dict[str, Any]]] = None):
+        self.store.written(self.name, documents)
+
+    # ---------- Lesen ----------
+
+    async def _rows(self, conn, view: _TableView, query, sort=(), skip: int = 0, limit: int = 0):
+        """(row, document) pairs matching ``query`` in sort order"""
+        condition, residual = view.translate(query)
+        statement = sa.select(view.table.c.pk, view.table.c._id, view.table.c.doc).where(condition)
+        statement = statement.order_by(*view.order(sort))
+        if residual is None:
+            if limit:
+                statement = statement.limit(limit)
+            if skip:
+                statement = statement.offset(skip)
+        rows = (await conn.execute(statement)).all()
+        pairs = [(row, self._document(row)) for row in rows]
+        if residual is not None:
+            pairs = [pair for pair in pairs if matches(pair[1], residual)]
+            pairs = pairs[skip:skip + limit] if limit else pairs[skip:]
+        return pairs
+
+    async def _select(self, query, sort=(), skip: int = 0, limit: int = 0) -> List[Dict[str, Any]]:
+        await self.store.ensure_open()
+        if self.name not in self.store.tables:
+            return []
+        async with self.store.reader.connect() as conn:
+            view = await self._current_view(conn)
+            return [doc for _, doc in await self._rows(conn, view, query, sort, skip, limit)]
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Any = None, sort: Any = None,
+             skip: int = 0, limit: int = 0, **_options) -> EmbeddedCursor:
+        return EmbeddedCursor(self, filter, projection, sort, skip, limit)
+
+    async def find_one(self, filter: Any = None, projection: Any = None, sort: Any = None,
+                       **_options) -> Optional[Dict[str, Any]]:
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        docs = await self.find(filter, projection, sort).to_list(1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter: Optional[Dict[str, Any]] = None, **_options) -> int:
+        await self.store.ensure_open()
+        if self.name not in self.store.tables:
+            return 0
+        async with self.store.reader.connect() as conn:
+            view = await self._current_view(conn)
+            condition, residual = view.translate(filter)
+            if residual is not None:
+                return len(await self._rows(conn, view, filter))
+            return (await conn.execute(
+                sa.select(sa.func.count()).select_from(view.table).where(condition))).scalar_one()
+
+    async def estimated_document_count(self, **_options) -> int:
+        return await self.count_documents({})
+
+    async def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None) -> List[Any]:
+        values: List[Any] = []
+        for doc in await self._select(filter):
+            value = _get(doc, key)
+            for item in value if isinstance(value, list) else [value]:
+                if item is not _MISSING and item not in values:
+                    values.append(item)
+        return values
+
+    def aggregate(self, pipeline: Sequence[Dict[str, Any]], **_options) -> _ListCursor:
+        pipeline = list(pipeline)
+
+        async def load():
+            for stage in pipeline:
+                (name, _), = stage.items()
+                if name not in ("$match", "$sort", "$limit", "$skip", "$project", "$group", "$count"):
+                    raise NotImplementedError(f"Pipeline stage {name} is not supported by the embedded store")
+            # Führendes $match läuft in SQL
+            query = pipeline[0]["$match"] if pipeline and "$match" in pipeline[0] else {}
+            stages = pipeline[1:] if pipeline and "$match" in pipeline[0] else pipeline
+            return run_pipeline(await self._select(query), stages)
+
+        return _ListCursor(load)
+
+    # ---------- Schreiben ----------
+
+    async def _insert_rows(self, conn, view: _TableView, docs: List[Dict[str, Any]]):
+        try:
+            await conn.execute(view.table.insert(), [self._row(doc) for doc in docs])
+        except sa.exc.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}: {e.orig}") from None
+
+    async def insert_one(self, document: Dict[str, Any], **_options) -> InsertOneResult:
+        document.setdefault("_id", ObjectId())  # wie pymongo: _id landet im übergebenen Dokument
+        view = await self._writable()
+        async with self.store.writer.begin() as conn:
+            await self._insert_rows(conn, view, [document])
+        self._written([document])
+        return InsertOneResult(document["_id"], True)
+
+    async def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True,
+                          **_options) -> InsertManyResult:
+        documents = list(documents)
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+        view = await self._writable()
+        try:
+            async with self.store.writer.begin() as conn:
+                await self._insert_rows(conn, view, documents)
+        except DuplicateKeyError:
+            # Einzeln wiederholen: wie MongoDB bleiben die gültigen Dokumente erhalten
+            errors = []
+            for position, document in enumerate(documents):
+                try:
+                    async with self.store.writer.begin() as conn:
+                        await self._insert_rows(conn, view, [document])
+                except DuplicateKeyError as e:
+                    errors.append({"index": position, "code": 11000, "errmsg": str(e)})
+                    if ordered:
+                        break
+            self._written(documents)
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(documents) - len(errors)})
+        self._written(documents)
+        return InsertManyResult([document["_id"] for document in documents], True)
+
+    async def _update_rows(self, conn, view: _TableView, pairs,
+                           change: Callable[[Dict[str, Any]], Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write the changed documents; returns those that actually changed"""
+        rows, changed = [], []
+        for row, doc in pairs:
+            updated = change(doc)
+            if updated.get("_id", doc["_id"]) != doc["_id"]:
+                raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'")
+            updated["_id"] = doc["_id"]
+            if updated != doc:
+                rows.append({"row_pk": row.pk, **self._row(updated)})
+                changed.append(updated)
+        if not rows:
+            return changed
+        # Ein executemany statt einer kompilierten Anweisung pro Zeile (update_many über Hunderte Dokumente)
+        columns = [name for name in rows[0] if name != "row_pk"]
+        statement = view.table.update().where(view.table.c.pk == sa.bindparam("row_pk")).values(
+            {name: sa.bindparam(name) for name in columns})
+        try:
+            await conn.execute(statement, rows)
+        except sa.exc.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}: {e.orig}") from None
+        return changed
+
+    async def _update(self, filter, change, upsert: bool, insert_document, many: bool, sort=None):
+        await self.store.ensure_table(self.name)
+        upserted_id = None
+        async with self.store.writer.begin() as conn:
+            view = await self._current_view(conn)
+            pairs = await self._rows(conn, view, filter, _sort_spec(sort), limit=0 if many else 1)
+            changed = await self._update_rows(conn, view, pairs, change)
+            if not pairs and upsert:
+                document = insert_document()
+                document.setdefault("_id", ObjectId())
+                await self._insert_rows(conn, view, [document])
+                upserted_id = document["_id"]
+                changed.append(document)
+        modified = len(changed) - int(upserted_id is not None)
+        if changed:
+            self._written(changed)
+        raw = {"n": len(pairs) or int(upserted_id is not None), "nModified": modified}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True), pairs
+
+    async def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+                         **_options) -> UpdateResult:
+        result, _ = await self._update(filter, lambda doc: apply_update(doc, update), upsert,
+                                       lambda: apply_update(_upsert_seed(filter), update, inserting=True), False)
+        return result
+
+    async def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+                          **_options) -> UpdateResult:
+        result, _ = await self._update(filter, lambda doc: apply_update(doc, update), upsert,
+                                       lambda: apply_update(_upsert_seed(filter), update, inserting=True), True)
+        return result
+
+    async def replace_one(self, filter: Dict[str, Any], replacement: Dict[str, Any], upsert: bool = False,
+                          **_options) -> UpdateResult:
+        if any(key.startswith("$") for key in replacement):
+            raise ValueError("replacement can not include $ operators")
+
+        def insert_document():
+            document = dict(replacement)
+            seed = _upsert_seed(filter)
+            if "_id" in seed:
+                document.setdefault("_id", seed["_id"])
+            return document
+
+        result, _ = await self._update(filter, lambda doc: dict(replacement), upsert, insert_document, False)
+        return result
+
+    async def find_one_and_update(self, filter: Dict[str, Any], update: Dict[str, Any], projection: Any = None,
+                                  sort: Any = None, upsert: bool = False,
+                                  return_document: bool = ReturnDocument.BEFORE, **_options):
+        inserted: Dict[str, Any] = {}
+
+        def insert_document():
+            inserted.update(apply_update(_upsert_seed(filter), update, inserting=True))
+            return inserted
+
+        result, pairs = await self._update(filter, lambda doc: apply_update(doc, update), upsert,
+                                           insert_document, False, sort)
+        if pairs:
+            before = pairs[0][1]
+            document = apply_update(before, update) if return_document == ReturnDocument.AFTER else before
+        elif inserted and return_document == ReturnDocument.AFTER:
+            document = inserted
+        else:
+            return None
+        return project(document, projection)
+
+    async def _delete(self, filter: Optional[Dict[str, Any]], many: bool) -> DeleteResult:
+        await self.store.ensure_open()
+        if self.name not in self.store.tables:
+            return DeleteResult({"n": 0}, True)
+        async with self.store.writer.begin() as conn:
+            view = await self._current_view(conn)
+            condition, residual = view.translate(filter)
+            if residual is None and many:
+                deleted = (await conn.execute(view.table.delete().where(condition))).rowcount
+            else:
+                pairs = await self._rows(conn, view, filter, limit=0 if many else 1)
+                keys = [row.pk for row, _ in pairs]
+                deleted = 0
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    deleted += (await conn.execute(view.table.delete().where(view.table.c.pk.in_(chunk)))).rowcount
+        if deleted:
+            self._written(())
+            self.store.deleted(self.name, filter)
+        return DeleteResult({"n": deleted}, True)
+
+    async def delete_one(self, filter: Dict[str, Any], **_options) -> DeleteResult:
+        return await self._delete(filter, many=False)
+
+    async def delete_many(self, filter: Dict[str, Any], **_options) -> DeleteResult:
+        return await self._delete(filter, many=True)
+
+    # ---------- Indizes und Verwaltung ----------
+
+    async def create_index(self, keys: Any, name: Optional[str] = None, unique: bool = False,
+                           sparse: bool = False, expireAfterSeconds: Optional[int] = None, **_options) -> str:
+        keys = _sort_spec(keys, 1)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        view = await self._writable()
+        expressions = [view.field(field).desc() if direction == -1 else view.field(field)
+                       for field, direction in keys]
+        options = {"sqlite_where": view.field(keys[0][0]).is_not(None)} if sparse else {}
+        index = sa.Index(f"ix_{self.name}_{name}", *expressions, unique=unique, **options)
+        try:
+            async with self.store.writer.begin() as conn:
+                await conn.run_sync(lambda sync_conn: index.create(sync_conn, checkfirst=True))
+        except sa.exc.IntegrityError as e:
+            raise OperationFailure(f"Index build failed: {e.orig}", code=11000) from None
+        finally:
+            view.table.indexes.discard(index)
+        await self.store.register_index(self.name, name, keys, unique, sparse, expireAfterSeconds)
+        self.store.schema_changed()
+        return name
+
+    async def index_information(self) -> Dict[str, Dict[str, Any]]:
+        await self.store.ensure_open()
+        info = {"_id_": {"key": [("_id", 1)], "v": 2}}
+        info.update(await self.store.indexes(self.name))
+        return info
+
+    async def drop(self):
+        await self.store.drop_collection(self.name)
+
+    async def rename(self, new_name: str, **_options):
+        await self.store.rename_collection(self.name, new_name)
+
+# ================================================
+# DATENBANK UND CLIENT
+# ================================================
+
+class EmbeddedDatabase:
+    """Motor-compatible database: db.users, db["users"], command(), list_collection_names()"""
+
+    def __init__(self, store: "EmbeddedStore", name: str):
+        self.store = store
+        self.name = name
+        self._collections: Dict[str, EmbeddedCollection] = {}
+
+    def __getitem__(self, name: str) -> EmbeddedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = EmbeddedCollection(self.store, name)
+        return collection
+
+    def __getattr__(self, name: str) -> EmbeddedCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **_options) -> EmbeddedCollection:
+        return self[name]
+
+    async def list_collection_names(self, **_options) -> List[str]:
+        await self.store.ensure_open()
+        return sorted(self.store.tables)
+
+    async def list_collections(self, **_options) -> _ListCursor:
+        names = await self.list_collection_names()
+        return _ListCursor(lambda: asyncio.sleep(0, [{"name": name, "type": "collection", "options": {}}
+                                                    for name in names]))
+
+    async def create_collection(self, name: str, **options) -> EmbeddedCollection:
+        await self.store.ensure_open()
+        if options.get("timeseries"):
+            raise OperationFailure("Time-series collections need a MongoDB server")
+        if name in self.store.tables:
+            raise CollectionInvalid(f"collection {name} already exists")
+        await self.store.ensure_table(name)
+        return self[name]
+
+    async def drop_collection(self, name: str, **_options):
+        await self.store.drop_collection(name)
+
+    async def command(self, command: Any, value: Any = 1, **_options) -> Dict[str, Any]:
+        if isinstance(command, str):
+            command = {command: value}
+        name = next(iter(command))
+        if name in ("ping", "buildInfo", "serverStatus"):
+            return {"ok": 1.0, "storage": "sqlite", "version": sa.__version__}
+        if name == "collMod":
+            # Neue TTL-Frist gilt ab dem nächsten Lauf von expire_documents()
+            index = command.get("index") or {}
+            if index.get("name") and "expireAfterSeconds" in index:
+                await self.store.update_index_expiry(command["collMod"], index["name"], index["expireAfterSeconds"])
+            return {"ok": 1.0}
+        if name == "explain":
+            return await self.store.explain(command["explain"])
+        if name == "dbStats":
+            return await self.store.stats()
+        raise OperationFailure(f"Command {name} is not supported by the embedded store")
+
+
+class EmbeddedClient:
+    """Stands in for AsyncIOMotorClient: client[DB_NAME], client.admin.command('ping')"""
+
+    def __init__(self, store: "EmbeddedStore"):
+        self.store = store
+        self._databases: Dict[str, EmbeddedDatabase] = {}
+
+    def __getitem__(self, name: str) -> EmbeddedDatabase:
+        # Eine Datei ist eine Datenbank - der Name wird nur durchgereicht
+        if name not in self._databases:
+            self._databases[name] = EmbeddedDatabase(self.store, name)
+        return self._databases[name]
+
+    def __getattr__(self, name: str) -> EmbeddedDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_database(self, name: str, **_options) -> EmbeddedDatabase:
+        return self[name]
+
+    async def drop_database(self, _name: Any):
+        await self.store.ensure_open()
+        for name in list(self.store.tables):
+            await self.store.drop_collection(name)
+        self.store.written(None)
+
+    def close(self):
+        """Engines are disposed by EmbeddedStore.close() on shutdown"""
+
+# ================================================
+# SPEICHER
+# ================================================
+
+class EmbeddedStore:
+    """Owns the engines, the table registry and the FTS5 search of the embedded mode"""
+
+    def __init__(self, url: Optional[str] = None, on_write: Optional[Callable[[Optional[str]], None]] = None,
+                 on_delete: Optional[Callable[[str, Optional[Dict[str, Any]]], None]] = None):
+        self.url = url or get_sqlite_url()
+        self.reader, self.writer = create_sqlite_engines(self.url)
+        self.metadata = build_metadata()
+        self.tables: Dict[str, sa.Table] = {}
+        self.on_write = on_write
+        self.on_delete = on_delete  # Löschungen sind per updated_at-Polling unsichtbar (Change Feed)
+        self.client = EmbeddedClient(self)
+        self.message_index = FtsMessageIndex(self)
+        self.repositories = sql_repositories(self.reader, self.metadata, write_engine=self.writer,
+                                             on_write=self.written)
+        self._registry = sa.Table(
+            INDEX_REGISTRY, sa.MetaData(),
+            sa.Column("collection", sa.String(255), primary_key=True),
+            sa.Column("name", sa.String(255), primary_key=True),
+            sa.Column("keys", sa.Text, nullable=False),
+            sa.Column("is_unique", sa.Boolean, nullable=False, default=False),
+            sa.Column("is_sparse", sa.Boolean, nullable=False, default=False),
+            sa.Column("expire_after_seconds", sa.Integer, nullable=True),
+        )
+        self._arrays = sa.Table(
+            ARRAY_REGISTRY, sa.MetaData(),
+            sa.Column("collection", sa.String(255), primary_key=True),
+            sa.Column("field", sa.String(255), primary_key=True),
+        )
+        # Array-Pfade je Collection; nach jedem Schreibzugriff wird vor der nächsten Übersetzung nachgeladen
+        self.array_fields: Dict[str, frozenset] = {}
+        self._arrays_current: set = set()
+        self._opened = False
+        self._open_lock = asyncio.Lock()
+        # Bereits offene Leseverbindungen planen neue Ausdrucks-Indizes erst nach einem Reconnect ein:
+        # veraltete Verbindungen werden beim Checkout verworfen (dispose() würde ausgeliehene verwaisen lassen)
+        self.schema_generation = 0
+        sa.event.listen(self.reader.sync_engine, "connect", self._stamp_connection)
+        sa.event.listen(self.reader.sync_engine, "checkout", self._check_generation)
+
+    def _stamp_connection(self, _conn, record):
+        record.info["schema_generation"] = self.schema_generation
+
+    def _check_generation(self, _conn, record, _proxy):
+        if record.info.get("schema_generation") != self.schema_generation:
+            raise sa.exc.DisconnectionError("schema changed")
+
+    def schema_changed(self):
+        self.schema_generation += 1
+
+    def database(self, name: str) -> EmbeddedDatabase:
+        return self.client[name]
+
+    def written(self, collection: Optional[str], documents: Optional[Iterable[Dict[str, Any]]] = None):
+        """After a write; ``documents`` (if known) only go stale in the array cache with a new array path"""
+        if collection is None:
+            self._arrays_current.clear()
+        elif documents is None or not _known_arrays(documents, self.array_fields.get(collection, frozenset())):
+            self._arrays_current.discard(collection)
+        if self.on_write is not None:
+            self.on_write(collection)
+
+    def deleted(self, collection: str, filter: Optional[Dict[str, Any]]):
+        if self.on_delete is not None:
+            self.on_delete(collection, filter)
+
+    # ---------- Schema ----------
+
+    async def ensure_open(self):
+        if not self._opened:
+            await self.open()
+
+    async def open(self):
+        """Create the schema (entity tables, FTS5, index registry) and load the table list"""
+        async with self._open_lock:
+            if self._opened:
+                return
+            path = _database_path(self.url)
+            if path is not None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+            async with self.writer.begin() as conn:
+                await conn.run_sync(self.metadata.create_all)
+                await conn.run_sync(self._registry.create, checkfirst=True)
+                await conn.run_sync(self._arrays.create, checkfirst=True)
+                for collection, columns in FTS_COLUMNS.items():
+                    for statement in _fts_statements(collection, columns):
+                        await conn.exec_driver_sql(statement)
+                names = (await conn.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite%' "
+                    "AND name NOT LIKE '%\\_fts%' ESCAPE '\\' AND name NOT LIKE '\\_%' ESCAPE '\\'")).scalars().all()
+                # Indizes aus build_metadata() wie angelegte MongoDB-Indizes registrieren
+                for table in self.metadata.tables.values():
+                    for index in table.indexes:
+                        await self._register(conn, table.name, index.name[len(f"ix_{table.name}_"):],
+                                             self._index_keys(index), bool(index.unique), False, None)
+                for name in names:
+                    await self._track_arrays(conn, name)
+            for name in names:
+                self.tables[name] = self._table(name)
+            self._opened = True
+            logger.info(f"🪶 Embedded SQLite store ready: {self.url} ({len(self.tables)} collections)")
+
+    @staticmethod
+    def _index_keys(index: sa.Index) -> List[Tuple[str, int]]:
+        keys = []
+        for expression in index.expressions:
+            if isinstance(expression, sa.Column):
+                keys.append((expression.name, 1))
+            else:  # UnaryExpression aus column.desc()
+                keys.append((expression.element.name, -1))
+        return keys
+
+    def _table(self, name: str) -> sa.Table:
+        table = self.metadata.tables.get(name)
+        return table if table is not None else _document_table(self.metadata, name)
+
+    async def ensure_table(self, name: str):
+        await self.ensure_open()
+        if name in self.tables:
+            return
+        table = self._table(name)
+        async with self.writer.begin() as conn:
+            await conn.run_sync(lambda sync_conn: table.create(sync_conn, checkfirst=True))
+            await self._track_arrays(conn, name)
+        self.tables[name] = table
+
+    async def drop_collection(self, name: str):
+        await self.ensure_open()
+        table = self.tables.get(name)
+        if table is None:
+            return
+        async with self.writer.begin() as conn:
+            if name in ENTITIES:
+                # Entitätstabellen (und ihre FTS-Trigger) bleiben bestehen, nur die Daten gehen
+                await conn.execute(table.delete())
+            else:
+                await conn.run_sync(lambda sync_conn: table.drop(sync_conn, checkfirst=True))
+                await conn.execute(self._registry.delete().where(self._registry.c.collection == name))
+            await conn.execute(self._arrays.delete().where(self._arrays.c.collection == name))
+        if name not in ENTITIES:
+            del self.tables[name]
+            self.metadata.remove(table)
+        self.written(name)
+
+    async def rename_collection(self, name: str, new_name: str):
+        await self.ensure_open()
+        if name in ENTITIES or new_name in ENTITIES:
+            raise OperationFailure("Entity collections can not be renamed in the embedded store")
+        if new_name in self.tables:
+            raise OperationFailure(f"target namespace {new_name} exists")
+        table = self.tables.pop(name)
+        async with self.writer.begin() as conn:
+            await conn.exec_driver_sql(f'ALTER TABLE "{name}" RENAME TO "{new_name}"')
+            await conn.execute(self._registry.update().where(self._registry.c.collection == name)
+                               .values(collection=new_name))
+            # Trigger wandern mit der Tabelle, tragen aber den alten Namen ein
+            for trigger in _array_triggers(name):
+                await conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS "{trigger}"')
+            await conn.execute(self._arrays.delete().where(self._arrays.c.collection == name))
+            await self._track_arrays(conn, new_name)
+        self.metadata.remove(table)
+        self.tables[new_name] = _document_table(self.metadata, new_name)
+        self.written(name)
+        self.written(new_name)
+
+    # ---------- Array-Felder ----------
+
+    async def _track_arrays(self, conn, collection: str):
+        """Install the array triggers; the first time, also record the paths of existing documents"""
+        installed = (await conn.exec_driver_sql(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?)",
+            _array_triggers(collection))).scalar()
+        if installed == 2:
+            return
+        for statement in _array_statements(collection):
+            await conn.exec_driver_sql(statement)
+        await conn.exec_driver_sql(
+            f"INSERT OR IGNORE INTO {ARRAY_REGISTRY}(collection, field) "
+            f"SELECT DISTINCT '{collection}', substr(tree.fullkey, 3) "
+            f'FROM "{collection}", json_tree("{collection}".doc) AS tree WHERE {_ARRAY_PATH}')
+        self._arrays_current.discard(collection)
+
+    async def refresh_arrays(self, collection: str, conn=None):
+        if collection in self._arrays_current:
+            return
+        # Vor dem Lesen markieren: ein Schreibzugriff währenddessen erzwingt das nächste Nachladen
+        self._arrays_current.add(collection)
+        statement = sa.select(self._arrays.c.field).where(self._arrays.c.collection == collection)
+        if conn is None:
+            async with self.reader.connect() as conn:
+                fields = (await conn.execute(statement)).scalars().all()
+        else:
+            fields = (await conn.execute(statement)).scalars().all()
+        self.array_fields[collection] = frozenset(fields)
+
+    # ---------- Index-Registry ----------
+
+    async def _register(self, conn, collection: str, name: str, keys, unique: bool, sparse: bool,
+                        expire_after_seconds: Optional[int]):
+        registry = self._registry
+        await conn.execute(registry.delete().where(
+            (registry.c.collection == collection) & (registry.c.name == name)))
+        await conn.execute(registry.insert().values(
+            collection=collection, name=name, keys=json.dumps(list(keys)), is_unique=unique, is_sparse=sparse,
+            expire_after_seconds=expire_after_seconds))
+
+    async def register_index(self, collection: str, name: str, keys, unique: bool, sparse: bool,
+                             expire_after_seconds: Optional[int]):
+        async with self.writer.begin() as conn:
+            await self._register(conn, collection, name, keys, unique, sparse, expire_after_seconds)
+
+    async def update_index_expiry(self, collection: str, name: str, expire_after_seconds: int):
+        async with self.writer.begin() as conn:
+            await conn.execute(self._registry.update().where(
+                (self._registry.c.collection == collection) & (self._registry.c.name == name)
+            ).values(expire_after_seconds=expire_after_seconds))
+
+    async def indexes(self, collection: str) -> Dict[str, Dict[str, Any]]:
+        async with self.reader.connect() as conn:
+            rows = (await conn.execute(
+                sa.select(self._registry).where(self._registry.c.collection == collection))).all()
+        info = {}
+        for row in rows:
+            details: Dict[str, Any] = {"key": [tuple(key) for key in json.loads(row.keys)], "v": 2}
+            if row.is_unique:
+                details["unique"] = True
+            if row.is_sparse:
+                details["sparse"] = True
+            if row.expire_after_seconds is not None:
+                details["expireAfterSeconds"] = row.expire_after_seconds
+            info[row.name] = details
+        return info
+
+    # ---------- TTL ----------
+
+    async def expire_documents(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Delete documents past a TTL index, like MongoDB's TTL monitor; returns deletions per collection"""
+        await self.ensure_open()
+        now = now or datetime.utcnow()
+        async with self.reader.connect() as conn:
+            rows = (await conn.execute(sa.select(self._registry).where(
+                self._registry.c.expire_after_seconds.is_not(None)))).all()
+        deleted: Dict[str, int] = {}
+        for row in rows:
+            if row.collection not in self.tables:
+                continue
+            field = json.loads(row.keys)[0][0]
+            cutoff = now - timedelta(seconds=row.expire_after_seconds)
+            # Wie MongoDB nur Datumswerte: $lt vergleicht Datum nur mit Datum
+            result = await self.database("ttl")[row.collection].delete_many({field: {"$lt": cutoff}})
+            if result.deleted_count:
+                deleted[row.collection] = deleted.get(row.collection, 0) + result.deleted_count
+        return deleted
+
+    async def run_ttl_forever(self, interval_seconds: float = SQLITE_TTL_INTERVAL_SECONDS):
+        while True:
+            try:
+                deleted = await self.expire_documents()
+                if deleted:
+                    logger.info(f"🗑️ TTL removed expired documents: {deleted}")
+            except Exception as e:
+                logger.error(f"❌ TTL sweep failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    # ---------- Diagnose ----------
+
+    async def explain(self, command: Dict[str, Any]) -> Dict[str, Any]:
+        """EXPLAIN QUERY PLAN in MongoDB's explain shape (IXSCAN / COLLSCAN / SORT)"""
+        await self.ensure_open()
+        collection = self.database("explain")[command["find"]]
+        view = await collection._current_view()
+        if view is None:
+            return {"queryPlanner": {"winningPlan": {"stage": "EOF"}}}
+        condition, residual = view.translate(command.get("filter"))
+        statement = sa.select(view.table.c.doc).where(condition).order_by(
+            *view.order(_sort_spec(command.get("sort")))[:-1])
+        if command.get("limit"):
+            statement = statement.limit(command["limit"])
+        compiled = statement.compile(self.reader.sync_engine, compile_kwargs={"literal_binds": True})
+        async with self.reader.connect() as conn:
+            details = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")).all()
+        stages = []
+        for row in details:
+            detail = row[-1]
+            if detail.startswith(("SEARCH", "SCAN")) and view.table.name in detail:
+                covered = "USING INDEX" in detail or "USING COVERING INDEX" in detail or "PRIMARY KEY" in detail
+                stages.append({"stage": "IXSCAN" if covered else "COLLSCAN", "detail": detail})
+            elif "TEMP B-TREE" in detail:
+                stages.append({"stage": "SORT", "detail": detail})
+        if residual is not None:
+            stages.append({"stage": "FILTER", "detail": f"python: {sorted(residual)}"})
+        return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStages": stages}}, "ok": 1.0}
+
+    async def stats(self) -> Dict[str, Any]:
+        await self.ensure_open()
+        async with self.reader.connect() as conn:
+            page_size = (await conn.exec_driver_sql("PRAGMA page_size")).scalar()
+            page_count = (await conn.exec_driver_sql("PRAGMA page_count")).scalar()
+            free_pages = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            journal_mode = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+        path = _database_path(self.url)
+        wal = Path(f"{path}-wal") if path is not None else None
+        return {
+            "ok": 1.0,
+            "storage": "sqlite",
+            "path": str(path) if path is not None else None,
+            "collections": len(self.tables),
+            "journal_mode": journal_mode,
+            "dataSize": page_size * (page_count - free_pages),
+            "storageSize": page_size * page_count,
+            "walSize": wal.stat().st_size if wal is not None and wal.exists() else 0,
+        }
+
+    # ---------- Volltextsuche ----------
+
+    async def search_messages(self, query: str, viewer_id: Optional[str] = None, channel: Optional[str] = None,
+                              sender_id: Optional[str] = None, since: Optional[datetime] = None,
+                              until: Optional[datetime] = None, cursor: Optional[int] = None,
+                              limit: int = 20) -> Tuple[List[str], Optional[int]]:
+        """Same contract as MessageSearchIndex.search(): (ids newest first, next cursor)"""
+        match = _fts_query(query)
+        if match is None:
+            return [], None
+        await self.ensure_open()
+        messages = self.metadata.tables["messages"]
+        fts = sa.table("messages_fts", sa.column("rowid"))
+        statement = (
+            sa.select(fts.c.rowid, messages.c.id)
+            .select_from(fts.join(messages, messages.c.pk == fts.c.rowid))
+            .where(sa.text("messages_fts MATCH :match").bindparams(match=match))
+        )
+        if cursor is not None:
+            statement = statement.where(fts.c.rowid < cursor)
+        if channel:
+            statement = statement.where(messages.c.channel == channel)
+        if sender_id:
+            statement = statement.where(messages.c.sender_id == sender_id)
+        if since:
+            statement = statement.where(messages.c.timestamp >= naive_utc(since))
+        if until:
+            statement = statement.where(messages.c.timestamp <= naive_utc(until))
+        # Privatnachrichten nur für Absender und Empfänger sichtbar
+        public = sa.and_(sa.func.coalesce(messages.c.recipient_id, "") == "",
+                         sa.func.coalesce(messages.c.channel, "") != "private")
+        if viewer_id:
+            public = sa.or_(public, messages.c.recipient_id == viewer_id, messages.c.sender_id == viewer_id)
+        statement = statement.where(public).order_by(fts.c.rowid.desc()).limit(limit + 1)
+        async with self.reader.connect() as conn:
+            rows = (await conn.execute(statement)).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1].rowid
+        return [row.id for row in rows], next_cursor
+
+    async def search_persons(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Active persons by name, case number, address or description; every term matches as a prefix"""
+        match = _fts_query(query, prefix_all=True)
+        if match is None:
+            return []
+        await self.ensure_open()
+        persons = self.metadata.tables["persons"]
+        fts = sa.table("persons_fts", sa.column("rowid"), sa.column("rank"))
+        statement = (
+            sa.select(persons.c.doc)
+            .select_from(fts.join(persons, persons.c.pk == fts.c.rowid))
+            .where(sa.text("persons_fts MATCH :match").bindparams(match=match))
+            .where(persons.c.is_active.is_(True))
+            .order_by(fts.c.rank)
+            .limit(limit)
+        )
+        async with self.reader.connect() as conn:
+            rows = (await conn.execute(statement)).scalars().all()
+        return [decode_document(text) for text in rows]
+
+    async def close(self):
+        await self.reader.dispose()
+        await self.writer.dispose()
+
+
+def _document_table(metadata: sa.MetaData, name: str) -> sa.Table:
+    """Generic collection: insertion order, encoded _id, document as JSON"""
+    return sa.Table(
+        name, metadata,
+        sa.Column("pk", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("_id", sa.String(64), nullable=False, unique=True),
+        sa.Column("doc", sa.Text, nullable=False),
+        sqlite_autoincrement=True, extend_existing=True,
+    )
+
+
+def _fts_statements(collection: str, columns: Sequence[str]) -> List[str]:
+    """Contentless FTS5 table plus triggers, so every write path (facade or repository) keeps it current"""
+    fts = f"{collection}_fts"
+    names = ", ".join(columns)
+    new_values = ", ".join(f"json_extract(new.doc, '$.{column}')" for column in columns)
+    old_values = ", ".join(f"json_extract(old.doc, '$.{column}')" for column in columns)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.pk, {old_values});"
+    insert = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.pk, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='', "
+        f"tokenize='{FTS_TOKENIZER}', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {collection} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {collection} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF doc ON {collection} BEGIN {delete} {insert} END",
+    ]
+
+
+# Nur benannte Pfade ($."a"."b" wird zu a.b); Pfade in Arrays hinein und Schlüssel mit Sonderzeichen nicht
+_ARRAY_PATH = "tree.type = 'array' AND instr(tree.fullkey, '[') = 0 AND instr(tree.fullkey, '\"') = 0"
+
+
+def _array_paths(doc: Dict[str, Any], prefix: str = "") -> Iterable[str]:
+    for key, value in doc.items():
+        if isinstance(value, list):
+            yield f"{prefix}{key}"
+        elif isinstance(value, dict):
+            yield from _array_paths(value, f"{prefix}{key}.")
+
+
+def _known_arrays(documents: Iterable[Dict[str, Any]], known: frozenset) -> bool:
+    """Whether every array in ``documents`` sits at a path the triggers have recorded already"""
+    return all(path in known for doc in documents for path in _array_paths(doc))
+
+
+def _array_triggers(collection: str) -> Tuple[str, str]:
+    return f"{collection}_arrays_insert", f"{collection}_arrays_update"
+
+
+def _array_statements(collection: str) -> List[str]:
+    """Triggers recording every field that holds an array, for facade and repository writes alike"""
+    record = (f"INSERT OR IGNORE INTO {ARRAY_REGISTRY}(collection, field) "
+              f"SELECT '{collection}', substr(tree.fullkey, 3) FROM json_tree(new.doc) AS tree WHERE {_ARRAY_PATH};")
+    insert, update = _array_triggers(collection)
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS "{insert}" AFTER INSERT ON "{collection}" BEGIN {record} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{update}" AFTER UPDATE OF doc ON "{collection}" BEGIN {record} END',
+    ]
+
+
+def _fts_query(query: str, prefix_all: bool = False) -> Optional[str]:
+    """Search input as FTS5 query: all terms (AND), prefix match for a trailing ``*`` or every term.
+
+    Lowercased instead of casefolded like parse_query(): unicode61 keeps "ß",
+    casefold() would turn it into "ss".
+    """
+    query = (query or "").strip()
+    terms = [token.lower() for token in TOKEN_PATTERN.findall(query) if len(token) >= MIN_TOKEN_LENGTH]
+    prefixed = [prefix_all or (query.endswith("*") and position == len(terms) - 1)
+                for position in range(len(terms))]
+    return " ".join(f'"{term}"*' if prefix else f'"{term}"' for term, prefix in zip(terms, prefixed)) or None
+
+# ================================================
+# NACHRICHTENSUCHE
+# ================================================
+
+class FtsMessageIndex:
+    """Drop-in for MessageSearchIndex in embedded mode.
+
+    The FTS5 table is maintained by triggers, so add/remove/expire are no-ops
+    and nothing is loaded into memory on startup; search() is a coroutine.
+    """
+
+    ready = True
+
+    def __init__(self, store: EmbeddedStore):
+        self.store = store
+
+    def __len__(self):
+        return 0
+
+    def add(self, _message: Dict[str, Any]):
+        pass
+
+    def remove(self, _message_id: str) -> bool:
+        return True
+
+    def expire_before(self, _cutoff: datetime) -> int:
+        return 0
+
+    async def search(self, query: str, **filters) -> Tuple[List[str], Optional[int]]:
+        return await self.store.search_messages(query, **filters)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# ⏱️ Time-Series Speicher für Stadtwache
+# locations und checkins als MongoDB Time-Series Collections (Buckets + Kompression)
+#
+#   python timeseries.py status
+#   python timeseries.py migrate [--drop-legacy]
+
+import os
+import sys
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict
+
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+# "standard" (normale Collections) oder "timeseries"
+STORAGE_MODE = os.getenv("TIMESERIES_STORAGE_MODE", "standard").lower()
+MIGRATION_BATCH_SIZE = int(os.getenv("TIMESERIES_MIGRATION_BATCH_SIZE", "10000"))
+
+# Granularität nach Meldeintervall: GPS alle paar Sekunden, Check-Ins alle ~30 Minuten
+TIMESERIES_COLLECTIONS = {
+    "locations": {"timeField": "timestamp", "metaField": "user_id", "granularity": "seconds"},
+    "checkins": {"timeField": "timestamp", "metaField": "user_id", "granularity": "hours"},
+}
+
+
+def timeseries_enabled() -> bool:
+    return STORAGE_MODE == "timeseries"
+
+
+async def collection_types(db) -> Dict[str, str]:
+    """Map of collection name -> type ("collection" or "timeseries")"""
+    types = {}
+    async for info in await db.list_collections():
+        types[info["name"]] = info.get("type", "collection")
+    return types
+
+
+async def ensure_timeseries_collections(db):
+    """Create missing time-series collections; warn about ones that still need migration"""
+    types = await collection_types(db)
+    for name, options in TIMESERIES_COLLECTIONS.items():
+        current = types.get(name)
+        if current == "timeseries":
+            continue
+        if current is not None:
+            logger.warning(f"⚠️ {name} is a regular collection - run 'python timeseries.py migrate'")
+            continue
+        try:
+            await db.create_collection(name, timeseries=options)
+            logger.info(f"⏱️ Created time-series collection {name} ({options['granularity']})")
+        except CollectionInvalid:
+            pass  # parallel angelegt
+
+
+# ================================================
+# MIGRATION
+# ================================================
+
+async def migrate_collection(db, name: str, drop_legacy: bool = False) -> Dict[str, Any]:
+    """Move an existing regular collection into a new time-series collection.
+
+    Time-series collections cannot be renamed, so the old collection is renamed
+    to ``<name>_legacy_<date>`` first and its documents are copied over in batches.
+    Stop the API while migrating - inserts between rename and create would
+    recreate a regular collection.
+    """
+    options = TIMESERIES_COLLECTIONS[name]
+    types = await collection_types(db)
+    if types.get(name) == "timeseries":
+        return {"collection": name, "status": "already timeseries"}
+
+    legacy = None
+    if name in types:
+        legacy = f"{name}_legacy_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+        await db[name].rename(legacy)
+
+    await db.create_collection(name, timeseries=options)
+    if legacy is None:
+        return {"collection": name, "status": "created", "copied": 0}
+
+    copied = 0
+    skipped = 0
+    batch = []
+    async for doc in db[legacy].find({}).sort("_id", 1):
+        # Zeitfeld ist Pflicht in Time-Series Collections
+        if not isinstance(doc.get(options["timeField"]), datetime):
+            skipped += 1
+            continue
+        batch.append(doc)
+        if len(batch) >= MIGRATION_BATCH_SIZE:
+            await db[name].insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+    if batch:
+        await db[name].insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    result = {"collection": name, "status": "migrated", "legacy": legacy, "copied": copied, "skipped": skipped}
+    if drop_legacy and skipped == 0 and await db[name].count_documents({}) >= copied:
+        await db[legacy].drop()
+        result["legacy_dropped"] = True
+    return result
+
+
+async def migrate(db, drop_legacy: bool = False):
+    results = []
+    for name in TIMESERIES_COLLECTIONS:
+        try:
+            results.append(await migrate_collection(db, name, drop_legacy))
+        except OperationFailure as e:
+            results.append({"collection": name, "status": "failed", "error": str(e)})
+    return results
+
+
+if __name__ == "__main__":
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def main():
+        client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017/stadtwache_db"))
+        db = client[os.getenv("DB_NAME", "stadtwache_db")]
+        command = sys.argv[1] if len(sys.argv) > 1 else "status"
+        try:
+            if command == "migrate":
+                for result in await migrate(db, drop_legacy="--drop-legacy" in sys.argv):
+                    print(f"✅ {result}")
+            else:
+                types = await collection_types(db)
+                for name in TIMESERIES_COLLECTIONS:
+                    print(f"📊 {name}: {types.get(name, 'missing')}")
+        finally:
+            client.close()
+
+    asyncio.run(main())
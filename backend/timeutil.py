@@ -0,0 +1,17 @@
+# 🕒 Zeitstempel-Hilfen für Stadtwache
+# Gespeichert wird naive UTC (wie bei MongoDB); Abfrageparameter von FastAPI sind oft zeitzonenbehaftet
+# Ohne Abhängigkeiten, damit retention/indexes/repositories es ohne Importzyklus nutzen können
+
+from datetime import datetime, timezone
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Aware datetimes are stored as naive UTC, like MongoDB does"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def utc_timestamp(value: datetime) -> float:
+    """Epoch seconds; naive values are UTC, not local time as ``datetime.timestamp()`` assumes"""
+    return naive_utc(value).replace(tzinfo=timezone.utc).timestamp()
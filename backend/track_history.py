@@ -0,0 +1,285 @@
+# 🛰️ Streifen-Verlauf für Stadtwache
+# Zeit-Buckets pro Beamten, Vereinfachung (Douglas-Peucker) und Delta-Kodierung der GPS-Punkte
+
+import os
+import math
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import Binary
+
+logger = logging.getLogger(__name__)
+
+# ================================================
+# KONFIGURATION
+# ================================================
+
+TRACK_BUCKET_MINUTES = int(os.getenv("TRACK_BUCKET_MINUTES", "60"))
+TRACK_EPSILON_METERS = float(os.getenv("TRACK_EPSILON_METERS", "5"))
+TRACK_COMPACT_INTERVAL_SECONDS = int(os.getenv("TRACK_COMPACT_INTERVAL_SECONDS", "300"))
+
+COORDINATE_SCALE = 100000  # 1e-5 Grad ≈ 1,1 m
+METERS_PER_DEGREE_LAT = 110540.0
+METERS_PER_DEGREE_LNG = 111320.0
+EPOCH = datetime(1970, 1, 1)
+
+# (unix seconds, lat, lng)
+TrackPoint = Tuple[float, float, float]
+
+# ================================================
+# PUNKTE
+# ================================================
+
+def to_track_point(doc: Dict[str, Any]) -> Optional[TrackPoint]:
+    """Extract (t, lat, lng) from a locations document"""
+    location = doc.get("location") or {}
+    lat = location.get("lat", location.get("latitude"))
+    lng = location.get("lng", location.get("longitude"))
+    timestamp = doc.get("timestamp")
+    if not isinstance(timestamp, datetime) or not isinstance(lat, (int, float)) or not isinstance(lng, (int, float)):
+        return None
+    return ((timestamp - EPOCH).total_seconds(), float(lat), float(lng))
+
+
+def _synchronized_distance(point: TrackPoint, start: TrackPoint, end: TrackPoint) -> float:
+    """Distance in meters between a point and the position interpolated at its timestamp"""
+    duration = end[0] - start[0]
+    ratio = (point[0] - start[0]) / duration if duration > 0 else 0.0
+    lat = start[1] + (end[1] - start[1]) * ratio
+    lng = start[2] + (end[2] - start[2]) * ratio
+    dy = (point[1] - lat) * METERS_PER_DEGREE_LAT
+    dx = (point[2] - lng) * METERS_PER_DEGREE_LNG * math.cos(math.radians(lat))
+    return math.hypot(dx, dy)
+
+
+def simplify(points: List[TrackPoint], epsilon_m: float = TRACK_EPSILON_METERS) -> List[TrackPoint]:
+    """Douglas-Peucker with time-synchronized distance.
+
+    Every dropped point lies within ``epsilon_m`` of the position a replay
+    would interpolate at the same timestamp, so speed and stops survive.
+    """
+    if len(points) <= 2:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_distance = 0.0
+        index = first
+        for i in range(first + 1, last):
+            distance = _synchronized_distance(points[i], points[first], points[last])
+            if distance > max_distance:
+                max_distance = distance
+                index = i
+        if max_distance > epsilon_m:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+# ================================================
+# DELTA-KODIERUNG
+# ================================================
+
+def _pack_varints(values: List[int]) -> bytes:
+    """Zigzag + LEB128 varints"""
+    out = bytearray()
+    for value in values:
+        value = (value << 1) ^ (value >> 63)
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def _unpack_varints(data: bytes) -> List[int]:
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append((value >> 1) ^ -(value & 1))
+        value = shift = 0
+    return values
+
+
+def delta_encode(points: List[TrackPoint]) -> Dict[str, Any]:
+    """Encode points as start values plus integer delta arrays"""
+    if not points:
+        return {"t0": None, "lat0": None, "lng0": None, "dt": [], "dlat": [], "dlng": []}
+    times = [int(round(p[0])) for p in points]
+    lats = [int(round(p[1] * COORDINATE_SCALE)) for p in points]
+    lngs = [int(round(p[2] * COORDINATE_SCALE)) for p in points]
+    return {
+        "t0": times[0],
+        "lat0": lats[0],
+        "lng0": lngs[0],
+        "dt": [b - a for a, b in zip(times, times[1:])],
+        "dlat": [b - a for a, b in zip(lats, lats[1:])],
+        "dlng": [b - a for a, b in zip(lngs, lngs[1:])],
+    }
+
+
+def delta_decode(encoded: Dict[str, Any]) -> List[TrackPoint]:
+    if encoded.get("t0") is None:
+        return []
+    t, lat, lng = encoded["t0"], encoded["lat0"], encoded["lng0"]
+    points = [(float(t), lat / COORDINATE_SCALE, lng / COORDINATE_SCALE)]
+    for dt, dlat, dlng in zip(encoded["dt"], encoded["dlat"], encoded["dlng"]):
+        t, lat, lng = t + dt, lat + dlat, lng + dlng
+        points.append((float(t), lat / COORDINATE_SCALE, lng / COORDINATE_SCALE))
+    return points
+
+
+def _bucket_document(user_id: str, bucket_start: datetime, raw: List[TrackPoint],
+                     epsilon_m: float) -> Dict[str, Any]:
+    kept = simplify(raw, epsilon_m)
+    encoded = delta_encode(kept)
+    return {
+        "user_id": user_id,
+        "bucket_start": bucket_start,
+        "bucket_end": bucket_start + timedelta(minutes=TRACK_BUCKET_MINUTES),
+        "t0": encoded["t0"],
+        "lat0": encoded["lat0"],
+        "lng0": encoded["lng0"],
+        "dt": Binary(_pack_varints(encoded["dt"])),
+        "dlat": Binary(_pack_varints(encoded["dlat"])),
+        "dlng": Binary(_pack_varints(encoded["dlng"])),
+        "points_raw": len(raw),
+        "points_kept": len(kept),
+        "epsilon_m": epsilon_m,
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def _bucket_points(doc: Dict[str, Any]) -> List[TrackPoint]:
+    return delta_decode({
+        "t0": doc.get("t0"),
+        "lat0": doc.get("lat0"),
+        "lng0": doc.get("lng0"),
+        "dt": _unpack_varints(doc["dt"]),
+        "dlat": _unpack_varints(doc["dlat"]),
+        "dlng": _unpack_varints(doc["dlng"]),
+    })
+
+
+def floor_bucket(moment: datetime) -> datetime:
+    minutes = (moment.hour * 60 + moment.minute) // TRACK_BUCKET_MINUTES * TRACK_BUCKET_MINUTES
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(minutes=minutes)
+
+# ================================================
+# TRACK STORE
+# ================================================
+
+class TrackHistory:
+    """Compacts db.locations into per-user track buckets and serves route replays"""
+
+    STATE_ID = "track_compactor"
+
+    def __init__(self, db, epsilon_m: float = TRACK_EPSILON_METERS):
+        self.db = db
+        self.epsilon_m = epsilon_m
+
+    async def _watermark(self) -> Optional[datetime]:
+        state = await self.db.track_state.find_one({"_id": self.STATE_ID})
+        if state:
+            return state["compacted_until"]
+        oldest = await self.db.locations.find({}, {"timestamp": 1}).sort("timestamp", 1).limit(1).to_list(1)
+        if not oldest or not isinstance(oldest[0].get("timestamp"), datetime):
+            return None
+        return floor_bucket(oldest[0]["timestamp"])
+
+    async def compact_bucket(self, bucket_start: datetime) -> int:
+        """Simplify and store all user tracks of one closed bucket, returns bucket count"""
+        bucket_end = bucket_start + timedelta(minutes=TRACK_BUCKET_MINUTES)
+        cursor = self.db.locations.find(
+            {"timestamp": {"$gte": bucket_start, "$lt": bucket_end}},
+            {"_id": 0, "user_id": 1, "location": 1, "timestamp": 1}
+        ).sort("timestamp", 1)
+
+        tracks: Dict[str, List[TrackPoint]] = {}
+        async for doc in cursor:
+            point = to_track_point(doc)
+            if point and doc.get("user_id"):
+                tracks.setdefault(doc["user_id"], []).append(point)
+
+        for user_id, raw in tracks.items():
+            document = _bucket_document(user_id, bucket_start, raw, self.epsilon_m)
+            await self.db.track_buckets.replace_one(
+                {"user_id": user_id, "bucket_start": bucket_start}, document, upsert=True
+            )
+        return len(tracks)
+
+    async def compact(self, now: Optional[datetime] = None) -> int:
+        """Compact all closed buckets since the last run"""
+        watermark = await self._watermark()
+        if watermark is None:
+            return 0
+        current = floor_bucket(now or datetime.utcnow())
+        compacted = 0
+        while watermark < current:
+            compacted += await self.compact_bucket(watermark)
+            watermark += timedelta(minutes=TRACK_BUCKET_MINUTES)
+            await self.db.track_state.update_one(
+                {"_id": self.STATE_ID}, {"$set": {"compacted_until": watermark}}, upsert=True
+            )
+        return compacted
+
+    async def run_forever(self, interval_seconds: int = TRACK_COMPACT_INTERVAL_SECONDS):
+        while True:
+            try:
+                compacted = await self.compact()
+                if compacted:
+                    logger.info(f"🛰️ Compacted {compacted} track buckets")
+            except Exception as e:
+                logger.error(f"❌ Track compaction failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    async def replay(self, user_id: str, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Return a user's simplified track between start and end as one delta-encoded payload"""
+        points: List[TrackPoint] = []
+        covered_until = start
+        buckets = self.db.track_buckets.find({
+            "user_id": user_id,
+            "bucket_start": {"$lt": end},
+            "bucket_end": {"$gt": start},
+        }).sort("bucket_start", 1)
+        async for bucket in buckets:
+            points.extend(_bucket_points(bucket))
+            covered_until = max(covered_until, bucket["bucket_end"])
+
+        # Noch nicht verdichteter Bereich (aktueller Bucket) direkt aus den Rohdaten
+        state = await self.db.track_state.find_one({"_id": self.STATE_ID})
+        raw_from = max(covered_until, state["compacted_until"]) if state else covered_until
+        if raw_from < end:
+            raw = []
+            cursor = self.db.locations.find(
+                {"user_id": user_id, "timestamp": {"$gte": raw_from, "$lte": end}},
+                {"_id": 0, "location": 1, "timestamp": 1}
+            ).sort("timestamp", 1)
+            async for doc in cursor:
+                point = to_track_point(doc)
+                if point:
+                    raw.append(point)
+            points.extend(simplify(raw, self.epsilon_m))
+
+        start_s = (start - EPOCH).total_seconds()
+        end_s = (end - EPOCH).total_seconds()
+        points = [p for p in points if start_s <= p[0] <= end_s]
+
+        payload = delta_encode(points)
+        payload.update({
+            "user_id": user_id,
+            "start": start,
+            "end": end,
+            "points": len(points),
+            "scale": COORDINATE_SCALE,
+            "epsilon_m": self.epsilon_m,
+        })
+        return payload
@@ -0,0 +1,39 @@
+"""
+asyncio-Hilfen: wait_for_event gibt ein cancel() beim Shutdown nicht verloren.
+
+    python -m pytest tests/test_asyncutil.py
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from asyncutil import wait_for_event  # noqa: E402
+
+
+def test_returns_whether_the_event_was_set():
+    async def run():
+        event = asyncio.Event()
+        timed_out = await wait_for_event(event, 0.01)
+        asyncio.get_running_loop().call_later(0.01, event.set)
+        return timed_out, await wait_for_event(event, 5)
+
+    assert asyncio.run(run()) == (False, True)
+
+
+def test_cancel_together_with_set_is_not_swallowed():
+    async def run():
+        event = asyncio.Event()
+        waiting = asyncio.create_task(wait_for_event(event, 5))
+        await asyncio.sleep(0)
+        # Shutdown und Wecken im selben Schleifendurchlauf
+        event.set()
+        waiting.cancel()
+        await waiting
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())
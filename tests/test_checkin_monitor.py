@@ -0,0 +1,93 @@
+"""
+Check-In-Überwachung: zwei Instanzen auf derselben Datenbank melden ein Versäumnis genau einmal.
+Läuft gegen mongomock und den eingebetteten SQLite-Store.
+
+    python -m pytest tests/test_checkin_monitor.py
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from checkin_monitor import CheckInMonitor  # noqa: E402
+
+
+async def _open(backend, tmp_path):
+    if backend == "sqlite":
+        from sqlite_store import EmbeddedStore
+        store = EmbeddedStore(f"sqlite+aiosqlite:///{tmp_path}/checkins.db")
+        await store.open()
+        return store.database("stadtwache_test_checkins"), store.close
+    from mongomock_motor import AsyncMongoMockClient
+
+    async def close():
+        pass
+    return AsyncMongoMockClient()["stadtwache_test_checkins"], close
+
+
+class _RacingUsers:
+    """``db.users`` proxy: the first read waits until the other instance has read as well"""
+
+    def __init__(self, users, barrier: asyncio.Barrier):
+        self.users, self.barrier, self.waiting = users, barrier, True
+
+    def find(self, *args):
+        cursor, racing = self.users.find(*args), self
+
+        class Cursor:
+            async def to_list(self, length):
+                docs = await cursor.to_list(length)
+                if racing.waiting:
+                    racing.waiting = False
+                    await racing.barrier.wait()
+                return docs
+        return Cursor()
+
+    def update_many(self, *args, **kwargs):
+        return self.users.update_many(*args, **kwargs)
+
+
+class _RacingDatabase:
+    def __init__(self, db, barrier: asyncio.Barrier):
+        self.users = _RacingUsers(db.users, barrier)
+
+
+@pytest.mark.parametrize("backend", ["mongomock", "sqlite"])
+def test_parallel_instances_alert_once(backend, tmp_path):
+    async def run():
+        db, close = await _open(backend, tmp_path)
+        try:
+            now = datetime.utcnow()
+            await db.users.insert_many([
+                {"id": f"u{n}", "username": f"Beamter {n}", "status": "Streife", "is_active": True,
+                 "check_in_interval": 1, "last_check_in": now - timedelta(seconds=90), "missed_check_ins": 0}
+                for n in range(3)
+            ])
+            alerts = []
+
+            async def on_missed(batch):
+                alerts.extend(alert["user_id"] for alert in batch)
+
+            monitors = [CheckInMonitor(db, on_missed), CheckInMonitor(db, on_missed)]
+            barrier = asyncio.Barrier(len(monitors))
+            for monitor in monitors:
+                await monitor.load()
+                # Beide lesen den Stand vor dem ersten Update (wie zwei App-Server im selben Moment)
+                monitor.db = _RacingDatabase(db, barrier)
+            await asyncio.gather(*(monitor.process_due(now) for monitor in monitors))
+            counted = {doc["id"]: doc["missed_check_ins"] for doc in await db.users.find({}).to_list(None)}
+            # Nächste Frist liegt eine Minute später: beide Instanzen haben neu geplant
+            pending = [monitor.next_deadline() for monitor in monitors]
+            return alerts, counted, pending, now
+        finally:
+            await close()
+
+    alerts, counted, pending, now = asyncio.run(run())
+    assert sorted(alerts) == ["u0", "u1", "u2"]
+    assert counted == {"u0": 1, "u1": 1, "u2": 1}
+    assert all(deadline is not None and deadline > now for deadline in pending)
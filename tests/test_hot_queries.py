@@ -0,0 +1,58 @@
+"""
+Index-Abdeckung der HOT_QUERIES gegen einen echten mongod (explain).
+Ohne erreichbaren Server (MONGO_URL, Standard localhost:27017) wird der Test übersprungen.
+
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_hot_queries.py
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = "stadtwache_hot_query_check"
+
+
+def _mongod_reachable() -> bool:
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+pytestmark = pytest.mark.skipif(not _mongod_reachable(), reason=f"no mongod reachable at {MONGO_URL}")
+
+
+def test_hot_queries_are_index_covered():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from indexes import HOT_QUERIES, IndexManager, check_hot_queries
+    from seed import SeedConfig, seed_database
+
+    async def run():
+        client = AsyncIOMotorClient(MONGO_URL)
+        await client.drop_database(DB_NAME)
+        db = client[DB_NAME]
+        try:
+            # Mit Daten, damit der Planer echte Pläne wählt statt EOF auf leeren Collections
+            await seed_database(db, SeedConfig(users=20, teams=2, districts=2, incidents=50, image_kb=1,
+                                               persons=20, reports=20, messages=200, locations=200, days=1))
+            report = await IndexManager(db).reconcile()
+            assert not report["failed"], report["failed"]
+            return await check_hot_queries(db)
+        finally:
+            await client.drop_database(DB_NAME)
+            client.close()
+
+    failures = asyncio.run(run())
+    assert not failures, "\n".join(f"{f['query']}: {f['error']}" for f in failures) + \
+        f"\n({len(failures)} of {len(HOT_QUERIES)} hot queries not index-covered)"
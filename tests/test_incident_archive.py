@@ -0,0 +1,60 @@
+"""
+Vorfall-Archiv: Migration alter Archivberichte, gegen mongomock und den eingebetteten SQLite-Store.
+
+    python -m pytest tests/test_incident_archive.py
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from incident_archive import IncidentArchive  # noqa: E402
+
+
+async def _open(backend, tmp_path):
+    if backend == "sqlite":
+        from sqlite_store import EmbeddedStore
+        store = EmbeddedStore(f"sqlite+aiosqlite:///{tmp_path}/archive.db")
+        await store.open()
+        return store.database("stadtwache_test_archive"), store.close
+    from mongomock_motor import AsyncMongoMockClient
+
+    async def close():
+        pass
+    return AsyncMongoMockClient()["stadtwache_test_archive"], close
+
+
+def _report(number: int, images):
+    report = {"id": f"r{number}", "incident_id": f"i{number}", "title": f"Archiv: Einsatz {number}",
+              "status": "archived", "author_id": "u1", "author_name": "Beamter",
+              "created_at": datetime(2025, 5, number)}
+    if images is not ...:
+        report["images"] = images
+    return report
+
+
+@pytest.mark.parametrize("backend", ["mongomock", "sqlite"])
+def test_migration_skips_reports_without_images(backend, tmp_path):
+    async def run():
+        db, close = await _open(backend, tmp_path)
+        try:
+            # Berichte ohne Bilder vorne: sie dürfen keinen leeren Batch erzeugen und die Migration beenden
+            await db.reports.insert_many([_report(1, None), _report(2, ...), _report(3, []),
+                                          _report(4, ["a", "b"]), _report(5, ["c"])])
+            archive = IncidentArchive(db)
+            migrated = await archive.migrate_legacy_reports(batch=1)
+            again = await archive.migrate_legacy_reports(batch=1)
+            archived = {doc["id"]: doc["image_count"] for doc in await archive.collection.find({}).to_list(None)}
+            return migrated, again, archived
+        finally:
+            await close()
+
+    migrated, again, archived = asyncio.run(run())
+    assert migrated == 2
+    assert again == 0
+    assert archived == {"i4": 2, "i5": 1}
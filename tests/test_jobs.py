@@ -0,0 +1,53 @@
+"""
+Job-Queue mit mongomock: Lease-Verlängerung für Jobs, die länger als JOBS_LEASE_SECONDS laufen.
+
+    python -m pytest tests/test_jobs.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+import jobs  # noqa: E402
+
+
+def test_long_job_keeps_its_lease(monkeypatch):
+    from mongomock_motor import AsyncMongoMockClient
+
+    monkeypatch.setattr(jobs, "JOBS_LEASE_SECONDS", 0.2)
+    monkeypatch.setattr(jobs, "JOBS_POLL_SECONDS", 0.05)
+
+    async def run():
+        db = AsyncMongoMockClient()["stadtwache_test_jobs"]
+        queue = jobs.JobQueue(db)
+        # Zweite Instanz auf derselben Collection, die abgelaufene Leases freigibt und Jobs übernimmt
+        other = jobs.JobQueue(db)
+        other.worker_id = "other:1"
+        runs = []
+
+        async def migrate(payload):
+            runs.append(payload["n"])
+            await asyncio.sleep(1.0)
+            return {"n": payload["n"]}
+
+        for instance in (queue, other):
+            instance.job("migrate", concurrency=1, timeout_seconds=5)(migrate)
+
+        job = await queue.enqueue("migrate", {"n": 1})
+        dispatcher = asyncio.create_task(queue.run_forever())
+        await asyncio.sleep(0.1)
+        other_dispatcher = asyncio.create_task(other.run_forever())
+        for _ in range(30):
+            await asyncio.sleep(0.05)
+            assert await other.release_expired() == 0
+        for task in (dispatcher, other_dispatcher):
+            task.cancel()
+        await asyncio.gather(dispatcher, other_dispatcher, return_exceptions=True)
+        return runs, await queue.get(job["id"])
+
+    runs, job = asyncio.run(run())
+    assert runs == [1]
+    assert job["status"] == "done"
+    assert job["worker"] != "other:1"
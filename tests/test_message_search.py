@@ -0,0 +1,116 @@
+"""
+In-Memory-Nachrichtensuche (MessageSearchIndex), ohne Datenbank.
+
+    python -m pytest tests/test_message_search.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from message_search import MessageSearchIndex, build_index_from_db, highlight  # noqa: E402
+
+NOON = datetime(2026, 3, 1, 12, 0)
+
+
+def _message(content: str, timestamp: datetime = NOON, **extra):
+    return {"id": str(uuid.uuid4()), "content": content, "channel": "general",
+            "sender_id": "u1", "sender_name": "Beamter", "timestamp": timestamp, **extra}
+
+
+@pytest.fixture
+def berlin_host():
+    """Run with a non-UTC local time zone, where naive ``.timestamp()`` would be off by an hour"""
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "Europe/Berlin"
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+def test_naive_timestamps_are_utc(berlin_host):
+    index = MessageSearchIndex()
+    message = _message("Lage am Bahnhof")
+    index.load([message])
+
+    since = datetime(2026, 3, 1, 11, 30, tzinfo=timezone.utc)
+    assert index.search("bahnhof", since=since)[0] == [message["id"]]
+    assert index.search("bahnhof", since=since + timedelta(hours=1))[0] == []
+    assert index.search("bahnhof", until=since)[0] == []
+
+    assert index.expire_before(datetime(2026, 3, 1, 11, 30)) == 0
+    assert index.expire_before(datetime(2026, 3, 1, 13, 0, tzinfo=timezone(timedelta(hours=1)))) == 0
+    assert index.expire_before(datetime(2026, 3, 1, 12, 30)) == 1
+
+
+class _Cursor:
+    """Motor-like cursor that lets a live message arrive in the middle of the backfill"""
+
+    def __init__(self, messages, index, live):
+        self.messages, self.index, self.live = messages, index, live
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for position, message in enumerate(self.messages):
+            if position == 2:
+                self.index.add(self.live)
+            yield message
+
+
+class _Database:
+    def __init__(self):
+        self.messages = self
+        self.cursor = None
+
+    def find(self, *args):
+        return self.cursor
+
+
+def test_backfill_does_not_index_live_message_twice():
+    index = MessageSearchIndex()
+    stored = [_message(f"Streife {n}", NOON + timedelta(minutes=n)) for n in range(3)]
+    live = _message("Streife live", NOON + timedelta(minutes=3))
+    # Der Cursor liefert die Live-Nachricht ebenfalls, weil sie schon gespeichert ist
+    db = _Database()
+    db.cursor = _Cursor(stored + [live], index, live)
+
+    asyncio.run(build_index_from_db(index, db, batch_size=2))
+
+    assert index.ready
+    assert len(index) == 4
+    ids, _ = index.search("streife", limit=10)
+    assert ids == [live["id"]] + [m["id"] for m in reversed(stored)]
+
+
+def test_load_keeps_live_messages_missing_from_snapshot():
+    index = MessageSearchIndex()
+    live = _message("Einsatz live", NOON + timedelta(minutes=5))
+    index.add(live)
+    stored = [_message("Einsatz alt")]
+    index.load(stored)
+    assert index.search("einsatz")[0] == [live["id"], stored[0]["id"]]
+
+
+def test_highlight_escapes_content():
+    result = highlight("<script>Alarm</script> am Tor", ["alarm"])
+    assert result["snippet"] == "&lt;script&gt;<mark>Alarm</mark>&lt;/script&gt; am Tor"
+    assert result["highlights"] == [{"start": 8, "end": 13}]
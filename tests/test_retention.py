@@ -0,0 +1,49 @@
+"""
+Archiv-Abfragen über Parquet-Partitionen (RetentionManager.query), ohne Datenbank.
+
+    python -m pytest tests/test_retention.py
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from retention import RetentionManager  # noqa: E402
+
+DAY = datetime(2026, 3, 1)
+
+
+def _archive(tmp_path) -> RetentionManager:
+    manager = RetentionManager(db=None, archive_dir=tmp_path)
+    batch = [
+        {"_id": n, "id": f"m{n}", "channel": "general", "content": f"Nachricht {n}",
+         "timestamp": DAY + timedelta(days=n // 2, hours=10 + n % 2)}
+        for n in range(4)
+    ]
+    asyncio.run(manager._write_batch(manager.policies["messages"], batch))
+    return manager
+
+
+def test_query_with_naive_bounds(tmp_path):
+    manager = _archive(tmp_path)
+    found = asyncio.run(manager.query("messages", DAY, DAY + timedelta(days=2)))
+    assert [m["id"] for m in found] == ["m0", "m1", "m2", "m3"]
+
+
+def test_query_with_aware_bounds_is_read_as_utc(tmp_path):
+    manager = _archive(tmp_path)
+    berlin = timezone(timedelta(hours=1))
+    # 11:30 Berlin = 10:30 UTC am ersten Tag bis 23:59 UTC am zweiten Tag
+    start = datetime(2026, 3, 1, 11, 30, tzinfo=berlin)
+    end = datetime(2026, 3, 2, 23, 59, tzinfo=timezone.utc)
+    found = asyncio.run(manager.query("messages", start, end))
+    assert [m["id"] for m in found] == ["m1", "m2", "m3"]
+
+
+def test_query_skips_partitions_without_filtered_column(tmp_path):
+    manager = _archive(tmp_path)
+    found = asyncio.run(manager.query("messages", DAY, DAY + timedelta(days=2), {"sender_id": "u1"}))
+    assert found == []
@@ -0,0 +1,192 @@
+"""
+Eingebetteter SQLite-Store: SQL-Übersetzung der Filter liefert dasselbe wie matches() in Python.
+
+    python -m pytest tests/test_sqlite_store.py
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from repositories import decode_document  # noqa: E402
+from sqlite_store import EmbeddedStore, matches  # noqa: E402
+
+DOCS = [
+    {"id": "a", "tags": ["x", "y"], "owner": {"roles": ["lead"]}},
+    {"id": "b", "tags": "x"},
+    {"id": "c", "tags": ["z"]},
+    {"id": "d"},
+]
+
+
+def _run(tmp_path, scenario):
+    async def run():
+        store = EmbeddedStore(f"sqlite+aiosqlite:///{tmp_path}/store.db")
+        await store.open()
+        try:
+            return await scenario(store, store.database("stadtwache_test_store"))
+        finally:
+            await store.close()
+    return asyncio.run(run())
+
+
+async def _ids(collection, query):
+    return sorted(doc["id"] for doc in await collection.find(query).to_list(None))
+
+
+def _expected(query):
+    return sorted(doc["id"] for doc in DOCS if matches(doc, query))
+
+
+@pytest.mark.parametrize("query", [
+    {"tags": "x"},
+    {"tags": {"$ne": "x"}},
+    {"tags": {"$in": ["y", "z"]}},
+    {"tags": {"$nin": ["x"]}},
+    {"tags": {"$gte": "y"}},
+    {"owner.roles": "lead"},
+])
+def test_array_fields_are_detected_from_the_data(tmp_path, query):
+    async def scenario(store, db):
+        await db.patrols.insert_many([dict(doc) for doc in DOCS])
+        return await _ids(db.patrols, query)
+
+    assert _run(tmp_path, scenario) == _expected(query)
+
+
+def test_array_written_later_and_after_reopen(tmp_path):
+    async def scenario(store, db):
+        await db.patrols.insert_one({"id": "b", "tags": "x"})
+        before = await _ids(db.patrols, {"tags": "x"})
+        # Erstes Array erst nach dem ersten Lesen: der Cache muss nachladen
+        await db.patrols.update_one({"id": "b"}, {"$set": {"tags": ["y", "x"]}})
+        after = await _ids(db.patrols, {"tags": "x"})
+        await store.close()
+
+        reopened = EmbeddedStore(store.url)
+        await reopened.open()
+        try:
+            return before, after, await _ids(reopened.database("stadtwache_test_store").patrols, {"tags": "x"})
+        finally:
+            await reopened.close()
+
+    assert _run(tmp_path, scenario) == (["b"], ["b"], ["b"])
+
+
+def test_renamed_collection_keeps_its_array_fields(tmp_path):
+    async def scenario(store, db):
+        await db.patrols.insert_one({"id": "a", "tags": ["x"]})
+        await db.patrols.rename("patrols_old")
+        await db.patrols_old.insert_one({"id": "b", "crew": ["u1"]})
+        return await _ids(db.patrols_old, {"tags": "x"}), await _ids(db.patrols_old, {"crew": "u1"})
+
+    assert _run(tmp_path, scenario) == (["a"], ["b"])
+
+
+NOON = datetime(2026, 3, 1, 12, 0)
+BERLIN = timezone(timedelta(hours=1))
+
+# Ein Datensatz je Sonderfall: fehlendes Feld, null, Zahl/Text/Bool gemischt, Arrays, Datum, Unterdokumente
+RECORDS = [
+    {"id": "int", "count": 3, "name": "Anna", "at": NOON, "tags": ["x", "y"], "meta": {"level": 2}},
+    {"id": "float", "count": 2.5, "name": "bert", "at": NOON - timedelta(hours=2), "tags": [], "meta": {"level": None}},
+    {"id": "text", "count": "3", "name": None, "at": "2026-03-01", "tags": "x", "meta": "flat"},
+    {"id": "bool", "count": True, "name": "Carl", "flag": False},
+    {"id": "zero", "count": 0, "name": "", "tags": [None], "meta": {}},
+    {"id": "empty"},
+]
+USERS = [
+    {"id": "u1", "username": "anna", "role": "admin", "status": "Streife", "is_active": True, "created_at": NOON},
+    {"id": "u2", "username": "bert", "role": "officer", "status": None, "is_active": False,
+     "created_at": NOON - timedelta(days=1)},
+    {"id": "u3", "username": "carl", "role": "officer", "is_active": True},
+]
+
+RECORD_QUERIES = [
+    {}, {"count": 3}, {"count": "3"}, {"count": True}, {"count": 0}, {"count": None}, {"nothing": None},
+    {"count": {"$eq": 2.5}}, {"count": {"$ne": 3}}, {"count": {"$ne": None}}, {"name": {"$ne": "Anna"}},
+    {"count": {"$in": [3, "3"]}}, {"count": {"$in": [None, 0]}}, {"count": {"$nin": [3, None]}},
+    {"name": {"$nin": ["Anna", ""]}}, {"count": {"$gt": 2}}, {"count": {"$gte": 2.5, "$lt": 3}},
+    {"count": {"$lte": 0}}, {"name": {"$gt": "B"}}, {"name": {"$lt": "b"}}, {"count": {"$gt": True}},
+    {"at": NOON}, {"at": NOON.replace(tzinfo=timezone.utc)}, {"at": {"$gte": datetime(2026, 3, 1, 12, 30, tzinfo=BERLIN)}},
+    {"at": {"$lt": NOON.replace(tzinfo=BERLIN)}}, {"at": {"$gt": "2026"}},
+    {"at": {"$in": [datetime(2026, 3, 1, 13, 0, tzinfo=BERLIN), "2026-03-01"]}},
+    {"tags": "x"}, {"tags": None}, {"tags": {"$ne": "x"}}, {"tags": {"$in": ["y", None]}}, {"tags": {"$nin": ["x"]}},
+    {"tags": {"$gt": "x"}}, {"tags": {"$exists": True}}, {"meta.level": 2}, {"meta.level": None},
+    {"meta.level": {"$exists": False}}, {"meta": "flat"}, {"nothing": {"$exists": False}},
+    {"flag": False}, {"flag": {"$ne": True}}, {"flag": {"$exists": True}},
+    {"$or": [{"count": 3}, {"name": "Carl"}]}, {"$and": [{"count": {"$gte": 0}}, {"name": {"$ne": ""}}]},
+    {"$or": [{"tags": "x"}, {"meta.level": {"$exists": True}}], "count": {"$ne": "3"}},
+]
+USER_QUERIES = [
+    {"role": "officer"}, {"role": {"$ne": "admin"}}, {"status": None}, {"status": {"$ne": None}},
+    {"status": {"$in": ["Streife", None]}}, {"status": {"$nin": [None]}}, {"is_active": True},
+    {"is_active": {"$ne": True}}, {"created_at": NOON}, {"created_at": NOON.replace(tzinfo=BERLIN) + timedelta(hours=1)},
+    {"created_at": {"$gte": datetime(2026, 3, 1, 0, 0, tzinfo=timezone.utc)}}, {"created_at": {"$lt": NOON}},
+    {"created_at": {"$exists": True}}, {"$or": [{"role": "admin"}, {"created_at": None}]},
+    {"username": {"$in": ["anna", "carl"]}, "is_active": True},
+]
+
+
+async def _translated(store, collection, query):
+    """Documents selected by the SQL part of translate() alone, and whether a residual remained"""
+    view = await collection._current_view()
+    condition, residual = view.translate(query)
+    async with store.reader.connect() as conn:
+        texts = (await conn.execute(sa.select(view.table.c.doc).where(condition))).scalars().all()
+    return sorted(decode_document(text)["id"] for text in texts), residual
+
+
+def _compare(tmp_path, name, documents, queries):
+    async def scenario(store, db):
+        await db[name].insert_many([dict(doc) for doc in documents])
+        return [(await _translated(store, db[name], query), await _ids(db[name], query)) for query in queries]
+
+    for query, ((translated, residual), found) in zip(queries, _run(tmp_path, scenario)):
+        expected = sorted(doc["id"] for doc in documents if matches(doc, query))
+        assert found == expected, query
+        if residual is None:
+            assert translated == expected, query
+        else:
+            # Der Python-Rest darf nur einschränken: SQL muss alle Treffer liefern
+            assert set(expected) <= set(translated), query
+
+
+def test_translate_agrees_with_matches_on_documents(tmp_path):
+    _compare(tmp_path, "records", RECORDS, RECORD_QUERIES)
+
+
+def test_translate_agrees_with_matches_on_typed_columns(tmp_path):
+    _compare(tmp_path, "users", USERS, USER_QUERIES)
+
+
+def test_ttl_index_expires_documents(tmp_path):
+    async def scenario(store, db):
+        await db.jobs.create_index("finished_at", expireAfterSeconds=3600)
+        await db.jobs.insert_many([
+            {"id": "old", "finished_at": NOON - timedelta(hours=2)},
+            {"id": "recent", "finished_at": NOON - timedelta(minutes=30)},
+            {"id": "open", "finished_at": None},
+            {"id": "queued"},
+            {"id": "text", "finished_at": "2020-01-01"},
+        ])
+        first = await store.expire_documents(now=NOON)
+        remaining = await _ids(db.jobs, {})
+        # collMod verkürzt die Frist: ab dem nächsten Lauf wirksam
+        index = next(name for name, info in (await db.jobs.index_information()).items()
+                     if info.get("expireAfterSeconds"))
+        await db.command({"collMod": "jobs", "index": {"name": index, "expireAfterSeconds": 600}})
+        second = await store.expire_documents(now=NOON)
+        return first, remaining, second, await _ids(db.jobs, {})
+
+    first, remaining, second, left = _run(tmp_path, scenario)
+    assert first == {"jobs": 1}
+    assert remaining == ["open", "queued", "recent", "text"]
+    assert second == {"jobs": 1}
+    assert left == ["open", "queued", "text"]